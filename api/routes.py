@@ -1,17 +1,60 @@
-from flask import Blueprint, request, jsonify, render_template
-from services.chat_service import ChatService
-from services.storage_service import StorageService
-from config import Config
+from flask import Blueprint, Response, current_app, request, jsonify, render_template, stream_with_context
+from services.app_services import AppServices
+from services.conversation_export import (
+    EXPORT_FORMATS,
+    iter_ndjson,
+    iter_text,
+    gzip_chunks,
+    buffer_chunks,
+    open_upload,
+    iter_import_records
+)
+from utils.memory import process_memory
+from datetime import datetime
+from functools import wraps
+import gzip
+import hmac
+import json
 import logging
+import os
+import zlib
 
 logger = logging.getLogger(__name__)
 
 # Створення blueprint
 api_bp = Blueprint('api', __name__)
 
-# Ініціалізація сервісів
-storage_service = StorageService(Config.DATA_DIR)
-chat_service = ChatService(storage_service, Config)
+# Ключ сервісів у app.extensions (створюються в create_app)
+SERVICES_KEY = 'gpt2chat'
+
+def get_services() -> AppServices:
+    """Сервіси поточного застосунку"""
+    return current_app.extensions[SERVICES_KEY]
+
+def model_not_ready():
+    """Відповідь 503, поки модель завантажується (або не завантажилась)"""
+    response = jsonify({
+        "success": False,
+        "error": "Model is not ready",
+        "model": get_services().chat.get_model_status()
+    })
+    response.status_code = 503
+    response.headers['Retry-After'] = str(current_app.config['MODEL_RETRY_AFTER'])
+    return response
+
+def admin_required(view):
+    """Перевірка заголовка X-Admin-Token, якщо задано ADMIN_TOKEN"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        token = request.headers.get('X-Admin-Token', '')
+        admin_token = current_app.config['ADMIN_TOKEN']
+        if admin_token and not hmac.compare_digest(token.encode('utf-8'), admin_token.encode('utf-8')):
+            return jsonify({
+                "success": False,
+                "error": "Admin token required"
+            }), 403
+        return view(*args, **kwargs)
+    return wrapper
 
 @api_bp.route('/')
 def index():
@@ -22,7 +65,7 @@ def index():
 def create_conversation():
     """Створення нової розмови"""
     try:
-        conversation_id = storage_service.create_conversation()
+        conversation_id = get_services().storage.create_conversation()
         return jsonify({
             "success": True,
             "conversation_id": conversation_id
@@ -54,6 +97,10 @@ def send_message(conversation_id):
                 "error": "Message cannot be empty"
             }), 400
 
+        chat_service = get_services().chat
+        if not chat_service.ready:
+            return model_not_ready()
+
         # Обробка повідомлення
         result = chat_service.process_message(conversation_id, user_message)
 
@@ -69,15 +116,79 @@ def send_message(conversation_id):
             "error": str(e)
         }), 500
 
+@api_bp.route('/api/conversations/<conversation_id>/messages/stream', methods=['POST'])
+def stream_message(conversation_id):
+    """Відправка повідомлення з потоковою відповіддю (Server-Sent Events)"""
+    data = request.get_json(silent=True)
+
+    if not data or 'message' not in data:
+        return jsonify({
+            "success": False,
+            "error": "Message is required"
+        }), 400
+
+    user_message = data['message'].strip()
+
+    if not user_message:
+        return jsonify({
+            "success": False,
+            "error": "Message cannot be empty"
+        }), 400
+
+    chat_service = get_services().chat
+    if not chat_service.ready:
+        return model_not_ready()
+
+    def events():
+        for event in chat_service.stream_message(conversation_id, user_message):
+            name = event.pop("event")
+            yield f"event: {name}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+
+    return Response(
+        stream_with_context(events()),
+        mimetype='text/event-stream',
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no"
+        }
+    )
+
 @api_bp.route('/api/conversations/<conversation_id>/messages', methods=['GET'])
 def get_messages(conversation_id):
-    """Отримання історії повідомлень"""
+    """
+    Отримання історії повідомлень
+
+    Параметри запиту (необов'язкові): limit - розмір сторінки, before /
+    after - курсори prev_cursor / next_cursor попередньої сторінки.
+    Без параметрів повертається вся історія.
+    """
     try:
-        messages = storage_service.get_messages(conversation_id)
+        if not {'limit', 'before', 'after'} & set(request.args):
+            return jsonify({
+                "success": True,
+                "messages": get_services().storage.get_messages(conversation_id)
+            })
+
+        limit = request.args.get('limit', current_app.config['MESSAGES_PAGE_SIZE'], type=int)
+        limit = max(1, min(limit, current_app.config['MESSAGES_MAX_PAGE_SIZE']))
+
+        messages, prev_cursor, next_cursor = get_services().storage.get_message_page(
+            conversation_id,
+            limit,
+            before=request.args.get('before') or None,
+            after=request.args.get('after') or None
+        )
         return jsonify({
             "success": True,
-            "messages": messages
+            "messages": messages,
+            "prev_cursor": prev_cursor,
+            "next_cursor": next_cursor
         })
+    except ValueError as e:
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 400
     except Exception as e:
         logger.error(f"Error getting messages: {e}")
         return jsonify({
@@ -87,13 +198,32 @@ def get_messages(conversation_id):
 
 @api_bp.route('/api/conversations', methods=['GET'])
 def list_conversations():
-    """Список всіх розмов"""
+    """
+    Список розмов з пагінацією
+
+    Параметри запиту: limit, cursor (next_cursor попередньої сторінки),
+    sort (updated_at, created_at, message_count), order (asc, desc)
+    """
     try:
-        conversations = storage_service.list_conversations()
+        limit = request.args.get('limit', current_app.config['CONVERSATIONS_PAGE_SIZE'], type=int)
+        limit = max(1, min(limit, current_app.config['CONVERSATIONS_MAX_PAGE_SIZE']))
+
+        conversations, next_cursor = get_services().storage.page_conversations(
+            limit=limit,
+            cursor=request.args.get('cursor') or None,
+            sort=request.args.get('sort', 'updated_at'),
+            order=request.args.get('order', 'desc')
+        )
         return jsonify({
             "success": True,
-            "conversations": conversations
+            "conversations": conversations,
+            "next_cursor": next_cursor
         })
+    except ValueError as e:
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 400
     except Exception as e:
         logger.error(f"Error listing conversations: {e}")
         return jsonify({
@@ -101,11 +231,114 @@ def list_conversations():
             "error": str(e)
         }), 500
 
+@api_bp.route('/api/search', methods=['GET'])
+def search_conversations():
+    """
+    Повнотекстовий пошук розмов
+
+    Параметри запиту: q (слова, які мають бути в розмові), limit,
+    cursor (next_cursor попередньої сторінки)
+    """
+    try:
+        limit = request.args.get('limit', current_app.config['SEARCH_PAGE_SIZE'], type=int)
+        limit = max(1, min(limit, current_app.config['SEARCH_MAX_PAGE_SIZE']))
+
+        results, next_cursor = get_services().storage.search(
+            request.args.get('q', ''),
+            limit=limit,
+            cursor=request.args.get('cursor') or None
+        )
+        return jsonify({
+            "success": True,
+            "results": results,
+            "next_cursor": next_cursor
+        })
+    except ValueError as e:
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 400
+    except Exception as e:
+        logger.error(f"Error searching conversations: {e}")
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 500
+
+@api_bp.route('/api/export', methods=['GET'])
+@admin_required
+def export_conversations():
+    """
+    Потоковий експорт усіх розмов
+
+    Параметри запиту: format (ndjson або txt), gzip (true - стиснути).
+    Розмови читаються і віддаються по одній, без збирання файлу в пам'яті.
+    """
+    export_format = request.args.get('format', 'ndjson')
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({
+            "success": False,
+            "error": f"Unknown export format: {export_format}"
+        }), 400
+
+    storage_service = get_services().storage
+    conversations = storage_service.export_conversations()
+    if export_format == 'ndjson':
+        chunks = iter_ndjson(conversations, storage_service.serializer)
+        mimetype = 'application/x-ndjson'
+    else:
+        chunks = iter_text(conversations)
+        mimetype = 'text/plain; charset=utf-8'
+
+    filename = f"conversations-{datetime.now():%Y%m%d-%H%M%S}.{export_format}"
+    if request.args.get('gzip', 'false').lower() in ('1', 'true', 'yes'):
+        chunks = gzip_chunks(chunks)
+        mimetype = 'application/gzip'
+        filename += '.gz'
+
+    return Response(
+        stream_with_context(buffer_chunks(chunks, current_app.config['EXPORT_CHUNK_BYTES'])),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+    )
+
+@api_bp.route('/api/import', methods=['POST'])
+@admin_required
+def import_conversations():
+    """
+    Пакетний імпорт розмов
+
+    Тіло запиту - NDJSON у форматі експорту, можна стиснений gzip.
+    Потік читається по рядку і записується пакетами по IMPORT_BATCH_SIZE;
+    некоректні рядки пропускаються і повертаються в errors.
+    """
+    report = {"imported": 0, "skipped": 0, "invalid": 0, "errors": []}
+    try:
+        storage_service = get_services().storage
+        records = iter_import_records(open_upload(request.stream), storage_service.serializer, report)
+        storage_service.import_conversations(records, current_app.config['IMPORT_BATCH_SIZE'], report)
+        return jsonify({"success": True, **report})
+    except (gzip.BadGzipFile, EOFError, zlib.error) as e:
+        return jsonify({
+            "success": False,
+            "error": f"Corrupted gzip upload: {e}",
+            **report
+        }), 400
+    except Exception as e:
+        logger.error(f"Error importing conversations: {e}")
+        return jsonify({
+            "success": False,
+            "error": str(e),
+            **report
+        }), 500
+
 @api_bp.route('/api/conversations/<conversation_id>', methods=['DELETE'])
 def delete_conversation(conversation_id):
     """Видалення розмови"""
     try:
-        success = storage_service.delete_conversation(conversation_id)
+        services = get_services()
+        success = services.storage.delete_conversation(conversation_id)
+        services.chat.drop_session(conversation_id)
         return jsonify({
             "success": success
         })
@@ -116,10 +349,60 @@ def delete_conversation(conversation_id):
             "error": str(e)
         }), 500
 
+@api_bp.route('/api/admin/maintenance', methods=['GET'])
+@admin_required
+def maintenance_status():
+    """Стан фонового обслуговування: поточне завдання з прогресом, тривалість завдань останнього проходу"""
+    return jsonify({
+        "success": True,
+        "maintenance": get_services().maintenance.get_status()
+    })
+
+@api_bp.route('/api/admin/maintenance', methods=['POST'])
+@admin_required
+def trigger_maintenance():
+    """Позачерговий прохід обслуговування (виконується у фоні)"""
+    if not get_services().maintenance.trigger():
+        return jsonify({
+            "success": False,
+            "error": "Maintenance worker is not running"
+        }), 409
+
+    return jsonify({
+        "success": True,
+        "maintenance": get_services().maintenance.get_status()
+    }), 202
+
 @api_bp.route('/api/health', methods=['GET'])
 def health_check():
-    """Перевірка стану системи"""
+    """
+    Перевірка стану системи
+
+    Сервер живий (200) і під час завантаження моделі: стан моделі -
+    model.state (not_loaded, loading, ready, failed), готовність - ready.
+    process - пам'ять процесу, що обробив запит (воркера server.py).
+    """
+    services = get_services()
+    ready = services.chat.ready
     return jsonify({
         "status": "healthy",
-        "model_loaded": chat_service.model.model is not None
+        "ready": ready,
+        "model_loaded": ready,
+        "model": services.chat.get_model_status(),
+        "stats": services.chat.model.get_stats() if ready else None,
+        "storage": services.storage.get_stats(),
+        "process": dict(process_memory(), pid=os.getpid())
+    })
+
+@api_bp.route('/api/health/ready', methods=['GET'])
+def readiness_check():
+    """Готовність до генерації (readiness probe): 200 лише після завантаження моделі"""
+    chat_service = get_services().chat
+    if not chat_service.ready:
+        return model_not_ready()
+
+    return jsonify({
+        "success": True,
+        "ready": True,
+        "model": chat_service.get_model_status()
     })
@@ -1,7 +1,9 @@
 from flask import Flask
 from flask_cors import CORS
-from api.routes import api_bp
+from api.routes import api_bp, SERVICES_KEY
+from services.app_services import AppServices
 from config import Config
+import atexit
 import logging
 
 # Налаштування логування
@@ -12,14 +14,26 @@ logging.basicConfig(
 
 logger = logging.getLogger(__name__)
 
-def create_app():
-    """Factory для створення Flask додатку"""
+def create_app(config=Config):
+    """
+    Factory для створення Flask додатку
+
+    Сервіси створюються тут, а не при імпорті модулів; модель
+    завантажується у фоні (MODEL_PRELOAD), тож сервер приймає запити
+    до сховища одразу, а готовність моделі видно в /api/health.
+    """
     app = Flask(__name__)
-    app.config.from_object(Config)
+    app.config.from_object(config)
 
     # CORS для API
     CORS(app)
 
+    # Сервіси застосунку
+    services = AppServices(config)
+    app.extensions[SERVICES_KEY] = services
+    services.start()
+    atexit.register(services.close)
+
     # Реєстрація blueprints
     app.register_blueprint(api_bp)
 
@@ -0,0 +1,110 @@
+"""
+Мікробенчмарк режимів довговічності файлового бекенду
+
+Для кожного режиму (none / write / group) кілька потоків паралельно
+додають повідомлення у власні розмови; вимірюється пропускна здатність
+і затримка add_message (p50 / p99) та кількість fsync.
+
+Каталог створюється в data/, а не в /tmp, бо /tmp часто є tmpfs,
+де fsync нічого не коштує.
+
+Запуск: python -m benchmarks.bench_durability [--group-commit-ms N]
+"""
+import argparse
+import os
+import shutil
+import statistics
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from config import Config
+from services.backends import FileBackend
+
+MESSAGES_PER_THREAD = 200
+
+
+def count_fsyncs():
+    """Обгортка os.fsync з лічильником викликів"""
+    counter = {"calls": 0}
+    real_fsync = os.fsync
+
+    def fsync(fd):
+        counter["calls"] += 1
+        real_fsync(fd)
+
+    os.fsync = fsync
+    return counter, real_fsync
+
+
+def run(mode, threads, data_dir, group_commit_ms):
+    backend = FileBackend(data_dir, durability=mode, group_commit_ms=group_commit_ms)
+    conversation_ids = []
+    for _ in range(threads):
+        conversation = {
+            "conversation_id": os.urandom(16).hex(),
+            "created_at": "2024-01-01T00:00:00",
+            "updated_at": "2024-01-01T00:00:00",
+            "messages": [],
+            "metadata": {"total_messages": 0, "model_config": {}}
+        }
+        backend.create(conversation)
+        conversation_ids.append(conversation["conversation_id"])
+
+    latencies = [[] for _ in range(threads)]
+
+    def write(worker):
+        for i in range(MESSAGES_PER_THREAD):
+            message = {"role": "user", "content": f"Message {i} from worker {worker}", "timestamp": "2024-01-01T00:00:01"}
+            start = time.perf_counter()
+            backend.append_message(conversation_ids[worker], message, token_ids=list(range(20)))
+            latencies[worker].append(time.perf_counter() - start)
+
+    counter, real_fsync = count_fsyncs()
+    workers = [threading.Thread(target=write, args=(w,)) for w in range(threads)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - start
+    os.fsync = real_fsync
+    backend.close()
+
+    samples = sorted(latency for worker in latencies for latency in worker)
+    return {
+        "throughput": len(samples) / elapsed,
+        "p50": statistics.median(samples) * 1000,
+        "p99": samples[int(len(samples) * 0.99) - 1] * 1000,
+        # Для group - fsync файлів і каталогів з лічильника GroupCommitter
+        "syncs": backend.committer.stats["fsyncs"] if backend.committer else counter["calls"]
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark storage durability modes")
+    parser.add_argument("--group-commit-ms", type=float, default=Config.STORAGE_GROUP_COMMIT_MS)
+    args = parser.parse_args()
+
+    root = Config.BASE_DIR / "data"
+    root.mkdir(parents=True, exist_ok=True)
+
+    print(f"{'mode':>6} {'threads':>7} {'msg/s':>9} {'p50 ms':>8} {'p99 ms':>8} {'syncs':>7}")
+    for mode in ("none", "write", "group"):
+        for threads in (1, 8, 32):
+            data_dir = Path(tempfile.mkdtemp(dir=root, prefix="bench-durability-"))
+            try:
+                result = run(mode, threads, data_dir, args.group_commit_ms)
+            finally:
+                shutil.rmtree(data_dir)
+
+            print(
+                f"{mode:>6} {threads:>7} {result['throughput']:>9.0f} {result['p50']:>8.2f} "
+                f"{result['p99']:>8.2f} {result['syncs']:>7}",
+                flush=True
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Мікробенчмарк форматування історії діалогу
+
+Порівнює попередню стратегію (повна токенізація після кожного
+видалення найстарішого повідомлення) з накопиченою сумою токенів
+по окремих повідомленнях.
+
+Запуск: python -m benchmarks.bench_history
+"""
+import time
+from collections import OrderedDict
+
+from transformers import GPT2Tokenizer
+
+from config import Config
+from services.chat_service import ChatService
+
+
+class _TokenizerModel:
+    """Мінімальна заміна GPT2ChatModel: лише підрахунок токенів"""
+
+    def __init__(self, tokenizer):
+        self.tokenizer = tokenizer
+        self.calls = 0
+
+    def count_tokens(self, text: str) -> int:
+        self.calls += 1
+        return len(self.tokenizer.encode(text))
+
+
+def legacy_format(model, messages, max_tokens):
+    """Попередня реалізація format_conversation_history"""
+    formatted_lines = []
+    for msg in messages:
+        role = "User" if msg["role"] == "user" else "Assistant"
+        formatted_lines.append(f"{role}: {msg['content']}")
+
+    full_text = "\n".join(formatted_lines)
+    token_count = model.count_tokens(full_text)
+
+    while token_count > max_tokens and len(formatted_lines) > 1:
+        formatted_lines.pop(0)
+        full_text = "\n".join(formatted_lines)
+        token_count = model.count_tokens(full_text)
+
+    return full_text
+
+
+def make_messages(count):
+    return [
+        {
+            "role": "user" if i % 2 == 0 else "assistant",
+            "content": f"Message number {i}: could you tell me more about item {i * 7}?"
+        }
+        for i in range(count)
+    ]
+
+
+def timed(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return (time.perf_counter() - start) / repeat * 1000, result
+
+
+def main():
+    tokenizer = GPT2Tokenizer.from_pretrained(Config.MODEL_NAME)
+    max_tokens = Config.MAX_CONTEXT_TOKENS - 100
+
+    print(f"{'messages':>8} {'legacy ms':>10} {'calls':>6} {'new ms':>8} {'calls':>6} {'cached ms':>10} {'same':>5}")
+    for count in (10, 100, 1000):
+        messages = make_messages(count)
+        repeat = 1 if count >= 1000 else 5
+
+        legacy_model = _TokenizerModel(tokenizer)
+        legacy_ms, legacy_text = timed(lambda: legacy_format(legacy_model, messages, max_tokens), repeat)
+
+        service = ChatService.__new__(ChatService)
+        service.model = _TokenizerModel(tokenizer)
+        service._token_counts = OrderedDict()
+
+        new_ms, new_text = timed(lambda: service.format_conversation_history(messages, max_tokens), 1)
+        cold_calls = service.model.calls
+        cached_ms, _ = timed(lambda: service.format_conversation_history(messages, max_tokens), repeat)
+
+        print(
+            f"{count:>8} {legacy_ms:>10.2f} {legacy_model.calls // repeat:>6} "
+            f"{new_ms:>8.2f} {cold_calls:>6} {cached_ms:>10.2f} {str(legacy_text == new_text):>5}",
+            flush=True
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Мікробенчмарк імпорту та експорту розмов
+
+Порівнює пакетний імпорт (StorageService.import_conversations) з
+послідовним створенням розмов через add_message і вимірює потоковий
+експорт NDJSON: швидкість і пік пам'яті Python (tracemalloc), який
+не має залежати від кількості розмов.
+
+Запуск: python -m benchmarks.bench_import_export
+"""
+import shutil
+import tempfile
+import time
+import tracemalloc
+import uuid
+from datetime import datetime
+from pathlib import Path
+
+from services.backends import FileBackend, SQLiteBackend
+from services.conversation_export import iter_ndjson
+from services.storage_service import StorageService
+
+CONVERSATIONS = 500
+MESSAGES_PER_CONVERSATION = 10
+
+
+def make_records(count):
+    timestamp = datetime.now().isoformat()
+    for i in range(count):
+        yield {
+            "conversation_id": str(uuid.uuid4()),
+            "created_at": timestamp,
+            "updated_at": timestamp,
+            "messages": [
+                {"role": "user" if j % 2 == 0 else "assistant", "content": f"Message {j} of conversation {i} " * 5,
+                 "timestamp": timestamp}
+                for j in range(MESSAGES_PER_CONVERSATION)
+            ],
+            "metadata": {"total_messages": MESSAGES_PER_CONVERSATION, "model_config": {}}
+        }
+
+
+def make_service(kind, directory, durability):
+    if kind == "sqlite":
+        backend = SQLiteBackend(directory / "conversations.db")
+    else:
+        backend = FileBackend(directory, durability=durability)
+    return StorageService(directory, backend=backend)
+
+
+def sequential(service, records):
+    for record in records:
+        conv_id = service.create_conversation()
+        for message in record["messages"]:
+            service.add_message(conv_id, message["role"], message["content"])
+
+
+def main():
+    print(f"{'backend':>16} {'sequential s':>13} {'batched s':>10} {'export s':>9} {'export peak KiB':>16}", flush=True)
+    for kind, durability in (("file", "write"), ("file", "group"), ("sqlite", None)):
+        timings = []
+        for mode in ("sequential", "batched"):
+            temp_dir = Path(tempfile.mkdtemp())
+            service = make_service(kind, temp_dir, durability)
+            try:
+                start = time.perf_counter()
+                if mode == "sequential":
+                    sequential(service, make_records(CONVERSATIONS))
+                else:
+                    service.import_conversations(make_records(CONVERSATIONS))
+                timings.append(time.perf_counter() - start)
+
+                if mode == "batched":
+                    tracemalloc.start()
+                    start = time.perf_counter()
+                    exported = sum(len(chunk) for chunk in iter_ndjson(service.export_conversations(), service.serializer))
+                    export_s = time.perf_counter() - start
+                    peak = tracemalloc.get_traced_memory()[1]
+                    tracemalloc.stop()
+            finally:
+                service.close()
+                shutil.rmtree(temp_dir)
+
+        label = f"{kind}/{durability}" if durability else kind
+        print(f"{label:>16} {timings[0]:>13.2f} {timings[1]:>10.2f} {export_s:>9.2f} {peak / 1024:>16.0f}"
+              f"  ({exported / 1e6:.1f} MB exported)", flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Мікробенчмарк сторінок історії повідомлень
+
+Порівнює повну історію (GET /api/conversations/<id>/messages без
+параметрів) зі сторінкою з MESSAGES_PAGE_SIZE останніх повідомлень і
+сторінкою з середини розмови (курсор before) для файлового бекенду та
+SQLite: час читання і розмір JSON-відповіді.
+
+Запуск: python -m benchmarks.bench_message_pages
+"""
+import json
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+from config import Config
+from services.backends import FileBackend, SQLiteBackend
+from services.storage_service import StorageService
+
+LIMIT = Config.MESSAGES_PAGE_SIZE
+
+
+def fill(service, count):
+    conversation_id = service.create_conversation()
+    for i in range(count):
+        service.add_message(
+            conversation_id,
+            "user" if i % 2 == 0 else "assistant",
+            f"Message number {i}: could you tell me more about item {i * 7}? " * 4,
+            model_config={"temperature": 0.7} if i % 2 else None
+        )
+    return conversation_id
+
+
+def timed(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return (time.perf_counter() - start) / repeat * 1000, result
+
+
+def middle_cursor(service, conversation_id, count):
+    """Курсор повідомлення з середини розмови"""
+    return service.get_message_page(conversation_id, count // 2)[1]
+
+
+def main():
+    temp_dir = Path(tempfile.mkdtemp())
+    backends = {
+        "file": lambda: FileBackend(temp_dir / "files"),
+        "sqlite": lambda: SQLiteBackend(temp_dir / "bench.db")
+    }
+
+    try:
+        print(
+            f"{'backend':>8} {'messages':>8} {'full ms':>9} {'full KB':>8} "
+            f"{'last ms':>8} {'middle ms':>10} {'page KB':>8}"
+        )
+        for name, make_backend in backends.items():
+            backend = make_backend()
+            service = StorageService(temp_dir, backend=backend)
+
+            for count in (100, 1000, 10000):
+                conversation_id = fill(service, count)
+                cursor = middle_cursor(service, conversation_id, count)
+                repeat = 5 if count >= 10000 else 20
+
+                full_ms, full = timed(lambda: json.dumps(service.get_messages(conversation_id)), repeat)
+                last_ms, page = timed(lambda: json.dumps(service.get_message_page(conversation_id, LIMIT)), repeat)
+                middle_ms, _ = timed(
+                    lambda: json.dumps(service.get_message_page(conversation_id, LIMIT, before=cursor)), repeat
+                )
+
+                print(
+                    f"{name:>8} {count:>8} {full_ms:>9.2f} {len(full) / 1024:>8.0f} "
+                    f"{last_ms:>8.3f} {middle_ms:>10.3f} {len(page) / 1024:>8.0f}",
+                    flush=True
+                )
+
+            backend.close()
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+if __name__ == "__main__":
+    main()
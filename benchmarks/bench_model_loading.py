@@ -0,0 +1,123 @@
+"""
+Бенчмарк завантаження моделі: from_pretrained проти mmap з кешу ваг
+
+Модель - випадкові ваги розміру GPT-2 small (124M параметрів, ~500 MB
+float32), збережені в тимчасовий каталог як локальна модель. Кожен
+замір - окремі процеси (spawn), що одночасно завантажують модель і
+виконують прохід уперед (усі сторінки ваг прочитані). Для процесу:
+- load s: час завантаження (mmap - з перевіркою SHA-256, no-sha256 - лише розміри)
+- peak MB: приріст піку RSS (VmHWM) відносно стану після імпорту torch
+- anon MB / file MB: приватна пам'ять і сторінки файлів (mmap) у RSS
+- PSS MB: пропорційна частка - спільні сторінки діляться між воркерами
+
+Запуск: python -m benchmarks.bench_model_loading [--workers N] [--layers N]
+"""
+import argparse
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+MB = 1024 * 1024
+
+
+def memory():
+    """RSS-лічильники процесу з /proc (кБ -> МБ)"""
+    values = {}
+    for file in ("/proc/self/status", "/proc/self/smaps_rollup"):
+        with open(file) as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                if key in ("VmHWM", "RssAnon", "RssFile", "Pss"):
+                    values[key] = int(value.split()[0]) / 1024
+    return values
+
+
+def worker(mode, source, cache_dir, barrier, results):
+    import torch
+    from transformers import GPT2LMHeadModel
+    from models.weights_cache import WeightsCache
+
+    torch.set_num_threads(1)
+    baseline = memory()
+    start = time.perf_counter()
+
+    if mode.startswith("mmap"):
+        model, _, _ = WeightsCache(cache_dir, verify=mode == "mmap").load(source)
+    else:
+        model = GPT2LMHeadModel.from_pretrained(source).eval()
+    load_seconds = time.perf_counter() - start
+
+    with torch.no_grad():
+        model(torch.randint(0, model.config.vocab_size, (1, 16)))
+
+    # Пам'ять вимірюється, коли всі воркери тримають модель
+    barrier.wait()
+    after = memory()
+    results.put({
+        "load_s": load_seconds,
+        "peak_mb": after["VmHWM"] - baseline["VmHWM"],
+        "anon_mb": after["RssAnon"] - baseline["RssAnon"],
+        "file_mb": after["RssFile"] - baseline["RssFile"],
+        "pss_mb": after["Pss"] - baseline["Pss"]
+    })
+    barrier.wait()
+
+
+def run(mode, source, cache_dir, workers):
+    context = multiprocessing.get_context("spawn")
+    barrier = context.Barrier(workers)
+    results = context.Queue()
+    processes = [
+        context.Process(target=worker, args=(mode, source, cache_dir, barrier, results))
+        for _ in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    rows = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--layers", type=int, default=12)
+    args = parser.parse_args()
+
+    import torch
+    from transformers import GPT2Config, GPT2LMHeadModel, GPT2Tokenizer
+    from config import Config
+    from models.weights_cache import WeightsCache, WEIGHTS_FILE
+
+    temp_dir = Path(tempfile.mkdtemp())
+    try:
+        source = str(temp_dir / "source")
+        cache_dir = temp_dir / "cache"
+        torch.manual_seed(0)
+        GPT2LMHeadModel(GPT2Config(n_layer=args.layers)).save_pretrained(source)
+        GPT2Tokenizer.from_pretrained(Config.MODEL_NAME).save_pretrained(source)
+
+        start = time.perf_counter()
+        path = WeightsCache(cache_dir).convert(source)
+        size = os.path.getsize(path / WEIGHTS_FILE) / MB
+        print(f"weights {size:.0f} MB, conversion {time.perf_counter() - start:.1f}s, {args.workers} workers", flush=True)
+
+        print(f"{'mode':>16} {'load s':>7} {'peak MB':>8} {'anon MB':>8} {'file MB':>8} {'PSS MB':>7}", flush=True)
+        for mode in ("from_pretrained", "mmap", "mmap no-sha256"):
+            rows = run(mode, source, cache_dir, args.workers)
+            average = {key: sum(row[key] for row in rows) / len(rows) for key in rows[0]}
+            print(
+                f"{mode:>16} {average['load_s']:>7.2f} {average['peak_mb']:>8.0f} {average['anon_mb']:>8.0f} "
+                f"{average['file_mb']:>8.0f} {average['pss_mb']:>7.0f}",
+                flush=True
+            )
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+if __name__ == "__main__":
+    main()
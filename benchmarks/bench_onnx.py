@@ -0,0 +1,121 @@
+"""
+Бенчмарк бекендів інференсу: PyTorch проти onnxruntime
+
+Модель - випадкові ваги з архітектурою GPT-2 small, експорт в ONNX
+виконується один раз (OnnxCache) до вимірювань. Кожен бекенд - окремий
+процес (spawn) з тією самою кількістю потоків. Для бекенду:
+- load s: завантаження моделі (для onnx - створення сесії)
+- prefill ms: прохід уперед по prompt з 128 токенів
+- step ms: один крок декодування з KV-кешем після prompt
+- tok/s: жадібна генерація 64 токенів через generate
+- rss MB: RSS процесу після вимірювань
+
+Запуск: python -m benchmarks.bench_onnx [--threads N] [--layers N]
+"""
+import argparse
+import multiprocessing
+import shutil
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+PROMPT_TOKENS = 128
+NEW_TOKENS = 64
+REPEATS = 5
+
+
+def median_ms(function, repeats=REPEATS):
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        function()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def worker(backend, source, cache_dir, threads, results):
+    import torch
+    from transformers import GPT2LMHeadModel
+    from models.onnx_model import OnnxCache
+    from utils.memory import process_memory
+
+    torch.set_num_threads(threads)
+
+    start = time.perf_counter()
+    if backend == "onnx":
+        model, _, _ = OnnxCache(cache_dir, verify=False, threads=threads).load(source)
+    else:
+        model = GPT2LMHeadModel.from_pretrained(source).eval()
+    load_seconds = time.perf_counter() - start
+
+    torch.manual_seed(0)
+    prompt = torch.randint(0, 2000, (1, PROMPT_TOKENS))
+    token = torch.tensor([[7]])
+
+    with torch.no_grad():
+        past = model(prompt, use_cache=True).past_key_values
+        prefill_ms = median_ms(lambda: model(prompt, use_cache=True))
+        step_ms = median_ms(lambda: model(token, past_key_values=past, use_cache=True), repeats=REPEATS * 10)
+
+        started = time.perf_counter()
+        model.generate(prompt, max_new_tokens=NEW_TOKENS, min_new_tokens=NEW_TOKENS, do_sample=False, pad_token_id=0)
+        tokens_per_second = NEW_TOKENS / (time.perf_counter() - started)
+
+    results.put({
+        "load_s": load_seconds,
+        "prefill_ms": prefill_ms,
+        "step_ms": step_ms,
+        "tokens_per_s": tokens_per_second,
+        "rss_mb": process_memory()["rss"]
+    })
+
+
+def run(backend, source, cache_dir, threads):
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    process = context.Process(target=worker, args=(backend, source, cache_dir, threads, results))
+    process.start()
+    result = results.get()
+    process.join()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--threads", type=int, default=1)
+    parser.add_argument("--layers", type=int, default=12)
+    args = parser.parse_args()
+
+    import torch
+    from transformers import GPT2Config, GPT2LMHeadModel, GPT2Tokenizer
+    from config import Config
+    from models.onnx_model import OnnxCache, ONNX_FILE
+
+    temp_dir = Path(tempfile.mkdtemp())
+    try:
+        source = str(temp_dir / "source")
+        cache_dir = temp_dir / "cache"
+        torch.manual_seed(0)
+        GPT2LMHeadModel(GPT2Config(n_layer=args.layers)).save_pretrained(source)
+        GPT2Tokenizer.from_pretrained(Config.MODEL_NAME).save_pretrained(source)
+
+        start = time.perf_counter()
+        path = OnnxCache(cache_dir).ensure(source)
+        size = (path / ONNX_FILE).stat().st_size / (1024 * 1024)
+        print(f"ONNX export {time.perf_counter() - start:.1f}s ({size:.0f} MB), {args.threads} threads", flush=True)
+
+        print(f"{'backend':>8} {'load s':>7} {'prefill ms':>11} {'step ms':>8} {'tok/s':>6} {'rss MB':>7}", flush=True)
+        for backend in ("torch", "onnx"):
+            result = run(backend, source, cache_dir, args.threads)
+            print(
+                f"{backend:>8} {result['load_s']:>7.2f} {result['prefill_ms']:>11.1f} {result['step_ms']:>8.2f} "
+                f"{result['tokens_per_s']:>6.1f} {result['rss_mb']:>7.0f}",
+                flush=True
+            )
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+if __name__ == "__main__":
+    main()
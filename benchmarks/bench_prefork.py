@@ -0,0 +1,174 @@
+"""
+Бенчмарк pre-fork сервера: пам'ять воркерів і пропускна здатність
+
+Модель - випадкові ваги з архітектурою GPT-2 small і словником
+налаштованого токенізатора, сховище SQLite у тимчасовому каталозі. Режими (server.PreforkServer, N воркерів):
+- separate: ваги завантажує кожен воркер сам (як N окремих процесів)
+- fork: ваги завантажені майстром до fork (copy-on-write)
+- fork+mmap: те саме з кешем ваг через mmap (MODEL_MMAP)
+
+Після прогріву (кожен воркер відповів на запити генерації) для кожного
+воркера читається /proc/<pid>/smaps_rollup: RSS, спільна і приватна
+пам'ять, PSS; total PSS - майстер і всі воркери разом.
+
+Запуск: python -m benchmarks.bench_prefork [--workers N] [--requests N]
+"""
+import argparse
+import json
+import os
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from utils.memory import process_memory
+
+ROOT = Path(__file__).resolve().parent.parent
+MODES = ("separate", "fork", "fork+mmap")
+
+SCRIPT = """
+import sys
+from pathlib import Path
+from config import Config
+from server import PreforkServer
+from services.storage_service import StorageService
+
+data_dir, source, mode, port, workers = Path(sys.argv[1]), sys.argv[2], sys.argv[3], int(sys.argv[4]), int(sys.argv[5])
+
+class BenchConfig(Config):
+    MODEL_NAME = source
+    MODEL_MMAP = mode == "fork+mmap"
+    MODEL_CACHE_DIR = data_dir / "models"
+    MAX_LENGTH = 20
+    STORAGE_BACKEND = "sqlite"
+    SQLITE_PATH = data_dir / "conversations.db"
+    DATA_DIR = data_dir / "conversations"
+    SEARCH_INDEX_PATH = data_dir / "search.db"
+    SERVER_MEMORY_REPORT_INTERVAL = 0
+
+class SeparateServer(PreforkServer):
+    def preload(self):
+        # Без завантаження ваг у майстрі: кожен воркер читає модель сам
+        StorageService.from_config(BenchConfig).close()
+
+server_class = SeparateServer if mode == "separate" else PreforkServer
+sys.exit(server_class(BenchConfig, host="127.0.0.1", port=port, workers=workers).run())
+"""
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def request(url, data=None):
+    body = json.dumps(data).encode() if data is not None else None
+    req = urllib.request.Request(url, data=body, headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(req, timeout=300) as response:
+        return json.loads(response.read())
+
+
+def wait_for_workers(base, workers, timeout=300):
+    """pid усіх воркерів з моделлю напоготові (за полем process у /api/health)"""
+    pids = set()
+    deadline = time.monotonic() + timeout
+    while len(pids) < workers:
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"Only {len(pids)} of {workers} workers are ready")
+        try:
+            health = request(f"{base}/api/health")
+            if health["ready"]:
+                pids.add(health["process"]["pid"])
+        except OSError:
+            time.sleep(0.2)
+    return pids
+
+
+def send_message(base):
+    conversation_id = request(f"{base}/api/conversations", {})["conversation_id"]
+    return request(f"{base}/api/conversations/{conversation_id}/messages", {"message": "Hello there"})["success"]
+
+
+def run(mode, data_dir, source, workers, requests):
+    port = free_port()
+    base = f"http://127.0.0.1:{port}"
+    log = open(data_dir / f"{mode}.log", "w")
+    master = subprocess.Popen(
+        [sys.executable, "-c", SCRIPT, str(data_dir), source, mode, str(port), str(workers)],
+        cwd=ROOT,
+        env=dict(os.environ, HF_HUB_OFFLINE="1"),
+        stdout=log,
+        stderr=subprocess.STDOUT
+    )
+
+    try:
+        started = time.perf_counter()
+        pids = wait_for_workers(base, workers)
+        ready_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers * 2) as pool:
+            assert all(pool.map(lambda _: send_message(base), range(requests)))
+        throughput = requests / (time.perf_counter() - started)
+
+        rows = [process_memory(pid) for pid in pids]
+        total_pss = process_memory(master.pid)["pss"] + sum(row["pss"] for row in rows)
+    except Exception:
+        log.flush()
+        print((data_dir / f"{mode}.log").read_text(errors="replace")[-4000:], file=sys.stderr)
+        raise
+    finally:
+        master.send_signal(signal.SIGTERM)
+        master.wait(timeout=60)
+        log.close()
+
+    average = {key: sum(row[key] for row in rows) / len(rows) for key in ("rss", "shared", "private", "pss")}
+    return dict(average, ready_s=ready_seconds, requests_per_s=throughput, total_pss=total_pss)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--requests", type=int, default=24)
+    parser.add_argument("--layers", type=int, default=12)
+    args = parser.parse_args()
+
+    import torch
+    from transformers import GPT2Config, GPT2LMHeadModel, GPT2Tokenizer
+    from config import Config
+
+    data_dir = Path(tempfile.mkdtemp())
+    try:
+        source = str(data_dir / "source")
+        tokenizer = GPT2Tokenizer.from_pretrained(Config.MODEL_NAME)
+        tokenizer.save_pretrained(source)
+        # Словник моделі збігається з токенізатором: згенеровані токени декодуються
+        torch.manual_seed(0)
+        GPT2LMHeadModel(GPT2Config(n_layer=args.layers, vocab_size=len(tokenizer))).save_pretrained(source)
+
+        print(f"{args.workers} workers, {os.cpu_count()} cpus, {args.requests} requests", flush=True)
+        print(
+            f"{'mode':>10} {'ready s':>8} {'req/s':>6} {'rss MB':>7} {'shared MB':>10} {'private MB':>11} "
+            f"{'pss MB':>7} {'total pss MB':>13}",
+            flush=True
+        )
+        for mode in MODES:
+            result = run(mode, data_dir, source, args.workers, args.requests)
+            print(
+                f"{mode:>10} {result['ready_s']:>8.1f} {result['requests_per_s']:>6.2f} {result['rss']:>7.0f} "
+                f"{result['shared']:>10.0f} {result['private']:>11.0f} {result['pss']:>7.0f} {result['total_pss']:>13.0f}",
+                flush=True
+            )
+    finally:
+        shutil.rmtree(data_dir)
+
+
+if __name__ == "__main__":
+    main()
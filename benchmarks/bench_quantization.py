@@ -0,0 +1,145 @@
+"""
+Бенчмарк квантизації: fp32 проти int8 (динамічна) і bf16
+
+Кожен режим - окремий процес (spawn), модель завантажується і
+квантизується так само, як у GPT2ChatModel.load_model. Для режиму:
+- load s: завантаження і квантизація
+- weights MB: розмір state dict (ваги в пам'яті після квантизації)
+- rss MB: RSS процесу після вимірювань
+- tok/s: жадібна генерація 64 токенів після prompt з 32 токенів
+- ppl / delta: перплексія на фіксованому тексті TEXT і зміна відносно fp32
+- top-1: частка позицій, де найімовірніший наступний токен збігається з fp32
+
+За замовчуванням - випадкові ваги з архітектурою GPT-2 small (для
+швидкості і пам'яті); перплексія має сенс лише з навченою моделлю:
+--model openai-community/gpt2.
+
+Запуск: python -m benchmarks.bench_quantization [--model NAME] [--threads N]
+"""
+import argparse
+import io
+import math
+import multiprocessing
+import shutil
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+TEXT = (
+    "The history of the city begins with a small settlement on the bank of the river. "
+    "Merchants travelling between the northern forests and the southern sea stopped there to trade "
+    "furs, honey and wax for salt, cloth and silver. Over the following centuries the settlement grew "
+    "into a fortified town with a market square, several churches and a wooden castle on the hill. "
+    "Fires and wars destroyed it more than once, but each time the inhabitants rebuilt their houses, "
+    "widened the streets and raised new walls. In the nineteenth century the railway reached the town, "
+    "factories appeared along the river, and the population doubled within a few decades. Today the old "
+    "quarter is a quiet place of narrow lanes and small museums, while the new districts stretch far "
+    "beyond the former walls, and the river, once the reason the town was founded, is crossed by seven bridges."
+)
+PROMPT_TOKENS = 32
+NEW_TOKENS = 64
+REPEATS = 3
+
+
+def worker(mode, source, threads, results):
+    import torch
+    from transformers import GPT2LMHeadModel, GPT2Tokenizer
+    from models.quantization import quantize_model
+    from utils.memory import process_memory
+
+    if threads:
+        torch.set_num_threads(threads)
+
+    start = time.perf_counter()
+    model = GPT2LMHeadModel.from_pretrained(source).eval()
+    applied = quantize_model(model, mode)
+    load_seconds = time.perf_counter() - start
+
+    buffer = io.BytesIO()
+    torch.save(model.state_dict(), buffer)
+
+    input_ids = torch.tensor([GPT2Tokenizer.from_pretrained(source).encode(TEXT)])
+    prompt = input_ids[:, :PROMPT_TOKENS]
+
+    with torch.no_grad():
+        outputs = model(input_ids, labels=input_ids)
+        perplexity = math.exp(outputs.loss.item())
+        predictions = outputs.logits[0].argmax(-1).tolist()
+
+        model.generate(prompt, max_new_tokens=4, do_sample=False, pad_token_id=0)
+        timings = []
+        for _ in range(REPEATS):
+            started = time.perf_counter()
+            model.generate(
+                prompt, max_new_tokens=NEW_TOKENS, min_new_tokens=NEW_TOKENS, do_sample=False, pad_token_id=0
+            )
+            timings.append(time.perf_counter() - started)
+
+    results.put({
+        "applied": applied,
+        "load_s": load_seconds,
+        "weights_mb": buffer.tell() / (1024 * 1024),
+        "rss_mb": process_memory()["rss"],
+        "tokens_per_s": NEW_TOKENS / statistics.median(timings),
+        "perplexity": perplexity,
+        "predictions": predictions
+    })
+
+
+def run(mode, source, threads):
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    process = context.Process(target=worker, args=(mode, source, threads, results))
+    process.start()
+    result = results.get()
+    process.join()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model", help="pretrained model name or path (default: random GPT-2 small)")
+    parser.add_argument("--threads", type=int, default=0, help="torch threads (0 - torch default)")
+    args = parser.parse_args()
+
+    import torch
+    from transformers import GPT2Config, GPT2LMHeadModel, GPT2Tokenizer
+    from config import Config
+    from models.quantization import QUANTIZATION_MODES
+
+    temp_dir = Path(tempfile.mkdtemp())
+    try:
+        source = args.model
+        if source is None:
+            source = str(temp_dir / "source")
+            torch.manual_seed(0)
+            GPT2LMHeadModel(GPT2Config()).save_pretrained(source)
+            GPT2Tokenizer.from_pretrained(Config.MODEL_NAME).save_pretrained(source)
+
+        print(f"model: {args.model or 'random GPT-2 small'}, torch threads: {args.threads or torch.get_num_threads()}")
+        print(
+            f"{'mode':>6} {'applied':>8} {'load s':>7} {'weights MB':>11} {'rss MB':>7} {'tok/s':>6} "
+            f"{'ppl':>10} {'delta':>7} {'top-1':>6}",
+            flush=True
+        )
+        reference = None
+        for mode in QUANTIZATION_MODES:
+            result = run(mode, source, args.threads)
+            reference = reference or result
+            delta = result["perplexity"] / reference["perplexity"] - 1
+            agreement = statistics.mean(
+                a == b for a, b in zip(result["predictions"], reference["predictions"])
+            )
+            print(
+                f"{mode:>6} {result['applied']:>8} {result['load_s']:>7.2f} {result['weights_mb']:>11.0f} "
+                f"{result['rss_mb']:>7.0f} {result['tokens_per_s']:>6.1f} {result['perplexity']:>10.2f} "
+                f"{delta:>+7.2%} {agreement:>6.1%}",
+                flush=True
+            )
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Мікробенчмарк повнотекстового пошуку
+
+Заповнює індекс розмовами (по 10 повідомлень) і вимірює вартість
+індексації одного повідомлення та затримку запитів з одним, двома
+і трьома словами для 1000, 10000 та 50000 розмов.
+
+Запуск: python -m benchmarks.bench_search
+"""
+import itertools
+import random
+import shutil
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+from services.search_index import SearchIndex
+
+MESSAGES_PER_CONVERSATION = 10
+QUERIES = ["python", "python tutorial", "kyiv weather forecast"]
+
+
+def make_vocabulary(size):
+    random.seed(0)
+    words = ["".join(random.choices("abcdefghijklmnopqrstuvwxyz", k=random.randint(3, 9))) for _ in range(size)]
+    # Слова запитів - типові змістовні слова, а не найчастіші службові
+    for rank, word in zip((100, 300, 1000, 2000, 5000), ("python", "tutorial", "weather", "forecast", "kyiv")):
+        words[rank] = word
+    return words
+
+
+def fill(index, start, count, vocabulary):
+    # Частоти слів за законом Ціпфа, як у природному тексті
+    weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(vocabulary))))
+    for i in range(start, start + count):
+        for j in range(MESSAGES_PER_CONVERSATION):
+            content = " ".join(random.choices(vocabulary, cum_weights=weights, k=25))
+            index.add_message(f"conv-{i:06d}", {
+                "role": "user" if j % 2 == 0 else "assistant",
+                "content": content,
+                "timestamp": datetime.now().isoformat()
+            })
+
+
+def main():
+    temp_dir = Path(tempfile.mkdtemp())
+    vocabulary = make_vocabulary(20000)
+    index = SearchIndex(temp_dir / "search.db")
+    indexed = 0
+
+    try:
+        print(f"{'conversations':>13} {'add ms':>7} " + " ".join(f"{q!r:>24}" for q in QUERIES), flush=True)
+        for total in (1000, 10000, 50000):
+            start = time.perf_counter()
+            fill(index, indexed, total - indexed, vocabulary)
+            add_ms = (time.perf_counter() - start) / ((total - indexed) * MESSAGES_PER_CONVERSATION) * 1000
+            indexed = total
+
+            timings = []
+            for query in QUERIES:
+                start = time.perf_counter()
+                for _ in range(10):
+                    results, _ = index.search(query, limit=20)
+                timings.append(f"{(time.perf_counter() - start) / 10 * 1000:>11.2f} ms ({len(results):>2} hits)")
+
+            print(f"{total:>13} {add_ms:>7.3f} " + " ".join(f"{t:>24}" for t in timings), flush=True)
+    finally:
+        index.close()
+        shutil.rmtree(temp_dir)
+
+
+if __name__ == "__main__":
+    main()
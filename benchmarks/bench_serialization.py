@@ -0,0 +1,86 @@
+"""
+Мікробенчмарк серіалізації розмов
+
+Порівнює попередній формат (json з indent=2) з компактним виводом
+stdlib json та orjson: час кодування/декодування розмови і розмір
+результату для розмов з 10, 100 та 1000 повідомлень.
+
+Запуск: python -m benchmarks.bench_serialization
+"""
+import time
+from datetime import datetime, timedelta
+
+from services.backends.serializers import JSONSerializer, get_serializer
+
+PROMPTS = [
+    "Could you explain how attention works in transformers?",
+    "Привіт! Розкажи, будь ласка, про історію Києва.",
+    "Write a short poem about the sea at night.",
+    "Яка різниця між списком і кортежем у Python?"
+]
+
+
+def make_conversation(count):
+    start = datetime(2024, 1, 1, 12, 0, 0)
+    messages = []
+    for i in range(count):
+        user = i % 2 == 0
+        content = PROMPTS[i % len(PROMPTS)] if user else (
+            f"Here is a detailed answer number {i}. " * 6 + "Сподіваюся, це допоможе!"
+        )
+        messages.append({
+            "role": "user" if user else "assistant",
+            "content": content,
+            "timestamp": (start + timedelta(seconds=i * 30)).isoformat(),
+            "tokens": [i * 40, 40]
+        })
+
+    return {
+        "conversation_id": "4f9c1d2e-8a7b-4c3d-9e1f-0a1b2c3d4e5f",
+        "created_at": start.isoformat(),
+        "updated_at": messages[-1]["timestamp"],
+        "messages": messages,
+        "metadata": {
+            "total_messages": count,
+            "model_config": {"temperature": 0.7, "top_k": 50, "top_p": 0.9, "max_length": 100}
+        }
+    }
+
+
+class IndentedJSON(JSONSerializer):
+    """Попередній формат сховища: json.dump(..., indent=2)"""
+
+    name = "json indent=2"
+
+    def dumps(self, obj, pretty=False):
+        return super().dumps(obj, pretty=True)
+
+
+def timed(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return (time.perf_counter() - start) / repeat * 1000, result
+
+
+def main():
+    serializers = [IndentedJSON(), JSONSerializer(), get_serializer("orjson")]
+
+    print(f"{'serializer':>14} {'messages':>8} {'encode ms':>10} {'decode ms':>10} {'bytes':>9}")
+    for count in (10, 100, 1000):
+        conversation = make_conversation(count)
+        repeat = 20 if count >= 1000 else 200
+
+        for serializer in serializers:
+            encode_ms, data = timed(lambda: serializer.dumps(conversation), repeat)
+            decode_ms, decoded = timed(lambda: serializer.loads(data), repeat)
+            assert decoded == conversation
+
+            print(
+                f"{serializer.name:>14} {count:>8} {encode_ms:>10.3f} {decode_ms:>10.3f} {len(data):>9}",
+                flush=True
+            )
+
+
+if __name__ == "__main__":
+    main()
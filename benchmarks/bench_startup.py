@@ -0,0 +1,81 @@
+"""
+Бенчмарк часу старту сервера
+
+Кожен замір - в окремому процесі (холодний імпорт), сховище - у
+тимчасовому каталозі:
+- import app: імпорт застосунку без створення сервісів
+- create_app: фабрика з фоновим завантаженням моделі; час до першої
+  відповіді ендпоінту сховища і до готовності моделі (/api/health/ready)
+- eager: колишній порядок - модель завантажується до першого запиту
+
+Запуск: python -m benchmarks.bench_startup
+"""
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+RUNS = 3
+
+SCRIPT = """
+import json, sys, time
+started = time.perf_counter()
+import app
+from config import Config
+result = {"import_s": time.perf_counter() - started}
+
+class BenchConfig(Config):
+    DATA_DIR = sys.argv[1] + "/conversations"
+    SQLITE_PATH = sys.argv[1] + "/conversations.db"
+    SEARCH_INDEX_PATH = sys.argv[1] + "/search.db"
+    MODEL_PRELOAD = sys.argv[2] == "background"
+
+flask_app = app.create_app(BenchConfig)
+services = flask_app.extensions["gpt2chat"]
+if sys.argv[2] == "eager":
+    services.chat.load_model()
+result["create_app_s"] = time.perf_counter() - started
+
+client = flask_app.test_client()
+assert client.post("/api/conversations").status_code == 200
+result["first_request_s"] = time.perf_counter() - started
+result["torch_at_first_request"] = "torch" in sys.modules
+
+services.chat.wait_until_ready()
+assert client.get("/api/health/ready").status_code == 200
+result["ready_s"] = time.perf_counter() - started
+services.close()
+print(json.dumps(result))
+"""
+
+
+def measure(mode):
+    with tempfile.TemporaryDirectory() as data_dir:
+        output = subprocess.run(
+            [sys.executable, "-c", SCRIPT, data_dir, mode],
+            cwd=ROOT,
+            env=dict(os.environ, HF_HUB_OFFLINE="1"),
+            capture_output=True,
+            text=True,
+            check=True
+        ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    print(f"{'mode':>10} {'import s':>9} {'create_app s':>13} {'first request s':>16} {'ready s':>8} {'torch':>6}", flush=True)
+    for mode in ("background", "eager"):
+        results = [measure(mode) for _ in range(RUNS)]
+        best = {key: min(r[key] for r in results) for key in ("import_s", "create_app_s", "first_request_s", "ready_s")}
+        print(
+            f"{mode:>10} {best['import_s']:>9.3f} {best['create_app_s']:>13.3f} "
+            f"{best['first_request_s']:>16.3f} {best['ready_s']:>8.3f} {str(results[0]['torch_at_first_request']):>6}",
+            flush=True
+        )
+
+
+if __name__ == "__main__":
+    main()
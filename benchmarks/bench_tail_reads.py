@@ -0,0 +1,74 @@
+"""
+Мікробенчмарк читання останніх повідомлень розмови
+
+Порівнює повне завантаження розмови зі зрізом (попередня реалізація
+get_messages(limit)) з читанням хвоста для файлового бекенду та SQLite
+на розмовах довжиною 100, 1000 та 10000 повідомлень.
+
+Запуск: python -m benchmarks.bench_tail_reads
+"""
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+from config import Config
+from services.backends import FileBackend, SQLiteBackend
+from services.storage_service import StorageService
+
+LIMIT = Config.MAX_HISTORY_MESSAGES
+
+
+def fill(service, count):
+    conversation_id = service.create_conversation()
+    for i in range(count):
+        service.add_message(
+            conversation_id,
+            "user" if i % 2 == 0 else "assistant",
+            f"Message number {i}: could you tell me more about item {i * 7}?",
+            model_config={"temperature": 0.7} if i % 2 else None,
+            token_ids=list(range(i % 50, i % 50 + 20))
+        )
+    return conversation_id
+
+
+def timed(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return (time.perf_counter() - start) / repeat * 1000, result
+
+
+def main():
+    temp_dir = Path(tempfile.mkdtemp())
+    backends = {
+        "file": lambda: FileBackend(temp_dir / "files"),
+        "sqlite": lambda: SQLiteBackend(temp_dir / "bench.db")
+    }
+
+    try:
+        print(f"{'backend':>8} {'messages':>8} {'full ms':>9} {'tail ms':>9} {'speedup':>8} {'same':>5}")
+        for name, make_backend in backends.items():
+            backend = make_backend()
+            service = StorageService(temp_dir, backend=backend)
+
+            for count in (100, 1000, 10000):
+                conversation_id = fill(service, count)
+                repeat = 5 if count >= 10000 else 20
+
+                full_ms, full = timed(lambda: backend.load(conversation_id)["messages"][-LIMIT:], repeat)
+                tail_ms, tail = timed(lambda: backend.get_messages(conversation_id, LIMIT), repeat)
+
+                print(
+                    f"{name:>8} {count:>8} {full_ms:>9.2f} {tail_ms:>9.3f} "
+                    f"{full_ms / tail_ms:>7.0f}x {str(full == tail):>5}",
+                    flush=True
+                )
+
+            backend.close()
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -8,18 +8,98 @@ class Config:
     BASE_DIR = Path(__file__).parent
     DATA_DIR = BASE_DIR / "data" / "conversations"
 
+    # Сховище розмов: "file" (журнал на розмову) або "sqlite"
+    STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "file")
+    SQLITE_PATH = BASE_DIR / "data" / "conversations.db"
+    STORAGE_SHARD_DEPTH = 2       # Рівні підкаталогів за префіксом UUID (0 - плаский каталог)
+    # Довговічність записів: "none" (без fsync), "write" (fsync на кожен запис),
+    # "group" (спільний fsync для записів за STORAGE_GROUP_COMMIT_MS або STORAGE_GROUP_COMMIT_WRITES)
+    STORAGE_DURABILITY = os.getenv("STORAGE_DURABILITY", "group")
+    STORAGE_GROUP_COMMIT_MS = 0.0       # Додаткове очікування записувачів (0 - група накопичується під час попереднього fsync)
+    STORAGE_GROUP_COMMIT_WRITES = 64    # Група закривається одразу при такій кількості записів
+    # Серіалізація записів: "auto" (orjson, якщо встановлено), "json" або "orjson"
+    STORAGE_SERIALIZER = os.getenv("STORAGE_SERIALIZER", "auto")
+
+    # Кеш розмов у пам'яті (LRU) з відкладеним записом
+    STORAGE_CACHE_SIZE = 128      # Максимум розмов у кеші (0 - вимкнено)
+    STORAGE_WRITE_BACK = os.getenv("STORAGE_WRITE_BACK", "False") == "True"  # Лише для одного процесу
+    STORAGE_FLUSH_INTERVAL = 1.0  # Інтервал фонового запису, секунд
+
+    # Холодне сховище (файловий бекенд): давно не оновлені розмови стискаються в пакети
+    # Архівувати розмови без оновлень довше за стільки днів (0 - вимкнено); виконує фонове обслуговування
+    STORAGE_ARCHIVE_AFTER_DAYS = 30.0
+    STORAGE_ARCHIVE_CODEC = os.getenv("STORAGE_ARCHIVE_CODEC", "gzip")  # "gzip" або "zstd" (потрібен zstandard)
+    STORAGE_ARCHIVE_PACK_BYTES = 64 * 1024 * 1024  # Розмір пакета архіву (0 - окремий файл на розмову)
+
+    # Фонове обслуговування сховища (стан і запуск: /api/admin/maintenance)
+    MAINTENANCE_INTERVAL = 3600.0          # Інтервал проходів, секунд (0 - лише на вимогу)
+    STORAGE_RETENTION_DAYS = float(os.getenv("STORAGE_RETENTION_DAYS", "0"))  # Видаляти розмови без оновлень довше за стільки днів (0 - зберігати завжди)
+    MAINTENANCE_BATCH = 1000               # Максимум розмов на кожне завдання за прохід
+    MAINTENANCE_MAX_OPS_PER_SECOND = 20.0  # Операцій над розмовами за секунду (0 - без обмеження)
+    # Токен для /api/admin/* (заголовок X-Admin-Token); порожній - без перевірки
+    ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+
+    # Повнотекстовий пошук по розмовах (GET /api/search)
+    SEARCH_ENABLED = os.getenv("SEARCH_ENABLED", "True") == "True"
+    SEARCH_INDEX_PATH = BASE_DIR / "data" / "search.db"
+    SEARCH_PAGE_SIZE = 20         # Розмір сторінки результатів за замовчуванням
+    SEARCH_MAX_PAGE_SIZE = 100    # Максимальний розмір сторінки
+
+    # Експорт та імпорт розмов (GET /api/export, POST /api/import)
+    EXPORT_CHUNK_BYTES = 64 * 1024     # Розмір блоку потокової відповіді
+    IMPORT_BATCH_SIZE = 500            # Розмов в одному пакеті запису
+
+    # Сторінки історії (GET /api/conversations/<id>/messages?limit=...)
+    MESSAGES_PAGE_SIZE = 50            # Розмір сторінки за замовчуванням
+    MESSAGES_MAX_PAGE_SIZE = 500       # Максимальний розмір сторінки
+
+    # Список розмов (GET /api/conversations)
+    CONVERSATIONS_PAGE_SIZE = 50       # Розмір сторінки за замовчуванням
+    CONVERSATIONS_MAX_PAGE_SIZE = 200  # Максимальний розмір сторінки
+
     # Налаштування моделі GPT-2
     MODEL_NAME = "openai-community/gpt2"
+    # Завантаження моделі у фоні одразу після старту (False - лише ChatService.load_model / start_loading)
+    MODEL_PRELOAD = os.getenv("MODEL_PRELOAD", "True") == "True"
+    MODEL_RETRY_AFTER = 5         # Заголовок Retry-After (секунд) для 503, поки модель завантажується
+    # Ваги через mmap з локального кешу safetensors (конвертація при першому запуску або tools.convert_model)
+    MODEL_MMAP = os.getenv("MODEL_MMAP", "True") == "True"
+    MODEL_CACHE_DIR = BASE_DIR / "data" / "models"
+    MODEL_CACHE_VERIFY = True     # Перевіряти SHA-256 кешу при кожному старті (False - лише розміри файлів)
+    # Квантизація для інференсу: none (fp32), int8 (динамічна, лінійні шари, CPU) або bf16 (якщо CPU підтримує)
+    MODEL_QUANTIZATION = os.getenv("MODEL_QUANTIZATION", "none")
+    # Бекенд інференсу: torch або onnx (експорт у MODEL_CACHE_DIR/onnx, onnxruntime на CPU)
+    MODEL_BACKEND = os.getenv("MODEL_BACKEND", "torch")
+    MODEL_ONNX_THREADS = 0        # Потоки onnxruntime (0 - як у torch)
     MAX_LENGTH = 100              # Максимальна довжина генерації
     MAX_CONTEXT_TOKENS = 512      # Максимум токенів контексту (GPT-2 max = 1024)
     TEMPERATURE = 0.7             # Креативність (0.1-1.0)
     TOP_K = 50                    # Top-k sampling
     TOP_P = 0.9                   # Nucleus sampling
     REPETITION_PENALTY = 1.2      # Штраф за повторення
+    STOP_SEQUENCES = ["\nUser:", "\nAssistant:"]  # Зупинка генерації на початку наступної репліки
 
     # Налаштування історії діалогу
     MAX_HISTORY_MESSAGES = 10     # Скільки повідомлень зберігати в контексті
+    PERSIST_TOKEN_IDS = True      # Зберігати токени повідомлень (prompt без повторної токенізації)
+
+    # Кеш KV-сесій (повторне використання prefill між репліками)
+    KV_CACHE_ENABLED = True
+    KV_CACHE_MAX_SESSIONS = 32    # Максимум розмов у кеші (LRU)
+    KV_CACHE_MAX_MEMORY_MB = 256  # Ліміт пам'яті для всіх сесій
+
+    # Неперервний батчинг паралельних запитів (фоновий рушій генерації)
+    BATCHING_ENABLED = os.getenv("BATCHING_ENABLED", "False") == "True"
+    MAX_BATCH_SIZE = 8            # Максимум послідовностей в одному кроці
 
     # Flask налаштування
     SECRET_KEY = os.getenv("SECRET_KEY", "dev-secret-key-change-in-production")
     DEBUG = os.getenv("DEBUG", "True") == "True"
+
+    # Pre-fork сервер (python server.py): модель завантажується в майстрі, воркери ділять ваги
+    SERVER_HOST = os.getenv("SERVER_HOST", "0.0.0.0")
+    SERVER_PORT = int(os.getenv("SERVER_PORT", "5000"))
+    SERVER_WORKERS = int(os.getenv("SERVER_WORKERS", "0"))  # Кількість воркерів (0 - за кількістю ядер)
+    SERVER_TORCH_THREADS = 0                # Потоків torch на воркер (0 - ядра порівну між воркерами)
+    SERVER_PIN_CPUS = True                  # Закріпити воркер за своїми ядрами (sched_setaffinity)
+    SERVER_MEMORY_REPORT_INTERVAL = 300.0   # Звіт про пам'ять воркерів у лог, секунд (0 - вимкнено)
@@ -0,0 +1,355 @@
+from typing import Callable, Iterator, List, Optional
+import queue
+import threading
+import logging
+
+import torch
+import torch.nn.functional as F
+from transformers import (
+    LogitsProcessorList,
+    RepetitionPenaltyLogitsProcessor,
+    TemperatureLogitsWarper,
+    TopKLogitsWarper,
+    TopPLogitsWarper
+)
+
+from models.kv_cache import PastKeyValues
+
+logger = logging.getLogger(__name__)
+
+
+class GenerationRequest:
+    """
+    Запит на генерацію, що обробляється GenerationEngine
+
+    Згенеровані токени передаються через внутрішню чергу (iter_tokens),
+    повний результат доступний після завершення (wait).
+    """
+
+    def __init__(
+        self,
+        input_ids: List[int],
+        max_new_tokens: int = 100,
+        temperature: float = 0.7,
+        top_k: int = 50,
+        top_p: float = 0.9,
+        repetition_penalty: float = 1.2,
+        do_sample: bool = True,
+        past_key_values: Optional[PastKeyValues] = None,
+        stopping_criteria: Optional[Callable[[List[int]], bool]] = None
+    ):
+        self.input_ids = list(input_ids)
+        self.max_new_tokens = max_new_tokens
+        self.do_sample = do_sample
+        # Викликається зі згенерованими токенами після кожного кроку;
+        # True - завершити послідовність (наприклад, знайдено стоп-рядок)
+        self.stopping_criteria = stopping_criteria
+        # KV-кеш для префікса input_ids (наприклад, з KV-сесії розмови);
+        # після завершення - кеш для всієї послідовності, крім останнього токена
+        self.past_key_values = past_key_values
+
+        self.generated: List[int] = []
+        self.finish_reason: Optional[str] = None
+        self.error: Optional[Exception] = None
+
+        processors = []
+        if repetition_penalty != 1.0:
+            processors.append(RepetitionPenaltyLogitsProcessor(repetition_penalty))
+        if do_sample:
+            if temperature != 1.0:
+                processors.append(TemperatureLogitsWarper(temperature))
+            if top_k > 0:
+                processors.append(TopKLogitsWarper(top_k))
+            if top_p < 1.0:
+                processors.append(TopPLogitsWarper(top_p))
+        self.logits_processor = LogitsProcessorList(processors)
+
+        self._tokens: "queue.Queue[Optional[int]]" = queue.Queue()
+        self._done = threading.Event()
+
+    @property
+    def done(self) -> bool:
+        return self._done.is_set()
+
+    def wait(self, timeout: Optional[float] = None) -> List[int]:
+        """Очікування завершення генерації"""
+        if not self._done.wait(timeout):
+            raise TimeoutError("Generation did not finish in time")
+        if self.error is not None:
+            raise RuntimeError(f"Generation failed: {self.error}") from self.error
+        return self.generated
+
+    def iter_tokens(self) -> Iterator[int]:
+        """Ітерація по токенах у міру їх генерації"""
+        while True:
+            token = self._tokens.get()
+            if token is None:
+                break
+            yield token
+        if self.error is not None:
+            raise RuntimeError(f"Generation failed: {self.error}") from self.error
+
+    def _emit(self, token: int):
+        self.generated.append(token)
+        self._tokens.put(token)
+
+    def _finish(self, reason: str, error: Optional[Exception] = None):
+        self.finish_reason = reason
+        self.error = error
+        self._tokens.put(None)
+        self._done.set()
+
+
+class _Sequence:
+    """Стан активної послідовності в батчі"""
+
+    __slots__ = ("request", "token_ids", "past_key_values")
+
+    def __init__(self, request: GenerationRequest):
+        self.request = request
+        self.token_ids = list(request.input_ids)
+        self.past_key_values: Optional[PastKeyValues] = None
+
+    @property
+    def past_length(self) -> int:
+        return self.past_key_values[0][0].shape[2]
+
+
+class GenerationEngine:
+    """
+    Фоновий рушій генерації з неперервним (iteration-level) батчингом
+
+    На кожному кроці декодування:
+    1. Нові запити допускаються в батч (prefill виконується окремо для кожного)
+    2. Один forward pass генерує наступний токен для всіх активних послідовностей
+    3. Завершені послідовності (EOS, стоп-рядок або max_new_tokens) виходять з батчу
+
+    KV-кеш зберігається окремо для кожної послідовності; для спільного
+    кроку він вирівнюється лівим padding з маскою уваги.
+    """
+
+    def __init__(
+        self,
+        model,
+        eos_token_id: int,
+        max_batch_size: int = 8,
+        max_positions: int = 1024,
+        device: str = "cpu"
+    ):
+        self.model = model
+        self.eos_token_id = eos_token_id
+        self.max_batch_size = max_batch_size
+        self.max_positions = max_positions
+        self.device = device
+
+        self._pending: "queue.Queue[GenerationRequest]" = queue.Queue()
+        self._active: List[_Sequence] = []
+        self._thread: Optional[threading.Thread] = None
+        self._running = False
+
+        self.stats = {
+            "admitted": 0,
+            "completed": 0,
+            "steps": 0,
+            "batched_tokens": 0
+        }
+
+    @property
+    def running(self) -> bool:
+        return self._running
+
+    def start(self):
+        """Запуск фонового потоку генерації"""
+        if self._running:
+            return
+        if self._thread is not None and self._thread.is_alive():
+            raise RuntimeError("Generation engine is still stopping")
+        self._running = True
+        self._thread = threading.Thread(target=self._loop, name="generation-engine", daemon=True)
+        self._thread.start()
+        logger.info(f"Generation engine started (max batch size: {self.max_batch_size})")
+
+    def stop(self, timeout: Optional[float] = 5.0):
+        """
+        Зупинка рушія; незавершені запити отримують помилку
+
+        _active належить потоку рушія: якщо за timeout він не завершив
+        поточний крок, незавершені запити він відхилить сам на виході
+        з циклу, а не потік, що викликав stop.
+        """
+        self._running = False
+        if self._thread is not None:
+            self._thread.join(timeout)
+            if self._thread.is_alive():
+                logger.warning("Generation engine is still finishing a step, it will fail outstanding requests on exit")
+                return
+            self._thread = None
+
+        self._fail_outstanding()
+
+    def submit(self, request: GenerationRequest) -> GenerationRequest:
+        """Постановка запиту в чергу"""
+        if not self._running:
+            raise RuntimeError("Generation engine is not running")
+        self._pending.put(request)
+        return request
+
+    def _loop(self):
+        try:
+            while self._running:
+                self._admit()
+                if not self._active:
+                    continue
+                try:
+                    with torch.no_grad():
+                        self._decode_step()
+                except Exception as e:
+                    logger.error(f"Decode step failed: {e}", exc_info=True)
+                    for sequence in self._active:
+                        sequence.request._finish("error", e)
+                    self._active = []
+        finally:
+            self._fail_outstanding()
+
+    def _fail_outstanding(self):
+        """Помилка для активних і ще не допущених запитів (потік рушія вже не працює з ними)"""
+        stopped = RuntimeError("Generation engine stopped")
+        for sequence in self._active:
+            sequence.request._finish("error", stopped)
+        self._active = []
+        while True:
+            try:
+                self._pending.get_nowait()._finish("error", stopped)
+            except queue.Empty:
+                break
+
+    def _admit(self):
+        """Допуск нових запитів у батч"""
+        while len(self._active) < self.max_batch_size:
+            try:
+                # Без активних послідовностей чекаємо на новий запит
+                block = not self._active
+                request = self._pending.get(block=block, timeout=0.1 if block else None)
+            except queue.Empty:
+                return
+
+            sequence = _Sequence(request)
+            try:
+                with torch.no_grad():
+                    self._prefill(sequence)
+            except Exception as e:
+                logger.error(f"Prefill failed: {e}", exc_info=True)
+                request._finish("error", e)
+                continue
+
+            self.stats["admitted"] += 1
+            if not self._retire_if_finished(sequence):
+                self._active.append(sequence)
+
+    def _prefill(self, sequence: _Sequence):
+        """Обробка prompt нової послідовності та вибір першого токена"""
+        request = sequence.request
+        past = request.past_key_values
+        cached = past[0][0].shape[2] if past is not None else 0
+
+        input_ids = torch.tensor([sequence.token_ids[cached:]], device=self.device)
+        total = len(sequence.token_ids)
+        outputs = self.model(
+            input_ids=input_ids,
+            past_key_values=past,
+            attention_mask=torch.ones((1, total), dtype=torch.long, device=self.device),
+            position_ids=torch.arange(cached, total, device=self.device).unsqueeze(0),
+            use_cache=True
+        )
+
+        sequence.past_key_values = outputs.past_key_values
+        self._append_token(sequence, outputs.logits[:, -1, :])
+
+    def _decode_step(self):
+        """Один крок декодування для всіх активних послідовностей"""
+        batch = self._active
+        lengths = [sequence.past_length for sequence in batch]
+        max_length = max(lengths)
+        num_layers = len(batch[0].past_key_values)
+
+        # Вирівнювання KV-кешів лівим padding
+        past_key_values = []
+        for layer in range(num_layers):
+            keys, values = [], []
+            for sequence, length in zip(batch, lengths):
+                key, value = sequence.past_key_values[layer]
+                pad = max_length - length
+                keys.append(F.pad(key, (0, 0, pad, 0)) if pad else key)
+                values.append(F.pad(value, (0, 0, pad, 0)) if pad else value)
+            past_key_values.append((torch.cat(keys), torch.cat(values)))
+
+        attention_mask = torch.zeros((len(batch), max_length + 1), dtype=torch.long, device=self.device)
+        for i, length in enumerate(lengths):
+            attention_mask[i, max_length - length:] = 1
+
+        input_ids = torch.tensor([[sequence.token_ids[-1]] for sequence in batch], device=self.device)
+        position_ids = torch.tensor([[length] for length in lengths], device=self.device)
+
+        outputs = self.model(
+            input_ids=input_ids,
+            past_key_values=tuple(past_key_values),
+            attention_mask=attention_mask,
+            position_ids=position_ids,
+            use_cache=True
+        )
+
+        self.stats["steps"] += 1
+        self.stats["batched_tokens"] += len(batch)
+
+        still_active = []
+        for i, (sequence, length) in enumerate(zip(batch, lengths)):
+            start = max_length - length
+            sequence.past_key_values = tuple(
+                (key[i:i + 1, :, start:, :], value[i:i + 1, :, start:, :])
+                for key, value in outputs.past_key_values
+            )
+            self._append_token(sequence, outputs.logits[i:i + 1, -1, :])
+            if not self._retire_if_finished(sequence):
+                still_active.append(sequence)
+        self._active = still_active
+
+    def _append_token(self, sequence: _Sequence, logits: torch.Tensor):
+        """Вибір наступного токена для послідовності"""
+        request = sequence.request
+        ids = torch.tensor([sequence.token_ids], device=self.device)
+        scores = request.logits_processor(ids, logits.float())
+
+        if request.do_sample:
+            probs = torch.softmax(scores, dim=-1)
+            token = int(torch.multinomial(probs, num_samples=1)[0, 0])
+        else:
+            token = int(torch.argmax(scores, dim=-1)[0])
+
+        sequence.token_ids.append(token)
+        if token == self.eos_token_id:
+            request.finish_reason = "eos"
+        else:
+            request._emit(token)
+            if request.stopping_criteria is not None and request.stopping_criteria(request.generated):
+                request.finish_reason = "stop"
+
+    def _retire_if_finished(self, sequence: _Sequence) -> bool:
+        """Завершення послідовності, якщо досягнуто EOS, стоп-рядка або ліміту довжини"""
+        request = sequence.request
+
+        if request.finish_reason in ("eos", "stop"):
+            reason = request.finish_reason
+        elif len(request.generated) >= request.max_new_tokens:
+            reason = "length"
+        elif len(sequence.token_ids) >= self.max_positions:
+            reason = "length"
+        else:
+            return False
+
+        request.past_key_values = tuple(
+            (key.contiguous(), value.contiguous())
+            for key, value in sequence.past_key_values
+        )
+        request._finish(reason)
+        self.stats["completed"] += 1
+        return True
@@ -1,10 +1,20 @@
-from transformers import GPT2LMHeadModel, GPT2Tokenizer
+from transformers import GPT2LMHeadModel, GPT2Tokenizer, StoppingCriteriaList, TextIteratorStreamer
 import torch
-from typing import Optional
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional
 import logging
 
+from models.kv_cache import SessionCache, KVCacheSession, PastKeyValues, common_prefix_length, crop_past
+from models.batch_engine import GenerationEngine, GenerationRequest
+from models.stopping import StopSequenceCriteria
+from models.quantization import quantize_model
+
 logger = logging.getLogger(__name__)
 
+# torch - GPT2LMHeadModel, onnx - граф ONNX на onnxruntime (models.onnx_model)
+BACKENDS = ("torch", "onnx")
+
 class GPT2ChatModel:
     """Singleton клас для роботи з GPT-2 моделлю"""
 
@@ -25,21 +35,113 @@ class GPT2ChatModel:
 
         self.model = None
         self.tokenizer = None
+        # Звідки завантажені ваги і як квантизовані: {"backend", "mmap", "path", "bytes", "verified", "quantization"}
+        self.weights: Dict = {}
+        self.sessions: Optional[SessionCache] = None
+        self.engine: Optional[GenerationEngine] = None
+        self.stop_stats = {
+            "stopped": 0,        # Генерацій, зупинених стоп-рядком
+            "tokens_saved": 0    # Токенів бюджету max_length, які не довелося генерувати
+        }
+        # Генерації паралельних запитів оновлюють stop_stats одночасно
+        self._stats_lock = threading.Lock()
         self._initialized = True
 
-    def load_model(self, model_name: str = "openai-community/gpt2"):
-        """Завантаження моделі та токенізатора"""
+    def load_model(
+        self,
+        model_name: str = "openai-community/gpt2",
+        cache_dir: Optional[Path] = None,
+        verify: bool = True,
+        quantization: str = "none",
+        backend: str = "torch",
+        onnx_threads: int = 0
+    ):
+        """
+        Завантаження моделі та токенізатора
+
+        З cache_dir ваги один раз конвертуються в локальний кеш
+        safetensors і далі відображаються в пам'ять (models.weights_cache).
+        quantization - "none", "int8" або "bf16" (models.quantization).
+        backend="onnx" - модель один раз експортується в ONNX (cache_dir/onnx)
+        і виконується onnxruntime на CPU в onnx_threads потоків (0 - як у torch).
+        """
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown model backend: {backend}")
+
         if self.model is None:
             logger.info(f"Loading model: {model_name}")
-            self.tokenizer = GPT2Tokenizer.from_pretrained(model_name)
-            self.model = GPT2LMHeadModel.from_pretrained(model_name)
+            if backend == "onnx":
+                from models import onnx_model
+
+                if onnx_model.ort is None:
+                    logger.warning("onnxruntime is not installed, using the torch backend")
+                    backend = "torch"
+
+            if backend == "onnx":
+                if cache_dir is None:
+                    raise ValueError("ONNX backend needs cache_dir for the exported model")
+                # onnxruntime виконує модель на CPU незалежно від наявності CUDA
+                self.device = "cpu"
+                cache = onnx_model.OnnxCache(cache_dir, verify=verify, threads=onnx_threads)
+                self.model, self.tokenizer, info = cache.load(model_name)
+                self.weights = dict(info, backend="onnx", mmap=False)
+            elif cache_dir is not None:
+                from models.weights_cache import WeightsCache
+
+                self.model, self.tokenizer, info = WeightsCache(cache_dir, verify=verify).load(model_name)
+                self.weights = dict(info, backend="torch", mmap=True)
+            else:
+                self.tokenizer = GPT2Tokenizer.from_pretrained(model_name)
+                self.model = GPT2LMHeadModel.from_pretrained(model_name)
+                self.weights = {"backend": "torch", "mmap": False}
             self.model.to(self.device)
             self.model.eval()
 
+            if backend == "onnx" and quantization != "none":
+                logger.warning(f"Quantization {quantization} applies to the torch backend only, ONNX model runs in fp32")
+                quantization = "none"
+            self.weights["quantization"] = quantize_model(self.model, quantization, self.device)
+
             # Встановлення pad_token (GPT-2 не має його за замовчуванням)
             self.tokenizer.pad_token = self.tokenizer.eos_token
             logger.info("Model loaded successfully")
 
+    def enable_sessions(self, max_sessions: int = 32, max_memory_mb: int = 256):
+        """Увімкнення кешу KV-сесій для розмов"""
+        self.sessions = SessionCache(
+            max_sessions=max_sessions,
+            max_bytes=max_memory_mb * 1024 * 1024
+        )
+        logger.info(f"KV sessions enabled: {max_sessions} sessions, {max_memory_mb} MB")
+
+    def drop_session(self, session_id: str) -> bool:
+        """Видалення KV-сесії розмови"""
+        if self.sessions is None:
+            return False
+        return self.sessions.drop(session_id)
+
+    def enable_batching(self, max_batch_size: int = 8):
+        """Запуск фонового рушія з неперервним батчингом"""
+        if self.model is None:
+            raise RuntimeError("Model not loaded. Call load_model() first.")
+
+        if self.engine is not None:
+            self.engine.stop()
+
+        self.engine = GenerationEngine(
+            self.model,
+            eos_token_id=self.tokenizer.eos_token_id,
+            max_batch_size=max_batch_size,
+            device=self.device
+        )
+        self.engine.start()
+
+    def disable_batching(self):
+        """Зупинка рушія батчингу"""
+        if self.engine is not None:
+            self.engine.stop()
+            self.engine = None
+
     def generate_response(
         self,
         prompt: str,
@@ -48,7 +150,11 @@ class GPT2ChatModel:
         top_k: int = 50,
         top_p: float = 0.9,
         repetition_penalty: float = 1.2,
-        num_return_sequences: int = 1
+        num_return_sequences: int = 1,
+        session_id: Optional[str] = None,
+        streamer: Optional[TextIteratorStreamer] = None,
+        stop_sequences: Optional[List[str]] = None,
+        input_ids: Optional[List[int]] = None
     ) -> str:
         """
         Генерація відповіді на основі prompt
@@ -61,6 +167,12 @@ class GPT2ChatModel:
             top_p: Nucleus sampling параметр
             repetition_penalty: Штраф за повторення слів
             num_return_sequences: Кількість варіантів відповіді
+            session_id: Ідентифікатор KV-сесії (зазвичай conversation_id);
+                якщо задано, prefill виконується лише для нових токенів
+            streamer: Streamer transformers, що отримує токени під час генерації
+            stop_sequences: Рядки, поява яких у відповіді зупиняє генерацію
+                (наприклад, "\nUser:" - модель почала наступну репліку)
+            input_ids: Готові токени prompt; якщо задано, prompt не токенізується
 
         Returns:
             Згенерована відповідь
@@ -69,27 +181,46 @@ class GPT2ChatModel:
             raise RuntimeError("Model not loaded. Call load_model() first.")
 
         # Токенізація prompt
-        inputs = self.tokenizer.encode(prompt, return_tensors="pt").to(self.device)
+        if input_ids is not None:
+            inputs = torch.tensor([input_ids], dtype=torch.long, device=self.device)
+        else:
+            inputs = self.tokenizer.encode(prompt, return_tensors="pt").to(self.device)
 
         # Перевірка довжини prompt
         if inputs.shape[1] > 1024:  # GPT-2 max context
             logger.warning(f"Prompt too long ({inputs.shape[1]} tokens), truncating...")
             inputs = inputs[:, -1000:]  # Залишаємо останні 1000 токенів
 
+        generation_kwargs = {
+            "max_length": inputs.shape[1] + max_length,
+            "temperature": temperature,
+            "top_k": top_k,
+            "top_p": top_p,
+            "repetition_penalty": repetition_penalty,
+            "num_return_sequences": num_return_sequences,
+            "do_sample": True,
+            "pad_token_id": self.tokenizer.eos_token_id,
+            "eos_token_id": self.tokenizer.eos_token_id
+        }
+        if streamer is not None:
+            generation_kwargs["streamer"] = streamer
+
+        stop_criteria = None
+        if stop_sequences:
+            stop_criteria = StopSequenceCriteria(self.tokenizer, stop_sequences, prompt_length=inputs.shape[1])
+            generation_kwargs["stopping_criteria"] = StoppingCriteriaList([stop_criteria])
+
+        if session_id is None or self.sessions is None or num_return_sequences != 1:
+            session_id = None
+
         # Генерація
         with torch.no_grad():
-            outputs = self.model.generate(
-                inputs,
-                max_length=inputs.shape[1] + max_length,
-                temperature=temperature,
-                top_k=top_k,
-                top_p=top_p,
-                repetition_penalty=repetition_penalty,
-                num_return_sequences=num_return_sequences,
-                do_sample=True,
-                pad_token_id=self.tokenizer.eos_token_id,
-                eos_token_id=self.tokenizer.eos_token_id
-            )
+            if self.engine is not None and num_return_sequences == 1:
+                outputs = self._generate_batched(session_id, inputs, generation_kwargs)
+            elif session_id is not None:
+                outputs = self._generate_with_session(session_id, inputs, generation_kwargs)
+            else:
+                outputs = self.model.generate(inputs, **generation_kwargs)
 
         # Декодування тільки нових токенів (без prompt)
         # outputs[0] містить всі токени (prompt + згенеровані)
@@ -97,8 +228,125 @@ class GPT2ChatModel:
         new_tokens = outputs[0][inputs.shape[1]:]
         response = self.tokenizer.decode(new_tokens, skip_special_tokens=True).strip()
 
+        if stop_criteria is not None and stop_criteria.triggered:
+            with self._stats_lock:
+                self.stop_stats["stopped"] += 1
+                self.stop_stats["tokens_saved"] += max(max_length - len(new_tokens), 0)
+
         return response
 
+    def _generate_with_session(self, session_id: str, inputs: torch.Tensor, generation_kwargs: dict) -> torch.Tensor:
+        """Генерація з повторним використанням KV-кешу розмови"""
+        past_key_values = self._reuse_session(session_id, inputs[0].tolist())
+
+        outputs = self.model.generate(
+            inputs,
+            attention_mask=torch.ones_like(inputs),
+            past_key_values=past_key_values,
+            return_dict_in_generate=True,
+            **generation_kwargs
+        )
+
+        self._store_session(session_id, outputs.sequences[0].tolist(), outputs.past_key_values)
+        return outputs.sequences
+
+    def _generate_batched(self, session_id: Optional[str], inputs: torch.Tensor, generation_kwargs: dict) -> torch.Tensor:
+        """Генерація через фоновий рушій батчингу (з KV-сесією, якщо задано)"""
+        input_ids = inputs[0].tolist()
+        stopping_criteria = generation_kwargs.get("stopping_criteria")
+        stop_criteria = stopping_criteria[0] if stopping_criteria else None
+        past_key_values = None
+        if session_id is not None:
+            past_key_values = self._reuse_session(session_id, input_ids)
+
+        request = self.engine.submit(GenerationRequest(
+            input_ids,
+            max_new_tokens=generation_kwargs["max_length"] - len(input_ids),
+            temperature=generation_kwargs["temperature"],
+            top_k=generation_kwargs["top_k"],
+            top_p=generation_kwargs["top_p"],
+            repetition_penalty=generation_kwargs["repetition_penalty"],
+            past_key_values=past_key_values,
+            stopping_criteria=stop_criteria.matches if stop_criteria is not None else None
+        ))
+
+        streamer = generation_kwargs.get("streamer")
+        if streamer is not None:
+            # Той самий протокол, що й у model.generate: спочатку prompt, потім токени
+            streamer.put(torch.tensor(input_ids))
+            for token in request.iter_tokens():
+                streamer.put(torch.tensor([token]))
+            streamer.end()
+
+        generated = request.wait()
+
+        if session_id is not None:
+            self._store_session(session_id, input_ids + generated, request.past_key_values)
+
+        return torch.tensor([input_ids + generated], device=self.device)
+
+    def _reuse_session(self, session_id: str, input_ids: List[int]) -> Optional[PastKeyValues]:
+        """
+        Пошук кешованого префікса prompt у KV-сесії розмови
+
+        Кешований префікс визначається як спільний префікс токенів
+        попереднього виклику та нового prompt. Якщо історію було обрізано
+        (змінився початок prompt), спільного префікса немає і виконується
+        повний prefill.
+        """
+        past_key_values = None
+        reused = 0
+
+        session = self.sessions.take(session_id)
+        if session is not None:
+            # Хоча б один токен має пройти через модель, щоб отримати logits
+            reused = min(common_prefix_length(session.token_ids, input_ids), len(input_ids) - 1)
+            if reused > 0:
+                past_key_values = crop_past(session.past_key_values, reused)
+
+        self.sessions.record(reused, len(input_ids) - reused)
+        logger.debug(f"KV session {session_id}: reused {reused}/{len(input_ids)} prompt tokens")
+        return past_key_values
+
+    def _store_session(self, session_id: str, token_ids: List[int], past_key_values: Optional[PastKeyValues]):
+        """Збереження KV-кешу після генерації"""
+        if past_key_values is None:
+            return
+
+        # Останній згенерований токен ще не пройшов через модель,
+        # тому кеш покриває лише перші cached_length токенів
+        cached_length = past_key_values[0][0].shape[2]
+        self.sessions.put(session_id, KVCacheSession(token_ids[:cached_length], past_key_values))
+
+    def create_streamer(self, timeout: Optional[float] = None) -> TextIteratorStreamer:
+        """Створення streamer для поступового отримання тексту відповіді"""
+        if self.tokenizer is None:
+            raise RuntimeError("Model not loaded. Call load_model() first.")
+        return TextIteratorStreamer(
+            self.tokenizer,
+            skip_prompt=True,
+            timeout=timeout,
+            skip_special_tokens=True
+        )
+
+    def get_stats(self) -> Dict:
+        """Лічильники кешу сесій, рушія батчингу та стоп-рядків"""
+        with self._stats_lock:
+            stats = {"stop_sequences": dict(self.stop_stats), "weights": dict(self.weights)}
+        if self.sessions is not None:
+            stats["kv_cache"] = dict(
+                self.sessions.stats,
+                sessions=len(self.sessions),
+                memory_bytes=self.sessions.total_bytes
+            )
+        if self.engine is not None:
+            stats["batching"] = dict(self.engine.stats)
+        return stats
+
+    def encode(self, text: str) -> List[int]:
+        """Токенізація тексту"""
+        return self.tokenizer.encode(text)
+
     def count_tokens(self, text: str) -> int:
         """Підрахунок токенів в тексті"""
         return len(self.tokenizer.encode(text))
@@ -0,0 +1,130 @@
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+import threading
+import logging
+
+import torch
+
+logger = logging.getLogger(__name__)
+
+# past_key_values у форматі transformers: ((key, value), ...) по шарах,
+# кожен тензор має форму [batch, heads, seq_len, head_dim]
+PastKeyValues = Tuple[Tuple[torch.Tensor, torch.Tensor], ...]
+
+
+def common_prefix_length(cached: List[int], current: List[int]) -> int:
+    """Довжина спільного префікса двох послідовностей токенів"""
+    limit = min(len(cached), len(current))
+    for i in range(limit):
+        if cached[i] != current[i]:
+            return i
+    return limit
+
+
+def crop_past(past_key_values: PastKeyValues, length: int) -> PastKeyValues:
+    """Обрізання KV-кешу до перших length позицій"""
+    return tuple(
+        (key[:, :, :length, :], value[:, :, :length, :])
+        for key, value in past_key_values
+    )
+
+
+def past_nbytes(past_key_values: PastKeyValues) -> int:
+    """Обсяг пам'яті, зайнятий KV-кешем (у байтах)"""
+    return sum(
+        tensor.numel() * tensor.element_size()
+        for layer in past_key_values
+        for tensor in layer
+    )
+
+
+class KVCacheSession:
+    """KV-кеш однієї розмови разом з токенами, які він покриває"""
+
+    __slots__ = ("token_ids", "past_key_values", "nbytes")
+
+    def __init__(self, token_ids: List[int], past_key_values: PastKeyValues):
+        self.token_ids = token_ids
+        self.past_key_values = past_key_values
+        self.nbytes = past_nbytes(past_key_values)
+
+
+class SessionCache:
+    """
+    LRU-кеш KV-сесій, ключ - conversation_id
+
+    Сесія вилучається з кешу на час генерації (take) і повертається
+    після неї (put), тому паралельні запити до однієї розмови
+    ніколи не працюють з одними й тими самими тензорами.
+    """
+
+    def __init__(self, max_sessions: int = 32, max_bytes: int = 256 * 1024 * 1024):
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self._sessions: "OrderedDict[str, KVCacheSession]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats: Dict[str, int] = {
+            "hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "reused_tokens": 0,
+            "prefilled_tokens": 0
+        }
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def __contains__(self, session_id: str) -> bool:
+        return session_id in self._sessions
+
+    def take(self, session_id: str) -> Optional[KVCacheSession]:
+        """Вилучення сесії з кешу для використання"""
+        with self._lock:
+            session = self._sessions.pop(session_id, None)
+            if session is not None:
+                self.total_bytes -= session.nbytes
+            return session
+
+    def put(self, session_id: str, session: KVCacheSession):
+        """Збереження сесії з витісненням найдавніше використаних"""
+        if session.nbytes > self.max_bytes:
+            logger.debug(f"KV session {session_id} exceeds memory cap, not cached")
+            return
+
+        with self._lock:
+            old = self._sessions.pop(session_id, None)
+            if old is not None:
+                self.total_bytes -= old.nbytes
+
+            self._sessions[session_id] = session
+            self.total_bytes += session.nbytes
+
+            while self._sessions and (
+                len(self._sessions) > self.max_sessions
+                or self.total_bytes > self.max_bytes
+            ):
+                evicted_id, evicted = self._sessions.popitem(last=False)
+                self.total_bytes -= evicted.nbytes
+                self.stats["evictions"] += 1
+                logger.debug(f"Evicted KV session: {evicted_id}")
+
+    def drop(self, session_id: str) -> bool:
+        """Видалення сесії (наприклад, при видаленні розмови)"""
+        return self.take(session_id) is not None
+
+    def clear(self):
+        """Очищення всіх сесій"""
+        with self._lock:
+            self._sessions.clear()
+            self.total_bytes = 0
+
+    def record(self, reused_tokens: int, prefilled_tokens: int):
+        """Оновлення лічильників після prefill"""
+        with self._lock:
+            if reused_tokens > 0:
+                self.stats["hits"] += 1
+            else:
+                self.stats["misses"] += 1
+            self.stats["reused_tokens"] += reused_tokens
+            self.stats["prefilled_tokens"] += prefilled_tokens
@@ -0,0 +1,245 @@
+import inspect
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+import logging
+
+import numpy as np
+import torch
+from transformers import GPT2Config, GPT2LMHeadModel, GPT2PreTrainedModel, GPT2Tokenizer, GenerationConfig
+from transformers.modeling_outputs import CausalLMOutputWithPast
+
+from models.weights_cache import WeightsCache
+
+try:
+    import onnxruntime as ort
+except ImportError:  # onnxruntime необов'язковий, без нього працює лише бекенд torch
+    ort = None
+
+logger = logging.getLogger(__name__)
+
+# Та сама назва, що й в експортах optimum / Transformers.js (Xenova/gpt2)
+ONNX_FILE = "decoder_model_merged.onnx"
+ONNX_CACHE_DIR = "onnx"
+ONNX_CACHE_FORMAT = "onnx-1"
+ONNX_OPSET = 14
+
+
+def past_names(num_layers: int, prefix: str) -> List[str]:
+    """Назви входів / виходів KV-кешу: past_key_values.0.key, past_key_values.0.value, ..."""
+    return [f"{prefix}.{layer}.{kind}" for layer in range(num_layers) for kind in ("key", "value")]
+
+
+class _DecoderWithPast(torch.nn.Module):
+    """Обгортка для експорту: KV-кеш як плоский список входів і виходів"""
+
+    def __init__(self, model: GPT2LMHeadModel):
+        super().__init__()
+        self.model = model
+
+    def forward(self, input_ids, attention_mask, position_ids, *past):
+        outputs = self.model(
+            input_ids=input_ids,
+            attention_mask=attention_mask,
+            position_ids=position_ids,
+            past_key_values=tuple(zip(past[::2], past[1::2])),
+            use_cache=True,
+            return_dict=True
+        )
+        return (outputs.logits,) + tuple(tensor for layer in outputs.past_key_values for tensor in layer)
+
+
+def export_decoder(model: GPT2LMHeadModel, path: Path):
+    """
+    Експорт GPT-2 в ONNX з входами KV-кешу
+
+    Один граф і для prefill, і для кроків декодування: на першому кроці
+    past має довжину 0. Це поведінка decoder_model_merged з optimum, але
+    без гілки use_cache_branch. Довжини послідовності, past і батча
+    динамічні.
+    """
+    config = model.config
+    head_dim = config.n_embd // config.n_head
+    past_length, length = 2, 3
+
+    args = (
+        torch.ones((1, length), dtype=torch.long),
+        torch.ones((1, past_length + length), dtype=torch.long),
+        torch.arange(past_length, past_length + length).unsqueeze(0),
+        *(torch.zeros((1, config.n_head, past_length, head_dim)) for _ in range(2 * config.n_layer))
+    )
+    input_names = ["input_ids", "attention_mask", "position_ids"] + past_names(config.n_layer, "past_key_values")
+    output_names = ["logits"] + past_names(config.n_layer, "present")
+
+    dynamic_axes = {
+        "input_ids": {0: "batch_size", 1: "sequence_length"},
+        "attention_mask": {0: "batch_size", 1: "total_sequence_length"},
+        "position_ids": {0: "batch_size", 1: "sequence_length"},
+        "logits": {0: "batch_size", 1: "sequence_length"}
+    }
+    dynamic_axes.update({name: {0: "batch_size", 2: "past_sequence_length"} for name in input_names[3:]})
+    dynamic_axes.update({name: {0: "batch_size", 2: "total_sequence_length"} for name in output_names[1:]})
+
+    # Нові версії torch за замовчуванням експортують через torch.export; трасування
+    # (TorchScript) однаково підтримує dynamic_axes у всіх версіях
+    options = {"dynamo": False} if "dynamo" in inspect.signature(torch.onnx.export).parameters else {}
+
+    # Обгортка має бути в режимі eval, інакше в граф потрапляє dropout
+    with torch.no_grad():
+        torch.onnx.export(
+            _DecoderWithPast(model).eval(),
+            args,
+            str(path),
+            input_names=input_names,
+            output_names=output_names,
+            dynamic_axes=dynamic_axes,
+            opset_version=ONNX_OPSET,
+            do_constant_folding=True,
+            **options
+        )
+
+
+def find_onnx_file(directory: Path) -> Optional[Path]:
+    """Готовий експорт у каталозі моделі (у корені або в onnx/, як у Xenova/gpt2)"""
+    for path in (directory / ONNX_FILE, directory / "onnx" / ONNX_FILE):
+        if path.is_file():
+            return path
+    return None
+
+
+def _to_numpy(tensor: torch.Tensor, dtype=None) -> np.ndarray:
+    if dtype is not None:
+        tensor = tensor.to(dtype)
+    return np.ascontiguousarray(tensor.detach().cpu().numpy())
+
+
+class OnnxGPT2LMHeadModel(GPT2PreTrainedModel):
+    """
+    GPT-2 на onnxruntime з інтерфейсом GPT2LMHeadModel
+
+    forward приймає і повертає тензори torch, KV-кеш - кортежі пар
+    тензорів, як у transformers, тож generate, KV-сесії розмов і рушій
+    батчингу працюють без змін. Виходи onnxruntime загортаються в
+    тензори без копіювання. Підтримуються і експорти optimum /
+    Transformers.js з входом use_cache_branch.
+    """
+
+    prepare_inputs_for_generation = GPT2LMHeadModel.prepare_inputs_for_generation
+    _reorder_cache = staticmethod(GPT2LMHeadModel._reorder_cache)
+
+    def __init__(self, config: GPT2Config, path: Path, threads: int = 0):
+        super().__init__(config)
+        self.path = Path(path)
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        # 0 - стільки ж потоків, скільки в torch (у pre-fork сервері - потоки воркера)
+        options.intra_op_num_threads = threads or torch.get_num_threads()
+        self.session = ort.InferenceSession(str(self.path), options, providers=["CPUExecutionProvider"])
+
+        self.input_names = {node.name for node in self.session.get_inputs()}
+        self.num_layers = sum(
+            1 for name in self.input_names if name.startswith("past_key_values.") and name.endswith(".key")
+        )
+        self.output_names = ["logits"] + past_names(self.num_layers, "present")
+        self.head_dim = config.n_embd // config.n_head
+
+    @property
+    def device(self) -> torch.device:
+        return torch.device("cpu")
+
+    @property
+    def dtype(self) -> torch.dtype:
+        return torch.float32
+
+    def forward(
+        self,
+        input_ids: torch.Tensor,
+        past_key_values: Optional[Tuple[Tuple[torch.Tensor, torch.Tensor], ...]] = None,
+        attention_mask: Optional[torch.Tensor] = None,
+        position_ids: Optional[torch.Tensor] = None,
+        use_cache: Optional[bool] = None,
+        return_dict: Optional[bool] = None,
+        **kwargs
+    ) -> CausalLMOutputWithPast:
+        batch_size, length = input_ids.shape
+        past_length = past_key_values[0][0].shape[2] if past_key_values else 0
+
+        if attention_mask is None:
+            attention_mask = torch.ones((batch_size, past_length + length), dtype=torch.long)
+        if position_ids is None:
+            position_ids = torch.arange(past_length, past_length + length).unsqueeze(0).expand(batch_size, -1)
+
+        feed = {
+            "input_ids": _to_numpy(input_ids, torch.long),
+            "attention_mask": _to_numpy(attention_mask, torch.long)
+        }
+        if "position_ids" in self.input_names:
+            feed["position_ids"] = _to_numpy(position_ids, torch.long)
+        if "use_cache_branch" in self.input_names:
+            feed["use_cache_branch"] = np.array([past_length > 0])
+
+        empty = np.zeros((batch_size, self.config.n_head, 0, self.head_dim), dtype=np.float32)
+        for layer in range(self.num_layers):
+            key, value = past_key_values[layer] if past_key_values else (None, None)
+            feed[f"past_key_values.{layer}.key"] = empty if key is None else _to_numpy(key)
+            feed[f"past_key_values.{layer}.value"] = empty if value is None else _to_numpy(value)
+
+        outputs = [torch.from_numpy(output) for output in self.session.run(self.output_names, feed)]
+        present = tuple(zip(outputs[1::2], outputs[2::2]))
+
+        return CausalLMOutputWithPast(logits=outputs[0], past_key_values=present if use_cache is not False else None)
+
+
+class OnnxCache(WeightsCache):
+    """
+    Кеш моделі, експортованої в ONNX (cache_dir/onnx)
+
+    Той самий manifest і атомарна конвертація, що й у WeightsCache:
+    експорт виконується один раз, далі файл лише перевіряється. Якщо
+    назва моделі - каталог з готовим експортом (decoder_model_merged.onnx,
+    наприклад завантажений Xenova/gpt2), він використовується напряму.
+    """
+
+    cache_format = ONNX_CACHE_FORMAT
+
+    def __init__(self, cache_dir: Path, verify: bool = True, threads: int = 0):
+        super().__init__(Path(cache_dir) / ONNX_CACHE_DIR, verify=verify)
+        self.threads = threads
+
+    def locate(self, model_name: str) -> Path:
+        """Файл ONNX моделі; експорт, якщо готового файлу немає"""
+        exported = find_onnx_file(Path(model_name))
+        if exported is not None:
+            return exported
+        return self.ensure(model_name) / ONNX_FILE
+
+    def load(self, model_name: str) -> Tuple[OnnxGPT2LMHeadModel, GPT2Tokenizer, Dict]:
+        """
+        Модель onnxruntime, токенізатор і відомості про файл
+
+        Returns:
+            (модель, токенізатор, {path, bytes, verified})
+        """
+        path = self.locate(model_name)
+        # Конфігурація і токенізатор лежать поруч з файлом (або в каталозі над onnx/)
+        directory = path.parent if (path.parent / "config.json").exists() else path.parent.parent
+
+        model = OnnxGPT2LMHeadModel(GPT2Config.from_pretrained(directory), path, threads=self.threads)
+        if (directory / "generation_config.json").exists():
+            model.generation_config = GenerationConfig.from_pretrained(directory)
+        tokenizer = GPT2Tokenizer.from_pretrained(directory)
+
+        return model, tokenizer, {
+            "path": str(path),
+            "bytes": path.stat().st_size,
+            # Готовий експорт поза кешем не має manifest і не перевіряється
+            "verified": self.verify_checksums and self.cache_dir in path.parents
+        }
+
+    def write_files(self, model_name: str, directory: Path):
+        """Файли кешу: граф ONNX з вагами, конфігурації моделі і генерації, токенізатор"""
+        model = GPT2LMHeadModel.from_pretrained(model_name).eval()
+        export_decoder(model, directory / ONNX_FILE)
+        model.config.save_pretrained(directory)
+        model.generation_config.save_pretrained(directory)
+        GPT2Tokenizer.from_pretrained(model_name).save_pretrained(directory)
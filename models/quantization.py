@@ -0,0 +1,82 @@
+from typing import Union
+import logging
+
+import torch
+from torch import nn
+from transformers.pytorch_utils import Conv1D
+
+logger = logging.getLogger(__name__)
+
+# none - fp32, int8 - динамічна квантизація лінійних шарів, bf16 - ваги й активації в bfloat16
+QUANTIZATION_MODES = ("none", "int8", "bf16")
+
+
+def bf16_supported(device: Union[str, torch.device] = "cpu") -> bool:
+    """Чи має пристрій швидкі bf16-ядра (на CPU - AVX512-BF16 / AMX через oneDNN)"""
+    if torch.device(device).type == "cuda":
+        return torch.cuda.is_bf16_supported()
+    return torch.backends.mkldnn.is_available() and torch.ops.mkldnn._is_mkldnn_bf16_supported()
+
+
+def conv1d_to_linear(model: nn.Module) -> int:
+    """
+    Заміна шарів Conv1D (GPT-2) на nn.Linear з тими самими вагами
+
+    Conv1D зберігає вагу транспонованою ([in, out]), тож nn.Linear
+    отримує представлення weight.t() без копіювання. quantize_dynamic
+    квантизує лише nn.Linear, тому заміна потрібна до квантизації.
+
+    Returns:
+        Кількість замінених шарів
+    """
+    replaced = 0
+    for module in list(model.modules()):
+        for name, child in list(module.named_children()):
+            if not isinstance(child, Conv1D):
+                continue
+
+            in_features, out_features = child.weight.shape
+            linear = nn.Linear(in_features, out_features, device="meta")
+            linear.weight = nn.Parameter(child.weight.detach().t(), requires_grad=False)
+            linear.bias = nn.Parameter(child.bias.detach(), requires_grad=False)
+            setattr(module, name, linear)
+            replaced += 1
+
+    return replaced
+
+
+def quantize_model(model: nn.Module, mode: str, device: Union[str, torch.device] = "cpu") -> str:
+    """
+    Квантизація моделі для інференсу
+
+    int8 - динамічна квантизація: ваги лінійних шарів (уся увага, MLP і
+    lm_head) зберігаються в int8, активації квантизуються на льоту для
+    кожного множення. Ембедінги лишаються fp32, lm_head більше не
+    зв'язаний з wte. Лише CPU (ядра fbgemm / oneDNN).
+
+    bf16 - модель цілком у bfloat16; вмикається лише там, де пристрій
+    має bf16-ядра, інакше модель лишається fp32.
+
+    Returns:
+        Застосований режим ("none", якщо режим не підтримується пристроєм)
+    """
+    if mode not in QUANTIZATION_MODES:
+        raise ValueError(f"Unknown quantization mode: {mode}")
+
+    if mode == "int8":
+        if torch.device(device).type != "cpu":
+            logger.warning(f"Dynamic int8 quantization is CPU-only, keeping fp32 on {device}")
+            return "none"
+        conv1d_to_linear(model)
+        layers = sum(isinstance(module, nn.Linear) for module in model.modules())
+        torch.ao.quantization.quantize_dynamic(model, {nn.Linear}, dtype=torch.qint8, inplace=True)
+        logger.info(f"Quantized {layers} linear layers to int8")
+
+    elif mode == "bf16":
+        if not bf16_supported(device):
+            logger.warning(f"No bf16 support on {device}, keeping fp32")
+            return "none"
+        model.to(torch.bfloat16)
+        logger.info("Model converted to bfloat16")
+
+    return mode
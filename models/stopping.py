@@ -0,0 +1,43 @@
+from typing import List
+import logging
+
+import torch
+from transformers import StoppingCriteria
+
+logger = logging.getLogger(__name__)
+
+
+class StopSequenceCriteria(StoppingCriteria):
+    """
+    Зупинка генерації, щойно в нових токенах з'являється один з рядків
+
+    Перевіряється лише хвіст згенерованих токенів: кожен токен GPT-2
+    містить хоча б один символ, тому рядок довжиною N символів
+    завжди вміщується в останні N токенів.
+    """
+
+    def __init__(self, tokenizer, stop_sequences: List[str], prompt_length: int = 0):
+        self.tokenizer = tokenizer
+        self.stop_sequences = [s for s in stop_sequences if s]
+        self.prompt_length = prompt_length
+        self.window = max((len(s) for s in self.stop_sequences), default=0)
+        self.triggered = False
+
+    def matches(self, generated_ids: List[int]) -> bool:
+        """Чи містить кінець згенерованого тексту стоп-рядок"""
+        if not self.stop_sequences or not generated_ids:
+            return False
+
+        tail = self.tokenizer.decode(generated_ids[-self.window:], skip_special_tokens=True)
+        if any(stop in tail for stop in self.stop_sequences):
+            self.triggered = True
+            return True
+
+        return False
+
+    def __call__(self, input_ids: torch.LongTensor, scores: torch.FloatTensor, **kwargs) -> bool:
+        # Зупиняємось, коли всі послідовності батчу дійшли до стоп-рядка
+        return all(
+            self.matches(row[self.prompt_length:].tolist())
+            for row in input_ids
+        )
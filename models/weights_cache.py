@@ -0,0 +1,251 @@
+import hashlib
+import json
+import os
+import re
+import shutil
+import struct
+import tempfile
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+import logging
+
+import torch
+from safetensors.torch import save_file
+from transformers import GPT2Config, GPT2LMHeadModel, GPT2Tokenizer, GenerationConfig
+from transformers.modeling_utils import no_init_weights
+
+logger = logging.getLogger(__name__)
+
+WEIGHTS_FILE = "model.safetensors"
+MANIFEST_FILE = "manifest.json"
+# Версія формату кешу: інша версія - повторна конвертація
+CACHE_FORMAT = 1
+
+DTYPES = {
+    "F64": torch.float64,
+    "F32": torch.float32,
+    "F16": torch.float16,
+    "BF16": torch.bfloat16,
+    "I64": torch.int64,
+    "I32": torch.int32,
+    "I16": torch.int16,
+    "I8": torch.int8,
+    "U8": torch.uint8,
+    "BOOL": torch.bool
+}
+
+
+def file_sha256(path: Path, chunk_size: int = 1024 * 1024) -> str:
+    """SHA-256 файлу (читання блоками, без завантаження файлу в пам'ять)"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def save_weights(model: torch.nn.Module, path: Path):
+    """
+    Збереження параметрів і буферів моделі у safetensors
+
+    Зв'язані ваги (lm_head = wte) зберігаються один раз, після
+    завантаження їх зв'язує tie_weights. Буфери зберігаються всі,
+    включно з непостійними (маска уваги).
+    """
+    tensors = {name: param.detach().contiguous() for name, param in model.named_parameters()}
+    tensors.update({name: buffer.contiguous() for name, buffer in model.named_buffers()})
+    save_file(tensors, str(path))
+
+
+def map_weights(path: Path) -> Dict[str, torch.Tensor]:
+    """
+    Тензори safetensors-файлу поверх mmap без копіювання
+
+    Файл відображається приватно (copy-on-write): сторінки читаються
+    з диска при першому зверненні і спільні з page cache, тож кілька
+    процесів з тими самими вагами тримають у RAM одну копію.
+    """
+    size = os.path.getsize(path)
+    with open(path, "rb") as f:
+        header_size = struct.unpack("<Q", f.read(8))[0]
+        header = json.loads(f.read(header_size))
+    header.pop("__metadata__", None)
+
+    storage = torch.UntypedStorage.from_file(str(path), shared=False, nbytes=size)
+    data_start = 8 + header_size
+    tensors = {}
+
+    for name, info in header.items():
+        dtype = DTYPES[info["dtype"]]
+        begin, end = info["data_offsets"]
+        itemsize = torch.empty(0, dtype=dtype).element_size()
+
+        if (data_start + begin) % itemsize:
+            # Невирівняний тензор не можна відобразити напряму - копія
+            tensors[name] = torch.frombuffer(
+                bytearray(storage[data_start + begin:data_start + end]), dtype=dtype
+            ).reshape(info["shape"])
+        else:
+            tensors[name] = torch.empty(0, dtype=dtype).set_(
+                storage, (data_start + begin) // itemsize, info["shape"]
+            )
+
+    return tensors
+
+
+def build_model(path: Path, tensors: Dict[str, torch.Tensor]) -> GPT2LMHeadModel:
+    """
+    Модель з готових тензорів без копіювання
+
+    Каркас створюється без ініціалізації ваг (no_init_weights): пам'ять
+    torch.empty не заповнюється, тож не потрапляє в RSS і звільняється
+    після заміни параметрів тензорами з mmap. Пристрій meta тут не
+    підходить - torch.tril на meta імпортує torch._dynamo (~1.5 с).
+    """
+    config = GPT2Config.from_pretrained(path)
+    with no_init_weights():
+        model = GPT2LMHeadModel(config)
+
+    for name, tensor in tensors.items():
+        module_name, _, attr = name.rpartition(".")
+        module = model.get_submodule(module_name)
+        if attr in module._parameters:
+            module._parameters[attr] = torch.nn.Parameter(tensor, requires_grad=False)
+        else:
+            module._buffers[attr] = tensor
+
+    model.tie_weights()
+    # Після tie_weights зв'язані параметри не повторюються в named_parameters
+    missing = [name for name, _ in model.named_parameters() if name not in tensors]
+    if missing:
+        raise ValueError(f"Weights cache has no tensors for: {', '.join(missing)}")
+
+    if (path / "generation_config.json").exists():
+        model.generation_config = GenerationConfig.from_pretrained(path)
+
+    return model
+
+
+class WeightsCache:
+    """
+    Локальний кеш сконвертованих ваг моделі
+
+    from_pretrained читає state dict цілком у пам'ять і лише потім
+    копіює його в модель. Кеш один раз конвертує модель у safetensors
+    (разом з конфігурацією і токенізатором), а далі ваги відображаються
+    в пам'ять через mmap: пік RSS при старті - без копії ваг, а воркери
+    на одному хості ділять сторінки page cache.
+
+    manifest.json містить розміри і SHA-256 файлів; з verify=True
+    контрольні суми перевіряються при кожному завантаженні, інакше
+    лише розміри. Пошкоджений кеш конвертується заново.
+    """
+
+    # Версія формату в manifest.json (підкласи з іншими файлами мають власну)
+    cache_format = CACHE_FORMAT
+
+    def __init__(self, cache_dir: Path, verify: bool = True):
+        self.cache_dir = Path(cache_dir)
+        self.verify_checksums = verify
+
+    def path_for(self, model_name: str) -> Path:
+        """Каталог кешу моделі (назва або локальний шлях HuggingFace)"""
+        return self.cache_dir / re.sub(r"[^A-Za-z0-9._-]+", "--", model_name).strip("-")
+
+    def load(self, model_name: str) -> Tuple[GPT2LMHeadModel, GPT2Tokenizer, Dict]:
+        """
+        Модель (ваги через mmap), токенізатор і відомості про кеш
+
+        Returns:
+            (модель у режимі eval, токенізатор, {path, bytes, verified})
+        """
+        path = self.ensure(model_name)
+        model = build_model(path, map_weights(path / WEIGHTS_FILE))
+        model.eval()
+        tokenizer = GPT2Tokenizer.from_pretrained(path)
+
+        return model, tokenizer, {
+            "path": str(path),
+            "bytes": (path / WEIGHTS_FILE).stat().st_size,
+            "verified": self.verify_checksums
+        }
+
+    def ensure(self, model_name: str) -> Path:
+        """Каталог з перевіреним кешем; конвертація, якщо його немає або він пошкоджений"""
+        path = self.path_for(model_name)
+
+        if path.exists():
+            problem = self.check(path, model_name)
+            if problem is None:
+                return path
+            logger.warning(f"Weights cache {path} is invalid ({problem}), converting again")
+            shutil.rmtree(path, ignore_errors=True)
+
+        return self.convert(model_name)
+
+    def check(self, path: Path, model_name: str) -> Optional[str]:
+        """Опис проблеми з кешем або None, якщо кеш цілий"""
+        try:
+            manifest = json.loads((path / MANIFEST_FILE).read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return "no manifest"
+
+        if manifest.get("format") != self.cache_format or manifest.get("source") != model_name:
+            return "different format or source model"
+
+        for name, expected in manifest["files"].items():
+            file_path = path / name
+            if not file_path.exists() or file_path.stat().st_size != expected["size"]:
+                return f"{name} is missing or has a different size"
+            if self.verify_checksums and file_sha256(file_path) != expected["sha256"]:
+                return f"{name} checksum mismatch"
+
+        return None
+
+    def convert(self, model_name: str) -> Path:
+        """
+        Одноразова конвертація моделі в кеш
+
+        Файли пишуться в тимчасовий каталог і переносяться атомарним
+        rename, тож інші процеси бачать лише завершений кеш. Якщо
+        паралельний процес встиг першим, використовується його кеш.
+        """
+        path = self.path_for(model_name)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        temp_dir = Path(tempfile.mkdtemp(prefix=f".{path.name}-", dir=self.cache_dir))
+
+        try:
+            logger.info(f"Converting {model_name} into weights cache {path}")
+            self.write_files(model_name, temp_dir)
+
+            files = {
+                file.name: {"size": file.stat().st_size, "sha256": file_sha256(file)}
+                for file in sorted(temp_dir.iterdir())
+            }
+            manifest = {
+                "format": self.cache_format,
+                "source": model_name,
+                "created_at": datetime.now().isoformat(),
+                "files": files
+            }
+            (temp_dir / MANIFEST_FILE).write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+
+            try:
+                os.rename(temp_dir, path)
+            except OSError:
+                if not path.exists():
+                    raise
+                logger.info(f"Weights cache {path} was created by another process")
+        finally:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+        return path
+
+    def write_files(self, model_name: str, directory: Path):
+        """Файли кешу: ваги safetensors, конфігурації моделі і генерації, токенізатор"""
+        model = GPT2LMHeadModel.from_pretrained(model_name)
+        save_weights(model, directory / WEIGHTS_FILE)
+        model.config.save_pretrained(directory)
+        model.generation_config.save_pretrained(directory)
+        GPT2Tokenizer.from_pretrained(model_name).save_pretrained(directory)
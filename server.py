@@ -0,0 +1,290 @@
+"""
+Pre-fork сервер для CPU-хостів
+
+Майстер один раз завантажує ваги моделі, заморожує об'єкти Python
+(gc.freeze) і запускає воркери через fork: ваги спільні з майстром
+(copy-on-write), а з MODEL_MMAP - ще й з page cache. Кожен воркер -
+окремий процес з власними сервісами (create_app), власною кількістю
+потоків torch і власними ядрами. Воркери приймають з'єднання зі
+спільного сокета; майстер перезапускає воркери, що завершилися, і
+пише в лог пам'ять воркерів (RSS, спільна, приватна, PSS) кожні
+SERVER_MEMORY_REPORT_INTERVAL секунд і за сигналом SIGUSR1.
+
+Запуск: python server.py [--host HOST] [--port PORT] [--workers N] [--threads N]
+"""
+import argparse
+import gc
+import logging
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+from typing import Dict, List, Optional
+
+from werkzeug.serving import make_server
+
+from app import create_app
+from api.routes import SERVICES_KEY
+from config import Config
+from services.chat_service import load_chat_model
+from services.storage_service import StorageService
+from utils.memory import process_memory
+
+logger = logging.getLogger(__name__)
+
+# Очікування завершення воркерів при зупинці, секунд
+SHUTDOWN_TIMEOUT = 30.0
+# Інтервал перевірки воркерів майстром, секунд
+SUPERVISE_INTERVAL = 0.5
+
+
+def available_cpus() -> List[int]:
+    """Ядра, доступні процесу"""
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def worker_cpus(index: int, workers: int, cpus: List[int]) -> List[int]:
+    """Ядра воркера: неперетинні частини майже рівного розміру (воркерів більше, ніж ядер - по колу)"""
+    if workers >= len(cpus):
+        return [cpus[index % len(cpus)]]
+    return cpus[index * len(cpus) // workers:(index + 1) * len(cpus) // workers]
+
+
+def worker_config(config, index: int, workers: int):
+    """
+    Конфігурація воркера
+
+    Ваги вже завантажені майстром, тож воркер готує модель синхронно
+    до першого запиту. Кеш розмов окремий у кожному процесі, тому з
+    кількома воркерами він вимикається; обслуговування сховища за
+    розкладом (разом з архівацією) виконує лише воркер 0.
+    """
+    overrides = {"MODEL_PRELOAD": False}
+    if workers > 1:
+        overrides.update(STORAGE_CACHE_SIZE=0, STORAGE_WRITE_BACK=False)
+    if index > 0:
+        overrides.update(MAINTENANCE_INTERVAL=0)
+    return type(f"Worker{index}Config", (config,), overrides)
+
+
+class PreforkServer:
+    """Майстер pre-fork сервера: завантаження ваг, запуск і нагляд за воркерами"""
+
+    def __init__(
+        self,
+        config=Config,
+        host: Optional[str] = None,
+        port: Optional[int] = None,
+        workers: Optional[int] = None,
+        torch_threads: Optional[int] = None
+    ):
+        self.config = config
+        self.host = host or config.SERVER_HOST
+        self.port = config.SERVER_PORT if port is None else port
+        self.cpus = available_cpus()
+        self.workers = workers or config.SERVER_WORKERS or len(self.cpus)
+        self.torch_threads = torch_threads or config.SERVER_TORCH_THREADS
+
+        self.children: Dict[int, int] = {}  # pid -> номер воркера
+        self.socket: Optional[socket.socket] = None
+        self._stopping = False
+        self._report_requested = False
+
+    def run(self) -> int:
+        """Запуск сервера; повертається після зупинки (SIGTERM / SIGINT)"""
+        self.socket = socket.create_server((self.host, self.port), backlog=1024)
+        # Неблокуючий accept: з'єднання забирає один воркер, решта повертаються до select
+        self.socket.setblocking(False)
+        self.preload()
+
+        signal.signal(signal.SIGTERM, self._request_stop)
+        signal.signal(signal.SIGINT, self._request_stop)
+        signal.signal(signal.SIGUSR1, self._request_report)
+
+        logger.info(f"Serving on http://{self.host}:{self.socket.getsockname()[1]} with {self.workers} workers")
+        for index in range(self.workers):
+            self._spawn(index)
+
+        self._supervise()
+        return 0
+
+    def preload(self):
+        """
+        Підготовка в майстрі до fork
+
+        Завантажуються ваги і створюються схеми сховища та індексів (щоб
+        воркери не робили цього одночасно). Фонові потоки сховища
+        зупиняються до fork. gc.freeze переносить усі об'єкти в постійне
+        покоління: збирач сміття воркерів не записує в їхні заголовки,
+        тож сторінки майстра не копіюються.
+
+        З MODEL_BACKEND=onnx майстер лише експортує модель: пули потоків
+        onnxruntime не переживають fork, тож сесію відкриває кожен воркер
+        (ваги ONNX у кожного воркера власні).
+        """
+        import torch
+
+        if torch.cuda.is_available():
+            # Контекст CUDA не переживає fork
+            raise RuntimeError("Pre-fork serving is CPU-only, run app.py for GPU hosts")
+
+        started = time.perf_counter()
+        if self.config.MODEL_BACKEND == "onnx":
+            from models.onnx_model import OnnxCache
+
+            OnnxCache(self.config.MODEL_CACHE_DIR, verify=self.config.MODEL_CACHE_VERIFY).locate(self.config.MODEL_NAME)
+        else:
+            load_chat_model(self.config)
+        # generate() імпортує torch._dynamo (разом зі sympy, ~150 МБ) при першому виклику;
+        # імпорт у майстрі робить ці модулі спільними, а не копією в кожному воркері
+        import torch._dynamo  # noqa: F401
+        StorageService.from_config(worker_config(self.config, 0, self.workers)).close()
+
+        gc.collect()
+        gc.freeze()
+        logger.info(f"Master ready in {time.perf_counter() - started:.1f}s (frozen objects: {gc.get_freeze_count()})")
+
+    def memory_report(self) -> List[Dict]:
+        """Пам'ять майстра і воркерів (utils.memory.process_memory)"""
+        rows = [dict(process_memory(os.getpid()), name="master", pid=os.getpid())]
+        for pid, index in sorted(self.children.items(), key=lambda item: item[1]):
+            rows.append(dict(process_memory(pid), name=f"worker {index}", pid=pid))
+        return rows
+
+    def log_memory(self):
+        rows = self.memory_report()
+        for row in rows:
+            if "rss" not in row:
+                continue
+            logger.info(
+                f"{row['name']} (pid {row['pid']}): rss {row['rss']} MB, shared {row['shared']} MB, "
+                f"private {row['private']} MB, pss {row['pss']} MB"
+            )
+        logger.info(f"Total PSS: {sum(row.get('pss', 0) for row in rows):.1f} MB")
+
+    def _request_stop(self, signum, frame):
+        self._stopping = True
+
+    def _request_report(self, signum, frame):
+        self._report_requested = True
+
+    def _spawn(self, index: int):
+        pid = os.fork()
+        if pid == 0:
+            code = 1
+            try:
+                code = self._run_worker(index)
+            except BaseException:
+                logger.exception(f"Worker {index} failed")
+            finally:
+                # Без atexit і finally майстра: їх виконує лише майстер
+                os._exit(code)
+
+        self.children[pid] = index
+        logger.info(f"Started worker {index} (pid {pid})")
+
+    def _run_worker(self, index: int) -> int:
+        signal.signal(signal.SIGUSR1, signal.SIG_IGN)
+
+        cpus = worker_cpus(index, self.workers, self.cpus)
+        pinned = self.config.SERVER_PIN_CPUS and hasattr(os, "sched_setaffinity")
+        if pinned:
+            os.sched_setaffinity(0, cpus)
+
+        import torch
+
+        threads = self.torch_threads or (len(cpus) if pinned else max(1, len(self.cpus) // self.workers))
+        torch.set_num_threads(threads)
+
+        app = create_app(worker_config(self.config, index, self.workers))
+        services = app.extensions[SERVICES_KEY]
+        services.chat.load_model()
+        server = make_server(self.host, self.port, app, threaded=True, fd=self.socket.fileno())
+
+        def stop(signum, frame):
+            # shutdown чекає на вихід з serve_forever, тож викликається з іншого потоку
+            threading.Thread(target=server.shutdown, daemon=True).start()
+
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+        logger.info(f"Worker {index} ready: cpus {cpus if pinned else 'any'}, torch threads {threads}")
+
+        try:
+            server.serve_forever()
+        finally:
+            services.close()
+        return 0
+
+    def _supervise(self):
+        interval = self.config.SERVER_MEMORY_REPORT_INTERVAL
+        next_report = time.monotonic() + interval if interval > 0 else None
+
+        while not self._stopping:
+            self._reap()
+
+            running = set(self.children.values())
+            for index in range(self.workers):
+                if index not in running and not self._stopping:
+                    self._spawn(index)
+
+            if self._report_requested or (next_report is not None and time.monotonic() >= next_report):
+                self._report_requested = False
+                self.log_memory()
+                if next_report is not None:
+                    next_report = time.monotonic() + interval
+
+            time.sleep(SUPERVISE_INTERVAL)
+
+        self._shutdown()
+
+    def _reap(self):
+        """Прибирання завершених воркерів"""
+        while self.children:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+            if pid == 0:
+                return
+
+            index = self.children.pop(pid, None)
+            if index is not None and not self._stopping:
+                logger.warning(f"Worker {index} (pid {pid}) exited with code {os.waitstatus_to_exitcode(status)}, restarting")
+
+    def _shutdown(self):
+        logger.info("Stopping workers")
+        for pid in list(self.children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+        deadline = time.monotonic() + SHUTDOWN_TIMEOUT
+        while self.children and time.monotonic() < deadline:
+            self._reap()
+            time.sleep(0.1)
+
+        for pid in list(self.children):
+            logger.warning(f"Worker pid {pid} did not stop in {SHUTDOWN_TIMEOUT}s, killing")
+            os.kill(pid, signal.SIGKILL)
+            os.waitpid(pid, 0)
+            del self.children[pid]
+
+        self.socket.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pre-fork server sharing model weights across worker processes")
+    parser.add_argument("--host", default=Config.SERVER_HOST)
+    parser.add_argument("--port", type=int, default=Config.SERVER_PORT)
+    parser.add_argument("--workers", type=int, default=Config.SERVER_WORKERS, help="0 - one per CPU")
+    parser.add_argument("--threads", type=int, default=Config.SERVER_TORCH_THREADS, help="torch threads per worker")
+    args = parser.parse_args()
+
+    server = PreforkServer(Config, host=args.host, port=args.port, workers=args.workers, torch_threads=args.threads)
+    sys.exit(server.run())
+
+
+if __name__ == '__main__':
+    main()
@@ -1,4 +1,5 @@
 from .storage_service import StorageService
 from .chat_service import ChatService
+from .app_services import AppServices
 
-__all__ = ['StorageService', 'ChatService']
+__all__ = ['StorageService', 'ChatService', 'AppServices']
@@ -0,0 +1,41 @@
+import logging
+
+from services.storage_service import StorageService
+from services.chat_service import ChatService
+from services.maintenance import MaintenanceWorker
+
+logger = logging.getLogger(__name__)
+
+
+class AppServices:
+    """
+    Сервіси застосунку: сховище, чат і фонове обслуговування
+
+    Створюються фабрикою create_app, а не при імпорті модулів, тож
+    імпорт blueprint не відкриває сховище і не завантажує torch.
+    Модель завантажується у фоні (start), а ендпоінти сховища
+    працюють ще до її готовності. Зупинкою всіх сервісів володіє
+    лише close (create_app реєструє його в atexit).
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self.storage = StorageService.from_config(config)
+        self.chat = ChatService(self.storage, config)
+        self.maintenance = MaintenanceWorker.from_config(self.storage, config)
+        self._closed = False
+
+    def start(self):
+        """Запуск обслуговування сховища і (MODEL_PRELOAD) фонового завантаження моделі"""
+        self.maintenance.start()
+        if self.config.MODEL_PRELOAD:
+            self.chat.start_loading()
+
+    def close(self):
+        """Обслуговування зупиняється до закриття сховища; повторний виклик нічого не робить"""
+        if self._closed:
+            return
+        self._closed = True
+
+        self.maintenance.stop()
+        self.storage.close()
@@ -0,0 +1,5 @@
+from .base import StorageBackend
+from .file_backend import FileBackend
+from .sqlite_backend import SQLiteBackend
+
+__all__ = ['StorageBackend', 'FileBackend', 'SQLiteBackend']
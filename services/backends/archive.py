@@ -0,0 +1,242 @@
+import gzip
+import os
+import struct
+import threading
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+import logging
+
+from services.backends.durability import fsync_path
+
+try:
+    import zstandard
+except ImportError:  # zstd необов'язковий, gzip є завжди
+    zstandard = None
+
+try:
+    import fcntl
+except ImportError:  # Windows: пакет захищений від видалення лише в межах процесу
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Кодеки стиснення архівних записів (номер зберігається в заголовку запису)
+ARCHIVE_CODECS = {"gzip": 1, "zstd": 2}
+
+# Заголовок запису в пакеті: сигнатура, кодек, довжина id, довжина стиснених даних
+FRAME_MAGIC = b"GCA1"
+FRAME_HEADER = struct.Struct(">4sBHI")
+# Стиснений вміст: довжина журналу, далі журнал і файл токенів
+PAYLOAD_HEADER = struct.Struct(">I")
+
+
+def available_codec(codec: str) -> str:
+    """Кодек, яким реально можна стискати (zstd без модуля zstandard замінюється на gzip)"""
+    if codec not in ARCHIVE_CODECS:
+        raise ValueError(f"Unknown archive codec: {codec}")
+
+    if codec == "zstd" and zstandard is None:
+        logger.warning("zstandard is not installed, archiving with gzip")
+        return "gzip"
+
+    return codec
+
+
+def compress(codec: str, data: bytes) -> bytes:
+    if codec == "zstd":
+        return zstandard.ZstdCompressor(level=3).compress(data)
+    return gzip.compress(data, compresslevel=6, mtime=0)
+
+
+def decompress(codec: str, data: bytes) -> bytes:
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("zstandard is required to read zstd archives")
+        return zstandard.ZstdDecompressor().decompress(data)
+    return gzip.decompress(data)
+
+
+class ArchiveStore:
+    """
+    Холодне сховище розмов: стиснені записи, упаковані в файли-пакети
+
+    Кожен запис - журнал розмови разом з файлом токенів, стиснені
+    одним блоком. Записи лише дописуються в поточний пакет
+    (<archive_dir>/<дата>-<id>.pack), доки той не перевищить pack_bytes;
+    pack_bytes=0 - окремий файл на кожну розмову. Кожен процес пише
+    у власний пакет і тримає на ньому спільний flock, тож інший процес
+    не видалить пакет, у який ще пишуть (release).
+
+    Розташування записів (пакет, зсув, довжина) веде ConversationIndex.
+    Пакети самоописні (заголовок запису містить id розмови), тому
+    розташування можна відновити скануванням (scan).
+
+    Записи відновлених і видалених розмов лишаються в пакеті мертвими
+    байтами; живі записи розріджених пакетів (sparse_packs) переносяться
+    в поточний пакет без перестискання (move), після чого пакет
+    звільняється (release).
+    """
+
+    def __init__(self, archive_dir: Path, codec: str = "gzip", pack_bytes: int = 64 * 1024 * 1024):
+        self.archive_dir = Path(archive_dir)
+        self.codec = available_codec(codec)
+        self.pack_bytes = pack_bytes
+        self._pack: Optional[str] = None
+        self._pack_fd: Optional[int] = None
+        self._lock = threading.Lock()
+
+    @property
+    def current_pack(self) -> Optional[str]:
+        return self._pack
+
+    def write(self, conversation_id: str, log: bytes, tokens: bytes) -> Tuple[str, int, int, str]:
+        """
+        Стиснення та запис розмови; повертається після fsync пакета
+
+        Returns:
+            (пакет, зсув стиснених даних, їх довжина, кодек)
+        """
+        data = compress(self.codec, PAYLOAD_HEADER.pack(len(log)) + log + tokens)
+        return self._append(conversation_id, self.codec, data)
+
+    def move(self, conversation_id: str, location: Tuple[str, int, int, str]) -> Tuple[str, int, int, str]:
+        """Перенесення стисненого запису з іншого пакета в поточний; повертає нове розташування"""
+        pack, offset, length, codec = location
+        with open(self._pack_path(pack), 'rb') as f:
+            f.seek(offset)
+            data = f.read(length)
+
+        if len(data) != length:
+            raise OSError(f"Truncated archive record of {conversation_id} in {pack}")
+        return self._append(conversation_id, codec, data)
+
+    def sparse_packs(self, usage: Dict[str, Tuple[int, int]], min_live: float) -> List[str]:
+        """
+        Пакети, в яких живі записи займають менше min_live розміру файлу
+
+        usage - кількість живих записів і їх байтів у кожному пакеті
+        (ConversationIndex.pack_usage). Пакети без живих записів теж
+        повертаються; поточний пакет - ні. Найрозрідженіші першими.
+        """
+        candidates = []
+
+        for path in self.archive_dir.glob("*.pack"):
+            if path.name == self._pack:
+                continue
+            try:
+                size = path.stat().st_size
+            except FileNotFoundError:
+                continue
+
+            entries, live = usage.get(path.name, (0, 0))
+            live += entries * FRAME_HEADER.size
+            if size == 0 or live < size * min_live:
+                candidates.append((live / size if size else 0.0, path.name))
+
+        return [pack for _, pack in sorted(candidates)]
+
+    def _append(self, conversation_id: str, codec: str, data: bytes) -> Tuple[str, int, int, str]:
+        key = conversation_id.encode("utf-8")
+        frame = FRAME_HEADER.pack(FRAME_MAGIC, ARCHIVE_CODECS[codec], len(key), len(data)) + key
+
+        with self._lock:
+            created = self._pack is None or self._pack_path(self._pack).stat().st_size >= self.pack_bytes
+            if created:
+                self.archive_dir.mkdir(parents=True, exist_ok=True)
+                self._pack = f"{datetime.now():%Y%m%d}-{uuid.uuid4().hex[:12]}.pack"
+                self._hold_pack(self._pack_path(self._pack))
+
+            with open(self._pack_path(self._pack), 'ab') as f:
+                offset = f.tell() + len(frame)
+                f.write(frame + data)
+                # Гарячі файли видаляються після запису в архів, тож він має бути на диску
+                f.flush()
+                os.fsync(f.fileno())
+
+            if created:
+                fsync_path(self.archive_dir)
+
+            return self._pack, offset, len(data), codec
+
+    def read(self, pack: str, offset: int, length: int, codec: str) -> Tuple[bytes, bytes]:
+        """Журнал і файл токенів розмови з запису пакета"""
+        with open(self._pack_path(pack), 'rb') as f:
+            f.seek(offset)
+            data = decompress(codec, f.read(length))
+
+        (log_length,) = PAYLOAD_HEADER.unpack_from(data)
+        start = PAYLOAD_HEADER.size
+        return data[start:start + log_length], data[start + log_length:]
+
+    def release(self, pack: str):
+        """Видалення пакета без живих записів (крім поточних пакетів цього та інших процесів)"""
+        with self._lock:
+            if pack == self._pack:
+                return
+
+            path = self._pack_path(pack)
+            if fcntl is None:
+                path.unlink(missing_ok=True)
+            else:
+                try:
+                    fd = os.open(path, os.O_RDONLY)
+                except FileNotFoundError:
+                    return
+                try:
+                    fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    # Поточний пакет іншого процесу
+                    return
+                else:
+                    path.unlink(missing_ok=True)
+                finally:
+                    os.close(fd)
+            logger.info(f"Removed empty archive pack: {pack}")
+
+    def close(self):
+        with self._lock:
+            self._hold_pack(None)
+
+    def scan(self) -> Iterator[Tuple[str, str, int, int, str]]:
+        """
+        Усі записи всіх пакетів у порядку запису: (id, пакет, зсув, довжина, кодек)
+
+        Пізніший запис тієї ж розмови заміщує попередній.
+        """
+        codecs = {number: name for name, number in ARCHIVE_CODECS.items()}
+        packs = sorted(self.archive_dir.glob("*.pack"), key=lambda path: (path.stat().st_mtime, path.name))
+
+        for path in packs:
+            with open(path, 'rb') as f:
+                while True:
+                    header = f.read(FRAME_HEADER.size)
+                    if len(header) < FRAME_HEADER.size:
+                        break
+
+                    magic, codec, key_length, length = FRAME_HEADER.unpack(header)
+                    if magic != FRAME_MAGIC or codec not in codecs:
+                        logger.warning(f"Corrupted archive pack {path.name}, stopped at {f.tell()}")
+                        break
+
+                    conversation_id = f.read(key_length).decode("utf-8")
+                    offset = f.tell()
+                    if f.seek(length, os.SEEK_CUR) > path.stat().st_size:
+                        # Недописаний останній запис (збій під час архівації)
+                        break
+
+                    yield conversation_id, path.name, offset, length, codecs[codec]
+
+    def _hold_pack(self, path: Optional[Path]):
+        """Спільний flock на поточний пакет замість попереднього"""
+        if self._pack_fd is not None:
+            os.close(self._pack_fd)
+            self._pack_fd = None
+
+        if path is not None and fcntl is not None:
+            self._pack_fd = os.open(path, os.O_RDONLY | os.O_CREAT, 0o644)
+            fcntl.flock(self._pack_fd, fcntl.LOCK_SH)
+
+    def _pack_path(self, pack: str) -> Path:
+        return self.archive_dir / pack
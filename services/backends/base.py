@@ -0,0 +1,427 @@
+import base64
+import json
+import sys
+import uuid
+from abc import ABC, abstractmethod
+from array import array
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+# Токени зберігаються як uint16 little-endian (словник GPT-2 < 65536)
+TOKEN_TYPECODE = "H"
+TOKEN_MAX_ID = 0xFFFF
+
+# Поля, за якими можна сортувати список розмов
+SORT_FIELDS = ("updated_at", "created_at", "message_count")
+TITLE_MAX_LENGTH = 80
+
+
+def token_ids_fit(token_ids: List[int]) -> bool:
+    """Чи вміщуються всі id у формат зберігання"""
+    return not any(token < 0 or token > TOKEN_MAX_ID for token in token_ids)
+
+
+def encode_token_ids(token_ids: List[int]) -> Optional[bytes]:
+    """Пакування токенів у uint16 little-endian; None, якщо id не вміщується"""
+    if not token_ids_fit(token_ids):
+        return None
+
+    tokens = array(TOKEN_TYPECODE, token_ids)
+    if sys.byteorder == "big":
+        tokens.byteswap()
+    return tokens.tobytes()
+
+
+def decode_token_ids(data: bytes) -> List[int]:
+    """Розпакування токенів з uint16 little-endian"""
+    tokens = array(TOKEN_TYPECODE)
+    tokens.frombytes(data)
+    if sys.byteorder == "big":
+        tokens.byteswap()
+    return tokens.tolist()
+
+
+def is_conversation_id(value) -> bool:
+    """Чи є значення канонічним UUID (лише такі id стають частиною шляхів до файлів)"""
+    try:
+        return isinstance(value, str) and str(uuid.UUID(value)) == value
+    except ValueError:
+        return False
+
+
+# Звірка індексів зі сховищем іде діапазонами id: діапазон i - UUID з
+# префіксом ID_RANGE_PREFIXES[i]; крок обмежувача - на кожні ID_SCAN_BATCH
+# прочитаних id (діапазон рахується щонайменше за один)
+ID_RANGE_PREFIXES = tuple(f"{i:02x}" for i in range(256))
+ID_SCAN_BATCH = 1000
+
+
+def id_range(index: int) -> Tuple[str, Optional[str]]:
+    """
+    Межі [start, end) діапазону index (end=None - без верхньої межі)
+
+    Крайні діапазони відкриті, тож разом вони покривають будь-які
+    рядки, зокрема записи індексу з id, що не є UUID.
+    """
+    start = ID_RANGE_PREFIXES[index] if index > 0 else ""
+    end = ID_RANGE_PREFIXES[index + 1] if index + 1 < len(ID_RANGE_PREFIXES) else None
+    return start, end
+
+
+def repair_id_ranges(
+    start: int,
+    repair_range: Callable[[int, int], Tuple[int, bool, int]],
+    limit: int,
+    throttle: Optional[Callable[[], bool]]
+) -> Tuple[int, int]:
+    """
+    Звірка індексу по діапазонах id, починаючи з діапазону start
+
+    repair_range(діапазон, ліміт) повертає (виправлено, чи звірено
+    весь діапазон, скільки id прочитано). Прохід зупиняється після
+    limit виправлень, відмови throttle або повного кола діапазонів.
+
+    Returns:
+        (кількість виправлень, діапазон, з якого почати наступний прохід)
+    """
+    repaired = 0
+    scanned = 0
+
+    for _ in ID_RANGE_PREFIXES:
+        if repaired >= limit:
+            break
+        if scanned >= ID_SCAN_BATCH:
+            if throttle is not None and not throttle():
+                break
+            scanned = 0
+
+        fixed, done, read = repair_range(start, limit - repaired)
+        repaired += fixed
+        scanned += max(read, 1)
+        if not done:
+            break
+        start = (start + 1) % len(ID_RANGE_PREFIXES)
+
+    return repaired, start
+
+
+def prefix_range(prefix: str) -> Tuple[str, Optional[str]]:
+    """Межі [start, end) рядків, що починаються з prefix"""
+    if not prefix:
+        return "", None
+    return prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+def make_title(content: str) -> str:
+    """Заголовок розмови з першого повідомлення користувача"""
+    title = " ".join(content.split())
+    if len(title) > TITLE_MAX_LENGTH:
+        title = title[:TITLE_MAX_LENGTH - 1].rstrip() + "…"
+    return title
+
+
+def summarize_conversation(conversation: Dict) -> Dict:
+    """Запис індексу розмов: id, час створення/оновлення, кількість повідомлень, заголовок"""
+    messages = conversation["messages"]
+    first_user = next((msg for msg in messages if msg["role"] == "user"), None)
+    return {
+        "conversation_id": conversation["conversation_id"],
+        "created_at": conversation["created_at"],
+        "updated_at": conversation["updated_at"],
+        "message_count": len(messages),
+        "title": make_title(first_user["content"]) if first_user else ""
+    }
+
+
+def encode_cursor(sort: str, value, conversation_id: str) -> str:
+    """Непрозорий курсор сторінки: поле сортування та ключ останнього запису"""
+    payload = json.dumps([sort, value, conversation_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: str, sort: str) -> Tuple:
+    """Розбір курсора; ValueError, якщо він пошкоджений або для іншого сортування"""
+    try:
+        cursor_sort, value, conversation_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+    if cursor_sort != sort:
+        raise ValueError("Cursor does not match sort order")
+
+    return value, conversation_id
+
+
+def encode_message_cursor(key, timestamp: str) -> str:
+    """
+    Курсор сторінки повідомлень: ключ повідомлення в бекенді і його час
+
+    Ключ залежить від бекенду (позиція, зсув у журналі, id рядка);
+    час дозволяє перевірити, що ключ досі вказує на те саме повідомлення.
+    """
+    return encode_cursor("message", key, timestamp)
+
+
+def decode_message_cursor(cursor: str) -> Tuple:
+    """(ключ, час) з курсора повідомлення; ValueError, якщо він пошкоджений"""
+    return decode_cursor(cursor, "message")
+
+
+class StorageBackend(ABC):
+    """
+    Інтерфейс сховища розмов для StorageService
+
+    Розмова передається і повертається у форматі:
+    {"conversation_id", "created_at", "updated_at", "messages": [...],
+     "metadata": {"total_messages", "model_config"}}
+
+    Ключ "tokens" у повідомленні - непрозоре посилання бекенду на
+    збережені токени; його розуміє лише get_token_ids того ж бекенду.
+    """
+
+    @abstractmethod
+    def create(self, conversation: Dict):
+        """Збереження нової розмови"""
+
+    @abstractmethod
+    def append_message(
+        self,
+        conversation_id: str,
+        message: Dict,
+        model_config: Optional[Dict] = None,
+        token_ids: Optional[List[int]] = None
+    ):
+        """Додавання повідомлення; ValueError, якщо розмови немає"""
+
+    @abstractmethod
+    def load(self, conversation_id: str) -> Optional[Dict]:
+        """Завантаження розмови або None"""
+
+    def exists(self, conversation_id: str) -> bool:
+        """Чи існує розмова"""
+        return self.load(conversation_id) is not None
+
+    def get_messages(self, conversation_id: str, limit: Optional[int] = None) -> List[Dict]:
+        """
+        Повідомлення розмови (останні limit, якщо задано)
+
+        Бекенди перевизначають цей метод, щоб читати лише хвіст розмови.
+        """
+        conversation = self.load(conversation_id)
+
+        if conversation is None:
+            return []
+
+        messages = conversation["messages"]
+
+        if limit:
+            return messages[-limit:]
+
+        return messages
+
+    def get_message_page(
+        self,
+        conversation_id: str,
+        limit: int,
+        before: Optional[str] = None,
+        after: Optional[str] = None
+    ) -> Tuple[List[Dict], Optional[str], Optional[str]]:
+        """
+        Сторінка повідомлень: останні limit, limit перед курсором before
+        або limit після курсора after
+
+        Returns:
+            (повідомлення в хронологічному порядку, курсор старіших
+             повідомлень або None, курсор новіших повідомлень або None)
+
+        Реалізація за замовчуванням завантажує всю розмову, ключ курсора -
+        позиція повідомлення; бекенди перевизначають її читанням лише сторінки.
+        """
+        conversation = self.load(conversation_id)
+
+        if conversation is None:
+            return [], None, None
+
+        messages = conversation["messages"]
+
+        def locate(cursor: str) -> int:
+            position, timestamp = decode_message_cursor(cursor)
+            if isinstance(position, int) and 0 <= position < len(messages) \
+                    and messages[position]["timestamp"] == timestamp:
+                return position
+            for index, msg in enumerate(messages):
+                if msg["timestamp"] == timestamp:
+                    return index
+            raise ValueError("Cursor does not match any message")
+
+        if after is not None:
+            start = locate(after) + 1
+            end = min(start + limit, len(messages))
+        else:
+            end = locate(before) if before is not None else len(messages)
+            start = max(end - limit, 0)
+
+        page = messages[start:end]
+        if not page:
+            return [], None, None
+
+        return (
+            page,
+            encode_message_cursor(start, page[0]["timestamp"]) if start > 0 else None,
+            encode_message_cursor(end - 1, page[-1]["timestamp"]) if end < len(messages) else None
+        )
+
+    @abstractmethod
+    def get_token_ids(self, conversation_id: str, messages: List[Dict]) -> List[Optional[List[int]]]:
+        """Збережені токени повідомлень (None для повідомлень без токенів)"""
+
+    @abstractmethod
+    def list_ids(self, prefix: str = "") -> List[str]:
+        """Ідентифікатори всіх розмов (або лише тих, що починаються з prefix)"""
+
+    def iter_conversations(self, ids: Optional[Iterable[str]] = None) -> Iterator[Dict]:
+        """
+        Усі розмови (або розмови з ids) по одній - для перебудови індексів і експорту
+
+        У пам'яті одночасно лише одна розмова.
+        """
+        for conversation_id in (self.list_ids() if ids is None else ids):
+            conversation = self.load(conversation_id)
+            if conversation is not None:
+                yield conversation
+
+    def page_conversations(
+        self,
+        limit: int,
+        cursor: Optional[str] = None,
+        sort: str = "updated_at",
+        descending: bool = True
+    ) -> Tuple[List[Dict], Optional[str]]:
+        """
+        Сторінка записів індексу розмов (див. summarize_conversation)
+
+        Returns:
+            (записи, курсор наступної сторінки або None)
+
+        Реалізація за замовчуванням завантажує всі розмови; бекенди
+        перевизначають її запитом до індексу.
+        """
+        summaries = []
+        for conversation_id in self.list_ids():
+            conversation = self.load(conversation_id)
+            if conversation is not None:
+                summaries.append(summarize_conversation(conversation))
+
+        key = lambda item: (item[sort], item["conversation_id"])
+        summaries.sort(key=key, reverse=descending)
+
+        if cursor is not None:
+            after = decode_cursor(cursor, sort)
+            summaries = [
+                item for item in summaries
+                if (key(item) < tuple(after) if descending else key(item) > tuple(after))
+            ]
+
+        page = summaries[:limit]
+        next_cursor = None
+        if len(summaries) > limit:
+            last = page[-1]
+            next_cursor = encode_cursor(sort, last[sort], last["conversation_id"])
+        return page, next_cursor
+
+    def import_conversations(self, conversations: List[Dict]) -> List[str]:
+        """
+        Збереження пакета готових розмов (імпорт); розмови з наявними id пропускаються
+
+        Returns:
+            id збережених розмов
+
+        Реалізація за замовчуванням записує повідомлення по одному;
+        бекенди перевизначають її пакетним записом.
+        """
+        imported = []
+        for conversation in conversations:
+            conversation_id = conversation["conversation_id"]
+            if self.exists(conversation_id):
+                continue
+
+            self.create(dict(conversation, messages=[]))
+            for message in conversation["messages"]:
+                self.append_message(conversation_id, dict(message))
+            imported.append(conversation_id)
+
+        return imported
+
+    @abstractmethod
+    def delete(self, conversation_id: str) -> bool:
+        """Видалення розмови"""
+
+    def compact(self, conversation_id: str) -> bool:
+        """Ущільнення збереженої розмови (якщо бекенд це підтримує)"""
+        return self.load(conversation_id) is not None
+
+    def archive_idle(
+        self,
+        before: str,
+        limit: int = 1000,
+        throttle: Optional[Callable[[], bool]] = None
+    ) -> int:
+        """
+        Перенесення розмов, не оновлених з before (ISO-час), у холодне сховище
+
+        throttle викликається перед кожною розмовою; False - зупинити.
+        Бекенди без холодного сховища нічого не переносять.
+        """
+        return 0
+
+    def compaction_candidates(self, limit: int = 1000) -> List[str]:
+        """Розмови, яким потрібне ущільнення (для фонового обслуговування)"""
+        return []
+
+    def compact_archive(self, limit: int = 1000, throttle: Optional[Callable[[], bool]] = None) -> int:
+        """
+        Ущільнення холодного сховища: перенесення до limit живих записів із розріджених пакетів
+
+        throttle викликається перед кожним записом; False - зупинити.
+        Бекенди без холодного сховища нічого не роблять.
+        """
+        return 0
+
+    def repair_index(
+        self,
+        before: str,
+        limit: int = 1000,
+        throttle: Optional[Callable[[], bool]] = None
+    ) -> int:
+        """
+        Звірка індексу розмов зі збереженими розмовами
+
+        Розмови, оновлені після before (ISO-час), пропускаються - їх запис
+        саме може оновлюватися. throttle викликається перед кожним
+        виправленням; False - зупинити. Бекенди, де індексом є саме
+        сховище, нічого не виправляють.
+
+        Returns:
+            Кількість виправлених записів
+        """
+        return 0
+
+    def optimize(self):
+        """Обслуговування файлів сховища після серії змін (якщо бекенд це підтримує)"""
+
+    def get_stats(self) -> Dict:
+        """Лічильники бекенду"""
+        return {}
+
+    def store_lock_path(self) -> Optional[Path]:
+        """Файл блокування сховища між процесами (None - без блокування)"""
+        return None
+
+    @contextmanager
+    def deferred_sync(self) -> Iterator[None]:
+        """Серія записів, довговічність яких гарантується наприкінці блоку"""
+        yield
+
+    def close(self):
+        """Звільнення ресурсів бекенду"""
@@ -0,0 +1,292 @@
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+import logging
+
+from services.backends.base import SORT_FIELDS, encode_cursor, decode_cursor, make_title
+from services.backends.sqlite_common import connect, range_query, ThreadConnections, Transaction
+
+logger = logging.getLogger(__name__)
+
+INDEX_SCHEMA = """
+CREATE TABLE IF NOT EXISTS conversation_index (
+    id TEXT PRIMARY KEY,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL,
+    message_count INTEGER NOT NULL DEFAULT 0,
+    title TEXT NOT NULL DEFAULT ''
+);
+CREATE INDEX IF NOT EXISTS idx_index_updated_at ON conversation_index (updated_at, id);
+CREATE INDEX IF NOT EXISTS idx_index_created_at ON conversation_index (created_at, id);
+CREATE INDEX IF NOT EXISTS idx_index_message_count ON conversation_index (message_count, id);
+CREATE TABLE IF NOT EXISTS archive_entries (
+    id TEXT PRIMARY KEY,
+    pack TEXT NOT NULL,
+    pack_offset INTEGER NOT NULL,
+    pack_length INTEGER NOT NULL,
+    codec TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_archive_pack ON archive_entries (pack);
+CREATE TABLE IF NOT EXISTS restored_entries (
+    id TEXT PRIMARY KEY,
+    restored_at TEXT NOT NULL
+);
+"""
+
+UPSERT_ENTRY = (
+    "INSERT OR REPLACE INTO conversation_index (id, created_at, updated_at, message_count, title) "
+    "VALUES (?, ?, ?, ?, ?)"
+)
+RECORD_MESSAGE = (
+    "UPDATE conversation_index SET updated_at = ?, message_count = message_count + 1, "
+    "title = CASE WHEN title = '' AND ? = 'user' THEN ? ELSE title END WHERE id = ?"
+)
+DELETE_ENTRY = "DELETE FROM conversation_index WHERE id = ?"
+DELETE_RESTORED = "DELETE FROM restored_entries WHERE id = ?"
+DELETE_ALL = "DELETE FROM conversation_index"
+SELECT_PAGE = "SELECT id, created_at, updated_at, message_count, title FROM conversation_index"
+SELECT_IDS = "SELECT id FROM conversation_index"
+SELECT_IDLE = (
+    "SELECT id FROM conversation_index WHERE updated_at < ? "
+    "AND id NOT IN (SELECT id FROM archive_entries) "
+    "AND id NOT IN (SELECT id FROM restored_entries WHERE restored_at >= ?) "
+    "ORDER BY updated_at, id LIMIT ?"
+)
+UPSERT_RESTORED = "INSERT OR REPLACE INTO restored_entries (id, restored_at) VALUES (?, ?)"
+PRUNE_RESTORED = "DELETE FROM restored_entries WHERE restored_at < ?"
+UPSERT_ARCHIVED = (
+    "INSERT OR REPLACE INTO archive_entries (id, pack, pack_offset, pack_length, codec) "
+    "VALUES (?, ?, ?, ?, ?)"
+)
+SELECT_ARCHIVED = "SELECT pack, pack_offset, pack_length, codec FROM archive_entries WHERE id = ?"
+SELECT_ARCHIVED_IDS = "SELECT id FROM archive_entries"
+DELETE_ARCHIVED = "DELETE FROM archive_entries WHERE id = ?"
+DELETE_ALL_ARCHIVED = "DELETE FROM archive_entries"
+COUNT_PACK_ENTRIES = "SELECT COUNT(*) FROM archive_entries WHERE pack = ?"
+SELECT_PACK_IDS = "SELECT id FROM archive_entries WHERE pack = ? ORDER BY pack_offset"
+# Живі байти пакета: стиснені дані та id розмови в заголовку кожного запису
+SELECT_PACK_USAGE = "SELECT pack, COUNT(*), SUM(pack_length + LENGTH(CAST(id AS BLOB))) FROM archive_entries GROUP BY pack"
+ARCHIVE_STATS = "SELECT COUNT(*), COUNT(DISTINCT pack), COALESCE(SUM(pack_length), 0) FROM archive_entries"
+TABLE_EXISTS = "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'conversation_index'"
+
+
+def build_page_query(
+    select: str,
+    sort_column: str,
+    descending: bool,
+    after: Optional[Tuple],
+    limit: int
+) -> Tuple[str, tuple]:
+    """
+    Запит сторінки з keyset-пагінацією по (sort_column, id)
+
+    Замість OFFSET наступна сторінка починається після ключа останнього
+    запису, тож вартість не залежить від номера сторінки.
+    """
+    direction = "DESC" if descending else "ASC"
+    params: tuple = ()
+    where = ""
+
+    if after is not None:
+        where = f" WHERE ({sort_column}, id) {'<' if descending else '>'} (?, ?)"
+        params = tuple(after)
+
+    sql = f"{select}{where} ORDER BY {sort_column} {direction}, id {direction} LIMIT ?"
+    return sql, params + (limit,)
+
+
+def page_rows(rows: List[Tuple], sort: str, limit: int) -> Tuple[List[Dict], Optional[str]]:
+    """Записи сторінки з рядків (id, created_at, updated_at, message_count, title) і курсор наступної"""
+    items = [
+        {
+            "conversation_id": row[0],
+            "created_at": row[1],
+            "updated_at": row[2],
+            "message_count": row[3],
+            "title": row[4]
+        }
+        for row in rows[:limit]
+    ]
+
+    next_cursor = None
+    if len(rows) > limit:
+        last = items[-1]
+        next_cursor = encode_cursor(sort, last[sort], last["conversation_id"])
+
+    return items, next_cursor
+
+
+class ConversationIndex:
+    """
+    Індекс метаданих розмов файлового бекенду (SQLite)
+
+    Оновлюється при кожному записі, тож список розмов з сортуванням
+    і пагінацією не потребує читання файлів розмов.
+    """
+
+    def __init__(self, db_path: Path, busy_timeout_ms: int = 5000):
+        self.db_path = Path(db_path)
+        self.busy_timeout_ms = busy_timeout_ms
+        self._connections = ThreadConnections(lambda: connect(self.db_path, self.busy_timeout_ms))
+
+        conn = self._connection()
+        # Новий індекс треба заповнити з уже наявних файлів розмов
+        self.created = conn.execute(TABLE_EXISTS).fetchone() is None
+        conn.executescript(INDEX_SCHEMA)
+
+    def add(self, summary: Dict):
+        """Додавання або заміна запису розмови"""
+        self._connection().execute(UPSERT_ENTRY, self._row(summary))
+
+    def add_many(self, summaries: Iterable[Dict]):
+        """Додавання записів одною транзакцією"""
+        conn = self._connection()
+        with Transaction(conn):
+            conn.executemany(UPSERT_ENTRY, (self._row(summary) for summary in summaries))
+
+    def record_message(self, conversation_id: str, message: Dict):
+        """Оновлення запису після додавання повідомлення"""
+        self._connection().execute(RECORD_MESSAGE, (
+            message["timestamp"],
+            message["role"],
+            make_title(message["content"]),
+            conversation_id
+        ))
+
+    def remove(self, conversation_id: str):
+        conn = self._connection()
+        with Transaction(conn):
+            conn.execute(DELETE_ENTRY, (conversation_id,))
+            conn.execute(DELETE_RESTORED, (conversation_id,))
+
+    def rebuild(self, summaries: Iterable[Dict]) -> int:
+        """Повна перебудова індексу однією транзакцією"""
+        conn = self._connection()
+        count = 0
+
+        with Transaction(conn):
+            conn.execute(DELETE_ALL)
+            for summary in summaries:
+                conn.execute(UPSERT_ENTRY, self._row(summary))
+                count += 1
+
+        return count
+
+    def page(
+        self,
+        limit: int,
+        cursor: Optional[str] = None,
+        sort: str = "updated_at",
+        descending: bool = True
+    ) -> Tuple[List[Dict], Optional[str]]:
+        if sort not in SORT_FIELDS:
+            raise ValueError(f"Unknown sort field: {sort}")
+
+        after = decode_cursor(cursor, sort) if cursor is not None else None
+        sql, params = build_page_query(SELECT_PAGE, sort, descending, after, limit + 1)
+        rows = self._connection().execute(sql, params).fetchall()
+        return page_rows(rows, sort, limit)
+
+    def ids(self, start: str = "", end: Optional[str] = None) -> List[str]:
+        """id записів індексу (або лише з діапазону [start, end))"""
+        return [row[0] for row in self._connection().execute(*range_query(SELECT_IDS, "id", start, end))]
+
+    def idle_ids(self, before: str, limit: int) -> List[str]:
+        """
+        Найдавніше оновлені неархівовані розмови з updated_at < before
+
+        Розмови, відновлені з архіву після before, пропускаються: читання
+        не змінює updated_at, і без цього щойно відкрита розмова
+        архівувалася б знову на наступному проході.
+        """
+        conn = self._connection()
+        conn.execute(PRUNE_RESTORED, (before,))
+        rows = conn.execute(SELECT_IDLE, (before, before, limit)).fetchall()
+        return [row[0] for row in rows]
+
+    def set_archived(self, conversation_id: str, location: Tuple[str, int, int, str]):
+        """
+        Розташування архівного запису розмови: (пакет, зсув, довжина, кодек)
+
+        Після цього гарячі файли розмови видаляються, тож запис
+        фіксується з synchronous=FULL (fsync WAL), а не лише в кеші ОС.
+        """
+        conn = self._connection()
+        conn.execute("PRAGMA synchronous=FULL")
+        try:
+            conn.execute(UPSERT_ARCHIVED, (conversation_id,) + tuple(location))
+        finally:
+            conn.execute("PRAGMA synchronous=NORMAL")
+
+    def archived(self, conversation_id: str) -> Optional[Tuple[str, int, int, str]]:
+        row = self._connection().execute(SELECT_ARCHIVED, (conversation_id,)).fetchone()
+        return tuple(row) if row is not None else None
+
+    def archived_ids(self, start: str = "", end: Optional[str] = None) -> List[str]:
+        return [row[0] for row in self._connection().execute(*range_query(SELECT_ARCHIVED_IDS, "id", start, end))]
+
+    def remove_archived(self, conversation_id: str, restored_at: Optional[str] = None) -> Optional[str]:
+        """
+        Вилучення архівного запису; повертає пакет, якщо в ньому не лишилося записів
+
+        restored_at - час повернення розмови у гарячі файли (для idle_ids).
+        """
+        conn = self._connection()
+
+        with Transaction(conn):
+            row = conn.execute(SELECT_ARCHIVED, (conversation_id,)).fetchone()
+            if row is None:
+                return None
+            conn.execute(DELETE_ARCHIVED, (conversation_id,))
+            if restored_at is not None:
+                conn.execute(UPSERT_RESTORED, (conversation_id, restored_at))
+            remaining = conn.execute(COUNT_PACK_ENTRIES, (row[0],)).fetchone()[0]
+
+        return row[0] if remaining == 0 else None
+
+    def pack_ids(self, pack: str) -> List[str]:
+        """Розмови, чиї архівні записи лежать у пакеті (у порядку запису)"""
+        return [row[0] for row in self._connection().execute(SELECT_PACK_IDS, (pack,))]
+
+    def pack_entries(self, pack: str) -> int:
+        return self._connection().execute(COUNT_PACK_ENTRIES, (pack,)).fetchone()[0]
+
+    def pack_usage(self) -> Dict[str, Tuple[int, int]]:
+        """Кількість живих записів і їх байтів (без заголовків) у кожному пакеті"""
+        return {pack: (entries, size) for pack, entries, size in self._connection().execute(SELECT_PACK_USAGE)}
+
+    def rebuild_archived(self, entries: Iterable[Tuple[str, str, int, int, str]]) -> int:
+        """Заміна всіх архівних розташувань (id, пакет, зсув, довжина, кодек)"""
+        conn = self._connection()
+        ids = set()
+
+        with Transaction(conn):
+            conn.execute(DELETE_ALL_ARCHIVED)
+            for entry in entries:
+                conn.execute(UPSERT_ARCHIVED, entry)
+                ids.add(entry[0])
+
+        return len(ids)
+
+    def archive_stats(self) -> Dict[str, int]:
+        conversations, packs, compressed = self._connection().execute(ARCHIVE_STATS).fetchone()
+        return {
+            "archived_conversations": conversations,
+            "archive_packs": packs,
+            "archive_bytes": compressed
+        }
+
+    def close(self):
+        self._connections.close()
+
+    def _row(self, summary: Dict) -> Tuple:
+        return (
+            summary["conversation_id"],
+            summary["created_at"],
+            summary["updated_at"],
+            summary["message_count"],
+            summary["title"]
+        )
+
+    def _connection(self):
+        """З'єднання поточного потоку"""
+        return self._connections.get()
@@ -0,0 +1,150 @@
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Iterable, Optional, Set
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Режими довговічності записів
+DURABILITY_MODES = ("none", "write", "group")
+
+
+def fsync_path(path: Path):
+    """fsync файлу або каталогу за шляхом"""
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class _Batch:
+    """Група записів, що чекають на спільний fsync"""
+
+    __slots__ = ("paths", "writes", "started", "done", "error")
+
+    def __init__(self):
+        self.paths: Set[Path] = set()
+        self.writes = 0
+        self.started = 0.0
+        self.done = threading.Event()
+        self.error: Optional[Exception] = None
+
+    def wait(self):
+        self.done.wait()
+        if self.error is not None:
+            raise OSError(f"Group commit failed: {self.error}") from self.error
+
+
+class GroupCommitter:
+    """
+    Груповий commit: один fsync на файл для багатьох паралельних записів
+
+    Записувач додає змінені файли в поточну групу і чекає на неї.
+    Фоновий потік закриває групу, щойно в ній max_writes записів або
+    минуло interval_ms від першого запису, синхронізує її і будить усіх
+    записувачів групи. Поки триває синхронізація, нові записи
+    накопичуються в наступній групі.
+
+    Група синхронізується fsync кожного файлу один раз, а потім fsync
+    їхніх каталогів: новий файл (журнал, файл токенів) довговічний лише
+    разом із записом про нього в каталозі.
+    """
+
+    def __init__(self, interval_ms: float = 5.0, max_writes: int = 64):
+        self.interval = interval_ms / 1000
+        self.max_writes = max_writes
+        self._batch = _Batch()
+        self._cond = threading.Condition()
+        self._running = False
+        self._thread: Optional[threading.Thread] = None
+
+        self.stats = {
+            "commits": 0,
+            "writes": 0,
+            "fsyncs": 0
+        }
+
+    def start(self) -> 'GroupCommitter':
+        with self._cond:
+            if self._running:
+                return self
+            self._running = True
+
+        self._thread = threading.Thread(target=self._loop, name="group-commit", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Зупинка потоку; записи, що вже в групі, синхронізуються"""
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def submit(self, paths: Iterable[Path]) -> _Batch:
+        """Додавання змінених файлів у поточну групу без очікування"""
+        with self._cond:
+            if not self._running:
+                raise RuntimeError("Group committer is not running")
+
+            batch = self._batch
+            batch.paths.update(paths)
+            batch.writes += 1
+            if batch.writes == 1:
+                batch.started = time.monotonic()
+                self._cond.notify_all()
+            elif batch.writes >= self.max_writes:
+                self._cond.notify_all()
+
+            return batch
+
+    def commit(self, paths: Iterable[Path]):
+        """Додавання файлів у групу та очікування її fsync"""
+        self.submit(paths).wait()
+
+    def _loop(self):
+        while True:
+            with self._cond:
+                while self._running and self._batch.writes == 0:
+                    self._cond.wait()
+
+                if self._batch.writes == 0:
+                    return
+
+                deadline = self._batch.started + self.interval
+                while self._running and self._batch.writes < self.max_writes:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+
+                batch = self._batch
+                self._batch = _Batch()
+
+            self._sync(batch)
+
+    def _sync(self, batch: _Batch):
+        syncs = 0
+        directories = {path.parent for path in batch.paths}
+        try:
+            for path in sorted(batch.paths - directories) + sorted(directories):
+                try:
+                    fsync_path(path)
+                except FileNotFoundError:
+                    # Файл видалено разом з розмовою - синхронізувати нічого
+                    continue
+                syncs += 1
+        except Exception as e:
+            logger.error(f"Group commit failed: {e}")
+            batch.error = e
+
+        self.stats["commits"] += 1
+        self.stats["writes"] += batch.writes
+        self.stats["fsyncs"] += syncs
+        batch.done.set()
@@ -0,0 +1,1056 @@
+import os
+import tempfile
+import threading
+from array import array
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+import logging
+
+from services.backends.base import (
+    StorageBackend,
+    TOKEN_TYPECODE,
+    ID_RANGE_PREFIXES,
+    id_range,
+    is_conversation_id,
+    prefix_range,
+    repair_id_ranges,
+    encode_token_ids,
+    decode_token_ids,
+    encode_message_cursor,
+    decode_message_cursor,
+    summarize_conversation
+)
+from services.backends.archive import ArchiveStore
+from services.backends.conversation_index import ConversationIndex
+from services.backends.durability import DURABILITY_MODES, GroupCommitter, fsync_path
+from services.backends.locks import ConversationLocks
+from services.backends.serializers import JSONSerializer, get_serializer
+
+logger = logging.getLogger(__name__)
+
+
+class FileBackend(StorageBackend):
+    """
+    Файлове сховище: журнал JSON Lines на кожну розмову
+
+    У журнал (<id>.jsonl) лише дописуються записи, тому вартість
+    додавання повідомлення не залежить від довжини розмови:
+    - {"type": "header", ...} - перший рядок: id, created_at, metadata
+    - {"type": "message", ...} - повідомлення
+    - {"type": "meta", ...} - оновлення model_config
+
+    Записи "meta" періодично згортаються в заголовок (компакція).
+    Записи кодує serializer (компактний JSON; orjson, якщо встановлено).
+    Останні N повідомлень читаються з кінця журналу блоками, тому
+    get_messages(limit=N) не залежить від довжини розмови.
+    Розмови у старому форматі (<id>.json) читаються і переводяться
+    в журнал при першому записі. Токени повідомлень дописуються
+    у <id>.tokens, посилання в повідомленні - [зсув, довжина].
+
+    Метадані всіх розмов (для списку з сортуванням і пагінацією)
+    ведуться в індексі index.db, який оновлюється при кожному записі.
+
+    Файли розмови лежать у підкаталогах за префіксом UUID
+    (shard_depth рівнів по 2 символи: ab/cd/abcd....jsonl), щоб жоден
+    каталог не містив мільйонів записів. Розмови у старому пласкому
+    розміщенні (<data_dir>/<id>.jsonl) знаходяться прозоро, доки їх
+    не перенесе migrate_layout.
+
+    Записи в розмову виконуються під блокуванням цієї розмови (між
+    потоками і між процесами, див. ConversationLocks), а журнал
+    переписується атомарно: тимчасовий файл + os.replace.
+
+    Довговічність (durability):
+    - "none" - без fsync (дані в кеші ОС, можлива втрата при збої живлення)
+    - "write" - fsync після кожного запису
+    - "group" - груповий commit (GroupCommitter): паралельні записи
+      чекають на спільний fsync, що виконується раз на
+      group_commit_ms або group_commit_writes записів
+
+    Холодне сховище: archive_idle переносить розмови, що давно не
+    оновлювалися, у стиснені пакети (ArchiveStore, <data_dir>/archive)
+    і видаляє їхні файли. Архівована розмова лишається в індексі
+    і списку; при першому зверненні (load, get_messages, запис) вона
+    розпаковується назад у звичайні файли, і далі читається як гаряча.
+    """
+
+    # Після скількох записів "meta" журнал розмови ущільнюється
+    COMPACT_AFTER_META_RECORDS = 50
+    # Фонове обслуговування ущільнює журнали вже з такою кількістю записів "meta"
+    COMPACT_IDLE_META_RECORDS = 5
+    # Пакет архіву переписується, коли живі записи займають меншу частку файлу
+    ARCHIVE_MIN_LIVE_FRACTION = 0.5
+    # Розмір блоку при читанні журналу з кінця
+    TAIL_BLOCK_SIZE = 64 * 1024
+    INDEX_FILE = "index.db"
+    STORE_LOCK_FILE = "store.lock"
+    ARCHIVE_DIR = "archive"
+    # Кількість символів UUID на один рівень каталогів
+    SHARD_WIDTH = 2
+
+    def __init__(
+        self,
+        data_dir: Path,
+        shard_depth: int = 2,
+        durability: str = "none",
+        group_commit_ms: float = 5.0,
+        group_commit_writes: int = 64,
+        archive_codec: str = "gzip",
+        archive_pack_bytes: int = 64 * 1024 * 1024,
+        serializer: Optional[JSONSerializer] = None
+    ):
+        if durability not in DURABILITY_MODES:
+            raise ValueError(f"Unknown durability mode: {durability}")
+
+        self.data_dir = Path(data_dir)
+        self.data_dir.mkdir(parents=True, exist_ok=True)
+        self.shard_depth = shard_depth
+        self.durability = durability
+        self.serializer = serializer if serializer is not None else get_serializer()
+        self.committer = GroupCommitter(group_commit_ms, group_commit_writes).start() if durability == "group" else None
+        # Групи, на які потік чекатиме наприкінці deferred_sync
+        self._deferred = threading.local()
+        # Кількість записів "meta" з моменту останньої компакції
+        self._meta_records: Dict[str, int] = {}
+        # Діапазон id, з якого почнеться наступна звірка індексу (repair_index)
+        self._repair_range = 0
+        self.locks = ConversationLocks(self._get_lock_path)
+
+        self.archive = ArchiveStore(self.data_dir / self.ARCHIVE_DIR, archive_codec, archive_pack_bytes)
+
+        self.index = ConversationIndex(self.data_dir / self.INDEX_FILE)
+        if self.index.created:
+            self.recover_archive()
+            if self.list_ids():
+                self.rebuild_index()
+
+    def create(self, conversation: Dict):
+        if not is_conversation_id(conversation["conversation_id"]):
+            raise ValueError(f"Invalid conversation_id: {conversation['conversation_id']!r}")
+
+        with self.locks.hold(conversation["conversation_id"]):
+            self._save_conversation(conversation["conversation_id"], conversation)
+        self.index.add(summarize_conversation(conversation))
+
+    def append_message(
+        self,
+        conversation_id: str,
+        message: Dict,
+        model_config: Optional[Dict] = None,
+        token_ids: Optional[List[int]] = None
+    ):
+        written: List[Path] = []
+
+        # Для невідомої розмови не створюються ні підкаталог, ні файл блокування
+        if not self.exists(conversation_id):
+            raise ValueError(f"Conversation {conversation_id} not found")
+
+        with self.locks.hold(conversation_id):
+            self._restore(conversation_id)
+            file_path = self._get_file_path(conversation_id)
+
+            if not file_path.exists():
+                if not self._get_legacy_path(conversation_id).exists():
+                    raise ValueError(f"Conversation {conversation_id} not found")
+                self._migrate_legacy(conversation_id)
+
+            if token_ids is not None:
+                span = self._append_token_ids(conversation_id, token_ids)
+                if span is not None:
+                    message["tokens"] = span
+                    written.append(self._get_tokens_path(conversation_id))
+
+            records = [dict(message, type="message")]
+            if model_config:
+                records.append({"type": "meta", "updated_at": message["timestamp"], "model_config": model_config})
+
+            self._append_records(conversation_id, records)
+            written.append(file_path)
+
+            if model_config:
+                count = self._meta_records.get(conversation_id, 0) + 1
+                self._meta_records[conversation_id] = count
+                if count >= self.COMPACT_AFTER_META_RECORDS:
+                    self._compact(conversation_id)
+
+        # Очікування групового fsync - вже без блокування розмови
+        if self.committer is not None:
+            self._group_commit(written)
+
+        self.index.record_message(conversation_id, message)
+
+    def import_conversations(self, conversations: List[Dict]) -> List[str]:
+        """
+        Пакетний імпорт: журнали пишуться без fsync і синхронізуються разом
+
+        Замість fsync файлу і каталогу на кожну розмову - одна група
+        (груповий commit) або fsync після запису всього пакета; індекс
+        оновлюється однією транзакцією.
+        """
+        imported = []
+        written: List[Path] = []
+
+        for conversation in conversations:
+            conversation_id = conversation["conversation_id"]
+            with self.locks.hold(conversation_id):
+                if self.exists(conversation_id):
+                    continue
+                written.append(self._save_conversation(conversation_id, conversation, sync=False))
+            imported.append(conversation)
+
+        if written and self.durability != "none":
+            paths = written + sorted({path.parent for path in written})
+            if self.committer is not None:
+                self._group_commit(paths)
+            else:
+                for path in paths:
+                    fsync_path(path)
+
+        self.index.add_many(summarize_conversation(conversation) for conversation in imported)
+        return [conversation["conversation_id"] for conversation in imported]
+
+    def load(self, conversation_id: str) -> Optional[Dict]:
+        if not is_conversation_id(conversation_id):
+            return None
+        self._ensure_hot(conversation_id)
+        return self._load_stored(conversation_id)
+
+    def _load_stored(self, conversation_id: str) -> Optional[Dict]:
+        """Завантаження з того місця, де розмова зараз лежить (без повернення з архіву)"""
+        file_path = self._get_file_path(conversation_id)
+
+        if not file_path.exists():
+            conversation = self._load_legacy(conversation_id)
+            return conversation if conversation is not None else self._load_archived(conversation_id)
+
+        try:
+            with open(file_path, 'rb') as f:
+                return self._replay(f)
+        except Exception as e:
+            logger.error(f"Error loading conversation {conversation_id}: {e}")
+            return None
+
+    def get_messages(self, conversation_id: str, limit: Optional[int] = None) -> List[Dict]:
+        if not is_conversation_id(conversation_id):
+            return []
+        self._ensure_hot(conversation_id)
+        file_path = self._get_file_path(conversation_id)
+
+        if not limit or not file_path.exists():
+            return super().get_messages(conversation_id, limit)
+
+        try:
+            with open(file_path, 'rb') as f:
+                return self._read_tail(f, limit)
+        except Exception as e:
+            logger.error(f"Error loading conversation {conversation_id}: {e}")
+            return []
+
+    def get_message_page(
+        self,
+        conversation_id: str,
+        limit: int,
+        before: Optional[str] = None,
+        after: Optional[str] = None
+    ) -> Tuple[List[Dict], Optional[str], Optional[str]]:
+        """
+        Ключ курсора - зсув рядка повідомлення в журналі
+
+        Сторінка читається від зсуву курсора (або кінця файлу) в потрібному
+        напрямку, тож вартість залежить від розміру сторінки, а не розмови.
+        """
+        if not is_conversation_id(conversation_id):
+            return [], None, None
+        self._ensure_hot(conversation_id)
+        file_path = self._get_file_path(conversation_id)
+
+        if not file_path.exists():
+            return super().get_message_page(conversation_id, limit, before, after)
+
+        with open(file_path, 'rb') as f:
+            if after is not None:
+                # Зайве повідомлення показує, чи є новіші
+                found = self._scan_forward(f, self._locate_message(f, after), limit + 2)[1:]
+                has_newer = len(found) > limit
+                found = found[:limit]
+                has_older = True
+            else:
+                end = self._locate_message(f, before) if before is not None else f.seek(0, os.SEEK_END)
+                found = self._scan_backward(f, end, limit + 1)
+                has_older = len(found) > limit
+                found = found[-limit:]
+                has_newer = before is not None
+
+        if not found:
+            return [], None, None
+
+        return (
+            [record for _, record in found],
+            encode_message_cursor(found[0][0], found[0][1]["timestamp"]) if has_older else None,
+            encode_message_cursor(found[-1][0], found[-1][1]["timestamp"]) if has_newer else None
+        )
+
+    def exists(self, conversation_id: str) -> bool:
+        if not is_conversation_id(conversation_id):
+            return False
+        return self._is_hot(conversation_id) or self.index.archived(conversation_id) is not None
+
+    def get_token_ids(self, conversation_id: str, messages: List[Dict]) -> List[Optional[List[int]]]:
+        """Читається лише діапазон файлу токенів, що покриває ці повідомлення"""
+        spans = [msg.get("tokens") for msg in messages]
+        present = [span for span in spans if span]
+        if not is_conversation_id(conversation_id):
+            return [None] * len(messages)
+        file_path = self._get_tokens_path(conversation_id)
+
+        if present and not file_path.exists():
+            self._ensure_hot(conversation_id)
+            file_path = self._get_tokens_path(conversation_id)
+
+        if not present or not file_path.exists():
+            return [None] * len(messages)
+
+        start = min(offset for offset, _ in present)
+        end = max(offset + length for offset, length in present)
+        itemsize = array(TOKEN_TYPECODE).itemsize
+
+        with open(file_path, 'rb') as f:
+            f.seek(start * itemsize)
+            tokens = decode_token_ids(f.read((end - start) * itemsize))
+
+        result = []
+        for span in spans:
+            if span and span[0] + span[1] - start <= len(tokens):
+                offset = span[0] - start
+                result.append(tokens[offset:offset + span[1]])
+            else:
+                result.append(None)
+        return result
+
+    def iter_conversations(self, ids: Optional[Iterable[str]] = None) -> Iterator[Dict]:
+        """Архівовані розмови читаються прямо з пакетів, без повернення у гарячі файли"""
+        for conversation_id in (self.list_ids() if ids is None else ids):
+            conversation = self._load_stored(conversation_id)
+            if conversation is not None:
+                yield conversation
+
+    def list_ids(self, prefix: str = "") -> List[str]:
+        """
+        id розмов у файлах і архіві
+
+        З prefix переглядаються лише підкаталоги, що відповідають
+        префіксу (для префікса з двох символів - один шард).
+        """
+        conversations = set()
+        directories = [""]
+        if self.shard_depth:
+            levels = [prefix[level * self.SHARD_WIDTH:(level + 1) * self.SHARD_WIDTH] for level in range(self.shard_depth)]
+            directories.append("".join((part if len(part) == self.SHARD_WIDTH else "*") + "/" for part in levels))
+
+        for directory in directories:
+            conversations.update(f.stem for f in self.data_dir.glob(f"{directory}{prefix}*.jsonl"))
+            conversations.update(f.stem for f in self.data_dir.glob(f"{directory}{prefix}*.json"))
+
+        conversations.update(self.index.archived_ids(*prefix_range(prefix)))
+        return [conversation_id for conversation_id in conversations if is_conversation_id(conversation_id)]
+
+    def delete(self, conversation_id: str) -> bool:
+        if not self.exists(conversation_id):
+            return False
+
+        deleted = False
+        empty_pack = None
+
+        with self.locks.hold(conversation_id, remove=True):
+            if self.index.archived(conversation_id) is not None:
+                empty_pack = self.index.remove_archived(conversation_id)
+                deleted = True
+
+            for directory in {self._shard_dir(conversation_id), self.data_dir}:
+                for suffix in (".jsonl", ".json"):
+                    file_path = directory / f"{conversation_id}{suffix}"
+                    if file_path.exists():
+                        file_path.unlink()
+                        deleted = True
+
+            if deleted:
+                for directory in {self._shard_dir(conversation_id), self.data_dir}:
+                    (directory / f"{conversation_id}.tokens").unlink(missing_ok=True)
+                if self.shard_depth:
+                    # Файл блокування, створений до переходу на підкаталоги
+                    (self.data_dir / f"{conversation_id}.lock").unlink(missing_ok=True)
+
+        if empty_pack is not None:
+            self.archive.release(empty_pack)
+
+        if deleted:
+            self._meta_records.pop(conversation_id, None)
+            self.index.remove(conversation_id)
+
+        return deleted
+
+    def migrate_layout(self) -> int:
+        """
+        Перенесення розмов з плаского каталогу в підкаталоги за префіксом
+
+        Файли переносяться os.replace (атомарно в межах файлової системи)
+        під блокуванням розмови, тож паралельні записи не губляться.
+        Повертає кількість перенесених розмов.
+        """
+        if self.shard_depth == 0:
+            return 0
+
+        moved = 0
+        flat_ids = {f.stem for f in self.data_dir.glob("*.jsonl")}
+        flat_ids.update(f.stem for f in self.data_dir.glob("*.json"))
+
+        for conversation_id in sorted(flat_ids):
+            target = self._shard_dir(conversation_id)
+
+            with self.locks.hold(conversation_id):
+                if any((target / f"{conversation_id}{suffix}").exists() for suffix in (".jsonl", ".json")):
+                    logger.warning(f"Conversation {conversation_id} exists in both layouts, skipping")
+                    continue
+
+                target.mkdir(parents=True, exist_ok=True)
+                for suffix in (".jsonl", ".json", ".tokens"):
+                    source = self.data_dir / f"{conversation_id}{suffix}"
+                    if source.exists():
+                        os.replace(source, target / source.name)
+                (self.data_dir / f"{conversation_id}.lock").unlink(missing_ok=True)
+            moved += 1
+
+        logger.info(f"Migrated {moved} conversations to sharded layout")
+        return moved
+
+    def archive_idle(
+        self,
+        before: str,
+        limit: int = 1000,
+        throttle: Optional[Callable[[], bool]] = None
+    ) -> int:
+        """
+        Перенесення в архів до limit розмов, не оновлених з before
+
+        Кандидати вибираються з індексу (найдавніші першими), тож
+        файли гарячих розмов не переглядаються.
+        """
+        archived = 0
+
+        for conversation_id in self.index.idle_ids(before, limit):
+            if throttle is not None and not throttle():
+                break
+            try:
+                if self.archive_conversation(conversation_id):
+                    archived += 1
+            except OSError as e:
+                logger.error(f"Error archiving conversation {conversation_id}: {e}")
+
+        if archived:
+            logger.info(f"Archived {archived} idle conversations")
+        return archived
+
+    def archive_conversation(self, conversation_id: str) -> bool:
+        """
+        Перенесення однієї розмови в холодне сховище
+
+        Порядок захищає від втрати даних при збої: запис у пакет (fsync),
+        розташування в індексі, і лише потім видалення гарячих файлів.
+        """
+        with self.locks.hold(conversation_id, remove=True):
+            if not self._is_hot(conversation_id):
+                return False
+
+            file_path = self._get_file_path(conversation_id)
+            if not file_path.exists():
+                self._migrate_legacy(conversation_id)
+                file_path = self._get_file_path(conversation_id)
+
+            tokens_path = self._get_tokens_path(conversation_id)
+            log = file_path.read_bytes()
+            tokens = tokens_path.read_bytes() if tokens_path.exists() else b""
+
+            self.index.set_archived(conversation_id, self.archive.write(conversation_id, log, tokens))
+            file_path.unlink()
+            tokens_path.unlink(missing_ok=True)
+            if self.shard_depth:
+                (self.data_dir / f"{conversation_id}.lock").unlink(missing_ok=True)
+
+        self._meta_records.pop(conversation_id, None)
+        logger.debug(f"Archived conversation: {conversation_id} ({len(log) + len(tokens)} bytes)")
+        return True
+
+    def recover_archive(self) -> int:
+        """
+        Відновлення розташувань архівних записів скануванням пакетів
+
+        Потрібне, якщо index.db втрачено. Записи розмов, що вже мають
+        гарячі файли, пропускаються. Розмови, видалені після архівації,
+        відновлюються знову: пакет не знає про видалення.
+        """
+        entries = (entry for entry in self.archive.scan() if not self._is_hot(entry[0]))
+        count = self.index.rebuild_archived(entries)
+
+        if count:
+            logger.info(f"Recovered {count} archived conversations from archive packs")
+        return count
+
+    def get_stats(self) -> Dict:
+        return self.index.archive_stats()
+
+    def compaction_candidates(self, limit: int = 1000) -> List[str]:
+        """
+        Розмови з найбільшою кількістю записів "meta" після останньої компакції
+
+        Лічильники ведуться в пам'яті процесу, тож після перезапуску
+        враховуються лише нові записи.
+        """
+        candidates = [
+            (count, conversation_id)
+            for conversation_id, count in list(self._meta_records.items())
+            if count >= self.COMPACT_IDLE_META_RECORDS
+        ]
+        return [conversation_id for _, conversation_id in sorted(candidates, reverse=True)[:limit]]
+
+    def compact_archive(self, limit: int = 1000, throttle: Optional[Callable[[], bool]] = None) -> int:
+        """
+        Переписування пакетів, у яких переважають мертві записи
+
+        Відновлені та видалені розмови лишають у пакеті мертві байти, а
+        release видаляє лише пакет без жодного живого запису. Живі записи
+        пакета з часткою менше ARCHIVE_MIN_LIVE_FRACTION переносяться
+        в поточний пакет (кожен - під блокуванням розмови, після fsync),
+        і спорожнілий пакет видаляється.
+
+        Returns:
+            Кількість перенесених записів
+        """
+        moved = 0
+
+        for pack in self.archive.sparse_packs(self.index.pack_usage(), self.ARCHIVE_MIN_LIVE_FRACTION):
+            for conversation_id in self.index.pack_ids(pack):
+                if moved >= limit or (throttle is not None and not throttle()):
+                    return moved
+
+                with self.locks.hold(conversation_id, remove=True):
+                    location = self.index.archived(conversation_id)
+                    # Розмову могли відновити або видалити після вибору пакета
+                    if location is None or location[0] != pack:
+                        continue
+                    try:
+                        self.index.set_archived(conversation_id, self.archive.move(conversation_id, location))
+                    except OSError as e:
+                        logger.error(f"Error moving archived conversation {conversation_id}: {e}")
+                        continue
+                moved += 1
+
+            if self.index.pack_entries(pack) == 0:
+                self.archive.release(pack)
+
+        if moved:
+            logger.info(f"Moved {moved} archived conversations out of sparse packs")
+        return moved
+
+    def repair_index(
+        self,
+        before: str,
+        limit: int = 1000,
+        throttle: Optional[Callable[[], bool]] = None
+    ) -> int:
+        """
+        Звірка індексу з файлами і архівом
+
+        Розмови без запису в індексі додаються, записи без розмови
+        вилучаються. Кожне виправлення - під блокуванням розмови.
+
+        Звірка йде діапазонами id (repair_id_ranges): діапазон - один
+        шард і відповідна частина індексу, і на кожні ID_SCAN_BATCH
+        прочитаних id, як і на кожне виправлення, прохід чекає на
+        throttle. Наступний прохід продовжує з діапазону, на якому
+        зупинився попередній.
+        """
+        repaired, self._repair_range = repair_id_ranges(
+            self._repair_range,
+            lambda index, quota: self._repair_index_range(index, before, quota, throttle),
+            limit,
+            throttle
+        )
+
+        if repaired:
+            logger.info(f"Repaired {repaired} conversation index entries")
+        return repaired
+
+    def _repair_index_range(
+        self,
+        index: int,
+        before: str,
+        limit: int,
+        throttle: Optional[Callable[[], bool]]
+    ) -> Tuple[int, bool, int]:
+        """Виправлення розбіжностей одного діапазону id (див. repair_id_ranges)"""
+        stored = set(self.list_ids(ID_RANGE_PREFIXES[index]))
+        indexed = set(self.index.ids(*id_range(index)))
+        drift = sorted(stored ^ indexed)
+        read = len(stored) + len(indexed)
+        repaired = 0
+
+        for conversation_id in drift[:limit]:
+            if throttle is not None and not throttle():
+                return repaired, False, read
+
+            if not is_conversation_id(conversation_id):
+                # Такий запис не може відповідати файлу розмови
+                self.index.remove(conversation_id)
+                repaired += 1
+                continue
+
+            with self.locks.hold(conversation_id, remove=conversation_id not in stored):
+                conversation = self._load_stored(conversation_id)
+                if conversation is None:
+                    self.index.remove(conversation_id)
+                elif conversation["updated_at"] < before:
+                    self.index.add(summarize_conversation(conversation))
+                else:
+                    continue
+            repaired += 1
+
+        return repaired, len(drift) <= limit, read
+
+    def page_conversations(
+        self,
+        limit: int,
+        cursor: Optional[str] = None,
+        sort: str = "updated_at",
+        descending: bool = True
+    ) -> Tuple[List[Dict], Optional[str]]:
+        return self.index.page(limit, cursor, sort, descending)
+
+    def rebuild_index(self) -> int:
+        """Перебудова індексу метаданих з файлів розмов"""
+        summaries = [summarize_conversation(conversation) for conversation in self.iter_conversations()]
+        count = self.index.rebuild(summaries)
+        logger.info(f"Rebuilt conversation index: {count} conversations")
+        return count
+
+    @contextmanager
+    def deferred_sync(self) -> Iterator[None]:
+        """
+        Серія записів з одним очікуванням групового fsync наприкінці
+
+        Послідовний записувач (наприклад, flush кешу StorageService)
+        інакше чекав би на окрему групу після кожного повідомлення.
+        """
+        if self.committer is None or getattr(self._deferred, "batches", None) is not None:
+            yield
+            return
+
+        self._deferred.batches = []
+        try:
+            yield
+        finally:
+            batches, self._deferred.batches = self._deferred.batches, None
+            for batch in {id(b): b for b in batches}.values():
+                batch.wait()
+
+    def store_lock_path(self) -> Path:
+        return self.data_dir / self.STORE_LOCK_FILE
+
+    def close(self):
+        if self.committer is not None:
+            self.committer.stop()
+        self.archive.close()
+        self.index.close()
+
+    def compact(self, conversation_id: str) -> bool:
+        """
+        Ущільнення журналу розмови
+
+        Записи "meta" згортаються в заголовок, журнал переписується
+        як заголовок + повідомлення.
+        """
+        if not self.exists(conversation_id):
+            return False
+
+        with self.locks.hold(conversation_id):
+            self._restore(conversation_id)
+            return self._compact(conversation_id)
+
+    def _compact(self, conversation_id: str) -> bool:
+        """Ущільнення журналу (викликається під блокуванням розмови)"""
+        conversation = self._load_stored(conversation_id)
+
+        if conversation is None:
+            return False
+
+        self._save_conversation(conversation_id, conversation)
+        self._meta_records.pop(conversation_id, None)
+        logger.debug(f"Compacted conversation: {conversation_id}")
+        return True
+
+    def _save_conversation(self, conversation_id: str, data: Dict, sync: Optional[bool] = None) -> Path:
+        """
+        Внутрішній метод збереження (повний запис журналу, під блокуванням розмови)
+
+        sync=False - без fsync (викликач синхронізує сам); за замовчуванням
+        fsync, якщо durability не "none". Повертає шлях до журналу.
+        """
+        file_path = self._get_file_path(conversation_id)
+
+        header = {
+            "type": "header",
+            "conversation_id": data["conversation_id"],
+            "created_at": data["created_at"],
+            "updated_at": data["updated_at"],
+            "metadata": {"model_config": data["metadata"].get("model_config", {})}
+        }
+        lines = [self._encode_record(header)]
+        lines.extend(self._encode_record(dict(msg, type="message")) for msg in data["messages"])
+
+        # Переписування рідкісні (створення, компакція), тому синхронізуються одразу
+        self._write_atomic(file_path, b"".join(lines), sync=self.durability != "none" if sync is None else sync)
+        return file_path
+
+    def _write_atomic(self, file_path: Path, data: bytes, sync: bool):
+        """Атомарна заміна файлу: збій посеред запису не зачіпає наявний вміст"""
+        file_path.parent.mkdir(parents=True, exist_ok=True)
+
+        fd, temp_path = tempfile.mkstemp(dir=file_path.parent, prefix=f".{file_path.name}.", suffix=".tmp")
+        try:
+            with open(fd, 'wb') as f:
+                f.write(data)
+                if sync:
+                    f.flush()
+                    os.fsync(f.fileno())
+            os.replace(temp_path, file_path)
+        except BaseException:
+            Path(temp_path).unlink(missing_ok=True)
+            raise
+
+        if sync:
+            fsync_path(file_path.parent)
+
+    def _append_records(self, conversation_id: str, records: List[Dict]):
+        """Дописування записів у журнал одним викликом write"""
+        file_path = self._get_file_path(conversation_id)
+
+        with open(file_path, 'ab') as f:
+            f.write(b"".join(self._encode_record(record) for record in records))
+            if self.durability == "write":
+                f.flush()
+                os.fsync(f.fileno())
+
+    def _encode_record(self, record: Dict) -> bytes:
+        return self.serializer.dumps(record) + b"\n"
+
+    def _replay(self, lines) -> Optional[Dict]:
+        """Відновлення розмови з записів журналу"""
+        conversation = None
+
+        for line in lines:
+            try:
+                record = self.serializer.loads(line)
+            except ValueError:
+                # Недописаний останній рядок (збій під час запису)
+                logger.warning("Skipping malformed conversation record")
+                continue
+
+            record_type = record.pop("type", None)
+
+            if record_type == "header":
+                conversation = {
+                    "conversation_id": record["conversation_id"],
+                    "created_at": record["created_at"],
+                    "updated_at": record.get("updated_at", record["created_at"]),
+                    "messages": [],
+                    "metadata": {
+                        "total_messages": 0,
+                        "model_config": record.get("metadata", {}).get("model_config", {})
+                    }
+                }
+            elif conversation is None:
+                continue
+            elif record_type == "message":
+                conversation["messages"].append(record)
+                conversation["updated_at"] = record["timestamp"]
+            elif record_type == "meta":
+                conversation["metadata"]["model_config"] = record["model_config"]
+                conversation["updated_at"] = record["updated_at"]
+
+        if conversation is not None:
+            conversation["metadata"]["total_messages"] = len(conversation["messages"])
+
+        return conversation
+
+    def _read_tail(self, f, limit: int) -> List[Dict]:
+        """Останні limit повідомлень журналу"""
+        return [record for _, record in self._scan_backward(f, f.seek(0, os.SEEK_END), limit)]
+
+    def _scan_backward(self, f, end: int, limit: int) -> List[Tuple[int, Dict]]:
+        """
+        До limit повідомлень журналу перед зсувом end: (зсув рядка, запис)
+
+        Читання блоками від end до заголовка; повідомлення повертаються
+        в порядку журналу.
+        """
+        position = end
+        remainder = b""
+        messages: List[Tuple[int, Dict]] = []
+
+        while position > 0 and len(messages) < limit:
+            size = min(self.TAIL_BLOCK_SIZE, position)
+            position -= size
+            f.seek(position)
+            lines = (f.read(size) + remainder).split(b"\n")
+
+            offsets = []
+            offset = position
+            for line in lines:
+                offsets.append(offset)
+                offset += len(line) + 1
+
+            # Перший рядок блоку може починатися в попередньому блоці
+            remainder = lines.pop(0) if position > 0 else b""
+            if position > 0:
+                offsets.pop(0)
+
+            for offset, line in zip(reversed(offsets), reversed(lines)):
+                if not line.strip():
+                    continue
+                try:
+                    record = self.serializer.loads(line)
+                except ValueError:
+                    logger.warning("Skipping malformed conversation record")
+                    continue
+
+                record_type = record.pop("type", None)
+                if record_type == "header":
+                    position = 0
+                    break
+                if record_type == "message":
+                    messages.append((offset, record))
+                    if len(messages) == limit:
+                        break
+
+        messages.reverse()
+        return messages
+
+    def _scan_forward(self, f, start: int, limit: int) -> List[Tuple[int, Dict]]:
+        """До limit повідомлень журналу, що починаються з зсуву start або пізніше"""
+        f.seek(start)
+        offset = start
+        messages: List[Tuple[int, Dict]] = []
+
+        for line in f:
+            line_offset = offset
+            offset += len(line)
+            if len(messages) == limit:
+                break
+            if not line.strip():
+                continue
+            try:
+                record = self.serializer.loads(line)
+            except ValueError:
+                logger.warning("Skipping malformed conversation record")
+                continue
+            if record.pop("type", None) == "message":
+                messages.append((line_offset, record))
+
+        return messages
+
+    def _locate_message(self, f, cursor: str) -> int:
+        """
+        Зсув рядка повідомлення з курсора
+
+        Після компакції зсуви змінюються - тоді повідомлення шукається
+        в журналі за часом.
+        """
+        offset, timestamp = decode_message_cursor(cursor)
+
+        if isinstance(offset, int) and offset >= 0:
+            if offset > 0:
+                f.seek(offset - 1)
+                valid = f.read(1) == b"\n"
+            else:
+                valid = True
+            if valid:
+                found = self._scan_forward(f, offset, 1)
+                if found and found[0][0] == offset and found[0][1]["timestamp"] == timestamp:
+                    return offset
+
+        f.seek(0)
+        offset = 0
+        needle = str(timestamp).encode("utf-8")
+
+        for line in f:
+            line_offset = offset
+            offset += len(line)
+            # Розбираються лише рядки, що містять час повідомлення
+            if needle not in line:
+                continue
+            try:
+                record = self.serializer.loads(line)
+            except ValueError:
+                continue
+            if record.get("type") == "message" and record["timestamp"] == timestamp:
+                return line_offset
+
+        raise ValueError("Cursor does not match any message")
+
+    def _load_legacy(self, conversation_id: str) -> Optional[Dict]:
+        """Завантаження розмови у старому форматі (один JSON-документ)"""
+        file_path = self._get_legacy_path(conversation_id)
+
+        if not file_path.exists():
+            return None
+
+        try:
+            with open(file_path, 'rb') as f:
+                return self.serializer.loads(f.read())
+        except Exception as e:
+            logger.error(f"Error loading conversation {conversation_id}: {e}")
+            return None
+
+    def _load_archived(self, conversation_id: str) -> Optional[Dict]:
+        """Читання розмови прямо з архівного пакета (без повернення у гарячі файли)"""
+        location = self.index.archived(conversation_id)
+
+        if location is None:
+            return None
+
+        try:
+            log, _ = self.archive.read(*location)
+            return self._replay(log.splitlines())
+        except Exception as e:
+            logger.error(f"Error loading archived conversation {conversation_id}: {e}")
+            return None
+
+    def _ensure_hot(self, conversation_id: str):
+        """Повернення архівованої розмови у гарячі файли перед читанням"""
+        if not self._is_hot(conversation_id) and self.index.archived(conversation_id) is not None:
+            with self.locks.hold(conversation_id):
+                self._restore(conversation_id)
+
+    def _restore(self, conversation_id: str) -> bool:
+        """
+        Розпакування розмови з архіву у файли (під блокуванням розмови)
+
+        Файли записуються з fsync до вилучення архівного запису; журнал -
+        останнім, бо саме його наявність означає, що розмова гаряча.
+        """
+        if self._is_hot(conversation_id):
+            return False
+
+        location = self.index.archived(conversation_id)
+        if location is None:
+            return False
+
+        log, tokens = self.archive.read(*location)
+        directory = self._shard_dir(conversation_id)
+        if tokens:
+            self._write_atomic(directory / f"{conversation_id}.tokens", tokens, sync=True)
+        self._write_atomic(directory / f"{conversation_id}.jsonl", log, sync=True)
+
+        empty_pack = self.index.remove_archived(conversation_id, restored_at=datetime.now().isoformat())
+        if empty_pack is not None:
+            self.archive.release(empty_pack)
+
+        logger.info(f"Restored archived conversation: {conversation_id}")
+        return True
+
+    def _migrate_legacy(self, conversation_id: str):
+        """Переведення розмови зі старого формату в журнал"""
+        conversation = self._load_legacy(conversation_id)
+
+        if conversation is None:
+            raise ValueError(f"Conversation {conversation_id} could not be migrated")
+
+        self._save_conversation(conversation_id, conversation)
+        self._get_legacy_path(conversation_id).unlink()
+        logger.info(f"Migrated conversation to append-only log: {conversation_id}")
+
+    def _append_token_ids(self, conversation_id: str, token_ids: List[int]) -> Optional[List[int]]:
+        """Дописування токенів у файл розмови, повертає [зсув, довжина]"""
+        data = encode_token_ids(token_ids)
+        if data is None:
+            logger.debug(f"Token ids out of uint16 range, not stored for {conversation_id}")
+            return None
+
+        itemsize = array(TOKEN_TYPECODE).itemsize
+        file_path = self._get_tokens_path(conversation_id)
+        created = not file_path.exists()
+        with open(file_path, 'ab') as f:
+            offset = f.tell() // itemsize
+            f.write(data)
+            if self.durability == "write":
+                f.flush()
+                os.fsync(f.fileno())
+
+        if created and self.durability == "write":
+            # Новий файл довговічний лише разом із записом у каталозі
+            # (у режимі group каталог синхронізує GroupCommitter)
+            fsync_path(file_path.parent)
+
+        return [offset, len(token_ids)]
+
+    def _group_commit(self, paths: List[Path]):
+        """Груповий fsync змінених файлів (у deferred_sync - без очікування)"""
+        batches = getattr(self._deferred, "batches", None)
+
+        if batches is None:
+            self.committer.commit(paths)
+        else:
+            batches.append(self.committer.submit(paths))
+
+    def _shard_dir(self, conversation_id: str) -> Path:
+        """Підкаталог розмови за префіксом її id"""
+        if not is_conversation_id(conversation_id):
+            # Довільний id міг би вказати за межі data_dir (наприклад, "../..")
+            raise ValueError(f"Invalid conversation_id: {conversation_id!r}")
+
+        directory = self.data_dir
+        for level in range(self.shard_depth):
+            start = level * self.SHARD_WIDTH
+            directory = directory / (conversation_id[start:start + self.SHARD_WIDTH] or "_")
+        return directory
+
+    def _conversation_dir(self, conversation_id: str) -> Path:
+        """Каталог, де лежить розмова: підкаталог, плаский каталог (до міграції) або підкаталог для нової"""
+        sharded = self._shard_dir(conversation_id)
+
+        for directory in (sharded, self.data_dir):
+            if (directory / f"{conversation_id}.jsonl").exists() or (directory / f"{conversation_id}.json").exists():
+                return directory
+
+        return sharded
+
+    def _is_hot(self, conversation_id: str) -> bool:
+        """Чи лежить розмова у звичайних файлах (журнал або старий формат)"""
+        directory = self._conversation_dir(conversation_id)
+        return (
+            (directory / f"{conversation_id}.jsonl").exists()
+            or (directory / f"{conversation_id}.json").exists()
+        )
+
+    def _get_file_path(self, conversation_id: str) -> Path:
+        """Отримання шляху до журналу розмови"""
+        return self._conversation_dir(conversation_id) / f"{conversation_id}.jsonl"
+
+    def _get_legacy_path(self, conversation_id: str) -> Path:
+        """Отримання шляху до файлу розмови у старому форматі"""
+        return self._conversation_dir(conversation_id) / f"{conversation_id}.json"
+
+    def _get_lock_path(self, conversation_id: str) -> Path:
+        """Файл блокування розмови (не залежить від того, де зараз лежать її файли)"""
+        return self._shard_dir(conversation_id) / f"{conversation_id}.lock"
+
+    def _get_tokens_path(self, conversation_id: str) -> Path:
+        """Отримання шляху до файлу токенів розмови (під час міграції - там, де він зараз)"""
+        name = f"{conversation_id}.tokens"
+
+        for directory in (self._shard_dir(conversation_id), self.data_dir):
+            if (directory / name).exists():
+                return directory / name
+
+        return self._conversation_dir(conversation_id) / name
@@ -0,0 +1,132 @@
+import os
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional
+import logging
+
+try:
+    import fcntl
+except ImportError:  # Windows: лише блокування між потоками
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+class StoreLock:
+    """
+    Блокування всього сховища між процесами (flock на файл path)
+
+    Процес, що кешує розмови в пам'яті, тримає сховище виключно
+    (LOCK_EX), решта - спільно (LOCK_SH): кеш і відкладений запис
+    коректні, лише поки ніхто інший не пише в те саме сховище.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._fd: Optional[int] = None
+
+    def acquire(self, exclusive: bool) -> bool:
+        """
+        Спроба взяти блокування без очікування
+
+        Returns:
+            False, якщо сховище вже тримає інший процес несумісним блокуванням
+        """
+        if fcntl is None:
+            return True
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, (fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH) | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return False
+
+        self.release()
+        self._fd = fd
+        return True
+
+    def release(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+
+class ConversationLocks:
+    """
+    Блокування на рівні окремої розмови
+
+    У межах процесу - threading.Lock на conversation_id (створюється
+    на час використання), між процесами - flock на файл блокування
+    розмови, шлях до якого повертає lock_path. Записи в різні розмови
+    не блокують один одного.
+    """
+
+    def __init__(self, lock_path: Callable[[str], Path]):
+        self.lock_path = lock_path
+        self._locks: Dict[str, List] = {}
+        self._mutex = threading.Lock()
+
+        if fcntl is None:
+            logger.warning("fcntl is unavailable, conversation locks are process-local")
+
+    @contextmanager
+    def hold(self, conversation_id: str, remove: bool = False) -> Iterator[None]:
+        """
+        Виключний доступ до розмови
+
+        Args:
+            remove: видалити файл блокування (при видаленні розмови)
+        """
+        thread_lock = self._acquire_entry(conversation_id)
+        try:
+            with thread_lock:
+                fd = self._lock_file(self.lock_path(conversation_id)) if fcntl is not None else None
+                try:
+                    yield
+                finally:
+                    if fd is not None:
+                        if remove:
+                            self.lock_path(conversation_id).unlink(missing_ok=True)
+                        fcntl.flock(fd, fcntl.LOCK_UN)
+                        os.close(fd)
+        finally:
+            self._release_entry(conversation_id)
+
+    def _acquire_entry(self, conversation_id: str) -> threading.Lock:
+        with self._mutex:
+            entry = self._locks.get(conversation_id)
+            if entry is None:
+                entry = self._locks[conversation_id] = [threading.Lock(), 0]
+            entry[1] += 1
+            return entry[0]
+
+    def _release_entry(self, conversation_id: str):
+        with self._mutex:
+            entry = self._locks[conversation_id]
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._locks[conversation_id]
+
+    def _lock_file(self, path: Path) -> int:
+        """
+        flock на файл блокування
+
+        Якщо поки ми чекали файл видалили (і, можливо, створили знову),
+        блокування старого inode нічого не захищає - пробуємо ще раз.
+        """
+        while True:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+                if os.fstat(fd).st_ino == os.stat(path).st_ino:
+                    return fd
+            except FileNotFoundError:
+                pass
+            except BaseException:
+                os.close(fd)
+                raise
+            os.close(fd)
@@ -0,0 +1,70 @@
+import json
+from typing import Any, Union
+import logging
+
+try:
+    import orjson
+except ImportError:  # orjson необов'язковий, stdlib json є завжди
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+SERIALIZERS = ("auto", "json", "orjson")
+
+
+class JSONSerializer:
+    """
+    Серіалізація записів сховища стандартним модулем json
+
+    Вихід компактний (без відступів і пробілів, UTF-8 без \\uXXXX);
+    читабельне форматування (pretty=True) - для експорту, не для сховища.
+    Помилки розбору - ValueError (json.JSONDecodeError).
+    """
+
+    name = "json"
+
+    def dumps(self, obj: Any, pretty: bool = False) -> bytes:
+        if pretty:
+            return json.dumps(obj, ensure_ascii=False, indent=2).encode("utf-8")
+        return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+    def loads(self, data: Union[bytes, str]) -> Any:
+        return json.loads(data)
+
+
+class OrjsonSerializer(JSONSerializer):
+    """
+    Серіалізація через orjson (у кілька разів швидша за json)
+
+    Формат той самий, тож файли, записані одним серіалізатором,
+    читаються іншим. orjson.JSONDecodeError - підклас ValueError.
+    """
+
+    name = "orjson"
+
+    def dumps(self, obj: Any, pretty: bool = False) -> bytes:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if pretty else 0)
+
+    def loads(self, data: Union[bytes, str]) -> Any:
+        return orjson.loads(data)
+
+
+def get_serializer(name: str = "auto") -> JSONSerializer:
+    """
+    Серіалізатор за назвою
+
+    "auto" - orjson, якщо встановлено, інакше json; "orjson" без
+    встановленого пакета замінюється на json з попередженням.
+    """
+    if name not in SERIALIZERS:
+        raise ValueError(f"Unknown serializer: {name}")
+
+    if name == "json":
+        return JSONSerializer()
+
+    if orjson is None:
+        if name == "orjson":
+            logger.warning("orjson is not installed, using the json module")
+        return JSONSerializer()
+
+    return OrjsonSerializer()
@@ -0,0 +1,383 @@
+import sqlite3
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+import logging
+
+from services.backends.base import (
+    StorageBackend,
+    encode_token_ids,
+    decode_token_ids,
+    decode_cursor,
+    encode_message_cursor,
+    decode_message_cursor,
+    make_title,
+    prefix_range,
+    summarize_conversation
+)
+from services.backends.conversation_index import build_page_query, page_rows
+from services.backends.serializers import JSONSerializer, get_serializer
+from services.backends.sqlite_common import connect, range_query, ThreadConnections, Transaction
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS conversations (
+    id TEXT PRIMARY KEY,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL,
+    total_messages INTEGER NOT NULL DEFAULT 0,
+    model_config TEXT NOT NULL DEFAULT '{}',
+    title TEXT NOT NULL DEFAULT ''
+);
+CREATE INDEX IF NOT EXISTS idx_conversations_updated_at ON conversations (updated_at);
+
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    conversation_id TEXT NOT NULL REFERENCES conversations (id) ON DELETE CASCADE,
+    role TEXT NOT NULL,
+    content TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    token_ids BLOB
+);
+CREATE INDEX IF NOT EXISTS idx_messages_conversation ON messages (conversation_id, id);
+CREATE INDEX IF NOT EXISTS idx_messages_conversation_timestamp ON messages (conversation_id, timestamp);
+"""
+
+# Індекси для сторінок списку розмов (створюються після міграції колонки title)
+LIST_INDEXES = """
+CREATE INDEX IF NOT EXISTS idx_conversations_updated_id ON conversations (updated_at, id);
+CREATE INDEX IF NOT EXISTS idx_conversations_created_id ON conversations (created_at, id);
+CREATE INDEX IF NOT EXISTS idx_conversations_total_id ON conversations (total_messages, id);
+"""
+
+SYNCHRONOUS_MODES = ("OFF", "NORMAL", "FULL")
+
+# Поле сортування списку -> колонка таблиці conversations
+SORT_COLUMNS = {
+    "updated_at": "updated_at",
+    "created_at": "created_at",
+    "message_count": "total_messages"
+}
+
+# Запити - сталі рядки з параметрами: sqlite3 кешує їх як prepared statements
+INSERT_CONVERSATION = (
+    "INSERT INTO conversations (id, created_at, updated_at, total_messages, model_config) "
+    "VALUES (?, ?, ?, 0, ?)"
+)
+INSERT_IMPORTED_CONVERSATION = (
+    "INSERT OR IGNORE INTO conversations (id, created_at, updated_at, total_messages, model_config, title) "
+    "VALUES (?, ?, ?, ?, ?, ?)"
+)
+INSERT_MESSAGE = (
+    "INSERT INTO messages (conversation_id, role, content, timestamp, token_ids) "
+    "VALUES (?, ?, ?, ?, ?)"
+)
+UPDATE_CONVERSATION = (
+    "UPDATE conversations SET updated_at = ?, total_messages = total_messages + 1, "
+    "model_config = COALESCE(?, model_config), "
+    "title = CASE WHEN title = '' AND ? = 'user' THEN ? ELSE title END WHERE id = ?"
+)
+SET_TITLE = "UPDATE conversations SET title = ? WHERE id = ?"
+SELECT_FIRST_USER_MESSAGES = (
+    "SELECT conversation_id, content FROM messages WHERE id IN "
+    "(SELECT MIN(id) FROM messages WHERE role = 'user' GROUP BY conversation_id)"
+)
+SELECT_PAGE = "SELECT id, created_at, updated_at, total_messages, title FROM conversations"
+SELECT_CONVERSATION = (
+    "SELECT id, created_at, updated_at, total_messages, model_config "
+    "FROM conversations WHERE id = ?"
+)
+SELECT_MESSAGES = (
+    "SELECT id, role, content, timestamp, length(token_ids) / 2 "
+    "FROM messages WHERE conversation_id = ? ORDER BY id"
+)
+SELECT_LAST_MESSAGES = (
+    "SELECT id, role, content, timestamp, length(token_ids) / 2 "
+    "FROM messages WHERE conversation_id = ? ORDER BY id DESC LIMIT ?"
+)
+SELECT_MESSAGES_BEFORE = (
+    "SELECT id, role, content, timestamp, length(token_ids) / 2 "
+    "FROM messages WHERE conversation_id = ? AND id < ? ORDER BY id DESC LIMIT ?"
+)
+SELECT_MESSAGES_AFTER = (
+    "SELECT id, role, content, timestamp, length(token_ids) / 2 "
+    "FROM messages WHERE conversation_id = ? AND id > ? ORDER BY id LIMIT ?"
+)
+SELECT_TOKEN_IDS = (
+    "SELECT id, token_ids FROM messages "
+    "WHERE conversation_id = ? AND id BETWEEN ? AND ? AND token_ids IS NOT NULL"
+)
+SELECT_CONVERSATION_EXISTS = "SELECT 1 FROM conversations WHERE id = ?"
+SELECT_CONVERSATION_IDS = "SELECT id FROM conversations"
+DELETE_MESSAGES = "DELETE FROM messages WHERE conversation_id = ?"
+DELETE_CONVERSATION = "DELETE FROM conversations WHERE id = ?"
+
+
+class SQLiteBackend(StorageBackend):
+    """
+    Сховище розмов у SQLite (режим WAL)
+
+    Кожен потік (і кожен процес-воркер) має власне з'єднання; WAL дозволяє
+    читати паралельно із записом, а записи серіалізуються транзакціями
+    BEGIN IMMEDIATE з busy_timeout, тому кілька воркерів gunicorn можуть
+    писати в одну базу без пошкодження даних.
+    Посилання "tokens" у повідомленні - [id повідомлення, довжина].
+    """
+
+    def __init__(
+        self,
+        db_path: Path,
+        busy_timeout_ms: int = 5000,
+        synchronous: str = "NORMAL",
+        serializer: Optional[JSONSerializer] = None
+    ):
+        if synchronous not in SYNCHRONOUS_MODES:
+            raise ValueError(f"Unknown synchronous mode: {synchronous}")
+
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.busy_timeout_ms = busy_timeout_ms
+        self.synchronous = synchronous
+        self.serializer = serializer if serializer is not None else get_serializer()
+        self._connections = ThreadConnections(lambda: connect(self.db_path, self.busy_timeout_ms, self.synchronous))
+
+        conn = self._connection()
+        conn.executescript(SCHEMA)
+        self._migrate(conn)
+        conn.executescript(LIST_INDEXES)
+
+    def create(self, conversation: Dict):
+        conn = self._connection()
+        with Transaction(conn):
+            conn.execute(INSERT_CONVERSATION, (
+                conversation["conversation_id"],
+                conversation["created_at"],
+                conversation["updated_at"],
+                self.serializer.dumps(conversation["metadata"].get("model_config", {})).decode("utf-8")
+            ))
+
+    def append_message(
+        self,
+        conversation_id: str,
+        message: Dict,
+        model_config: Optional[Dict] = None,
+        token_ids: Optional[List[int]] = None
+    ):
+        token_blob = encode_token_ids(token_ids) if token_ids is not None else None
+        model_config_json = self.serializer.dumps(model_config).decode("utf-8") if model_config else None
+
+        conn = self._connection()
+        with Transaction(conn):
+            cursor = conn.execute(UPDATE_CONVERSATION, (
+                message["timestamp"],
+                model_config_json,
+                message["role"],
+                make_title(message["content"]),
+                conversation_id
+            ))
+            if cursor.rowcount == 0:
+                raise ValueError(f"Conversation {conversation_id} not found")
+
+            cursor = conn.execute(INSERT_MESSAGE, (
+                conversation_id,
+                message["role"],
+                message["content"],
+                message["timestamp"],
+                token_blob
+            ))
+
+        if token_blob is not None:
+            message["tokens"] = [cursor.lastrowid, len(token_ids)]
+
+    def import_conversations(self, conversations: List[Dict]) -> List[str]:
+        """Пакетний імпорт однією транзакцією"""
+        imported = []
+        conn = self._connection()
+
+        with Transaction(conn):
+            for conversation in conversations:
+                conversation_id = conversation["conversation_id"]
+                summary = summarize_conversation(conversation)
+                cursor = conn.execute(INSERT_IMPORTED_CONVERSATION, (
+                    conversation_id,
+                    conversation["created_at"],
+                    conversation["updated_at"],
+                    summary["message_count"],
+                    self.serializer.dumps(conversation["metadata"].get("model_config", {})).decode("utf-8"),
+                    summary["title"]
+                ))
+                if cursor.rowcount == 0:
+                    continue
+
+                conn.executemany(INSERT_MESSAGE, (
+                    (conversation_id, msg["role"], msg["content"], msg["timestamp"], None)
+                    for msg in conversation["messages"]
+                ))
+                imported.append(conversation_id)
+
+        return imported
+
+    def load(self, conversation_id: str) -> Optional[Dict]:
+        conn = self._connection()
+        row = conn.execute(SELECT_CONVERSATION, (conversation_id,)).fetchone()
+
+        if row is None:
+            return None
+
+        messages = [self._message(r) for r in conn.execute(SELECT_MESSAGES, (conversation_id,))]
+        return {
+            "conversation_id": row[0],
+            "created_at": row[1],
+            "updated_at": row[2],
+            "messages": messages,
+            "metadata": {
+                "total_messages": row[3],
+                "model_config": self.serializer.loads(row[4])
+            }
+        }
+
+    def get_messages(self, conversation_id: str, limit: Optional[int] = None) -> List[Dict]:
+        conn = self._connection()
+
+        if not limit:
+            rows = conn.execute(SELECT_MESSAGES, (conversation_id,)).fetchall()
+        else:
+            rows = conn.execute(SELECT_LAST_MESSAGES, (conversation_id, limit)).fetchall()
+            rows.reverse()
+
+        return [self._message(r) for r in rows]
+
+    def get_message_page(
+        self,
+        conversation_id: str,
+        limit: int,
+        before: Optional[str] = None,
+        after: Optional[str] = None
+    ) -> Tuple[List[Dict], Optional[str], Optional[str]]:
+        """Ключ курсора - id рядка повідомлення (keyset по індексу (conversation_id, id))"""
+        conn = self._connection()
+
+        if after is not None:
+            key = self._message_key(after)
+            # Зайвий рядок показує, чи є ще повідомлення
+            rows = conn.execute(SELECT_MESSAGES_AFTER, (conversation_id, key, limit + 1)).fetchall()
+            has_newer = len(rows) > limit
+            rows = rows[:limit]
+            has_older = True
+        else:
+            if before is not None:
+                rows = conn.execute(
+                    SELECT_MESSAGES_BEFORE, (conversation_id, self._message_key(before), limit + 1)
+                ).fetchall()
+            else:
+                rows = conn.execute(SELECT_LAST_MESSAGES, (conversation_id, limit + 1)).fetchall()
+            has_older = len(rows) > limit
+            rows = rows[:limit]
+            rows.reverse()
+            has_newer = before is not None
+
+        if not rows:
+            return [], None, None
+
+        return (
+            [self._message(r) for r in rows],
+            encode_message_cursor(rows[0][0], rows[0][3]) if has_older else None,
+            encode_message_cursor(rows[-1][0], rows[-1][3]) if has_newer else None
+        )
+
+    def exists(self, conversation_id: str) -> bool:
+        conn = self._connection()
+        return conn.execute(SELECT_CONVERSATION_EXISTS, (conversation_id,)).fetchone() is not None
+
+    def get_token_ids(self, conversation_id: str, messages: List[Dict]) -> List[Optional[List[int]]]:
+        ids = [msg["tokens"][0] for msg in messages if msg.get("tokens")]
+
+        if not ids:
+            return [None] * len(messages)
+
+        conn = self._connection()
+        rows = conn.execute(SELECT_TOKEN_IDS, (conversation_id, min(ids), max(ids)))
+        tokens = {message_id: decode_token_ids(blob) for message_id, blob in rows}
+
+        return [
+            tokens.get(msg["tokens"][0]) if msg.get("tokens") else None
+            for msg in messages
+        ]
+
+    def list_ids(self, prefix: str = "") -> List[str]:
+        conn = self._connection()
+        return [row[0] for row in conn.execute(*range_query(SELECT_CONVERSATION_IDS, "id", *prefix_range(prefix)))]
+
+    def page_conversations(
+        self,
+        limit: int,
+        cursor: Optional[str] = None,
+        sort: str = "updated_at",
+        descending: bool = True
+    ) -> Tuple[List[Dict], Optional[str]]:
+        if sort not in SORT_COLUMNS:
+            raise ValueError(f"Unknown sort field: {sort}")
+
+        after = decode_cursor(cursor, sort) if cursor is not None else None
+        sql, params = build_page_query(SELECT_PAGE, SORT_COLUMNS[sort], descending, after, limit + 1)
+        rows = self._connection().execute(sql, params).fetchall()
+        return page_rows(rows, sort, limit)
+
+    def delete(self, conversation_id: str) -> bool:
+        conn = self._connection()
+        with Transaction(conn):
+            conn.execute(DELETE_MESSAGES, (conversation_id,))
+            cursor = conn.execute(DELETE_CONVERSATION, (conversation_id,))
+        return cursor.rowcount > 0
+
+    def compact(self, conversation_id: str) -> bool:
+        """Перенесення WAL в основний файл бази"""
+        if self.load(conversation_id) is None:
+            return False
+        self._connection().execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        return True
+
+    def optimize(self):
+        """Перенесення WAL в основний файл і оновлення статистики планувальника запитів"""
+        conn = self._connection()
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        conn.execute("PRAGMA optimize")
+
+    def store_lock_path(self) -> Path:
+        return self.db_path.with_name(self.db_path.name + ".lock")
+
+    def close(self):
+        self._connections.close()
+
+    def _message_key(self, cursor: str) -> int:
+        key, _ = decode_message_cursor(cursor)
+        if not isinstance(key, int):
+            raise ValueError("Invalid cursor")
+        return key
+
+    def _migrate(self, conn: sqlite3.Connection):
+        """Додавання колонки title у базу попередньої версії"""
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(conversations)")}
+        if "title" in columns:
+            return
+
+        with Transaction(conn):
+            conn.execute("ALTER TABLE conversations ADD COLUMN title TEXT NOT NULL DEFAULT ''")
+            for conversation_id, content in conn.execute(SELECT_FIRST_USER_MESSAGES).fetchall():
+                conn.execute(SET_TITLE, (make_title(content), conversation_id))
+        logger.info("Migrated conversations table: added title column")
+
+    def _message(self, row) -> Dict:
+        message = {
+            "role": row[1],
+            "content": row[2],
+            "timestamp": row[3]
+        }
+        if row[4] is not None:
+            message["tokens"] = [row[0], row[4]]
+        return message
+
+    def _connection(self) -> sqlite3.Connection:
+        """З'єднання поточного потоку"""
+        return self._connections.get()
+
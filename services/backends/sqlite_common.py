@@ -0,0 +1,113 @@
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Callable, Dict, Optional, Tuple
+
+
+def connect(db_path: Path, busy_timeout_ms: int = 5000, synchronous: str = "NORMAL") -> sqlite3.Connection:
+    """
+    З'єднання з базою в режимі WAL
+
+    Транзакції керуються явно (isolation_level=None, див. Transaction);
+    кеш prepared statements збільшено під сталі запити бекендів.
+    З'єднанням користується один потік (ThreadConnections), але закрити
+    його можна з іншого, тому check_same_thread вимкнено.
+    """
+    conn = sqlite3.connect(
+        db_path,
+        timeout=busy_timeout_ms / 1000,
+        isolation_level=None,
+        cached_statements=128,
+        check_same_thread=False
+    )
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute(f"PRAGMA synchronous={synchronous}")
+    conn.execute("PRAGMA foreign_keys=ON")
+    conn.execute(f"PRAGMA busy_timeout={int(busy_timeout_ms)}")
+    return conn
+
+
+def range_query(select: str, column: str, start: str = "", end: Optional[str] = None) -> Tuple[str, tuple]:
+    """Запит select (без WHERE) лише для рядків з column у [start, end) - пошук по індексу"""
+    conditions = []
+    params: tuple = ()
+
+    if start:
+        conditions.append(f"{column} >= ?")
+        params += (start,)
+    if end is not None:
+        conditions.append(f"{column} < ?")
+        params += (end,)
+
+    where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+    return f"{select}{where}", params
+
+
+class ThreadConnections:
+    """
+    З'єднання по одному на потік з реєстром усіх відкритих
+
+    close закриває з'єднання всіх потоків (запитів, фонового запису,
+    обслуговування), а не лише того, що його викликав. Потік, що
+    звернеться після close, отримає нове з'єднання.
+
+    Сервер з потоком на запит створює нові потоки постійно, тож при
+    відкритті кожного нового з'єднання закриваються з'єднання потоків,
+    що вже завершилися: їх кількість обмежена кількістю живих потоків.
+    """
+
+    def __init__(self, factory: Callable[[], sqlite3.Connection]):
+        self._factory = factory
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections: Dict[threading.Thread, sqlite3.Connection] = {}
+        self._generation = 0
+
+    def get(self) -> sqlite3.Connection:
+        """З'єднання поточного потоку"""
+        conn = getattr(self._local, "conn", None)
+
+        if conn is None or self._local.generation != self._generation:
+            conn = self._factory()
+            with self._lock:
+                self._prune()
+                self._connections[threading.current_thread()] = conn
+                self._local.generation = self._generation
+            self._local.conn = conn
+
+        return conn
+
+    def close(self):
+        with self._lock:
+            connections, self._connections = self._connections, {}
+            self._generation += 1
+
+        for conn in connections.values():
+            conn.close()
+        self._local.conn = None
+
+    def __len__(self) -> int:
+        return len(self._connections)
+
+    def _prune(self):
+        """Закриття з'єднань потоків, що завершилися (під self._lock)"""
+        for thread in [thread for thread in self._connections if not thread.is_alive()]:
+            self._connections.pop(thread).close()
+
+
+class Transaction:
+    """Транзакція BEGIN IMMEDIATE: блокування на запис береться одразу"""
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+
+    def __enter__(self):
+        self.conn.execute("BEGIN IMMEDIATE")
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.conn.execute("COMMIT")
+        else:
+            self.conn.execute("ROLLBACK")
+        return False
@@ -1,19 +1,148 @@
-from typing import List, Dict
-from models.gpt2_model import GPT2ChatModel
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Callable, Iterator, List, Dict, Optional, Tuple
 from services.storage_service import StorageService
 from config import Config
+import threading
+import time
 import logging
 
+if TYPE_CHECKING:
+    from models.gpt2_model import GPT2ChatModel
+
 logger = logging.getLogger(__name__)
 
+# Префікси ролей, які модель може згенерувати на початку відповіді
+ROLE_PREFIXES = ["Assistant:", "Bot:", "AI:"]
+
+# Стан завантаження моделі
+MODEL_STATES = ("not_loaded", "loading", "ready", "failed")
+
+
+def load_chat_model(config: Config) -> "GPT2ChatModel":
+    """
+    Завантаження ваг у синглтон GPT2ChatModel (без KV-сесій і батчингу)
+
+    torch і transformers імпортуються лише тут, а не при імпорті сервісу.
+    Окремо від ChatService - для майстра pre-fork сервера (server.py),
+    який завантажує ваги до fork воркерів.
+    """
+    from models.gpt2_model import GPT2ChatModel
+
+    model = GPT2ChatModel()
+    model.load_model(
+        config.MODEL_NAME,
+        # Кеш потрібен і для ваг через mmap, і для експорту ONNX
+        cache_dir=config.MODEL_CACHE_DIR if config.MODEL_MMAP or config.MODEL_BACKEND == "onnx" else None,
+        verify=config.MODEL_CACHE_VERIFY,
+        quantization=config.MODEL_QUANTIZATION,
+        backend=config.MODEL_BACKEND,
+        onnx_threads=config.MODEL_ONNX_THREADS
+    )
+    return model
+
 class ChatService:
     """Сервіс для обробки чат-логіки"""
 
+    # Скільки відформатованих повідомлень пам'ятати у кеші кількості токенів
+    TOKEN_COUNT_CACHE_SIZE = 4096
+
     def __init__(self, storage_service: StorageService, config: Config):
+        """
+        Модель не завантажується в конструкторі: load_model (синхронно)
+        або start_loading (у фоновому потоці). До готовності моделі
+        сервіс не обробляє повідомлення, а сховище вже доступне.
+        """
         self.storage = storage_service
         self.config = config
-        self.model = GPT2ChatModel()
-        self.model.load_model(config.MODEL_NAME)
+        # Рядки, на яких модель зупиняє генерацію, - вони ж обрізають відповідь
+        self.stop_markers = [marker for marker in config.STOP_SEQUENCES if marker]
+        self._token_counts: "OrderedDict[str, int]" = OrderedDict()
+        # Кеш спільний для потоків запитів
+        self._token_counts_lock = threading.Lock()
+        # Токенів у роздільнику "\n" між повідомленнями (вимірюється при завантаженні моделі)
+        self._separator_tokens = 1
+        self._separator_ids: Optional[Tuple[List[int], List[int]]] = None
+
+        self.model: Optional["GPT2ChatModel"] = None
+        self.model_state = "not_loaded"
+        self.model_error: Optional[str] = None
+        self.model_load_seconds: Optional[float] = None
+        self._model_ready = threading.Event()
+        self._model_lock = threading.Lock()
+        self._loader: Optional[threading.Thread] = None
+
+    @property
+    def ready(self) -> bool:
+        """Чи завантажена модель"""
+        return self._model_ready.is_set()
+
+    def load_model(self):
+        """Завантаження моделі в поточному потоці; повторний виклик нічого не робить"""
+        with self._model_lock:
+            if self.ready:
+                return
+
+            self.model_state = "loading"
+            self.model_error = None
+            started = time.perf_counter()
+
+            try:
+                model = load_chat_model(self.config)
+
+                if self.config.KV_CACHE_ENABLED:
+                    model.enable_sessions(
+                        max_sessions=self.config.KV_CACHE_MAX_SESSIONS,
+                        max_memory_mb=self.config.KV_CACHE_MAX_MEMORY_MB
+                    )
+
+                if self.config.BATCHING_ENABLED:
+                    model.enable_batching(max_batch_size=self.config.MAX_BATCH_SIZE)
+            except Exception as e:
+                self.model_state = "failed"
+                self.model_error = str(e)
+                logger.error(f"Model loading failed: {e}", exc_info=True)
+                raise
+
+            self.model = model
+            self._separator_tokens = model.count_tokens("\n")
+            self.model_load_seconds = time.perf_counter() - started
+            self.model_state = "ready"
+            self._model_ready.set()
+            logger.info(f"Model ready in {self.model_load_seconds:.1f}s")
+
+    def start_loading(self):
+        """Завантаження моделі у фоновому потоці (після помилки - нова спроба)"""
+        if self.ready or (self._loader is not None and self._loader.is_alive()):
+            return
+
+        self._loader = threading.Thread(target=self._load_in_background, name="model-loader", daemon=True)
+        self._loader.start()
+
+    def wait_until_ready(self, timeout: Optional[float] = None) -> bool:
+        """Очікування готовності моделі; False, якщо час вийшов"""
+        return self._model_ready.wait(timeout)
+
+    def get_model_status(self) -> Dict:
+        return {
+            "state": self.model_state,
+            "error": self.model_error,
+            "load_seconds": round(self.model_load_seconds, 3) if self.model_load_seconds is not None else None
+        }
+
+    def drop_session(self, conversation_id: str) -> bool:
+        """Видалення KV-сесії розмови (якщо модель уже завантажена)"""
+        return self.model.drop_session(conversation_id) if self.ready else False
+
+    def _load_in_background(self):
+        try:
+            self.load_model()
+        except Exception:
+            # Помилка вже записана в model_state / model_error
+            pass
+
+    def _require_model(self):
+        if not self.ready:
+            raise RuntimeError(f"Model is not ready ({self.model_state})")
 
     def format_conversation_history(
         self,
@@ -28,29 +157,86 @@ class ChatService:
         2. Обрізаємо старі повідомлення якщо перевищено ліміт токенів
         3. Завжди залишаємо останнє повідомлення користувача
         """
+        history, _ = self._format_history(messages, max_tokens)
+        return history
+
+    def _format_history(
+        self,
+        messages: List[Dict],
+        max_tokens: int
+    ) -> Tuple[str, int]:
+        """
+        Форматування історії з підрахунком токенів
+
+        Кожне повідомлення токенізується один раз (з кешем між репліками),
+        а обрізання виконується накопиченою сумою від найновішого
+        повідомлення: лінійно замість повторної токенізації всього тексту
+        після кожного видалення.
+
+        Returns:
+            (текст історії, кількість токенів у ньому)
+        """
         if not messages:
-            return ""
+            return "", 0
 
         # Форматування повідомлень
-        formatted_lines = []
-        for msg in messages:
-            role = "User" if msg["role"] == "user" else "Assistant"
-            formatted_lines.append(f"{role}: {msg['content']}")
+        formatted_lines = [self._format_line(msg["role"], msg["content"]) for msg in messages]
+
+        start, total = self._trim_history(
+            len(formatted_lines),
+            lambda i: self._count_line_tokens(formatted_lines[i]),
+            max_tokens
+        )
 
-        # Об'єднання в один текст
-        full_text = "\n".join(formatted_lines)
+        return "\n".join(formatted_lines[start:]), total
 
-        # Перевірка кількості токенів
-        token_count = self.model.count_tokens(full_text)
+    def _trim_history(
+        self,
+        size: int,
+        line_tokens: Callable[[int], int],
+        max_tokens: int
+    ) -> Tuple[int, int]:
+        """
+        Вибір найдовшого хвоста історії, що вміщується в max_tokens
 
-        # Якщо перевищено ліміт - обрізаємо старі повідомлення
-        # Зберігаємо хоча б одне повідомлення (останнє)
-        while token_count > max_tokens and len(formatted_lines) > 1:
-            formatted_lines.pop(0)  # Видаляємо найстаріше
-            full_text = "\n".join(formatted_lines)
-            token_count = self.model.count_tokens(full_text)
+        Токени накопичуються від найновішого повідомлення до найстарішого;
+        хоча б одне повідомлення (останнє) зберігається завжди.
 
-        return full_text
+        Returns:
+            (індекс першого повідомлення, кількість токенів з роздільниками)
+        """
+        total = 0
+        start = size
+        for i in range(size - 1, -1, -1):
+            # "\n" між рядками токенізується окремо від повідомлень
+            cost = line_tokens(i) + (self._separator_tokens if i < size - 1 else 0)
+            if total + cost > max_tokens and start < size:
+                break
+            total += cost
+            start = i
+
+        return start, total
+
+    def _format_line(self, role: str, content: str) -> str:
+        """Форматування одного повідомлення"""
+        role_name = "User" if role == "user" else "Assistant"
+        return f"{role_name}: {content}"
+
+    def _count_line_tokens(self, line: str) -> int:
+        """Кількість токенів відформатованого повідомлення (з LRU-кешем)"""
+        with self._token_counts_lock:
+            count = self._token_counts.get(line)
+            if count is not None:
+                self._token_counts.move_to_end(line)
+                return count
+
+        # Токенізація - поза блокуванням, щоб не чекали інші запити
+        count = self.model.count_tokens(line)
+        with self._token_counts_lock:
+            self._token_counts[line] = count
+            if len(self._token_counts) > self.TOKEN_COUNT_CACHE_SIZE:
+                self._token_counts.popitem(last=False)
+        return count
 
     def create_prompt(self, conversation_history: str, new_message: str) -> str:
         """
@@ -80,19 +266,130 @@ class ChatService:
         response = generated_text.strip()
 
         # Обрізаємо якщо модель почала генерувати наступну репліку
-        if "\nUser:" in response:
-            response = response.split("\nUser:")[0].strip()
-
-        if "\nAssistant:" in response:
-            response = response.split("\nAssistant:")[0].strip()
+        for marker in self.stop_markers:
+            if marker in response:
+                response = response.split(marker)[0].strip()
 
         # Видалення префіксів якщо модель їх згенерувала
-        for prefix in ["Assistant:", "Bot:", "AI:"]:
+        for prefix in ROLE_PREFIXES:
             if response.startswith(prefix):
                 response = response[len(prefix):].strip()
 
         return response
 
+    def _prepare_prompt(self, conversation_id: str, user_message: str) -> Tuple[str, int, Optional[List[int]]]:
+        """
+        Збереження повідомлення користувача та побудова prompt
+
+        Якщо увімкнено PERSIST_TOKEN_IDS, токени кожного повідомлення
+        зберігаються разом з ним, а input_ids збираються конкатенацією
+        збережених токенів без повторної токенізації історії.
+
+        Returns:
+            (prompt, кількість токенів у prompt, input_ids або None)
+        """
+        persist_ids = self.config.PERSIST_TOKEN_IDS
+        user_ids = self.model.encode(self._format_line("user", user_message)) if persist_ids else None
+
+        # Збереження повідомлення користувача
+        self.storage.add_message(
+            conversation_id=conversation_id,
+            role="user",
+            content=user_message,
+            token_ids=user_ids
+        )
+
+        # Завантаження історії
+        messages = self.storage.get_messages(
+            conversation_id,
+            limit=self.config.MAX_HISTORY_MESSAGES
+        )
+
+        # Видалення останнього повідомлення (щойно додане) для форматування
+        history_messages = messages[:-1]
+        max_tokens = self.config.MAX_CONTEXT_TOKENS - 100
+
+        if not persist_ids:
+            # Форматування історії
+            conversation_history, history_tokens = self._format_history(history_messages, max_tokens)
+
+            # Створення prompt; історію повторно не токенізуємо
+            prompt = self.create_prompt(conversation_history, user_message)
+            new_turn = self.create_prompt("", user_message)
+            prompt_tokens = self.model.count_tokens(new_turn)
+            if conversation_history:
+                prompt_tokens += history_tokens + 1
+
+            return prompt, prompt_tokens, None
+
+        history_ids = self._history_token_ids(conversation_id, history_messages)
+        start, _ = self._trim_history(len(history_ids), lambda i: len(history_ids[i]), max_tokens)
+
+        conversation_history = "\n".join(
+            self._format_line(msg["role"], msg["content"])
+            for msg in history_messages[start:]
+        )
+        prompt = self.create_prompt(conversation_history, user_message)
+
+        newline_ids, assistant_ids = self._turn_token_ids()
+        input_ids: List[int] = []
+        for ids in history_ids[start:]:
+            input_ids.extend(ids)
+            input_ids.extend(newline_ids)
+        input_ids.extend(user_ids)
+        input_ids.extend(newline_ids)
+        input_ids.extend(assistant_ids)
+
+        return prompt, len(input_ids), input_ids
+
+    def _history_token_ids(self, conversation_id: str, messages: List[Dict]) -> List[List[int]]:
+        """Токени повідомлень історії: збережені або (для старих повідомлень) обчислені"""
+        stored = self.storage.get_token_ids(conversation_id, messages)
+        return [
+            ids if ids is not None else self.model.encode(self._format_line(msg["role"], msg["content"]))
+            for msg, ids in zip(messages, stored)
+        ]
+
+    def _turn_token_ids(self) -> Tuple[List[int], List[int]]:
+        """Токени роздільника "\\n" та "Assistant:" (обчислюються один раз)"""
+        if self._separator_ids is None:
+            self._separator_ids = (self.model.encode("\n"), self.model.encode("Assistant:"))
+        return self._separator_ids
+
+    def _generation_params(self) -> Dict:
+        """Параметри генерації з конфігурації"""
+        return {
+            "max_length": self.config.MAX_LENGTH,
+            "temperature": self.config.TEMPERATURE,
+            "top_k": self.config.TOP_K,
+            "top_p": self.config.TOP_P,
+            "repetition_penalty": self.config.REPETITION_PENALTY,
+            "stop_sequences": self.config.STOP_SEQUENCES
+        }
+
+    def _save_response(self, conversation_id: str, response: str) -> Dict:
+        """Збереження відповіді асистента, повертає model_config"""
+        model_config = {
+            "temperature": self.config.TEMPERATURE,
+            "max_length": self.config.MAX_LENGTH,
+            "top_k": self.config.TOP_K,
+            "top_p": self.config.TOP_P
+        }
+
+        token_ids = None
+        if self.config.PERSIST_TOKEN_IDS:
+            token_ids = self.model.encode(self._format_line("assistant", response))
+
+        self.storage.add_message(
+            conversation_id=conversation_id,
+            role="assistant",
+            content=response,
+            model_config=model_config,
+            token_ids=token_ids
+        )
+
+        return model_config
+
     def process_message(
         self,
         conversation_id: str,
@@ -105,67 +402,32 @@ class ChatService:
             Dict з відповіддю та метаданими
         """
         try:
-            # Збереження повідомлення користувача
-            self.storage.add_message(
-                conversation_id=conversation_id,
-                role="user",
-                content=user_message
-            )
-
-            # Завантаження історії
-            messages = self.storage.get_messages(
-                conversation_id,
-                limit=self.config.MAX_HISTORY_MESSAGES
-            )
+            # До готовності моделі повідомлення користувача не зберігається
+            self._require_model()
+            prompt, prompt_tokens, input_ids = self._prepare_prompt(conversation_id, user_message)
 
-            # Видалення останнього повідомлення (щойно додане) для форматування
-            history_messages = messages[:-1]
-
-            # Форматування історії
-            conversation_history = self.format_conversation_history(
-                history_messages,
-                max_tokens=self.config.MAX_CONTEXT_TOKENS - 100
-            )
-
-            # Створення prompt
-            prompt = self.create_prompt(conversation_history, user_message)
-
-            logger.info(f"Prompt length: {self.model.count_tokens(prompt)} tokens")
+            logger.info(f"Prompt length: {prompt_tokens} tokens")
 
             # Генерація відповіді
             generated = self.model.generate_response(
                 prompt=prompt,
-                max_length=self.config.MAX_LENGTH,
-                temperature=self.config.TEMPERATURE,
-                top_k=self.config.TOP_K,
-                top_p=self.config.TOP_P,
-                repetition_penalty=self.config.REPETITION_PENALTY
+                input_ids=input_ids,
+                session_id=conversation_id,
+                **self._generation_params()
             )
 
             # Витяг відповіді
             response = self.extract_response(generated)
 
             # Збереження відповіді асистента
-            model_config = {
-                "temperature": self.config.TEMPERATURE,
-                "max_length": self.config.MAX_LENGTH,
-                "top_k": self.config.TOP_K,
-                "top_p": self.config.TOP_P
-            }
-
-            self.storage.add_message(
-                conversation_id=conversation_id,
-                role="assistant",
-                content=response,
-                model_config=model_config
-            )
+            model_config = self._save_response(conversation_id, response)
 
             return {
                 "success": True,
                 "response": response,
                 "conversation_id": conversation_id,
                 "metadata": {
-                    "prompt_tokens": self.model.count_tokens(prompt),
+                    "prompt_tokens": prompt_tokens,
                     "model_config": model_config
                 }
             }
@@ -177,3 +439,123 @@ class ChatService:
                 "error": str(e),
                 "conversation_id": conversation_id
             }
+
+    def _visible_response(self, generated_text: str) -> str:
+        """
+        Частина відповіді, яку вже безпечно показати під час стрімінгу
+
+        Утримується хвіст, що може виявитися початком маркера зупинки
+        (config.STOP_SEQUENCES), а також початок відповіді, поки він
+        може виявитися префіксом ролі ("Assistant:", "Bot:", "AI:").
+        """
+        if any(marker in generated_text for marker in self.stop_markers):
+            return self.extract_response(generated_text)
+
+        hold = 0
+        for marker in self.stop_markers:
+            for size in range(min(len(marker) - 1, len(generated_text)), 0, -1):
+                if generated_text.endswith(marker[:size]):
+                    hold = max(hold, size)
+                    break
+
+        response = self.extract_response(generated_text[:len(generated_text) - hold])
+        if any(prefix.startswith(response) for prefix in ROLE_PREFIXES):
+            return ""
+
+        return response
+
+    def stream_message(
+        self,
+        conversation_id: str,
+        user_message: str
+    ) -> Iterator[Dict]:
+        """
+        Обробка повідомлення з поступовою видачею відповіді
+
+        Yields:
+            Події {"event": "token", "text": ...}, а наприкінці
+            {"event": "done", ...} або {"event": "error", ...}.
+            Відповідь асистента зберігається при закритті потоку,
+            навіть якщо клієнт від'єднався раніше.
+        """
+        try:
+            self._require_model()
+            prompt, prompt_tokens, input_ids = self._prepare_prompt(conversation_id, user_message)
+            streamer = self.model.create_streamer()
+        except Exception as e:
+            logger.error(f"Error preparing stream: {e}", exc_info=True)
+            yield {"event": "error", "error": str(e), "conversation_id": conversation_id}
+            return
+
+        errors = []
+
+        def generate():
+            try:
+                self.model.generate_response(
+                    prompt=prompt,
+                    input_ids=input_ids,
+                    session_id=conversation_id,
+                    streamer=streamer,
+                    **self._generation_params()
+                )
+            except Exception as e:
+                errors.append(e)
+                streamer.end()
+
+        worker = threading.Thread(target=generate, daemon=True)
+        worker.start()
+
+        generated = ""
+        emitted = ""
+        exhausted = False
+        saved = False
+
+        try:
+            for chunk in streamer:
+                generated += chunk
+                visible = self._visible_response(generated)
+
+                if visible.startswith(emitted) and len(visible) > len(emitted):
+                    yield {"event": "token", "text": visible[len(emitted):]}
+                    emitted = visible
+
+                # Модель почала наступну репліку - далі текст не потрібен
+                if any(marker in generated for marker in self.stop_markers):
+                    break
+            else:
+                exhausted = True
+
+            if errors:
+                raise errors[0]
+
+            response = self.extract_response(generated)
+            model_config = self._save_response(conversation_id, response)
+            saved = True
+
+            yield {
+                "event": "done",
+                "response": response,
+                "conversation_id": conversation_id,
+                "metadata": {
+                    "prompt_tokens": prompt_tokens,
+                    "model_config": model_config
+                }
+            }
+
+        except Exception as e:
+            logger.error(f"Error streaming message: {e}", exc_info=True)
+            saved = True
+            yield {"event": "error", "error": str(e), "conversation_id": conversation_id}
+
+        finally:
+            # Дочитуємо решту генерації, щоб потік завершився і KV-сесія збереглася
+            if not exhausted:
+                for chunk in streamer:
+                    generated += chunk
+            worker.join()
+
+            if not saved and not errors:
+                try:
+                    self._save_response(conversation_id, self.extract_response(generated))
+                except Exception as e:
+                    logger.error(f"Error saving streamed response: {e}", exc_info=True)
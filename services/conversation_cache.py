@@ -0,0 +1,104 @@
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class PendingMessage:
+    """Повідомлення, ще не записане в бекенд"""
+
+    __slots__ = ("message", "model_config", "token_ids")
+
+    def __init__(self, message: Dict, model_config: Optional[Dict], token_ids: Optional[List[int]]):
+        self.message = message
+        self.model_config = model_config
+        self.token_ids = token_ids
+
+
+class CachedConversation:
+    """
+    Розмова в пам'яті разом з незаписаними повідомленнями
+
+    Неповний запис (complete=False) містить лише хвіст повідомлень
+    без метаданих - його достатньо для get_messages(limit) і add_message.
+    """
+
+    __slots__ = ("conversation", "pending", "complete")
+
+    def __init__(self, conversation: Dict, complete: bool = True):
+        self.conversation = conversation
+        self.pending: List[PendingMessage] = []
+        self.complete = complete
+
+    @property
+    def dirty(self) -> bool:
+        return bool(self.pending)
+
+
+class ConversationCache:
+    """
+    LRU-кеш розмов, ключ - conversation_id
+
+    Кеш не синхронізований сам по собі: виклики серіалізує StorageService,
+    який також записує "брудні" розмови в бекенд перед їх витісненням.
+    """
+
+    def __init__(self, max_conversations: int = 128):
+        self.max_conversations = max_conversations
+        self._conversations: "OrderedDict[str, CachedConversation]" = OrderedDict()
+        self.stats: Dict[str, int] = {
+            "hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "flushes": 0,
+            "flushed_messages": 0
+        }
+
+    def __len__(self) -> int:
+        return len(self._conversations)
+
+    def __contains__(self, conversation_id: str) -> bool:
+        return conversation_id in self._conversations
+
+    def get(self, conversation_id: str) -> Optional[CachedConversation]:
+        """Розмова з кешу (з оновленням порядку LRU) або None"""
+        entry = self._conversations.get(conversation_id)
+
+        if entry is None:
+            self.stats["misses"] += 1
+            return None
+
+        self._conversations.move_to_end(conversation_id)
+        self.stats["hits"] += 1
+        return entry
+
+    def peek(self, conversation_id: str) -> Optional[CachedConversation]:
+        """Розмова з кешу без оновлення порядку LRU і лічильників"""
+        return self._conversations.get(conversation_id)
+
+    def put(self, conversation_id: str, entry: CachedConversation) -> List[Tuple[str, CachedConversation]]:
+        """Додавання розмови; повертає витіснені записи (їх треба записати, якщо вони брудні)"""
+        self._conversations[conversation_id] = entry
+        self._conversations.move_to_end(conversation_id)
+
+        evicted = []
+        while len(self._conversations) > self.max_conversations:
+            evicted_id, evicted_entry = self._conversations.popitem(last=False)
+            self.stats["evictions"] += 1
+            logger.debug(f"Evicted cached conversation: {evicted_id}")
+            evicted.append((evicted_id, evicted_entry))
+
+        return evicted
+
+    def pop(self, conversation_id: str) -> Optional[CachedConversation]:
+        """Вилучення розмови з кешу"""
+        return self._conversations.pop(conversation_id, None)
+
+    def dirty_items(self) -> List[Tuple[str, CachedConversation]]:
+        """Розмови з незаписаними повідомленнями"""
+        return [(cid, entry) for cid, entry in self._conversations.items() if entry.dirty]
+
+    def clear(self):
+        """Очищення кешу (без запису брудних розмов)"""
+        self._conversations.clear()
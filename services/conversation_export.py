@@ -0,0 +1,190 @@
+import gzip
+import io
+import zlib
+from datetime import datetime
+from typing import BinaryIO, Dict, Iterable, Iterator
+import logging
+
+from services.backends.base import is_conversation_id, make_title
+from services.backends.serializers import JSONSerializer
+
+logger = logging.getLogger(__name__)
+
+EXPORT_FORMATS = ("ndjson", "txt")
+MESSAGE_ROLES = ("user", "assistant")
+# Скільки помилок імпорту повертати з номерами рядків
+MAX_REPORTED_ERRORS = 100
+# Перші байти gzip-потоку
+GZIP_MAGIC = b"\x1f\x8b"
+
+
+def export_record(conversation: Dict) -> Dict:
+    """
+    Розмова у форматі експорту
+
+    Посилання "tokens" - внутрішні для бекенду, тож не експортуються;
+    після імпорту токени обчислюються заново.
+    """
+    return dict(
+        conversation,
+        messages=[
+            {"role": msg["role"], "content": msg["content"], "timestamp": msg["timestamp"]}
+            for msg in conversation["messages"]
+        ]
+    )
+
+
+def iter_ndjson(conversations: Iterable[Dict], serializer: JSONSerializer) -> Iterator[bytes]:
+    """NDJSON: по одному JSON-документу розмови на рядок"""
+    for conversation in conversations:
+        yield serializer.dumps(export_record(conversation)) + b"\n"
+
+
+def format_text(conversation: Dict) -> str:
+    """Текстове представлення розмови (як експорт TXT у клієнті, docs/js/utils/fileHandler.js)"""
+    messages = conversation["messages"]
+    first_user = next((msg for msg in messages if msg["role"] == "user"), None)
+    model_config = conversation["metadata"].get("model_config") or {}
+
+    lines = [
+        "GPT-2 Chatbot Conversation",
+        "==========================",
+        "",
+        f"ID: {conversation['conversation_id']}",
+        f"Title: {make_title(first_user['content']) if first_user else 'Untitled'}",
+        f"Date: {conversation['created_at']}",
+        f"Total Messages: {len(messages)}",
+        "",
+        "---",
+        ""
+    ]
+
+    for msg in messages:
+        lines.append(f"[{msg['timestamp']}] {'User' if msg['role'] == 'user' else 'Assistant'}:")
+        lines.append(msg["content"])
+        lines.append("")
+
+    lines.append("---")
+    lines.append("Settings used:")
+    for key, label in (
+        ("temperature", "Temperature"),
+        ("max_length", "Max Length"),
+        ("top_k", "Top K"),
+        ("top_p", "Top P"),
+        ("repetition_penalty", "Repetition Penalty")
+    ):
+        lines.append(f"{label}: {model_config.get(key, 'N/A')}")
+
+    return "\n".join(lines) + "\n\n"
+
+
+def iter_text(conversations: Iterable[Dict]) -> Iterator[bytes]:
+    for conversation in conversations:
+        yield format_text(conversation).encode("utf-8")
+
+
+def gzip_chunks(chunks: Iterable[bytes], level: int = 6) -> Iterator[bytes]:
+    """Потокове стиснення у формат gzip без накопичення всього виводу"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+
+    yield compressor.flush()
+
+
+def buffer_chunks(chunks: Iterable[bytes], size: int) -> Iterator[bytes]:
+    """Об'єднання дрібних фрагментів у блоки від size байтів (менше записів у сокет)"""
+    buffer = bytearray()
+
+    for chunk in chunks:
+        buffer += chunk
+        if len(buffer) >= size:
+            yield bytes(buffer)
+            buffer.clear()
+
+    if buffer:
+        yield bytes(buffer)
+
+
+def open_upload(stream: BinaryIO) -> BinaryIO:
+    """
+    Буферизований потік завантаження; gzip розпізнається за сигнатурою
+
+    Дані розпаковуються по мірі читання, файл цілком у пам'ять не потрапляє.
+    """
+    buffered = stream if isinstance(stream, io.BufferedReader) else io.BufferedReader(stream)
+
+    if buffered.peek(2)[:2] == GZIP_MAGIC:
+        return io.BufferedReader(gzip.GzipFile(fileobj=buffered, mode="rb"))
+
+    return buffered
+
+
+def validate_conversation(record) -> Dict:
+    """Перевірка і нормалізація розмови з імпорту; ValueError, якщо вона некоректна"""
+    if not isinstance(record, dict):
+        raise ValueError("Conversation must be a JSON object")
+
+    conversation_id = record.get("conversation_id")
+    if not is_conversation_id(conversation_id):
+        # id стає частиною шляху до файлу - лише канонічний UUID
+        raise ValueError(f"Invalid conversation_id: {conversation_id!r}")
+
+    messages = record.get("messages", [])
+    if not isinstance(messages, list):
+        raise ValueError("messages must be a list")
+
+    normalized = []
+    for msg in messages:
+        if not isinstance(msg, dict) or msg.get("role") not in MESSAGE_ROLES:
+            raise ValueError("Message must have role 'user' or 'assistant'")
+        if not isinstance(msg.get("content"), str) or not isinstance(msg.get("timestamp"), str):
+            raise ValueError("Message must have string content and timestamp")
+        normalized.append({"role": msg["role"], "content": msg["content"], "timestamp": msg["timestamp"]})
+
+    created_at = record.get("created_at")
+    if not isinstance(created_at, str):
+        created_at = normalized[0]["timestamp"] if normalized else datetime.now().isoformat()
+    updated_at = record.get("updated_at")
+    if not isinstance(updated_at, str):
+        updated_at = normalized[-1]["timestamp"] if normalized else created_at
+
+    metadata = record.get("metadata") or {}
+    model_config = (metadata.get("model_config") if isinstance(metadata, dict) else None) or {}
+    if not isinstance(metadata, dict) or not isinstance(model_config, dict):
+        raise ValueError("metadata.model_config must be an object")
+
+    return {
+        "conversation_id": conversation_id,
+        "created_at": created_at,
+        "updated_at": updated_at,
+        "messages": normalized,
+        "metadata": {
+            "total_messages": len(normalized),
+            "model_config": model_config
+        }
+    }
+
+
+def iter_import_records(stream: BinaryIO, serializer: JSONSerializer, report: Dict) -> Iterator[Dict]:
+    """
+    Коректні розмови з NDJSON-потоку по одній
+
+    Некоректні рядки пропускаються: report["invalid"] - їх кількість,
+    report["errors"] - перші MAX_REPORTED_ERRORS (номер рядка, помилка).
+    """
+    report.setdefault("invalid", 0)
+    report.setdefault("errors", [])
+
+    for line_number, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            yield validate_conversation(serializer.loads(line))
+        except ValueError as e:
+            report["invalid"] += 1
+            if len(report["errors"]) < MAX_REPORTED_ERRORS:
+                report["errors"].append({"line": line_number, "error": str(e)})
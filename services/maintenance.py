@@ -0,0 +1,236 @@
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+import logging
+
+from services.storage_service import StorageService
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimiter:
+    """
+    Обмежувач швидкості (token bucket): не більше rate операцій за секунду
+
+    Очікування переривається подією stop, тож зупинка сервера не чекає
+    на розтягнутий у часі прохід.
+    """
+
+    def __init__(self, rate: float, stop: threading.Event):
+        self.rate = rate
+        # Запас не більше ніж на секунду роботи - без сплесків після простою
+        self.capacity = max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.waited = 0.0
+        self._stop = stop
+
+    def acquire(self) -> bool:
+        """Очікування дозволу на наступну операцію; False, якщо роботу зупинено"""
+        if self.rate <= 0:
+            return not self._stop.is_set()
+
+        while True:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return not self._stop.is_set()
+
+            delay = (1 - self.tokens) / self.rate
+            self.waited += delay
+            if self._stop.wait(delay):
+                return False
+
+
+class MaintenanceWorker:
+    """
+    Фонове обслуговування сховища
+
+    Прохід виконує завдання по черзі:
+    - retention: видалення розмов без оновлень довше за retention_days
+    - archive: перенесення в холодне сховище розмов без оновлень довше
+      за archive_after_days
+    - compaction: ущільнення журналів зі службовими записами
+    - indexes: інкрементна звірка індексу розмов та індексу пошуку
+
+    Проходи запускаються раз на interval секунд (0 - лише на вимогу,
+    trigger) в окремому потоці, поза обробкою запитів. Кожна операція
+    над розмовою чекає на RateLimiter, тож прохід розтягується в часі
+    замість сплеску I/O. Прогрес і тривалість завдань - get_status.
+    """
+
+    TASKS = ("retention", "archive", "compaction", "indexes")
+
+    def __init__(
+        self,
+        storage: StorageService,
+        interval: float = 3600.0,
+        retention_days: float = 0.0,
+        batch_size: int = 1000,
+        max_ops_per_second: float = 20.0,
+        archive_after_days: float = 0.0
+    ):
+        self.storage = storage
+        self.interval = interval
+        self.retention_days = retention_days
+        self.archive_after_days = archive_after_days
+        self.batch_size = batch_size
+        self.max_ops_per_second = max_ops_per_second
+
+        self.runs = 0
+        self.current: Optional[Dict] = None
+        self.last_run: Optional[Dict] = None
+        self.next_run_at: Optional[str] = None
+
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        # Стан читається з потоків запитів
+        self._lock = threading.Lock()
+        # Одночасно лише один прохід (фоновий або run_once)
+        self._run_lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, storage: StorageService, config) -> 'MaintenanceWorker':
+        return cls(
+            storage,
+            interval=config.MAINTENANCE_INTERVAL,
+            retention_days=config.STORAGE_RETENTION_DAYS,
+            batch_size=config.MAINTENANCE_BATCH,
+            max_ops_per_second=config.MAINTENANCE_MAX_OPS_PER_SECOND,
+            archive_after_days=config.STORAGE_ARCHIVE_AFTER_DAYS
+        )
+
+    def start(self):
+        """Запуск фонового потоку"""
+        if self._thread is not None:
+            return
+
+        self._stop.clear()
+        self._wake.clear()
+        self._thread = threading.Thread(target=self._loop, name="storage-maintenance", daemon=True)
+        self._thread.start()
+        logger.info(
+            f"Storage maintenance started (interval: {self.interval}s, retention: {self.retention_days} days, "
+            f"archive after: {self.archive_after_days} days, max {self.max_ops_per_second} ops/s)"
+        )
+
+    def stop(self):
+        """Зупинка фонового потоку; поточний прохід переривається на наступній операції"""
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def trigger(self) -> bool:
+        """Позачерговий прохід у фоні; False, якщо потік не запущено"""
+        if self._thread is None:
+            return False
+        self._wake.set()
+        return True
+
+    def run_once(self) -> Dict:
+        """
+        Один прохід усіх завдань у поточному потоці
+
+        Returns:
+            Підсумок проходу (як last_run у get_status)
+        """
+        with self._run_lock:
+            limiter = RateLimiter(self.max_ops_per_second, self._stop)
+            started = time.perf_counter()
+            run = {"started_at": datetime.now().isoformat(), "tasks": {}}
+
+            for task in self.TASKS:
+                if self._stop.is_set():
+                    break
+                run["tasks"][task] = self._run_task(task, limiter)
+
+            run["finished_at"] = datetime.now().isoformat()
+            run["duration_ms"] = round((time.perf_counter() - started) * 1000, 1)
+            run["throttled_ms"] = round(limiter.waited * 1000, 1)
+
+            with self._lock:
+                self.current = None
+                self.last_run = run
+                self.runs += 1
+
+            logger.info(
+                f"Storage maintenance finished in {run['duration_ms']} ms: "
+                + ", ".join(f"{task} {result.get('changed', 0)}" for task, result in run["tasks"].items())
+            )
+            return run
+
+    def get_status(self) -> Dict:
+        """Налаштування, поточне завдання з прогресом і підсумок останнього проходу"""
+        with self._lock:
+            return {
+                "running": self._thread is not None,
+                "interval": self.interval,
+                "retention_days": self.retention_days,
+                "archive_after_days": self.archive_after_days,
+                "batch_size": self.batch_size,
+                "max_ops_per_second": self.max_ops_per_second,
+                "runs": self.runs,
+                "current": dict(self.current) if self.current is not None else None,
+                "last_run": self.last_run,
+                "next_run_at": self.next_run_at
+            }
+
+    def _run_task(self, task: str, limiter: RateLimiter) -> Dict:
+        with self._lock:
+            self.current = {"task": task, "processed": 0, "started_at": datetime.now().isoformat()}
+
+        def step() -> bool:
+            with self._lock:
+                self.current["processed"] += 1
+            return limiter.acquire()
+
+        started = time.perf_counter()
+        result: Dict = {}
+        try:
+            if task == "retention":
+                if self.retention_days > 0:
+                    result["changed"] = self.storage.expire_conversations(self.retention_days, self.batch_size, step)
+                else:
+                    result["skipped"] = True
+            elif task == "archive":
+                if self.archive_after_days > 0:
+                    result["changed"] = self.storage.archive_idle(self.archive_after_days, self.batch_size, step)
+                else:
+                    result["skipped"] = True
+            elif task == "compaction":
+                result["changed"] = self.storage.compact_pending(self.batch_size, step)
+            else:
+                result["changed"] = self.storage.repair_indexes(self.batch_size, step)
+        except Exception as e:
+            logger.error(f"Storage maintenance task {task} failed: {e}", exc_info=True)
+            result["error"] = str(e)
+
+        with self._lock:
+            result["processed"] = self.current["processed"]
+        result["duration_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        return result
+
+    def _loop(self):
+        while not self._stop.is_set():
+            timeout = self.interval if self.interval > 0 else None
+            with self._lock:
+                self.next_run_at = (
+                    (datetime.now() + timedelta(seconds=self.interval)).isoformat() if timeout else None
+                )
+
+            self._wake.wait(timeout)
+            self._wake.clear()
+            if self._stop.is_set():
+                break
+
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.error(f"Storage maintenance run failed: {e}", exc_info=True)
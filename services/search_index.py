@@ -0,0 +1,243 @@
+import math
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+import logging
+
+from services.backends.base import encode_cursor, decode_cursor, make_title
+from services.backends.sqlite_common import connect, range_query, ThreadConnections, Transaction
+from utils.text_utils import tokenize_words
+
+logger = logging.getLogger(__name__)
+
+SEARCH_SCHEMA = """
+CREATE TABLE IF NOT EXISTS search_postings (
+    term TEXT NOT NULL,
+    conversation_id TEXT NOT NULL,
+    tf INTEGER NOT NULL,
+    PRIMARY KEY (term, conversation_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_search_postings_conversation ON search_postings (conversation_id);
+
+CREATE TABLE IF NOT EXISTS search_documents (
+    conversation_id TEXT PRIMARY KEY,
+    length INTEGER NOT NULL DEFAULT 0,
+    title TEXT NOT NULL DEFAULT ''
+);
+
+CREATE TABLE IF NOT EXISTS search_totals (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    documents INTEGER NOT NULL,
+    total_length INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO search_totals (id, documents, total_length) VALUES (1, 0, 0);
+"""
+
+UPSERT_POSTING = (
+    "INSERT INTO search_postings (term, conversation_id, tf) VALUES (?, ?, ?) "
+    "ON CONFLICT (term, conversation_id) DO UPDATE SET tf = tf + excluded.tf"
+)
+SELECT_DOCUMENT = "SELECT length FROM search_documents WHERE conversation_id = ?"
+INSERT_DOCUMENT = "INSERT INTO search_documents (conversation_id, length, title) VALUES (?, ?, ?)"
+UPDATE_DOCUMENT = (
+    "UPDATE search_documents SET length = length + ?, "
+    "title = CASE WHEN title = '' THEN ? ELSE title END WHERE conversation_id = ?"
+)
+UPDATE_TOTALS = "UPDATE search_totals SET documents = documents + ?, total_length = total_length + ? WHERE id = 1"
+SELECT_TOTALS = "SELECT documents, total_length FROM search_totals WHERE id = 1"
+DOCUMENT_FREQUENCY = "SELECT COUNT(*) FROM search_postings WHERE term = ?"
+DELETE_POSTINGS = "DELETE FROM search_postings WHERE conversation_id = ?"
+DELETE_DOCUMENT = "DELETE FROM search_documents WHERE conversation_id = ?"
+SELECT_DOCUMENT_IDS = "SELECT conversation_id FROM search_documents"
+DELETE_ALL = """
+DELETE FROM search_postings;
+DELETE FROM search_documents;
+UPDATE search_totals SET documents = 0, total_length = 0 WHERE id = 1;
+"""
+TABLE_EXISTS = "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'search_postings'"
+
+
+class SearchIndex:
+    """
+    Інвертований індекс повнотекстового пошуку по розмовах (SQLite)
+
+    Для кожного слова (utils.text_utils.tokenize_words) зберігається,
+    скільки разів воно трапляється в кожній розмові. Індекс оновлюється
+    інкрементно при кожному повідомленні, тож пошук не відкриває
+    файли розмов. Результати ранжуються за BM25; шукаються розмови,
+    що містять усі слова запиту.
+    """
+
+    # Параметри BM25: насичення частоти слова і нормалізація за довжиною
+    K1 = 1.2
+    B = 0.75
+
+    def __init__(self, db_path: Path, busy_timeout_ms: int = 5000):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.busy_timeout_ms = busy_timeout_ms
+        self._connections = ThreadConnections(lambda: connect(self.db_path, self.busy_timeout_ms))
+
+        conn = self._connection()
+        # Новий індекс треба заповнити з уже збережених розмов
+        self.created = conn.execute(TABLE_EXISTS).fetchone() is None
+        conn.executescript(SEARCH_SCHEMA)
+
+    def add_message(self, conversation_id: str, message: Dict):
+        """Додавання слів повідомлення до індексу розмови"""
+        conn = self._connection()
+        with Transaction(conn):
+            self._index_messages(conn, conversation_id, [message])
+
+    def add_conversations(self, conversations: Iterable[Dict]):
+        """Додавання цілих розмов (імпорт) однією транзакцією"""
+        conn = self._connection()
+        with Transaction(conn):
+            for conversation in conversations:
+                self._index_messages(conn, conversation["conversation_id"], conversation["messages"])
+
+    def add_missing(self, conversation: Dict) -> bool:
+        """Додавання розмови, якої ще немає в індексі (звірка); False, якщо вона вже є"""
+        conn = self._connection()
+        with Transaction(conn):
+            if conn.execute(SELECT_DOCUMENT, (conversation["conversation_id"],)).fetchone() is not None:
+                return False
+            self._index_messages(conn, conversation["conversation_id"], conversation["messages"])
+        return True
+
+    def document_ids(self, start: str = "", end: Optional[str] = None) -> List[str]:
+        """id усіх проіндексованих розмов (або лише з діапазону [start, end))"""
+        query = range_query(SELECT_DOCUMENT_IDS, "conversation_id", start, end)
+        return [row[0] for row in self._connection().execute(*query)]
+
+    def remove(self, conversation_id: str):
+        """Вилучення розмови з індексу"""
+        conn = self._connection()
+        with Transaction(conn):
+            row = conn.execute(SELECT_DOCUMENT, (conversation_id,)).fetchone()
+            if row is None:
+                return
+            conn.execute(DELETE_POSTINGS, (conversation_id,))
+            conn.execute(DELETE_DOCUMENT, (conversation_id,))
+            conn.execute(UPDATE_TOTALS, (-1, -row[0]))
+
+    def rebuild(self, conversations: Iterable[Dict]) -> int:
+        """Повна перебудова індексу однією транзакцією"""
+        conn = self._connection()
+        count = 0
+
+        with Transaction(conn):
+            for statement in DELETE_ALL.strip().splitlines():
+                conn.execute(statement)
+            for conversation in conversations:
+                self._index_messages(conn, conversation["conversation_id"], conversation["messages"])
+                count += 1
+
+        logger.info(f"Rebuilt search index: {count} conversations")
+        return count
+
+    def search(
+        self,
+        query: str,
+        limit: int = 20,
+        cursor: Optional[str] = None
+    ) -> Tuple[List[Dict], Optional[str]]:
+        """
+        Розмови, що містять усі слова запиту, від найрелевантніших
+
+        Returns:
+            (записи {conversation_id, title, score}, курсор наступної сторінки або None)
+        """
+        terms = sorted(set(tokenize_words(query)))
+        if not terms:
+            raise ValueError("Search query has no words")
+
+        after = decode_cursor(cursor, "score") if cursor is not None else None
+        conn = self._connection()
+
+        documents, total_length = conn.execute(SELECT_TOTALS).fetchone()
+        weights = []
+        for term in terms:
+            frequency = conn.execute(DOCUMENT_FREQUENCY, (term,)).fetchone()[0]
+            if frequency == 0:
+                return [], None
+            weights.append((term, math.log(1 + (documents - frequency + 0.5) / (frequency + 0.5))))
+
+        sql, params = self._ranking_query(weights, total_length / max(documents, 1), after, limit + 1)
+        rows = conn.execute(sql, params).fetchall()
+
+        results = [{"conversation_id": row[0], "title": row[1], "score": row[2]} for row in rows[:limit]]
+        next_cursor = None
+        if len(rows) > limit:
+            last = results[-1]
+            next_cursor = encode_cursor("score", last["score"], last["conversation_id"])
+
+        return results, next_cursor
+
+    def close(self):
+        self._connections.close()
+
+    def _index_messages(self, conn, conversation_id: str, messages: List[Dict]):
+        """Оновлення postings, документа і підсумків (у транзакції викликача)"""
+        terms: Counter = Counter()
+        title = ""
+        for message in messages:
+            terms.update(tokenize_words(message["content"]))
+            if not title and message["role"] == "user":
+                title = make_title(message["content"])
+
+        length = sum(terms.values())
+        conn.executemany(UPSERT_POSTING, ((term, conversation_id, tf) for term, tf in terms.items()))
+
+        if conn.execute(SELECT_DOCUMENT, (conversation_id,)).fetchone() is None:
+            conn.execute(INSERT_DOCUMENT, (conversation_id, length, title))
+            conn.execute(UPDATE_TOTALS, (1, length))
+        else:
+            conn.execute(UPDATE_DOCUMENT, (length, title, conversation_id))
+            conn.execute(UPDATE_TOTALS, (0, length))
+
+    def _ranking_query(
+        self,
+        weights: List[Tuple[str, float]],
+        average_length: float,
+        after: Optional[Tuple],
+        limit: int
+    ) -> Tuple[str, tuple]:
+        """
+        Запит BM25: сума по словах idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * len / avg_len))
+
+        Кандидати - postings найрідкіснішого слова (найбільший idf), решта
+        слів перевіряються точковим пошуком за (term, conversation_id),
+        тож вартість визначає найрідкісніше слово запиту. Розмова без
+        будь-якого зі слів відкидається (HAVING). Сторінки - keyset
+        по (score, id).
+        """
+        rarest = max(weights, key=lambda weight: weight[1])[0]
+        values = ", ".join("(?, ?)" for _ in weights)
+        params: tuple = tuple(value for weight in weights for value in weight)
+
+        sql = (
+            f"WITH query (term, idf) AS (VALUES {values}), "
+            "ranked AS ("
+            "SELECT c.conversation_id, d.title, "
+            "SUM(q.idf * p.tf * (? + 1) / (p.tf + ? * (1 - ? + ? * d.length / ?))) AS score "
+            "FROM search_postings c "
+            "CROSS JOIN query q "
+            "CROSS JOIN search_postings p ON p.term = q.term AND p.conversation_id = c.conversation_id "
+            "CROSS JOIN search_documents d ON d.conversation_id = c.conversation_id "
+            "WHERE c.term = ? "
+            "GROUP BY c.conversation_id HAVING COUNT(*) = ?"
+            ") SELECT conversation_id, title, score FROM ranked"
+        )
+        params += (self.K1, self.K1, self.B, self.B, average_length or 1.0, rarest, len(weights))
+
+        if after is not None:
+            sql += " WHERE score < ? OR (score = ? AND conversation_id > ?)"
+            params += (after[0], after[0], after[1])
+
+        sql += " ORDER BY score DESC, conversation_id LIMIT ?"
+        return sql, params + (limit,)
+
+    def _connection(self):
+        """З'єднання поточного потоку"""
+        return self._connections.get()
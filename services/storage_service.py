@@ -1,18 +1,122 @@
-import json
+import threading
 import uuid
-from datetime import datetime
+from datetime import datetime, timedelta
 from pathlib import Path
-from typing import List, Dict, Optional
+from typing import Callable, Iterable, Iterator, List, Dict, Optional, Tuple
 import logging
 
+from services.backends import StorageBackend, FileBackend, SQLiteBackend
+from services.backends.base import ID_RANGE_PREFIXES, SORT_FIELDS, id_range, repair_id_ranges, token_ids_fit
+from services.backends.locks import StoreLock
+from services.backends.serializers import JSONSerializer, get_serializer
+from services.conversation_cache import ConversationCache, CachedConversation, PendingMessage
+from services.search_index import SearchIndex
+
 logger = logging.getLogger(__name__)
 
+# Режим довговічності -> PRAGMA synchronous для SQLite (кожен commit - окремий fsync WAL)
+SQLITE_SYNCHRONOUS = {
+    "none": "OFF",
+    "write": "FULL",
+    "group": "FULL"
+}
+
 class StorageService:
-    """Сервіс для збереження та завантаження діалогів"""
+    """
+    Сервіс для збереження та завантаження діалогів
+
+    Саме зберігання виконує бекенд (StorageBackend): за замовчуванням
+    файловий журнал на розмову (FileBackend), або SQLite (SQLiteBackend).
+
+    Якщо cache_size > 0, активні розмови тримаються в пам'яті (LRU),
+    і читання не звертаються до бекенду. У режимі write_back нові
+    повідомлення лише позначають розмову брудною; в бекенд вони
+    записуються при flush (явному, періодичному або при витісненні).
+    Кеш вимагає виключного володіння сховищем (StoreLock): якщо його
+    вже відкрив інший процес, кеш вимикається, а якщо інший процес
+    сам кешує розмови - сервіс не створюється (RuntimeError).
 
-    def __init__(self, data_dir: Path):
+    Записи кодує serializer (компактний JSON, orjson за наявності),
+    спільний для сервісу і бекенду; читабельний формат (pretty) -
+    лише для експорту.
+
+    Якщо задано search_index, кожне повідомлення додається до індексу
+    повнотекстового пошуку (search).
+
+    archive_idle переносить розмови, що давно не оновлювалися, у
+    холодне сховище бекенду; періодично його виконує фонове
+    обслуговування (services.maintenance.MaintenanceWorker).
+    """
+
+    def __init__(
+        self,
+        data_dir: Path,
+        backend: Optional[StorageBackend] = None,
+        cache_size: int = 0,
+        write_back: bool = False,
+        serializer: Optional[JSONSerializer] = None,
+        search_index: Optional[SearchIndex] = None
+    ):
         self.data_dir = Path(data_dir)
         self.data_dir.mkdir(parents=True, exist_ok=True)
+        self.serializer = serializer if serializer is not None else get_serializer()
+        self.backend = backend if backend is not None else FileBackend(self.data_dir, serializer=self.serializer)
+
+        self.search_index = search_index
+        self.cache = ConversationCache(cache_size) if cache_size > 0 else None
+        self._store_lock = self._lock_store()
+        self.write_back = write_back and self.cache is not None
+        self._lock = threading.RLock()
+        self._flusher: Optional[threading.Thread] = None
+        self._stop_workers = threading.Event()
+        # Діапазон id, з якого почнеться наступна звірка індексу пошуку
+        self._search_repair_range = 0
+
+    @classmethod
+    def from_config(cls, config) -> 'StorageService':
+        """Створення сервісу з бекендом, вибраним у конфігурації"""
+        if config.STORAGE_DURABILITY not in SQLITE_SYNCHRONOUS:
+            raise ValueError(f"Unknown durability mode: {config.STORAGE_DURABILITY}")
+
+        serializer = get_serializer(config.STORAGE_SERIALIZER)
+
+        if config.STORAGE_BACKEND == "sqlite":
+            backend = SQLiteBackend(
+                config.SQLITE_PATH,
+                synchronous=SQLITE_SYNCHRONOUS[config.STORAGE_DURABILITY],
+                serializer=serializer
+            )
+        elif config.STORAGE_BACKEND == "file":
+            backend = FileBackend(
+                config.DATA_DIR,
+                shard_depth=config.STORAGE_SHARD_DEPTH,
+                durability=config.STORAGE_DURABILITY,
+                group_commit_ms=config.STORAGE_GROUP_COMMIT_MS,
+                group_commit_writes=config.STORAGE_GROUP_COMMIT_WRITES,
+                archive_codec=config.STORAGE_ARCHIVE_CODEC,
+                archive_pack_bytes=config.STORAGE_ARCHIVE_PACK_BYTES,
+                serializer=serializer
+            )
+        else:
+            raise ValueError(f"Unknown storage backend: {config.STORAGE_BACKEND}")
+
+        logger.info(f"Using storage backend: {config.STORAGE_BACKEND} ({serializer.name} serializer)")
+        service = cls(
+            config.DATA_DIR,
+            backend=backend,
+            cache_size=config.STORAGE_CACHE_SIZE,
+            write_back=config.STORAGE_WRITE_BACK,
+            serializer=serializer,
+            search_index=SearchIndex(config.SEARCH_INDEX_PATH) if config.SEARCH_ENABLED else None
+        )
+
+        if service.search_index is not None and service.search_index.created and backend.list_ids():
+            service.rebuild_search_index()
+
+        if service.write_back:
+            service.start_flusher(config.STORAGE_FLUSH_INTERVAL)
+
+        return service
 
     def create_conversation(self) -> str:
         """Створення нової розмови"""
@@ -28,7 +132,12 @@ class StorageService:
             }
         }
 
-        self._save_conversation(conversation_id, conversation_data)
+        self.backend.create(conversation_data)
+
+        if self.cache is not None:
+            with self._lock:
+                self._cache_put(conversation_id, CachedConversation(conversation_data))
+
         logger.info(f"Created new conversation: {conversation_id}")
         return conversation_id
 
@@ -37,79 +146,589 @@ class StorageService:
         conversation_id: str,
         role: str,
         content: str,
-        model_config: Optional[Dict] = None
+        model_config: Optional[Dict] = None,
+        token_ids: Optional[List[int]] = None
     ):
-        """Додавання повідомлення до розмови"""
-        conversation = self.load_conversation(conversation_id)
-
-        if conversation is None:
-            raise ValueError(f"Conversation {conversation_id} not found")
+        """
+        Додавання повідомлення до розмови
 
+        token_ids (необов'язково) - токени відформатованого повідомлення;
+        бекенд зберігає їх окремо, а в повідомленні лишається посилання
+        "tokens" для get_token_ids.
+        """
         message = {
             "role": role,
             "content": content,
             "timestamp": datetime.now().isoformat()
         }
 
-        conversation["messages"].append(message)
-        conversation["updated_at"] = datetime.now().isoformat()
-        conversation["metadata"]["total_messages"] = len(conversation["messages"])
-
-        if model_config:
-            conversation["metadata"]["model_config"] = model_config
+        if self.cache is None:
+            self.backend.append_message(conversation_id, message, model_config, token_ids)
+        else:
+            self._add_cached_message(conversation_id, message, model_config, token_ids)
 
-        self._save_conversation(conversation_id, conversation)
+        if self.search_index is not None:
+            self.search_index.add_message(conversation_id, message)
 
     def load_conversation(self, conversation_id: str) -> Optional[Dict]:
         """Завантаження розмови"""
-        file_path = self._get_file_path(conversation_id)
+        if self.cache is None:
+            return self.backend.load(conversation_id)
 
-        if not file_path.exists():
-            return None
+        with self._lock:
+            entry = self._cached(conversation_id)
+            if entry is None:
+                return None
 
-        try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except Exception as e:
-            logger.error(f"Error loading conversation {conversation_id}: {e}")
-            return None
+            # Копія верхнього рівня, щоб зміни викликача не потрапили в кеш
+            conversation = entry.conversation
+            return dict(
+                conversation,
+                messages=list(conversation["messages"]),
+                metadata=dict(conversation["metadata"])
+            )
 
     def get_messages(self, conversation_id: str, limit: Optional[int] = None) -> List[Dict]:
         """Отримання повідомлень з розмови"""
-        conversation = self.load_conversation(conversation_id)
+        if self.cache is None:
+            return self.backend.get_messages(conversation_id, limit)
 
-        if conversation is None:
-            return []
+        with self._lock:
+            entry = self._cached(conversation_id) if not limit else self._cached_tail(conversation_id, limit)
+            if entry is None:
+                return []
+
+            messages = entry.conversation["messages"]
+            return messages[-limit:] if limit else list(messages)
+
+    def get_message_page(
+        self,
+        conversation_id: str,
+        limit: int,
+        before: Optional[str] = None,
+        after: Optional[str] = None
+    ) -> Tuple[List[Dict], Optional[str], Optional[str]]:
+        """
+        Сторінка повідомлень розмови (курсори before / after)
+
+        Returns:
+            (повідомлення, курсор старіших або None, курсор новіших або None)
+        """
+        if limit < 1:
+            raise ValueError("Limit must be positive")
+        if before is not None and after is not None:
+            raise ValueError("Use either before or after cursor")
+
+        # Сторінка читається з бекенду, тож відкладені повідомлення розмови записуємо заздалегідь
+        self.flush(conversation_id)
+        return self.backend.get_message_page(conversation_id, limit, before, after)
+
+    def get_token_ids(self, conversation_id: str, messages: List[Dict]) -> List[Optional[List[int]]]:
+        """
+        Збережені токени для переданих повідомлень розмови
 
-        messages = conversation["messages"]
+        Для повідомлень без збережених токенів повертається None.
+        """
+        if self.cache is None:
+            return self.backend.get_token_ids(conversation_id, messages)
 
-        if limit:
-            return messages[-limit:]
+        with self._lock:
+            entry = self.cache.peek(conversation_id)
+            # Токени ще не записаних повідомлень беруться з пам'яті
+            pending = {id(p.message): p.token_ids for p in entry.pending} if entry is not None else {}
+            result = self.backend.get_token_ids(conversation_id, messages)
 
-        return messages
+            if pending:
+                result = [
+                    pending.get(id(msg), ids) if ids is None else ids
+                    for msg, ids in zip(messages, result)
+                ]
+
+            return result
 
     def list_conversations(self) -> List[str]:
         """Список всіх розмов"""
-        return [f.stem for f in self.data_dir.glob("*.json")]
+        return self.backend.list_ids()
+
+    def page_conversations(
+        self,
+        limit: int = 50,
+        cursor: Optional[str] = None,
+        sort: str = "updated_at",
+        order: str = "desc"
+    ) -> Tuple[List[Dict], Optional[str]]:
+        """
+        Сторінка списку розмов з індексу метаданих
+
+        Args:
+            limit: кількість записів на сторінці
+            cursor: курсор з попередньої сторінки
+            sort: updated_at, created_at або message_count
+            order: asc або desc
+
+        Returns:
+            (записи {conversation_id, created_at, updated_at, message_count, title},
+             курсор наступної сторінки або None)
+        """
+        if sort not in SORT_FIELDS:
+            raise ValueError(f"Unknown sort field: {sort}")
+        if order not in ("asc", "desc"):
+            raise ValueError(f"Unknown sort order: {order}")
+        if limit < 1:
+            raise ValueError("Limit must be positive")
+
+        # Індекс оновлюється бекендом, тож відкладені повідомлення записуємо заздалегідь
+        self.flush()
+        return self.backend.page_conversations(limit, cursor, sort, order == "desc")
+
+    def search(self, query: str, limit: int = 20, cursor: Optional[str] = None) -> Tuple[List[Dict], Optional[str]]:
+        """
+        Повнотекстовий пошук розмов (усі слова запиту, ранжування BM25)
+
+        Returns:
+            (записи {conversation_id, title, score}, курсор наступної сторінки або None)
+        """
+        if self.search_index is None:
+            raise ValueError("Search is disabled")
+        if limit < 1:
+            raise ValueError("Limit must be positive")
+
+        return self.search_index.search(query, limit, cursor)
+
+    def rebuild_search_index(self) -> int:
+        """Перебудова індексу пошуку з усіх збережених розмов"""
+        if self.search_index is None:
+            raise ValueError("Search is disabled")
+
+        self.flush()
+        return self.search_index.rebuild(self.backend.iter_conversations())
+
+    def export_conversations(self) -> Iterator[Dict]:
+        """
+        Усі розмови по одній (потоковий експорт)
+
+        Відкладені повідомлення записуються заздалегідь; далі розмови
+        читаються з бекенду ліниво, у пам'яті лише поточна.
+        """
+        self.flush()
+        return self.backend.iter_conversations()
+
+    def import_conversations(
+        self,
+        conversations: Iterable[Dict],
+        batch_size: int = 500,
+        report: Optional[Dict] = None
+    ) -> Dict:
+        """
+        Імпорт готових розмов пакетами по batch_size
+
+        Розмови з наявними id пропускаються. Лічильники imported/skipped
+        оновлюються в report після кожного пакета, тож при помилці
+        посеред потоку видно, скільки вже збережено.
+
+        Returns:
+            report з лічильниками {"imported": N, "skipped": M}
+        """
+        if batch_size < 1:
+            raise ValueError("Batch size must be positive")
+
+        report = report if report is not None else {}
+        report.setdefault("imported", 0)
+        report.setdefault("skipped", 0)
+
+        batch = []
+        for conversation in conversations:
+            batch.append(conversation)
+            if len(batch) >= batch_size:
+                self._import_batch(batch, report)
+                batch = []
+        if batch:
+            self._import_batch(batch, report)
+
+        logger.info(f"Imported {report['imported']} conversations, skipped {report['skipped']}")
+        return report
 
     def delete_conversation(self, conversation_id: str) -> bool:
         """Видалення розмови"""
-        file_path = self._get_file_path(conversation_id)
+        with self._lock:
+            if self.cache is not None:
+                self.cache.pop(conversation_id)
+            deleted = self.backend.delete(conversation_id)
 
-        if file_path.exists():
-            file_path.unlink()
+        if deleted:
+            if self.search_index is not None:
+                self.search_index.remove(conversation_id)
             logger.info(f"Deleted conversation: {conversation_id}")
-            return True
 
-        return False
+        return deleted
+
+    def compact(self, conversation_id: str) -> bool:
+        """Ущільнення збереженої розмови"""
+        with self._lock:
+            self.flush(conversation_id)
+            return self.backend.compact(conversation_id)
+
+    def flush(self, conversation_id: Optional[str] = None) -> int:
+        """
+        Запис незаписаних повідомлень у бекенд
+
+        Args:
+            conversation_id: лише ця розмова (за замовчуванням - усі брудні)
+
+        Returns:
+            Кількість записаних повідомлень
+        """
+        if self.cache is None:
+            return 0
+
+        with self._lock:
+            if conversation_id is None:
+                items = self.cache.dirty_items()
+            else:
+                entry = self.cache.peek(conversation_id)
+                items = [(conversation_id, entry)] if entry is not None and entry.dirty else []
+
+            with self.backend.deferred_sync():
+                return sum(self._flush_entry(cid, entry) for cid, entry in items)
+
+    def start_flusher(self, interval: float):
+        """Запуск фонового потоку, що періодично виконує flush"""
+        if self._flusher is not None or interval <= 0:
+            return
+
+        self._stop_workers.clear()
+        self._flusher = threading.Thread(
+            target=self._flush_loop,
+            args=(interval,),
+            name="storage-flusher",
+            daemon=True
+        )
+        self._flusher.start()
+        logger.info(f"Storage flusher started (interval: {interval}s)")
+
+    def archive_idle(
+        self,
+        max_age_days: float,
+        limit: int = 1000,
+        throttle: Optional[Callable[[], bool]] = None
+    ) -> int:
+        """
+        Перенесення в холодне сховище розмов без оновлень довше за max_age_days
+
+        throttle викликається перед кожною розмовою; False - зупинити.
+
+        Returns:
+            Кількість архівованих розмов
+        """
+        # Відкладені повідомлення оновлюють updated_at в індексі бекенду
+        self.flush()
+        before = (datetime.now() - timedelta(days=max_age_days)).isoformat()
+        return self.backend.archive_idle(before, limit, throttle)
+
+    def expire_conversations(
+        self,
+        max_age_days: float,
+        limit: int = 1000,
+        throttle: Optional[Callable[[], bool]] = None
+    ) -> int:
+        """
+        Видалення розмов без оновлень довше за max_age_days (термін зберігання)
+
+        throttle викликається перед кожним видаленням; False - зупинити.
+        Розмова з незаписаними повідомленнями в кеші не видаляється.
+
+        Returns:
+            Кількість видалених розмов
+        """
+        self.flush()
+        before = (datetime.now() - timedelta(days=max_age_days)).isoformat()
+        page, _ = self.backend.page_conversations(limit, sort="updated_at", descending=False)
+        deleted = 0
+
+        for item in page:
+            if item["updated_at"] >= before:
+                break
+            if throttle is not None and not throttle():
+                break
+            if self._has_pending(item["conversation_id"]):
+                continue
+            if self.delete_conversation(item["conversation_id"]):
+                deleted += 1
+
+        if deleted:
+            logger.info(f"Expired {deleted} conversations older than {max_age_days} days")
+        return deleted
+
+    def compact_pending(self, limit: int = 1000, throttle: Optional[Callable[[], bool]] = None) -> int:
+        """
+        Ущільнення журналів, у яких накопичилися службові записи, і розріджених пакетів архіву
+
+        Returns:
+            Кількість ущільнених розмов і перенесених архівних записів
+        """
+        compacted = 0
+
+        for conversation_id in self.backend.compaction_candidates(limit):
+            if throttle is not None and not throttle():
+                break
+            # Без блокування сервісу: бекенд блокує лише цю розмову
+            if self.backend.compact(conversation_id):
+                compacted += 1
+
+        compacted += self.backend.compact_archive(limit, throttle)
+        self.backend.optimize()
+        return compacted
+
+    def repair_indexes(
+        self,
+        limit: int = 1000,
+        throttle: Optional[Callable[[], bool]] = None,
+        grace_seconds: float = 60.0
+    ) -> int:
+        """
+        Інкрементна звірка індексу розмов бекенду та індексу пошуку зі сховищем
+
+        Виправляються лише розбіжності (до limit на кожен індекс), а не
+        перебудовується весь індекс. Розмови, оновлені за останні
+        grace_seconds, не чіпаються: їх записи саме можуть оновлюватися.
+
+        Returns:
+            Кількість виправлених записів
+        """
+        self.flush()
+        before = (datetime.now() - timedelta(seconds=grace_seconds)).isoformat()
+        repaired = self.backend.repair_index(before, limit, throttle)
+
+        if self.search_index is not None:
+            repaired += self._repair_search_index(before, limit, throttle)
+
+        return repaired
+
+    def close(self):
+        """Зупинка фонових потоків, запис брудних розмов і закриття бекенду"""
+        self._stop_workers.set()
+        if self._flusher is not None:
+            self._flusher.join()
+            self._flusher = None
+
+        self.flush()
+        self.backend.close()
+        if self.search_index is not None:
+            self.search_index.close()
+        if self._store_lock is not None:
+            self._store_lock.release()
+
+    def get_stats(self) -> Dict:
+        """Лічильники кешу розмов і бекенду"""
+        stats = self.backend.get_stats()
+
+        if self.cache is None:
+            return stats
+
+        with self._lock:
+            return dict(
+                stats,
+                **self.cache.stats,
+                conversations=len(self.cache),
+                dirty_messages=sum(len(entry.pending) for _, entry in self.cache.dirty_items())
+            )
+
+    def _add_cached_message(
+        self,
+        conversation_id: str,
+        message: Dict,
+        model_config: Optional[Dict],
+        token_ids: Optional[List[int]]
+    ):
+        with self._lock:
+            entry = self._cached_tail(conversation_id, 0)
+            if entry is None:
+                raise ValueError(f"Conversation {conversation_id} not found")
+
+            if self.write_back:
+                if token_ids is not None and not token_ids_fit(token_ids):
+                    # Бекенд не зберіг би такі токени - не віддаємо їх і з пам'яті
+                    token_ids = None
+                entry.pending.append(PendingMessage(message, model_config, token_ids))
+            else:
+                self.backend.append_message(conversation_id, message, model_config, token_ids)
+
+            conversation = entry.conversation
+            conversation["messages"].append(message)
+            if entry.complete:
+                conversation["updated_at"] = message["timestamp"]
+                conversation["metadata"]["total_messages"] = len(conversation["messages"])
+                if model_config:
+                    conversation["metadata"]["model_config"] = model_config
+
+    def _has_pending(self, conversation_id: str) -> bool:
+        if self.cache is None:
+            return False
+        with self._lock:
+            entry = self.cache.peek(conversation_id)
+            return entry is not None and bool(entry.pending)
+
+    def _repair_search_index(self, before: str, limit: int, throttle: Optional[Callable[[], bool]]) -> int:
+        """Звірка індексу пошуку діапазонами id (repair_id_ranges) з місця зупинки попереднього проходу"""
+        repaired, self._search_repair_range = repair_id_ranges(
+            self._search_repair_range,
+            lambda index, quota: self._repair_search_range(index, before, quota, throttle),
+            limit,
+            throttle
+        )
+
+        if repaired:
+            logger.info(f"Repaired {repaired} search index entries")
+        return repaired
+
+    def _repair_search_range(
+        self,
+        index: int,
+        before: str,
+        limit: int,
+        throttle: Optional[Callable[[], bool]]
+    ) -> Tuple[int, bool, int]:
+        """Виправлення розбіжностей одного діапазону id (див. repair_id_ranges)"""
+        stored = set(self.backend.list_ids(ID_RANGE_PREFIXES[index]))
+        indexed = set(self.search_index.document_ids(*id_range(index)))
+        stale = sorted(indexed - stored)
+        missing = sorted(stored - indexed)
+        read = len(stored) + len(indexed)
+        repaired = 0
+
+        for conversation_id in stale[:limit]:
+            if throttle is not None and not throttle():
+                return repaired, False, read
+            if not self.backend.exists(conversation_id):
+                self.search_index.remove(conversation_id)
+                repaired += 1
+
+        quota = max(limit - len(stale), 0)
+        for conversation in self.backend.iter_conversations(missing[:quota]):
+            if throttle is not None and not throttle():
+                return repaired, False, read
+            # Нове повідомлення активної розмови індексується саме - не дублюємо його
+            if conversation["updated_at"] < before and self.search_index.add_missing(conversation):
+                repaired += 1
+
+        return repaired, len(stale) + len(missing) <= limit, read
+
+    def _import_batch(self, batch: List[Dict], report: Dict):
+        imported = set(self.backend.import_conversations(batch))
+
+        if self.search_index is not None and imported:
+            # Розмова з повтореним у пакеті id збережена лише раз - перша
+            indexed = {}
+            for conversation in batch:
+                if conversation["conversation_id"] in imported:
+                    indexed.setdefault(conversation["conversation_id"], conversation)
+            self.search_index.add_conversations(indexed.values())
+
+        report["imported"] += len(imported)
+        report["skipped"] += len(batch) - len(imported)
+
+    def _cached(self, conversation_id: str) -> Optional[CachedConversation]:
+        """Повна розмова з кешу; при промаху (або неповному записі) завантажується з бекенду"""
+        entry = self.cache.get(conversation_id)
+
+        if entry is not None and entry.complete:
+            return entry
+
+        if entry is not None:
+            self._flush_entry(conversation_id, entry)
+
+        conversation = self.backend.load(conversation_id)
+        if conversation is None:
+            return None
+
+        entry = CachedConversation(conversation)
+        self._cache_put(conversation_id, entry)
+        return entry
+
+    def _cached_tail(self, conversation_id: str, limit: int) -> Optional[CachedConversation]:
+        """
+        Запис кешу, що містить щонайменше limit останніх повідомлень
+
+        При промаху з бекенду читається лише хвіст розмови, тож вартість
+        не залежить від її довжини.
+        """
+        entry = self.cache.get(conversation_id)
+
+        if entry is not None and (entry.complete or len(entry.conversation["messages"]) >= limit):
+            return entry
+
+        if entry is not None:
+            self._flush_entry(conversation_id, entry)
+        elif not self.backend.exists(conversation_id):
+            return None
+
+        messages = self.backend.get_messages(conversation_id, limit) if limit else []
+        entry = CachedConversation(
+            {"conversation_id": conversation_id, "messages": messages, "metadata": {}},
+            complete=False
+        )
+        self._cache_put(conversation_id, entry)
+        return entry
+
+    def _cache_put(self, conversation_id: str, entry: CachedConversation):
+        for evicted_id, evicted in self.cache.put(conversation_id, entry):
+            if evicted.dirty:
+                self._flush_entry(evicted_id, evicted)
+
+    def _flush_entry(self, conversation_id: str, entry: CachedConversation) -> int:
+        """Запис незаписаних повідомлень однієї розмови в порядку додавання"""
+        written = 0
+
+        with self.backend.deferred_sync():
+            written = self._write_pending(conversation_id, entry)
+
+        if written:
+            self.cache.stats["flushes"] += 1
+            self.cache.stats["flushed_messages"] += written
+
+        return written
+
+    def _write_pending(self, conversation_id: str, entry: CachedConversation) -> int:
+        written = 0
+
+        while entry.pending:
+            pending = entry.pending[0]
+            try:
+                self.backend.append_message(
+                    conversation_id,
+                    pending.message,
+                    pending.model_config,
+                    pending.token_ids
+                )
+            except ValueError as e:
+                # Розмову видалено в бекенді (наприклад, іншим процесом)
+                logger.error(f"Dropping {len(entry.pending)} unsaved messages of {conversation_id}: {e}")
+                entry.pending.clear()
+                break
+            entry.pending.pop(0)
+            written += 1
+
+        return written
+
+    def _lock_store(self) -> Optional[StoreLock]:
+        """Блокування сховища: виключне для кешу, спільне без нього"""
+        path = self.backend.store_lock_path()
+        if path is None:
+            return None
+
+        store_lock = StoreLock(path)
+        if self.cache is not None and not store_lock.acquire(exclusive=True):
+            logger.warning(f"Storage {path.parent} is open in another process, conversation cache is disabled")
+            self.cache = None
 
-    def _save_conversation(self, conversation_id: str, data: Dict):
-        """Внутрішній метод збереження"""
-        file_path = self._get_file_path(conversation_id)
+        if self.cache is None and not store_lock.acquire(exclusive=False):
+            raise RuntimeError(f"Storage {path.parent} is used by another process with the conversation cache enabled")
 
-        with open(file_path, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
+        return store_lock
 
-    def _get_file_path(self, conversation_id: str) -> Path:
-        """Отримання шляху до файлу розмови"""
-        return self.data_dir / f"{conversation_id}.json"
+    def _flush_loop(self, interval: float):
+        while not self._stop_workers.wait(interval):
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Periodic storage flush failed: {e}", exc_info=True)
@@ -126,7 +126,7 @@ class ChatApp {
         const loadingId = this.showLoading();
 
         try {
-            const response = await fetch(`/api/conversations/${this.conversationId}/messages`, {
+            const response = await fetch(`/api/conversations/${this.conversationId}/messages/stream`, {
                 method: 'POST',
                 headers: {
                     'Content-Type': 'application/json'
@@ -138,15 +138,40 @@ class ChatApp {
                 })
             });
 
-            const data = await response.json();
-
-            this.removeLoading(loadingId);
-
-            if (data.success) {
-                this.addMessage('assistant', data.response);
-            } else {
+            if (!response.ok || !response.body) {
+                const data = await response.json();
+                this.removeLoading(loadingId);
                 this.addSystemMessage('Помилка: ' + data.error, 'error');
+                return;
             }
+
+            let contentDiv = null;
+            let text = '';
+
+            await this.readEvents(response, (event, data) => {
+                if (event === 'token') {
+                    if (!contentDiv) {
+                        this.removeLoading(loadingId);
+                        contentDiv = this.addMessage('assistant', '');
+                    }
+                    text += data.text;
+                    contentDiv.textContent = text;
+                    this.scrollToBottom();
+                } else if (event === 'done') {
+                    this.removeLoading(loadingId);
+                    if (!contentDiv) {
+                        contentDiv = this.addMessage('assistant', '');
+                    }
+                    // Остаточна відповідь з сервера
+                    contentDiv.textContent = data.response;
+                    this.scrollToBottom();
+                } else if (event === 'error') {
+                    this.removeLoading(loadingId);
+                    this.addSystemMessage('Помилка: ' + data.error, 'error');
+                }
+            });
+
+            this.removeLoading(loadingId);
         } catch (error) {
             console.error('Error sending message:', error);
             this.removeLoading(loadingId);
@@ -159,6 +184,40 @@ class ChatApp {
         }
     }
 
+    async readEvents(response, onEvent) {
+        // Розбір потоку Server-Sent Events з тіла відповіді fetch
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+
+            buffer += decoder.decode(value, { stream: true });
+
+            let boundary;
+            while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                const rawEvent = buffer.slice(0, boundary);
+                buffer = buffer.slice(boundary + 2);
+
+                let event = 'message';
+                let data = '';
+                for (const line of rawEvent.split('\n')) {
+                    if (line.startsWith('event: ')) {
+                        event = line.slice(7);
+                    } else if (line.startsWith('data: ')) {
+                        data += line.slice(6);
+                    }
+                }
+
+                if (data) {
+                    onEvent(event, JSON.parse(data));
+                }
+            }
+        }
+    }
+
     addMessage(role, content) {
         const messageDiv = document.createElement('div');
         messageDiv.className = `message ${role}`;
@@ -177,6 +236,8 @@ class ChatApp {
 
         this.elements.chatMessages.appendChild(messageDiv);
         this.scrollToBottom();
+
+        return contentDiv;
     }
 
     addSystemMessage(text, type = 'info') {
@@ -1,7 +1,10 @@
+import json
 import pytest
 import tempfile
 import shutil
+import torch
 from pathlib import Path
+from transformers import GPT2Config, GPT2LMHeadModel, GPT2Tokenizer
 from app import create_app
 from services.storage_service import StorageService
 from config import Config
@@ -15,6 +18,22 @@ def temp_data_dir():
     shutil.rmtree(temp_dir)
 
 
+@pytest.fixture
+def source_model(temp_data_dir):
+    """A tiny random GPT-2 with a minimal tokenizer saved as a local model directory"""
+    source = temp_data_dir / "source"
+    source.mkdir()
+    vocab = {"<|endoftext|>": 0, "a": 1, "b": 2, "Ġ": 3}
+    (temp_data_dir / "vocab.json").write_text(json.dumps(vocab))
+    (temp_data_dir / "merges.txt").write_text("#version: 0.2\n")
+    GPT2Tokenizer(str(temp_data_dir / "vocab.json"), str(temp_data_dir / "merges.txt")).save_pretrained(source)
+
+    torch.manual_seed(0)
+    config = GPT2Config(vocab_size=len(vocab), n_positions=32, n_embd=16, n_layer=2, n_head=2)
+    GPT2LMHeadModel(config).save_pretrained(source)
+    return str(source)
+
+
 @pytest.fixture
 def storage_service(temp_data_dir):
     """Create a StorageService with temporary directory"""
@@ -22,11 +41,29 @@ def storage_service(temp_data_dir):
 
 
 @pytest.fixture
-def app():
+def app_config(temp_data_dir):
+    """App configuration with storage in a temporary directory and no model preload"""
+    class TestConfig(Config):
+        DATA_DIR = temp_data_dir / "conversations"
+        SQLITE_PATH = temp_data_dir / "conversations.db"
+        SEARCH_INDEX_PATH = temp_data_dir / "search.db"
+        MODEL_PRELOAD = False
+    return TestConfig
+
+
+@pytest.fixture
+def app(app_config):
     """Create Flask app for testing"""
-    app = create_app()
+    app = create_app(app_config)
     app.config['TESTING'] = True
-    return app
+    yield app
+    app.extensions['gpt2chat'].close()
+
+
+@pytest.fixture
+def app_services(app):
+    """Services of the test app"""
+    return app.extensions['gpt2chat']
 
 
 @pytest.fixture
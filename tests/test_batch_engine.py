@@ -0,0 +1,162 @@
+import threading
+import pytest
+import torch
+from transformers import GPT2Config, GPT2LMHeadModel
+from models.batch_engine import GenerationEngine, GenerationRequest
+
+
+@pytest.fixture(scope="module")
+def tiny_model():
+    """Create a small randomly initialized GPT-2 model"""
+    torch.manual_seed(0)
+    config = GPT2Config(vocab_size=100, n_positions=128, n_embd=32, n_layer=2, n_head=2)
+    model = GPT2LMHeadModel(config)
+    model.eval()
+    return model
+
+
+@pytest.fixture
+def engine(tiny_model):
+    """Create and start a GenerationEngine"""
+    engine = GenerationEngine(tiny_model, eos_token_id=99, max_batch_size=4, max_positions=128)
+    engine.start()
+    yield engine
+    engine.stop()
+
+
+def greedy_reference(model, input_ids, max_new_tokens):
+    """Generate tokens one request at a time with model.generate"""
+    with torch.no_grad():
+        output = model.generate(
+            torch.tensor([input_ids]),
+            max_new_tokens=max_new_tokens,
+            do_sample=False,
+            pad_token_id=99,
+            eos_token_id=99
+        )
+    tokens = output[0][len(input_ids):].tolist()
+    return [t for t in tokens if t != 99]
+
+
+class TestGenerationEngine:
+    """Test suite for GenerationEngine"""
+
+    def test_submit_requires_running_engine(self, tiny_model):
+        """Test that submitting to a stopped engine fails"""
+        engine = GenerationEngine(tiny_model, eos_token_id=99)
+
+        with pytest.raises(RuntimeError, match="not running"):
+            engine.submit(GenerationRequest([1, 2, 3]))
+
+    def test_single_request_matches_generate(self, engine, tiny_model):
+        """Test that engine output matches greedy model.generate"""
+        prompt = [5, 6, 7, 8]
+        request = engine.submit(GenerationRequest(
+            prompt, max_new_tokens=10, do_sample=False, repetition_penalty=1.0
+        ))
+
+        assert request.wait(timeout=30) == greedy_reference(tiny_model, prompt, 10)
+
+    def test_concurrent_requests_batched(self, engine, tiny_model):
+        """Test that prompts of different lengths are decoded correctly in one batch"""
+        prompts = [[1, 2], [10, 11, 12, 13, 14, 15], [20, 21, 22, 23]]
+        requests = [
+            GenerationRequest(p, max_new_tokens=8, do_sample=False, repetition_penalty=1.0)
+            for p in prompts
+        ]
+
+        threads = [threading.Thread(target=engine.submit, args=(r,)) for r in requests]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        for prompt, request in zip(prompts, requests):
+            assert request.wait(timeout=30) == greedy_reference(tiny_model, prompt, 8)
+
+        assert engine.stats["completed"] == 3
+        assert engine.stats["batched_tokens"] >= engine.stats["steps"]
+
+    def test_retires_at_max_new_tokens(self, engine):
+        """Test that sequences finish at max_new_tokens"""
+        request = engine.submit(GenerationRequest([1, 2, 3], max_new_tokens=5))
+
+        tokens = request.wait(timeout=30)
+
+        assert len(tokens) <= 5
+        assert request.finish_reason in ("length", "eos")
+        assert request.past_key_values is not None
+
+    def test_retires_on_stopping_criteria(self, engine):
+        """Test that a stopping criteria callback finishes the sequence early"""
+        request = engine.submit(GenerationRequest(
+            [1, 2, 3],
+            max_new_tokens=50,
+            stopping_criteria=lambda generated: len(generated) >= 2
+        ))
+
+        tokens = request.wait(timeout=30)
+
+        assert request.finish_reason in ("stop", "eos")
+        assert len(tokens) <= 2
+
+    def test_iter_tokens_streams_generated_tokens(self, engine):
+        """Test that tokens are handed back as they are generated"""
+        request = engine.submit(GenerationRequest([1, 2, 3], max_new_tokens=6))
+
+        streamed = list(request.iter_tokens())
+
+        assert streamed == request.generated
+        assert request.done
+
+    def test_continues_from_past_key_values(self, engine, tiny_model):
+        """Test that a cached prefix produces the same output as a full prefill"""
+        prompt = [3, 4, 5, 6, 7]
+        with torch.no_grad():
+            past = tiny_model(torch.tensor([prompt[:3]]), use_cache=True).past_key_values
+
+        request = engine.submit(GenerationRequest(
+            prompt, max_new_tokens=6, do_sample=False, repetition_penalty=1.0,
+            past_key_values=past
+        ))
+
+        assert request.wait(timeout=30) == greedy_reference(tiny_model, prompt, 6)
+
+    def test_stop_fails_pending_requests(self, tiny_model):
+        """Test that stopping the engine releases waiting requests"""
+        engine = GenerationEngine(tiny_model, eos_token_id=99)
+        engine.start()
+        engine.stop()
+
+        request = GenerationRequest([1, 2, 3])
+        engine._pending.put(request)
+        engine.stop()
+
+        with pytest.raises(RuntimeError, match="stopped"):
+            request.wait(timeout=1)
+
+    def test_stop_timeout_leaves_active_requests_to_worker(self, tiny_model):
+        """Test that a worker still inside a step fails its own requests on exit"""
+        engine = GenerationEngine(tiny_model, eos_token_id=99)
+        in_step, release = threading.Event(), threading.Event()
+        decode_step = engine._decode_step
+
+        def slow_step():
+            in_step.set()
+            release.wait(5)
+            decode_step()
+
+        engine._decode_step = slow_step
+        engine.start()
+        request = engine.submit(GenerationRequest([1, 2, 3], max_new_tokens=50, do_sample=False))
+        assert in_step.wait(5)
+
+        engine.stop(timeout=0.05)
+        assert not request.done
+        assert len(engine._active) == 1
+
+        release.set()
+        with pytest.raises(RuntimeError, match="stopped"):
+            request.wait(timeout=5)
+        assert engine._active == []
+        engine.stop()
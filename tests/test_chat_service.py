@@ -11,9 +11,10 @@ class TestChatService:
     @pytest.fixture
     def mock_model(self):
         """Create a mock GPT2ChatModel"""
-        with patch('services.chat_service.GPT2ChatModel') as mock:
+        with patch('models.gpt2_model.GPT2ChatModel') as mock:
             model_instance = Mock()
-            model_instance.count_tokens.return_value = 10
+            model_instance.count_tokens.side_effect = lambda text: 1 if text == "\n" else 10
+            model_instance.encode.side_effect = lambda text: [len(word) for word in text.split(" ")]
             model_instance.generate_response.return_value = "This is a response"
             mock.return_value = model_instance
             yield model_instance
@@ -21,7 +22,60 @@ class TestChatService:
     @pytest.fixture
     def chat_service(self, storage_service, mock_model):
         """Create ChatService with mocked model"""
-        return ChatService(storage_service, Config)
+        service = ChatService(storage_service, Config)
+        service.load_model()
+        return service
+
+    def test_model_not_loaded_on_construction(self, storage_service, mock_model):
+        """The model is loaded on demand; messages are rejected until it is ready"""
+        service = ChatService(storage_service, Config)
+        assert service.ready is False
+        assert service.get_model_status()["state"] == "not_loaded"
+
+        conv_id = storage_service.create_conversation()
+        result = service.process_message(conv_id, "Hello")
+        assert result["success"] is False
+        assert "not ready" in result["error"]
+        # The user message is not stored when it cannot be answered
+        assert storage_service.get_messages(conv_id) == []
+        assert service.drop_session(conv_id) is False
+
+    def test_background_loading(self, storage_service, mock_model):
+        """start_loading loads the model in a thread and signals readiness"""
+        service = ChatService(storage_service, Config)
+        service.start_loading()
+
+        assert service.wait_until_ready(timeout=5)
+        status = service.get_model_status()
+        assert status["state"] == "ready"
+        assert status["load_seconds"] is not None
+        assert service.model is mock_model
+        mock_model.load_model.assert_called_once_with(
+            Config.MODEL_NAME,
+            cache_dir=Config.MODEL_CACHE_DIR if Config.MODEL_MMAP else None,
+            verify=Config.MODEL_CACHE_VERIFY,
+            quantization=Config.MODEL_QUANTIZATION,
+            backend=Config.MODEL_BACKEND,
+            onnx_threads=Config.MODEL_ONNX_THREADS
+        )
+
+        # Repeated loading does not reload the weights
+        service.load_model()
+        mock_model.load_model.assert_called_once()
+
+    def test_background_loading_failure(self, storage_service, mock_model):
+        """A failed load is reported in the status and can be retried"""
+        mock_model.load_model.side_effect = [OSError("weights not found"), None]
+        service = ChatService(storage_service, Config)
+        service.start_loading()
+        service._loader.join(timeout=5)
+
+        assert service.ready is False
+        assert service.get_model_status() == {"state": "failed", "error": "weights not found", "load_seconds": None}
+
+        service.start_loading()
+        assert service.wait_until_ready(timeout=5)
+        assert service.model_error is None
 
     def test_format_conversation_history_empty(self, chat_service):
         """Test formatting empty conversation history"""
@@ -68,6 +122,43 @@ class TestChatService:
         lines = result.split('\n')
         assert len(lines) <= len(messages)
 
+    def test_format_conversation_history_tokenizes_each_message_once(self, chat_service, mock_model):
+        """Test that trimming does not re-tokenize the joined history"""
+        mock_model.count_tokens.reset_mock()
+        messages = [{"role": "user", "content": f"Message {i}"} for i in range(20)]
+
+        result = chat_service.format_conversation_history(messages, max_tokens=54)
+
+        # 5 lines * 10 tokens + 4 newline separators
+        assert result.split("\n") == [f"User: Message {i}" for i in range(15, 20)]
+        assert mock_model.count_tokens.call_count <= len(messages)
+        assert all("\n" not in call.args[0] for call in mock_model.count_tokens.call_args_list)
+
+    def test_separator_tokens_measured_at_load(self, storage_service, mock_model):
+        """Test that the newline separator cost comes from the tokenizer"""
+        mock_model.count_tokens.side_effect = lambda text: 3 if text == "\n" else 10
+        service = ChatService(storage_service, Config)
+        service.load_model()
+        messages = [{"role": "user", "content": f"Message {i}"} for i in range(5)]
+
+        # 3 lines * 10 tokens + 2 separators * 3 tokens
+        history, total = service._format_history(messages, max_tokens=36)
+        assert history.split("\n") == [f"User: Message {i}" for i in range(2, 5)]
+        assert total == 36
+
+    def test_format_conversation_history_reuses_token_counts(self, chat_service, mock_model):
+        """Test that token counts are cached between turns"""
+        messages = [
+            {"role": "user", "content": "Hello"},
+            {"role": "assistant", "content": "Hi there"}
+        ]
+
+        chat_service.format_conversation_history(messages, max_tokens=512)
+        calls = mock_model.count_tokens.call_count
+        chat_service.format_conversation_history(messages, max_tokens=512)
+
+        assert mock_model.count_tokens.call_count == calls
+
     def test_create_prompt_with_history(self, chat_service):
         """Test creating prompt with conversation history"""
         history = "User: Hello\nAssistant: Hi there"
@@ -113,6 +204,16 @@ class TestChatService:
         assert result == "First response"
         assert "Assistant:" not in result
 
+    def test_stop_markers_follow_config(self, storage_service, mock_model):
+        """Test that configured stop sequences also cut the visible response"""
+        class StopConfig(Config):
+            STOP_SEQUENCES = ["\nUser:", "<|endoftext|>"]
+
+        service = ChatService(storage_service, StopConfig)
+
+        assert service.extract_response("Done<|endoftext|>User: next") == "Done"
+        assert service._visible_response("Done<|endof") == "Done"
+
     def test_process_message_success(self, chat_service, storage_service, mock_model):
         """Test successful message processing"""
         # Create a conversation
@@ -157,6 +258,42 @@ class TestChatService:
         assert "First response" in prompt
         assert "Second message" in prompt
 
+    def test_process_message_builds_input_ids_from_stored_tokens(self, chat_service, storage_service, mock_model):
+        """Test that the prompt ids are concatenated from persisted message tokens"""
+        conv_id = storage_service.create_conversation()
+        storage_service.add_message(conv_id, "user", "First", token_ids=[11, 12])
+        storage_service.add_message(conv_id, "assistant", "Reply", token_ids=[21, 22, 23])
+
+        mock_model.encode.side_effect = lambda text: {
+            "\n": [198],
+            "Assistant:": [48902, 25],
+            "User: Second": [31, 32]
+        }.get(text, [99])
+
+        result = chat_service.process_message(conv_id, "Second")
+
+        kwargs = mock_model.generate_response.call_args.kwargs
+        assert kwargs["input_ids"] == [11, 12, 198, 21, 22, 23, 198, 31, 32, 198, 48902, 25]
+        assert "User: First\nAssistant: Reply\nUser: Second\nAssistant:" == kwargs["prompt"]
+        assert result["metadata"]["prompt_tokens"] == 12
+
+        # Messages of this turn store their token ids as well
+        messages = storage_service.get_messages(conv_id)
+        stored = storage_service.get_token_ids(conv_id, messages)
+        assert stored[2] == [31, 32]
+        assert stored[3] == [99]
+
+    def test_process_message_encodes_legacy_history(self, chat_service, storage_service, mock_model):
+        """Test that messages stored without token ids are encoded on the fly"""
+        conv_id = storage_service.create_conversation()
+        storage_service.add_message(conv_id, "user", "Old message")
+
+        chat_service.process_message(conv_id, "New")
+
+        encoded = [call.args[0] for call in mock_model.encode.call_args_list]
+        assert "User: Old message" in encoded
+        assert mock_model.generate_response.call_args.kwargs["input_ids"] is not None
+
     def test_process_message_with_error(self, chat_service, storage_service, mock_model):
         """Test error handling in message processing"""
         conv_id = storage_service.create_conversation()
@@ -205,3 +342,99 @@ class TestChatService:
         assert lines[0] == "User: First"
         assert lines[1] == "Assistant: Second"
         assert lines[2] == "User: Third"
+
+    def make_streamer(self, mock_model, chunks):
+        """Make generate_response feed the given chunks into a fake streamer"""
+        import queue
+
+        class FakeStreamer:
+            def __init__(self):
+                self.queue = queue.Queue()
+
+            def put_text(self, text):
+                self.queue.put(text)
+
+            def end(self):
+                self.queue.put(None)
+
+            def __iter__(self):
+                while True:
+                    item = self.queue.get(timeout=5)
+                    if item is None:
+                        return
+                    yield item
+
+        streamer = FakeStreamer()
+        mock_model.create_streamer.return_value = streamer
+
+        def generate(**kwargs):
+            for chunk in chunks:
+                kwargs["streamer"].put_text(chunk)
+            kwargs["streamer"].end()
+            return "".join(chunks)
+
+        mock_model.generate_response.side_effect = generate
+
+    def test_stream_message_emits_tokens_and_saves(self, chat_service, storage_service, mock_model):
+        """Test that streamed tokens add up to the saved response"""
+        conv_id = storage_service.create_conversation()
+        self.make_streamer(mock_model, [" Hello", " there", "!"])
+
+        events = list(chat_service.stream_message(conv_id, "Hi"))
+
+        tokens = [e["text"] for e in events if e["event"] == "token"]
+        assert "".join(tokens) == "Hello there!"
+        assert events[-1]["event"] == "done"
+        assert events[-1]["response"] == "Hello there!"
+
+        messages = storage_service.get_messages(conv_id)
+        assert [m["role"] for m in messages] == ["user", "assistant"]
+        assert messages[1]["content"] == "Hello there!"
+
+    def test_stream_message_stops_at_role_marker(self, chat_service, storage_service, mock_model):
+        """Test that the next role turn is never streamed to the client"""
+        conv_id = storage_service.create_conversation()
+        self.make_streamer(mock_model, [" Fine", " thanks", "\n", "User", ":", " more"])
+
+        events = list(chat_service.stream_message(conv_id, "How are you?"))
+
+        streamed = "".join(e["text"] for e in events if e["event"] == "token")
+        assert streamed == "Fine thanks"
+        assert events[-1]["response"] == "Fine thanks"
+        assert storage_service.get_messages(conv_id)[-1]["content"] == "Fine thanks"
+
+    def test_stream_message_holds_back_role_prefix(self, chat_service, storage_service, mock_model):
+        """Test that a generated role prefix is stripped incrementally"""
+        conv_id = storage_service.create_conversation()
+        self.make_streamer(mock_model, [" Assist", "ant", ":", " Sure"])
+
+        events = list(chat_service.stream_message(conv_id, "Help"))
+
+        streamed = "".join(e["text"] for e in events if e["event"] == "token")
+        assert streamed == "Sure"
+        assert events[-1]["response"] == "Sure"
+
+    def test_stream_message_saves_on_disconnect(self, chat_service, storage_service, mock_model):
+        """Test that the response is persisted when the client closes the stream"""
+        conv_id = storage_service.create_conversation()
+        self.make_streamer(mock_model, [" One", " two", " three"])
+
+        stream = chat_service.stream_message(conv_id, "Count")
+        first = next(stream)
+        stream.close()
+
+        assert first["event"] == "token"
+        messages = storage_service.get_messages(conv_id)
+        assert messages[-1]["role"] == "assistant"
+        assert messages[-1]["content"] == "One two three"
+
+    def test_stream_message_with_error(self, chat_service, storage_service, mock_model):
+        """Test that generation errors are reported as an error event"""
+        conv_id = storage_service.create_conversation()
+        self.make_streamer(mock_model, [])
+        mock_model.generate_response.side_effect = Exception("Model error")
+
+        events = list(chat_service.stream_message(conv_id, "Test"))
+
+        assert events[-1]["event"] == "error"
+        assert "Model error" in events[-1]["error"]
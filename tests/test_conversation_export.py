@@ -0,0 +1,168 @@
+import gzip
+import io
+import json
+import uuid
+import pytest
+from datetime import datetime
+from services.backends import SQLiteBackend
+from services.backends.serializers import JSONSerializer
+from services.conversation_export import (
+    iter_ndjson,
+    iter_text,
+    gzip_chunks,
+    buffer_chunks,
+    open_upload,
+    validate_conversation,
+    iter_import_records
+)
+from services.search_index import SearchIndex
+from services.storage_service import StorageService
+
+
+def record(content="Hello there", conversation_id=None):
+    timestamp = datetime.now().isoformat()
+    return {
+        "conversation_id": conversation_id or str(uuid.uuid4()),
+        "created_at": timestamp,
+        "updated_at": timestamp,
+        "messages": [
+            {"role": "user", "content": content, "timestamp": timestamp},
+            {"role": "assistant", "content": "General Kenobi", "timestamp": timestamp}
+        ],
+        "metadata": {"total_messages": 2, "model_config": {"temperature": 0.7}}
+    }
+
+
+def ndjson(records):
+    return b"".join(json.dumps(r).encode("utf-8") + b"\n" for r in records)
+
+
+@pytest.fixture(params=["file", "sqlite"])
+def service(request, temp_data_dir):
+    backend = SQLiteBackend(temp_data_dir / "conversations.db") if request.param == "sqlite" else None
+    service = StorageService(temp_data_dir, backend=backend, search_index=SearchIndex(temp_data_dir / "search.db"))
+    yield service
+    service.close()
+
+
+class TestExportFormats:
+    """Test suite for export encoders and the import parser"""
+
+    def test_ndjson_omits_token_ids(self):
+        conversation = record()
+        conversation["messages"][0]["tokens"] = [1, 2, 3]
+
+        lines = b"".join(iter_ndjson([conversation, record()], JSONSerializer())).splitlines()
+
+        assert len(lines) == 2
+        assert "tokens" not in json.loads(lines[0])["messages"][0]
+        assert json.loads(lines[0])["conversation_id"] == conversation["conversation_id"]
+
+    def test_text_export(self):
+        text = b"".join(iter_text([record("What is Python?")])).decode("utf-8")
+
+        assert "Title: What is Python?" in text
+        assert "User:\nWhat is Python?" in text
+        assert "Temperature: 0.7" in text
+        assert "Top K: N/A" in text
+
+    def test_gzip_and_buffering_roundtrip(self):
+        chunks = [f"line {i}\n".encode() for i in range(1000)]
+
+        buffered = list(buffer_chunks(chunks, 1024))
+        assert all(len(chunk) >= 1024 for chunk in buffered[:-1])
+        assert b"".join(buffered) == b"".join(chunks)
+        assert gzip.decompress(b"".join(gzip_chunks(chunks))) == b"".join(chunks)
+
+    def test_open_upload_detects_gzip(self):
+        data = ndjson([record()])
+
+        assert open_upload(io.BytesIO(gzip.compress(data))).read() == data
+        assert open_upload(io.BytesIO(data)).read() == data
+
+    def test_validate_conversation(self):
+        normalized = validate_conversation({
+            "conversation_id": str(uuid.uuid4()),
+            "messages": [{"role": "user", "content": "hi", "timestamp": "2024-01-01T00:00:00", "tokens": [1]}]
+        })
+
+        assert normalized["created_at"] == normalized["updated_at"] == "2024-01-01T00:00:00"
+        assert normalized["messages"][0] == {"role": "user", "content": "hi", "timestamp": "2024-01-01T00:00:00"}
+        assert normalized["metadata"] == {"total_messages": 1, "model_config": {}}
+
+        for invalid in (
+            [],
+            {"conversation_id": "../../etc/passwd"},
+            {"conversation_id": str(uuid.uuid4()), "messages": [{"role": "system", "content": "x", "timestamp": "t"}]},
+            {"conversation_id": str(uuid.uuid4()), "metadata": {"model_config": "hot"}}
+        ):
+            with pytest.raises(ValueError):
+                validate_conversation(invalid)
+
+    def test_invalid_lines_are_reported(self):
+        report = {}
+        stream = io.BytesIO(ndjson([record()]) + b"{broken\n\n" + ndjson([{"conversation_id": "x"}, record()]))
+
+        records = list(iter_import_records(stream, JSONSerializer(), report))
+
+        assert len(records) == 2
+        assert report["invalid"] == 2
+        assert [error["line"] for error in report["errors"]] == [2, 4]
+
+
+class TestStorageImportExport:
+    """Test suite for batched import and lazy export through StorageService"""
+
+    def test_import_then_export_roundtrip(self, service):
+        records = [record(f"Question {i}") for i in range(7)]
+
+        report = service.import_conversations(records, batch_size=3)
+
+        assert report == {"imported": 7, "skipped": 0}
+        exported = {c["conversation_id"]: c for c in service.export_conversations()}
+        assert set(exported) == {r["conversation_id"] for r in records}
+        first = exported[records[0]["conversation_id"]]
+        assert [m["content"] for m in first["messages"]] == ["Question 0", "General Kenobi"]
+        assert first["metadata"]["model_config"] == {"temperature": 0.7}
+
+    def test_imported_conversations_are_listed_and_searchable(self, service):
+        conversation = record("Importing haystack needle")
+        service.import_conversations([conversation])
+
+        page, _ = service.page_conversations(limit=10)
+        assert page[0]["conversation_id"] == conversation["conversation_id"]
+        assert page[0]["message_count"] == 2
+        assert page[0]["title"] == "Importing haystack needle"
+        assert [r["conversation_id"] for r in service.search("needle")[0]] == [conversation["conversation_id"]]
+
+    def test_existing_and_duplicate_ids_are_skipped(self, service):
+        """Test that import never overwrites a conversation"""
+        conv_id = service.create_conversation()
+        service.add_message(conv_id, "user", "original")
+        duplicate = record("imported twice")
+
+        report = service.import_conversations([record("replacement", conv_id), duplicate, duplicate])
+
+        assert report == {"imported": 1, "skipped": 2}
+        assert [m["content"] for m in service.load_conversation(conv_id)["messages"]] == ["original"]
+        assert len(service.search("twice")[0]) == 1
+
+    def test_imported_conversation_accepts_new_messages(self, service):
+        conversation = record()
+        service.import_conversations([conversation])
+
+        service.add_message(conversation["conversation_id"], "user", "continued")
+
+        messages = service.get_messages(conversation["conversation_id"])
+        assert [m["content"] for m in messages][-1] == "continued"
+        assert len(messages) == 3
+
+    def test_export_includes_pending_write_back_messages(self, temp_data_dir):
+        service = StorageService(temp_data_dir, cache_size=4, write_back=True)
+        conv_id = service.create_conversation()
+        service.add_message(conv_id, "user", "not flushed yet")
+
+        exported = list(service.export_conversations())
+
+        assert [m["content"] for m in exported[0]["messages"]] == ["not flushed yet"]
+        service.close()
@@ -0,0 +1,169 @@
+import pytest
+import threading
+import time
+from services.storage_service import StorageService
+from services.backends import FileBackend, SQLiteBackend
+from services.backends import durability
+from services.backends.durability import GroupCommitter
+import tests.test_storage_service as base
+
+
+@pytest.fixture
+def fsyncs(monkeypatch):
+    """Record fsync'ed paths instead of touching the disk"""
+    calls = []
+    monkeypatch.setattr(durability, "fsync_path", lambda path: calls.append(path))
+    return calls
+
+
+class TestGroupCommitStorageService(base.TestStorageService):
+    """Run the StorageService suite with group commit enabled"""
+
+    @pytest.fixture
+    def storage_service(self, temp_data_dir):
+        backend = FileBackend(temp_data_dir, durability="group", group_commit_ms=1)
+        yield StorageService(temp_data_dir, backend=backend)
+        backend.close()
+
+
+class TestGroupCommitter:
+    """Test suite for GroupCommitter"""
+
+    def test_concurrent_writers_share_fsync(self, fsyncs, tmp_path):
+        committer = GroupCommitter(interval_ms=50, max_writes=1000).start()
+        path = tmp_path / "log"
+
+        threads = [threading.Thread(target=committer.commit, args=([path],)) for _ in range(16)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        committer.stop()
+
+        assert committer.stats["writes"] == 16
+        assert committer.stats["commits"] < 16
+        # The file and its directory once per group
+        assert len(fsyncs) == 2 * committer.stats["commits"]
+
+    def test_full_group_commits_before_interval(self, fsyncs, tmp_path):
+        committer = GroupCommitter(interval_ms=60_000, max_writes=4).start()
+
+        start = time.monotonic()
+        threads = [threading.Thread(target=committer.commit, args=([tmp_path / str(i)],)) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(timeout=10)
+        committer.stop()
+
+        assert time.monotonic() - start < 10
+        assert committer.stats["commits"] == 1
+        assert len(fsyncs) == 5
+
+    def test_group_syncs_files_then_directories(self, fsyncs, tmp_path):
+        paths = [tmp_path / "a" / "log", tmp_path / "b" / "log", tmp_path / "a" / "tokens"]
+
+        committer = GroupCommitter(interval_ms=1).start()
+        committer.commit(paths)
+        committer.stop()
+
+        assert sorted(fsyncs[:3]) == sorted(paths)
+        assert sorted(fsyncs[3:]) == [tmp_path / "a", tmp_path / "b"]
+        assert committer.stats["fsyncs"] == 5
+
+    def test_fsync_error_is_raised_to_writers(self, monkeypatch, tmp_path):
+        def fail(path):
+            raise OSError("I/O error")
+        monkeypatch.setattr(durability, "fsync_path", fail)
+        committer = GroupCommitter(interval_ms=1).start()
+
+        with pytest.raises(OSError):
+            committer.commit([tmp_path / "log"])
+        committer.stop()
+
+    def test_commit_after_stop(self, tmp_path):
+        committer = GroupCommitter().start()
+        committer.stop()
+
+        with pytest.raises(RuntimeError):
+            committer.commit([tmp_path / "log"])
+
+
+class TestFileBackendDurability:
+    """Durability modes of the file backend"""
+
+    def test_unknown_mode(self, temp_data_dir):
+        with pytest.raises(ValueError):
+            FileBackend(temp_data_dir, durability="sometimes")
+
+    def test_write_mode_fsyncs_every_append(self, temp_data_dir, monkeypatch):
+        backend = FileBackend(temp_data_dir, durability="write")
+        service = StorageService(temp_data_dir, backend=backend)
+        conv_id = service.create_conversation()
+
+        calls = []
+        real_fsync = durability.os.fsync
+        monkeypatch.setattr("services.backends.file_backend.os.fsync", lambda fd: calls.append(fd) or real_fsync(fd))
+
+        service.add_message(conv_id, "user", "Hello", token_ids=[1])
+        service.add_message(conv_id, "user", "Again")
+
+        # New tokens file + its directory + log for the first message, log for the second
+        assert len(calls) == 4
+
+    def test_group_mode_waits_for_commit(self, temp_data_dir, fsyncs):
+        backend = FileBackend(temp_data_dir, durability="group", group_commit_ms=1)
+        service = StorageService(temp_data_dir, backend=backend)
+        conv_id = service.create_conversation()
+
+        service.add_message(conv_id, "user", "Hello", token_ids=[1])
+
+        assert backend.committer.stats["writes"] == 1
+        assert backend._get_file_path(conv_id) in fsyncs
+        assert backend._get_tokens_path(conv_id) in fsyncs
+        assert backend._get_tokens_path(conv_id).parent in fsyncs
+        backend.close()
+
+    def test_deferred_sync_waits_once(self, temp_data_dir, fsyncs):
+        backend = FileBackend(temp_data_dir, durability="group", group_commit_ms=200)
+        service = StorageService(temp_data_dir, backend=backend)
+        conv_id = service.create_conversation()
+
+        start = time.monotonic()
+        with backend.deferred_sync():
+            for i in range(10):
+                service.add_message(conv_id, "user", f"message {i}")
+        elapsed = time.monotonic() - start
+
+        # Ten sequential writes share a group instead of waiting 200 ms each
+        assert elapsed < 1.5
+        assert backend.committer.stats["writes"] == 10
+        assert backend.committer.stats["commits"] <= 2
+        backend.close()
+
+    def test_write_back_flush_uses_deferred_sync(self, temp_data_dir, fsyncs):
+        backend = FileBackend(temp_data_dir, durability="group", group_commit_ms=200)
+        service = StorageService(temp_data_dir, backend=backend, cache_size=4, write_back=True)
+        conv_id = service.create_conversation()
+        for i in range(10):
+            service.add_message(conv_id, "user", f"message {i}")
+
+        start = time.monotonic()
+        assert service.flush() == 10
+
+        assert time.monotonic() - start < 1.5
+        assert backend.committer.stats["commits"] <= 2
+        service.close()
+
+
+class TestSQLiteDurability:
+    """Durability settings of the SQLite backend"""
+
+    def test_synchronous_mode(self, temp_data_dir):
+        backend = SQLiteBackend(temp_data_dir / "test.db", synchronous="FULL")
+        assert backend._connection().execute("PRAGMA synchronous").fetchone()[0] == 2
+        backend.close()
+
+    def test_unknown_synchronous_mode(self, temp_data_dir):
+        with pytest.raises(ValueError):
+            SQLiteBackend(temp_data_dir / "test.db", synchronous="SOMETIMES")
@@ -151,3 +151,148 @@ class TestGPT2ChatModel:
 
         # The model should still generate (it will log a warning but not crash)
         mock_model.generate.assert_called_once()
+
+    @patch('models.gpt2_model.GPT2LMHeadModel')
+    @patch('models.gpt2_model.GPT2Tokenizer')
+    def test_generate_response_reuses_session(self, mock_tokenizer_class, mock_model_class):
+        """Test that a second turn feeds cached past_key_values for the shared prefix"""
+        mock_tokenizer = Mock()
+        mock_tokenizer.eos_token = "<|endoftext|>"
+        mock_tokenizer.eos_token_id = 50256
+        mock_tokenizer.decode.return_value = "Response text"
+        mock_tokenizer_class.from_pretrained.return_value = mock_tokenizer
+
+        def make_output(sequence):
+            # Past covers every token except the last generated one
+            seq_len = len(sequence) - 1
+            past = tuple(
+                (torch.zeros(1, 2, seq_len, 4), torch.zeros(1, 2, seq_len, 4))
+                for _ in range(2)
+            )
+            return Mock(sequences=torch.tensor([sequence]), past_key_values=past)
+
+        mock_model = Mock()
+        mock_model.generate.side_effect = [
+            make_output([1, 2, 3, 4, 5]),
+            make_output([1, 2, 3, 4, 7, 8, 9])
+        ]
+        mock_model_class.from_pretrained.return_value = mock_model
+
+        GPT2ChatModel._instance = None
+        model = GPT2ChatModel()
+        model.load_model("openai-community/gpt2")
+        model.enable_sessions(max_sessions=4, max_memory_mb=1)
+
+        # First turn: nothing cached, full prefill
+        mock_tokenizer.encode.return_value = torch.tensor([[1, 2, 3]])
+        model.generate_response("Turn one", session_id="conv")
+        first_call = mock_model.generate.call_args_list[0]
+        assert first_call.kwargs["past_key_values"] is None
+
+        # Second turn shares the first four tokens with the cached session
+        mock_tokenizer.encode.return_value = torch.tensor([[1, 2, 3, 4, 7, 8]])
+        model.generate_response("Turn two", session_id="conv")
+        second_call = mock_model.generate.call_args_list[1]
+        past = second_call.kwargs["past_key_values"]
+        assert past[0][0].shape[2] == 4
+
+        assert model.sessions.stats["hits"] == 1
+        assert model.sessions.stats["misses"] == 1
+        assert model.sessions.stats["reused_tokens"] == 4
+        assert "conv" in model.sessions
+
+    @patch('models.gpt2_model.GPT2LMHeadModel')
+    @patch('models.gpt2_model.GPT2Tokenizer')
+    def test_generate_response_full_prefill_after_trim(self, mock_tokenizer_class, mock_model_class):
+        """Test that a changed prompt prefix falls back to full prefill"""
+        mock_tokenizer = Mock()
+        mock_tokenizer.eos_token = "<|endoftext|>"
+        mock_tokenizer.eos_token_id = 50256
+        mock_tokenizer.decode.return_value = "Response text"
+        mock_tokenizer.encode.return_value = torch.tensor([[9, 8, 7]])
+        mock_tokenizer_class.from_pretrained.return_value = mock_tokenizer
+
+        past = tuple((torch.zeros(1, 2, 4, 4), torch.zeros(1, 2, 4, 4)) for _ in range(2))
+        mock_model = Mock()
+        mock_model.generate.return_value = Mock(
+            sequences=torch.tensor([[9, 8, 7, 6, 5]]),
+            past_key_values=past
+        )
+        mock_model_class.from_pretrained.return_value = mock_model
+
+        GPT2ChatModel._instance = None
+        model = GPT2ChatModel()
+        model.load_model("openai-community/gpt2")
+        model.enable_sessions()
+
+        from models.kv_cache import KVCacheSession
+        model.sessions.put("conv", KVCacheSession([1, 2, 3, 4], past))
+
+        model.generate_response("Trimmed history", session_id="conv")
+
+        assert mock_model.generate.call_args.kwargs["past_key_values"] is None
+        assert model.sessions.stats["misses"] == 1
+        assert model.drop_session("conv") is True
+
+    @patch('models.gpt2_model.GPT2LMHeadModel')
+    @patch('models.gpt2_model.GPT2Tokenizer')
+    def test_generate_response_with_batching_engine(self, mock_tokenizer_class, mock_model_class):
+        """Test that generate_response routes through the batching engine"""
+        from transformers import GPT2Config, GPT2LMHeadModel
+
+        mock_tokenizer = Mock()
+        mock_tokenizer.eos_token = "<|endoftext|>"
+        mock_tokenizer.eos_token_id = 99
+        mock_tokenizer.encode.return_value = torch.tensor([[1, 2, 3]])
+        mock_tokenizer.decode.return_value = "Batched response"
+        mock_tokenizer_class.from_pretrained.return_value = mock_tokenizer
+
+        GPT2ChatModel._instance = None
+        model = GPT2ChatModel()
+        model.load_model("openai-community/gpt2")
+        config = GPT2Config(vocab_size=100, n_positions=64, n_embd=16, n_layer=1, n_head=2)
+        model.model = GPT2LMHeadModel(config).eval()
+        model.enable_sessions()
+        model.enable_batching(max_batch_size=2)
+
+        try:
+            response = model.generate_response("Test prompt", max_length=5, session_id="conv")
+        finally:
+            model.disable_batching()
+
+        assert response == "Batched response"
+        assert "conv" in model.sessions
+        decoded_tokens = mock_tokenizer.decode.call_args.args[0]
+        assert len(decoded_tokens) <= 5
+
+    @patch('models.gpt2_model.GPT2LMHeadModel')
+    @patch('models.gpt2_model.GPT2Tokenizer')
+    def test_generate_response_stop_sequences(self, mock_tokenizer_class, mock_model_class):
+        """Test that stop sequences are passed as stopping criteria and counted"""
+        mock_tokenizer = Mock()
+        mock_tokenizer.eos_token = "<|endoftext|>"
+        mock_tokenizer.eos_token_id = 50256
+        mock_tokenizer.encode.return_value = torch.tensor([[1, 2, 3]])
+        mock_tokenizer.decode.return_value = "Reply\nUser:"
+        mock_tokenizer_class.from_pretrained.return_value = mock_tokenizer
+
+        mock_model = Mock()
+
+        def generate(inputs, **kwargs):
+            # Simulate the criteria firing after two new tokens
+            output = torch.tensor([[1, 2, 3, 4, 5]])
+            assert kwargs["stopping_criteria"][0](output, None) is True
+            return output
+
+        mock_model.generate.side_effect = generate
+        mock_model_class.from_pretrained.return_value = mock_model
+
+        GPT2ChatModel._instance = None
+        model = GPT2ChatModel()
+        model.load_model("openai-community/gpt2")
+
+        model.generate_response("Test prompt", max_length=100, stop_sequences=["\nUser:"])
+
+        assert model.stop_stats["stopped"] == 1
+        assert model.stop_stats["tokens_saved"] == 98
+        assert model.get_stats()["stop_sequences"]["tokens_saved"] == 98
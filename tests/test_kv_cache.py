@@ -0,0 +1,106 @@
+import pytest
+import torch
+from models.kv_cache import (
+    SessionCache,
+    KVCacheSession,
+    common_prefix_length,
+    crop_past,
+    past_nbytes
+)
+
+
+def make_past(seq_len, layers=2):
+    """Create fake past_key_values with shape [1, 2, seq_len, 4]"""
+    return tuple(
+        (torch.zeros(1, 2, seq_len, 4), torch.zeros(1, 2, seq_len, 4))
+        for _ in range(layers)
+    )
+
+
+class TestKVCacheHelpers:
+    """Test suite for KV-cache helper functions"""
+
+    def test_common_prefix_length(self):
+        """Test common prefix of token sequences"""
+        assert common_prefix_length([1, 2, 3, 4], [1, 2, 3, 9]) == 3
+        assert common_prefix_length([1, 2], [1, 2, 3]) == 2
+        assert common_prefix_length([5, 2], [1, 2]) == 0
+        assert common_prefix_length([], [1]) == 0
+
+    def test_crop_past(self):
+        """Test cropping past_key_values along the sequence axis"""
+        cropped = crop_past(make_past(10), 4)
+
+        assert len(cropped) == 2
+        assert cropped[0][0].shape == (1, 2, 4, 4)
+        assert cropped[1][1].shape == (1, 2, 4, 4)
+
+    def test_past_nbytes(self):
+        """Test memory accounting of past_key_values"""
+        # 2 layers * 2 tensors * (2 * 10 * 4) float32 values
+        assert past_nbytes(make_past(10)) == 2 * 2 * 80 * 4
+
+
+class TestSessionCache:
+    """Test suite for SessionCache"""
+
+    def test_take_removes_session(self):
+        """Test that take hands the session out exclusively"""
+        cache = SessionCache()
+        cache.put("conv", KVCacheSession([1, 2, 3], make_past(3)))
+
+        session = cache.take("conv")
+
+        assert session is not None
+        assert session.token_ids == [1, 2, 3]
+        assert "conv" not in cache
+        assert cache.total_bytes == 0
+        assert cache.take("conv") is None
+
+    def test_lru_eviction_by_count(self):
+        """Test that least recently used sessions are evicted first"""
+        cache = SessionCache(max_sessions=2)
+        cache.put("a", KVCacheSession([1], make_past(1)))
+        cache.put("b", KVCacheSession([1], make_past(1)))
+        cache.put("a", cache.take("a"))
+        cache.put("c", KVCacheSession([1], make_past(1)))
+
+        assert "a" in cache
+        assert "b" not in cache
+        assert "c" in cache
+        assert cache.stats["evictions"] == 1
+
+    def test_eviction_by_memory(self):
+        """Test that the memory cap is enforced"""
+        one_session = past_nbytes(make_past(10))
+        cache = SessionCache(max_sessions=10, max_bytes=one_session * 2)
+
+        for name in ["a", "b", "c"]:
+            cache.put(name, KVCacheSession([1], make_past(10)))
+
+        assert len(cache) == 2
+        assert cache.total_bytes <= cache.max_bytes
+        assert "a" not in cache
+
+    def test_oversized_session_not_cached(self):
+        """Test that a session larger than the cap is skipped"""
+        cache = SessionCache(max_bytes=16)
+        cache.put("big", KVCacheSession([1], make_past(10)))
+
+        assert len(cache) == 0
+        assert cache.total_bytes == 0
+
+    def test_drop_and_record(self):
+        """Test dropping sessions and hit/miss counters"""
+        cache = SessionCache()
+        cache.put("conv", KVCacheSession([1], make_past(1)))
+
+        assert cache.drop("conv") is True
+        assert cache.drop("conv") is False
+
+        cache.record(reused_tokens=5, prefilled_tokens=2)
+        cache.record(reused_tokens=0, prefilled_tokens=7)
+        assert cache.stats["hits"] == 1
+        assert cache.stats["misses"] == 1
+        assert cache.stats["reused_tokens"] == 5
+        assert cache.stats["prefilled_tokens"] == 9
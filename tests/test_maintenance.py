@@ -0,0 +1,253 @@
+import threading
+import time
+import uuid
+import pytest
+from datetime import datetime, timedelta
+from services.backends import FileBackend, SQLiteBackend, base
+from services.maintenance import MaintenanceWorker, RateLimiter
+from services.search_index import SearchIndex
+from services.storage_service import StorageService
+
+
+def old_record(days, content="old conversation"):
+    timestamp = (datetime.now() - timedelta(days=days)).isoformat()
+    return {
+        "conversation_id": str(uuid.uuid4()),
+        "created_at": timestamp,
+        "updated_at": timestamp,
+        "messages": [{"role": "user", "content": content, "timestamp": timestamp}],
+        "metadata": {"total_messages": 1, "model_config": {}}
+    }
+
+
+@pytest.fixture(params=["file", "sqlite"])
+def service(request, temp_data_dir):
+    backend = SQLiteBackend(temp_data_dir / "conversations.db") if request.param == "sqlite" else None
+    service = StorageService(temp_data_dir, backend=backend, search_index=SearchIndex(temp_data_dir / "search.db"))
+    yield service
+    service.close()
+
+
+class TestRateLimiter:
+    """Test suite for the maintenance token bucket"""
+
+    def test_limits_rate(self):
+        limiter = RateLimiter(50, threading.Event())
+
+        start = time.monotonic()
+        for _ in range(60):
+            assert limiter.acquire()
+
+        # 50 з запасу + 10 з очікуванням по 20 мс
+        assert time.monotonic() - start >= 0.15
+        assert limiter.waited > 0
+
+    def test_stop_interrupts_wait(self):
+        stop = threading.Event()
+        limiter = RateLimiter(0.1, stop)
+        assert limiter.acquire()
+
+        threading.Timer(0.05, stop.set).start()
+        start = time.monotonic()
+        assert limiter.acquire() is False
+        assert time.monotonic() - start < 2
+
+
+class TestStorageMaintenance:
+    """Test suite for retention, compaction and index repair"""
+
+    def test_expire_conversations(self, service):
+        expired = old_record(40, "expired words")
+        kept = old_record(5)
+        service.import_conversations([expired, kept])
+        fresh = service.create_conversation()
+
+        assert service.expire_conversations(30) == 1
+
+        assert not service.backend.exists(expired["conversation_id"])
+        assert service.backend.exists(kept["conversation_id"])
+        assert service.backend.exists(fresh)
+        assert service.search("expired") == ([], None)
+
+    def test_expire_keeps_conversations_with_pending_messages(self, temp_data_dir):
+        """Test that a message arriving after the flush protects the conversation"""
+        service = StorageService(temp_data_dir, cache_size=4, write_back=True)
+        record = old_record(40)
+        service.import_conversations([record])
+        service.flush = lambda conversation_id=None: 0
+        service.add_message(record["conversation_id"], "user", "I am back")
+
+        assert service.expire_conversations(30) == 0
+        assert service.backend.exists(record["conversation_id"])
+        del service.flush
+        service.close()
+
+    def test_throttle_stops_pass(self, service):
+        service.import_conversations([old_record(40) for _ in range(3)])
+        calls = []
+
+        def throttle():
+            calls.append(1)
+            return len(calls) < 2
+
+        assert service.expire_conversations(30, throttle=throttle) == 1
+        assert len(service.list_conversations()) == 2
+
+    def test_compact_pending(self, temp_data_dir):
+        service = StorageService(temp_data_dir)
+        conv_id = service.create_conversation()
+        for i in range(FileBackend.COMPACT_IDLE_META_RECORDS):
+            service.add_message(conv_id, "user", f"message {i}", model_config={"temperature": i})
+        log_path = service.backend._get_file_path(conv_id)
+        size = log_path.stat().st_size
+
+        assert service.backend.compaction_candidates() == [conv_id]
+        assert service.compact_pending() == 1
+
+        assert log_path.stat().st_size < size
+        assert service.backend.compaction_candidates() == []
+        assert len(service.get_messages(conv_id)) == FileBackend.COMPACT_IDLE_META_RECORDS
+        service.close()
+
+    def test_repair_conversation_index(self, temp_data_dir):
+        service = StorageService(temp_data_dir)
+        record = old_record(1, "Lost index entry")
+        service.import_conversations([record])
+        service.backend.index.remove(record["conversation_id"])
+        service.backend.index.add({
+            "conversation_id": "stale", "created_at": "2020", "updated_at": "2020", "message_count": 0, "title": ""
+        })
+
+        assert service.repair_indexes() == 2
+
+        page, _ = service.page_conversations(limit=10)
+        assert [(item["conversation_id"], item["title"]) for item in page] == [
+            (record["conversation_id"], "Lost index entry")
+        ]
+        assert service.repair_indexes() == 0
+        service.close()
+
+    def test_repair_resumes_from_last_id_range(self, temp_data_dir, monkeypatch):
+        monkeypatch.setattr(base, "ID_SCAN_BATCH", 1)
+        service = StorageService(temp_data_dir)
+        record = old_record(1)
+        record["conversation_id"] = "ff" + record["conversation_id"][2:]
+        service.import_conversations([record])
+        service.backend.index.remove(record["conversation_id"])
+        before = datetime.now().isoformat()
+
+        def budget(steps):
+            calls = iter(range(steps))
+            return lambda: next(calls, None) is not None
+
+        # Кожен діапазон id - окремий крок обмежувача, тож прохід зупиняється до шарду "ff"
+        assert service.backend.repair_index(before, throttle=budget(100)) == 0
+        assert service.backend.repair_index(before, throttle=budget(200)) == 1
+        assert service.backend.index.ids("ff") == [record["conversation_id"]]
+        service.close()
+
+    def test_repair_search_index(self, service):
+        idle = old_record(1, "reconciled needle")
+        service.import_conversations([idle])
+        service.search_index.remove(idle["conversation_id"])
+        service.search_index.add_message("deleted-elsewhere", {"role": "user", "content": "ghost", "timestamp": "t"})
+        active = service.create_conversation()
+
+        assert service.repair_indexes() == 2
+
+        assert [r["conversation_id"] for r in service.search("needle")[0]] == [idle["conversation_id"]]
+        assert service.search("ghost") == ([], None)
+        # Щойно створена розмова не чіпається до кінця вікна grace_seconds
+        assert active not in service.search_index.document_ids()
+
+
+class TestMaintenanceWorker:
+    """Test suite for the background maintenance worker"""
+
+    def test_run_once_reports_tasks(self, service):
+        service.import_conversations([old_record(40), old_record(1)])
+        worker = MaintenanceWorker(service, interval=0, retention_days=30, max_ops_per_second=0)
+
+        run = worker.run_once()
+
+        assert set(run["tasks"]) == set(MaintenanceWorker.TASKS)
+        assert run["tasks"]["retention"]["changed"] == 1
+        assert all("duration_ms" in result and "error" not in result for result in run["tasks"].values())
+        status = worker.get_status()
+        assert status["runs"] == 1
+        assert status["last_run"] == run
+        assert status["current"] is None
+
+    def test_retention_disabled(self, service):
+        service.import_conversations([old_record(400)])
+        worker = MaintenanceWorker(service, interval=0, retention_days=0)
+
+        result = worker.run_once()["tasks"]["retention"]
+
+        assert result["skipped"] is True
+        assert result["processed"] == 0
+        assert len(service.list_conversations()) == 1
+
+    def test_archive_task(self, temp_data_dir):
+        service = StorageService(temp_data_dir)
+        idle, recent = old_record(40), old_record(1)
+        service.import_conversations([idle, recent])
+        worker = MaintenanceWorker(service, interval=0, archive_after_days=30, max_ops_per_second=0)
+
+        result = worker.run_once()["tasks"]["archive"]
+
+        assert result["changed"] == 1
+        assert result["processed"] == 1
+        assert service.backend.index.archived(idle["conversation_id"]) is not None
+        assert service.backend.index.archived(recent["conversation_id"]) is None
+        assert worker.get_status()["archive_after_days"] == 30
+        service.close()
+
+    def test_restored_conversation_is_not_rearchived(self, temp_data_dir):
+        service = StorageService(temp_data_dir)
+        idle = old_record(40)
+        service.import_conversations([idle])
+        worker = MaintenanceWorker(service, interval=0, archive_after_days=30, max_ops_per_second=0)
+        assert worker.run_once()["tasks"]["archive"]["changed"] == 1
+
+        assert service.backend.load(idle["conversation_id"]) is not None
+        result = worker.run_once()["tasks"]["archive"]
+
+        assert result["changed"] == 0
+        assert service.backend.index.archived(idle["conversation_id"]) is None
+        service.close()
+
+    def test_archive_disabled(self, service):
+        service.import_conversations([old_record(400)])
+        worker = MaintenanceWorker(service, interval=0)
+
+        assert worker.run_once()["tasks"]["archive"]["skipped"] is True
+
+    def test_task_error_is_reported(self, service):
+        worker = MaintenanceWorker(service, interval=0)
+
+        def fail(*args):
+            raise RuntimeError("disk on fire")
+
+        service.compact_pending = fail
+        run = worker.run_once()
+
+        assert run["tasks"]["compaction"]["error"] == "disk on fire"
+        assert "error" not in run["tasks"]["indexes"]
+
+    def test_trigger_runs_in_background(self, service):
+        worker = MaintenanceWorker(service, interval=0)
+        assert worker.trigger() is False
+
+        worker.start()
+        try:
+            assert worker.get_status()["next_run_at"] is None
+            assert worker.trigger()
+            deadline = time.monotonic() + 5
+            while worker.get_status()["runs"] == 0 and time.monotonic() < deadline:
+                time.sleep(0.01)
+            assert worker.get_status()["runs"] == 1
+        finally:
+            worker.stop()
+
+        assert worker.get_status()["running"] is False
@@ -0,0 +1,151 @@
+import pytest
+from services.backends import FileBackend, SQLiteBackend
+from services.backends.base import StorageBackend, encode_message_cursor
+from services.storage_service import StorageService
+
+
+@pytest.fixture(params=["file", "sqlite"])
+def service(request, temp_data_dir):
+    backend = SQLiteBackend(temp_data_dir / "conversations.db") if request.param == "sqlite" else None
+    service = StorageService(temp_data_dir, backend=backend)
+    yield service
+    service.close()
+
+
+def fill(service, count):
+    conv_id = service.create_conversation()
+    for i in range(count):
+        # Записи налаштувань між повідомленнями не мають потрапляти в сторінки
+        service.add_message(conv_id, "user" if i % 2 == 0 else "assistant", f"message {i}",
+                            model_config={"temperature": i} if i % 3 == 0 else None)
+    return conv_id
+
+
+def contents(messages):
+    return [m["content"] for m in messages]
+
+
+class TestMessagePages:
+    """Test suite for cursor-paginated message reads"""
+
+    def test_latest_page(self, service):
+        conv_id = fill(service, 10)
+
+        messages, prev_cursor, next_cursor = service.get_message_page(conv_id, 4)
+
+        assert contents(messages) == [f"message {i}" for i in range(6, 10)]
+        assert prev_cursor is not None
+        assert next_cursor is None
+
+    def test_walk_backward_and_forward(self, service):
+        """Test that before/after cursors cover every message exactly once"""
+        conv_id = fill(service, 23)
+        expected = [f"message {i}" for i in range(23)]
+
+        pages = []
+        messages, cursor, _ = service.get_message_page(conv_id, 5)
+        pages.append(messages)
+        while cursor is not None:
+            messages, cursor, newer = service.get_message_page(conv_id, 5, before=cursor)
+            assert newer is not None
+            pages.append(messages)
+        assert contents(m for page in reversed(pages) for m in page) == expected
+        assert len(pages[-1]) == 3
+
+        first, _, cursor = service.get_message_page(conv_id, 5, before=service.get_message_page(conv_id, 18)[1])
+        forward = list(first)
+        while cursor is not None:
+            messages, older, cursor = service.get_message_page(conv_id, 5, after=cursor)
+            assert older is not None
+            forward.extend(messages)
+        assert contents(forward) == expected
+
+    def test_whole_conversation_fits(self, service):
+        conv_id = fill(service, 3)
+
+        assert service.get_message_page(conv_id, 10) == (service.get_messages(conv_id), None, None)
+        assert service.get_message_page(service.create_conversation(), 10) == ([], None, None)
+        assert service.get_message_page("missing", 10) == ([], None, None)
+
+    def test_new_messages_after_last_page(self, service):
+        conv_id = fill(service, 4)
+        _, _, next_cursor = service.get_message_page(conv_id, 2, before=service.get_message_page(conv_id, 2)[1])
+        service.add_message(conv_id, "user", "late message")
+
+        messages, _, next_cursor = service.get_message_page(conv_id, 10, after=next_cursor)
+
+        assert contents(messages) == ["message 2", "message 3", "late message"]
+        assert next_cursor is None
+
+    def test_pending_write_back_messages(self, temp_data_dir):
+        service = StorageService(temp_data_dir, cache_size=4, write_back=True)
+        conv_id = service.create_conversation()
+        service.add_message(conv_id, "user", "unflushed")
+
+        assert contents(service.get_message_page(conv_id, 5)[0]) == ["unflushed"]
+        service.close()
+
+    def test_invalid_arguments(self, service):
+        conv_id = fill(service, 3)
+        _, cursor, _ = service.get_message_page(conv_id, 1)
+
+        with pytest.raises(ValueError):
+            service.get_message_page(conv_id, 0)
+        with pytest.raises(ValueError):
+            service.get_message_page(conv_id, 1, before=cursor, after=cursor)
+        with pytest.raises(ValueError):
+            service.get_message_page(conv_id, 1, before="not-a-cursor")
+
+
+class TestFileMessagePages:
+    """Test suite for offset cursors of the file backend"""
+
+    def test_cursor_survives_compaction(self, temp_data_dir):
+        """Test that a cursor whose offset moved is resolved by timestamp"""
+        service = StorageService(temp_data_dir)
+        conv_id = fill(service, 12)
+        _, cursor, _ = service.get_message_page(conv_id, 4)
+
+        service.compact(conv_id)
+        messages, _, _ = service.get_message_page(conv_id, 4, before=cursor)
+
+        assert contents(messages) == [f"message {i}" for i in range(4, 8)]
+        service.close()
+
+    def test_small_blocks(self, temp_data_dir, monkeypatch):
+        """Test that offsets stay correct when lines span read blocks"""
+        monkeypatch.setattr(FileBackend, "TAIL_BLOCK_SIZE", 37)
+        service = StorageService(temp_data_dir)
+        conv_id = fill(service, 9)
+
+        collected = []
+        messages, cursor, _ = service.get_message_page(conv_id, 2)
+        collected = messages + collected
+        while cursor is not None:
+            messages, cursor, _ = service.get_message_page(conv_id, 2, before=cursor)
+            collected = messages + collected
+
+        assert contents(collected) == [f"message {i}" for i in range(9)]
+        service.close()
+
+    def test_unknown_cursor(self, temp_data_dir):
+        service = StorageService(temp_data_dir)
+        conv_id = fill(service, 3)
+
+        with pytest.raises(ValueError):
+            service.get_message_page(conv_id, 2, before=encode_message_cursor(5, "1999-01-01T00:00:00"))
+        service.close()
+
+    def test_default_implementation(self, temp_data_dir):
+        """Test the position-based fallback used by backends without page reads"""
+        backend = FileBackend(temp_data_dir)
+        service = StorageService(temp_data_dir, backend=backend)
+        conv_id = fill(service, 7)
+
+        messages, cursor, _ = StorageBackend.get_message_page(backend, conv_id, 3)
+        older, _, newer = StorageBackend.get_message_page(backend, conv_id, 3, before=cursor)
+
+        assert contents(messages) == ["message 4", "message 5", "message 6"]
+        assert contents(older) == ["message 1", "message 2", "message 3"]
+        assert contents(StorageBackend.get_message_page(backend, conv_id, 3, after=newer)[0]) == contents(messages)
+        service.close()
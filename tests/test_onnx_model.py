@@ -0,0 +1,122 @@
+import shutil
+import pytest
+import torch
+from unittest.mock import patch
+from transformers import GPT2LMHeadModel
+
+pytest.importorskip("onnxruntime")
+pytest.importorskip("onnx")
+
+from models.onnx_model import OnnxCache, OnnxGPT2LMHeadModel, ONNX_FILE
+from models.gpt2_model import GPT2ChatModel
+
+
+@pytest.fixture
+def chat_model():
+    GPT2ChatModel._instance = None
+    model = GPT2ChatModel()
+    yield model
+    model.disable_batching()
+    GPT2ChatModel._instance = None
+
+
+class TestOnnxModel:
+    """Test suite for the onnxruntime inference backend"""
+
+    def test_matches_torch(self, temp_data_dir, source_model):
+        """Prefill and cached decoding steps give the same logits as PyTorch"""
+        model, tokenizer, info = OnnxCache(temp_data_dir / "cache").load(source_model)
+        reference = GPT2LMHeadModel.from_pretrained(source_model).eval()
+        input_ids = torch.tensor([[1, 2, 3, 1]])
+
+        with torch.no_grad():
+            outputs = model(input_ids, use_cache=True)
+            expected = reference(input_ids, use_cache=True)
+            assert torch.allclose(outputs.logits, expected.logits, atol=1e-5)
+
+            step = model(torch.tensor([[2]]), past_key_values=outputs.past_key_values)
+            expected_step = reference(torch.tensor([[2]]), past_key_values=expected.past_key_values)
+            assert torch.allclose(step.logits, expected_step.logits, atol=1e-5)
+            assert step.past_key_values[0][0].shape[2] == 5
+
+        assert isinstance(model, OnnxGPT2LMHeadModel)
+        assert tokenizer.encode("ab") == [1, 2]
+        assert info["path"].endswith(ONNX_FILE)
+
+    def test_left_padded_batch(self, temp_data_dir, source_model):
+        """A padded batch with an attention mask matches unpadded single sequences"""
+        model, _, _ = OnnxCache(temp_data_dir / "cache").load(source_model)
+        input_ids = torch.tensor([[0, 0, 1, 2], [3, 1, 2, 3]])
+        attention_mask = torch.tensor([[0, 0, 1, 1], [1, 1, 1, 1]])
+        position_ids = torch.tensor([[1, 1, 0, 1], [0, 1, 2, 3]])
+
+        with torch.no_grad():
+            batch = model(input_ids, attention_mask=attention_mask, position_ids=position_ids).logits
+            single = model(torch.tensor([[1, 2]])).logits
+
+        assert torch.allclose(batch[0, 2:], single[0], atol=1e-5)
+
+    def test_greedy_generation_matches_torch(self, temp_data_dir, source_model):
+        model, _, _ = OnnxCache(temp_data_dir / "cache").load(source_model)
+        reference = GPT2LMHeadModel.from_pretrained(source_model).eval()
+        input_ids = torch.tensor([[1, 2, 3]])
+
+        kwargs = {"max_new_tokens": 8, "do_sample": False, "pad_token_id": 0}
+        assert torch.equal(model.generate(input_ids, **kwargs), reference.generate(input_ids, **kwargs))
+
+    def test_export_happens_once(self, temp_data_dir, source_model):
+        """The exported model is cached and reused"""
+        cache = OnnxCache(temp_data_dir / "cache")
+        cache.load(source_model)
+
+        with patch.object(OnnxCache, 'convert') as convert:
+            cache.load(source_model)
+            convert.assert_not_called()
+
+        assert cache.check(cache.path_for(source_model), source_model) is None
+
+    def test_pre_exported_directory(self, temp_data_dir, source_model):
+        """A model directory with onnx/decoder_model_merged.onnx is loaded without exporting"""
+        exported = OnnxCache(temp_data_dir / "cache").ensure(source_model)
+        model_dir = temp_data_dir / "exported"
+        shutil.copytree(exported, model_dir)
+        (model_dir / "onnx").mkdir()
+        (model_dir / ONNX_FILE).rename(model_dir / "onnx" / ONNX_FILE)
+
+        cache = OnnxCache(temp_data_dir / "other-cache")
+        with patch.object(OnnxCache, 'convert') as convert:
+            model, tokenizer, info = cache.load(str(model_dir))
+            convert.assert_not_called()
+
+        assert info["path"] == str(model_dir / "onnx" / ONNX_FILE)
+        assert info["verified"] is False
+        assert tokenizer.encode("ab") == [1, 2]
+
+    def test_chat_model_backend(self, temp_data_dir, source_model, chat_model):
+        """GPT2ChatModel generates through onnxruntime with KV sessions and batching"""
+        chat_model.load_model(source_model, cache_dir=temp_data_dir / "cache", backend="onnx", quantization="int8")
+        chat_model.enable_sessions()
+
+        assert chat_model.get_stats()["weights"]["backend"] == "onnx"
+        # Quantization applies to the torch backend only
+        assert chat_model.get_stats()["weights"]["quantization"] == "none"
+
+        assert isinstance(chat_model.generate_response("ab", max_length=4, session_id="s"), str)
+        assert isinstance(chat_model.generate_response("ab ab", max_length=4, session_id="s"), str)
+        assert chat_model.sessions.stats["hits"] == 1
+
+        chat_model.enable_batching(max_batch_size=2)
+        assert isinstance(chat_model.generate_response("ba", max_length=4), str)
+        assert chat_model.count_tokens("ab") == 2
+
+    def test_falls_back_without_onnxruntime(self, temp_data_dir, source_model, chat_model):
+        """Without onnxruntime the torch backend is used"""
+        with patch('models.onnx_model.ort', None):
+            chat_model.load_model(source_model, cache_dir=temp_data_dir / "cache", backend="onnx")
+
+        assert isinstance(chat_model.model, GPT2LMHeadModel)
+        assert chat_model.get_stats()["weights"]["backend"] == "torch"
+
+    def test_unknown_backend(self, chat_model):
+        with pytest.raises(ValueError):
+            chat_model.load_model("openai-community/gpt2", backend="tensorrt")
@@ -0,0 +1,78 @@
+import pytest
+import torch
+from torch import nn
+from transformers import GPT2Config, GPT2LMHeadModel
+from transformers.pytorch_utils import Conv1D
+
+from models.gpt2_model import GPT2ChatModel
+from models.quantization import bf16_supported, conv1d_to_linear, quantize_model
+
+
+@pytest.fixture
+def tiny_model():
+    torch.manual_seed(0)
+    config = GPT2Config(vocab_size=64, n_positions=32, n_embd=32, n_layer=2, n_head=2)
+    return GPT2LMHeadModel(config).eval()
+
+
+class TestQuantization:
+    """Test suite for int8 / bf16 inference modes"""
+
+    def test_conv1d_to_linear_keeps_outputs(self, tiny_model):
+        """Conv1D layers become nn.Linear views of the same weights"""
+        input_ids = torch.tensor([[1, 2, 3, 4]])
+        with torch.no_grad():
+            reference = tiny_model(input_ids).logits
+
+        weight = tiny_model.transformer.h[0].attn.c_attn.weight
+        assert conv1d_to_linear(tiny_model) == 8
+        assert not any(isinstance(module, Conv1D) for module in tiny_model.modules())
+        assert tiny_model.transformer.h[0].attn.c_attn.weight.data_ptr() == weight.data_ptr()
+
+        with torch.no_grad():
+            assert torch.allclose(tiny_model(input_ids).logits, reference, atol=1e-5)
+
+    def test_int8(self, tiny_model):
+        """Linear layers are dynamically quantized, outputs stay close to fp32"""
+        input_ids = torch.tensor([[1, 2, 3, 4]])
+        with torch.no_grad():
+            reference = tiny_model(input_ids).logits
+
+        assert quantize_model(tiny_model, "int8") == "int8"
+        c_attn = tiny_model.transformer.h[0].attn.c_attn
+        assert isinstance(c_attn, torch.ao.nn.quantized.dynamic.Linear)
+        assert isinstance(tiny_model.lm_head, torch.ao.nn.quantized.dynamic.Linear)
+        assert not any(type(module) is nn.Linear for module in tiny_model.modules())
+
+        with torch.no_grad():
+            logits = tiny_model(input_ids).logits
+        assert (logits - reference).abs().max() < 0.1 * reference.abs().max()
+
+    def test_int8_is_cpu_only(self, tiny_model):
+        """int8 on another device falls back to fp32"""
+        assert quantize_model(tiny_model, "int8", device="cuda") == "none"
+        assert isinstance(tiny_model.transformer.h[0].attn.c_attn, Conv1D)
+
+    def test_bf16(self, tiny_model):
+        """bf16 converts the model only where the CPU supports it"""
+        applied = quantize_model(tiny_model, "bf16")
+
+        expected = torch.bfloat16 if bf16_supported() else torch.float32
+        assert applied == ("bf16" if bf16_supported() else "none")
+        assert tiny_model.transformer.wte.weight.dtype == expected
+
+    def test_unknown_mode(self, tiny_model):
+        with pytest.raises(ValueError):
+            quantize_model(tiny_model, "int4")
+
+    def test_chat_model_generates_with_int8(self, temp_data_dir, source_model):
+        """GPT2ChatModel applies quantization after loading (mmap cache included)"""
+        GPT2ChatModel._instance = None
+        try:
+            model = GPT2ChatModel()
+            model.load_model(source_model, cache_dir=temp_data_dir / "cache", quantization="int8")
+
+            assert model.get_stats()["weights"]["quantization"] == "int8"
+            assert isinstance(model.generate_response("ab", max_length=5), str)
+        finally:
+            GPT2ChatModel._instance = None
@@ -1,5 +1,10 @@
 import pytest
+import gzip
 import json
+import subprocess
+import sys
+import uuid
+from pathlib import Path
 from unittest.mock import patch, Mock
 
 
@@ -21,7 +26,7 @@ class TestRoutes:
         assert 'conversation_id' in data
         assert len(data['conversation_id']) == 36  # UUID length
 
-    def test_send_message_success(self, client):
+    def test_send_message_success(self, client, app_services):
         """Test sending a message to a conversation"""
         # First create a conversation
         create_response = client.post('/api/conversations')
@@ -29,7 +34,7 @@ class TestRoutes:
         conv_id = conv_data['conversation_id']
 
         # Mock the chat service to avoid actually running the model
-        with patch('api.routes.chat_service') as mock_chat_service:
+        with patch.object(app_services, 'chat') as mock_chat_service:
             mock_chat_service.process_message.return_value = {
                 "success": True,
                 "response": "Test response",
@@ -49,6 +54,41 @@ class TestRoutes:
             assert data['success'] is True
             assert data['response'] == "Test response"
 
+    def test_stream_message(self, client, app_services):
+        """Test streaming a reply as Server-Sent Events"""
+        create_response = client.post('/api/conversations')
+        conv_id = json.loads(create_response.data)['conversation_id']
+
+        with patch.object(app_services, 'chat') as mock_chat_service:
+            mock_chat_service.stream_message.return_value = iter([
+                {"event": "token", "text": "Hello"},
+                {"event": "done", "response": "Hello", "conversation_id": conv_id}
+            ])
+
+            response = client.post(
+                f'/api/conversations/{conv_id}/messages/stream',
+                data=json.dumps({'message': 'Hi'}),
+                content_type='application/json'
+            )
+
+            assert response.status_code == 200
+            assert response.mimetype == 'text/event-stream'
+            body = response.get_data(as_text=True)
+            assert 'event: token\ndata: {"text": "Hello"}' in body
+            assert 'event: done' in body
+
+    def test_stream_message_missing_message(self, client):
+        """Test streaming endpoint validates the request body"""
+        response = client.post(
+            '/api/conversations/some-id/messages/stream',
+            data=json.dumps({}),
+            content_type='application/json'
+        )
+
+        assert response.status_code == 400
+        data = json.loads(response.data)
+        assert data['success'] is False
+
     def test_send_message_missing_message(self, client):
         """Test sending message without message field"""
         create_response = client.post('/api/conversations')
@@ -98,6 +138,28 @@ class TestRoutes:
         assert data['success'] is True
         assert data['messages'] == []
 
+    def test_get_messages_pages(self, client, app_services):
+        """Test cursor pagination of conversation messages"""
+        storage_service = app_services.storage
+
+        conv_id = json.loads(client.post('/api/conversations').data)['conversation_id']
+        for i in range(5):
+            storage_service.add_message(conv_id, "user", f"message {i}")
+
+        data = json.loads(client.get(f'/api/conversations/{conv_id}/messages?limit=2').data)
+        assert [m['content'] for m in data['messages']] == ["message 3", "message 4"]
+        assert data['next_cursor'] is None
+
+        response = client.get(f"/api/conversations/{conv_id}/messages?limit=2&before={data['prev_cursor']}")
+        older = json.loads(response.data)
+        assert [m['content'] for m in older['messages']] == ["message 1", "message 2"]
+
+        response = client.get(f"/api/conversations/{conv_id}/messages?after={older['next_cursor']}")
+        assert [m['content'] for m in json.loads(response.data)['messages']] == ["message 3", "message 4"]
+
+        response = client.get(f'/api/conversations/{conv_id}/messages?before=broken')
+        assert response.status_code == 400
+
     def test_list_conversations(self, client):
         """Test listing all conversations"""
         # Create a few conversations
@@ -112,6 +174,112 @@ class TestRoutes:
         assert 'conversations' in data
         assert len(data['conversations']) >= 2
 
+    def test_list_conversations_pagination(self, client):
+        """Test cursor pagination and validation of list parameters"""
+        for _ in range(3):
+            client.post('/api/conversations')
+
+        response = client.get('/api/conversations?limit=2&sort=created_at&order=desc')
+        data = json.loads(response.data)
+        assert len(data['conversations']) == 2
+        assert {'conversation_id', 'created_at', 'updated_at', 'message_count', 'title'} <= set(data['conversations'][0])
+        assert data['next_cursor'] is not None
+
+        response = client.get(f"/api/conversations?limit=2&sort=created_at&cursor={data['next_cursor']}")
+        next_page = json.loads(response.data)
+        first_ids = {c['conversation_id'] for c in data['conversations']}
+        assert not first_ids & {c['conversation_id'] for c in next_page['conversations']}
+
+        response = client.get('/api/conversations?sort=title')
+        assert response.status_code == 400
+
+    def test_routes_use_app_config(self, app_config):
+        """Page sizes come from the config the app was created with"""
+        from app import create_app
+
+        class SmallPages(app_config):
+            CONVERSATIONS_PAGE_SIZE = 1
+        app = create_app(SmallPages)
+        client = app.test_client()
+        for _ in range(2):
+            client.post('/api/conversations')
+
+        data = json.loads(client.get('/api/conversations').data)
+        assert len(data['conversations']) == 1
+        assert data['next_cursor'] is not None
+        app.extensions['gpt2chat'].close()
+
+    def test_search_conversations(self, client, app_services):
+        """Test full-text search endpoint and query validation"""
+        storage_service = app_services.storage
+
+        conv_id = json.loads(client.post('/api/conversations').data)['conversation_id']
+        word = f"marker{conv_id.replace('-', '')}"
+        storage_service.add_message(conv_id, "user", f"Searching for {word} here")
+
+        response = client.get(f'/api/search?q={word.upper()}&limit=5')
+        data = json.loads(response.data)
+        assert response.status_code == 200
+        assert [r['conversation_id'] for r in data['results']] == [conv_id]
+        assert data['next_cursor'] is None
+
+        response = client.get('/api/search?q=')
+        assert response.status_code == 400
+
+    def test_import_and_export(self, client):
+        """Test NDJSON import (gzip) and streaming export in both formats"""
+        conv_id = str(uuid.uuid4())
+        lines = [
+            json.dumps({
+                "conversation_id": conv_id,
+                "messages": [{"role": "user", "content": "Imported hello", "timestamp": "2024-01-01T00:00:00"}]
+            }),
+            "not json"
+        ]
+
+        response = client.post('/api/import', data=gzip.compress("\n".join(lines).encode("utf-8")))
+        data = json.loads(response.data)
+        assert response.status_code == 200
+        assert (data['imported'], data['skipped'], data['invalid']) == (1, 0, 1)
+        assert data['errors'][0]['line'] == 2
+
+        response = client.get('/api/export?format=ndjson&gzip=true')
+        assert response.headers['Content-Disposition'].endswith('.ndjson.gz"')
+        exported = [json.loads(line) for line in gzip.decompress(response.data).splitlines()]
+        assert conv_id in {c['conversation_id'] for c in exported}
+
+        response = client.get('/api/export?format=txt')
+        assert response.mimetype == 'text/plain'
+        assert f"ID: {conv_id}" in response.get_data(as_text=True)
+
+        assert client.get('/api/export?format=csv').status_code == 400
+        assert client.post('/api/import', data=b"\x1f\x8bgarbage").status_code == 400
+
+    def test_import_and_export_require_admin_token(self, app, client):
+        """Export and import are admin endpoints when ADMIN_TOKEN is set"""
+        with patch.dict(app.config, {'ADMIN_TOKEN': 'secret'}):
+            assert client.get('/api/export').status_code == 403
+            assert client.post('/api/import', data=b"").status_code == 403
+
+            response = client.get('/api/export', headers={'X-Admin-Token': 'secret'})
+            assert response.status_code == 200
+            response = client.post('/api/import', data=b"", headers={'X-Admin-Token': 'secret'})
+            assert response.status_code == 200
+
+    def test_maintenance_endpoints(self, app, client):
+        """Test maintenance status, manual trigger and admin token check"""
+        response = client.get('/api/admin/maintenance')
+        data = json.loads(response.data)
+        assert response.status_code == 200
+        assert {'running', 'runs', 'current', 'last_run', 'max_ops_per_second'} <= set(data['maintenance'])
+
+        assert client.post('/api/admin/maintenance').status_code == 202
+
+        with patch.dict(app.config, {'ADMIN_TOKEN': 'secret'}):
+            assert client.get('/api/admin/maintenance').status_code == 403
+            response = client.get('/api/admin/maintenance', headers={'X-Admin-Token': 'secret'})
+            assert response.status_code == 200
+
     def test_delete_conversation(self, client):
         """Test deleting a conversation"""
         # Create conversation
@@ -148,13 +316,66 @@ class TestRoutes:
         assert 'status' in data
         assert 'model_loaded' in data
 
-    def test_send_message_model_error(self, client):
+    def test_endpoints_before_model_ready(self, client):
+        """Storage endpoints work while the model loads; generation returns 503"""
+        conv_id = json.loads(client.post('/api/conversations').data)['conversation_id']
+        assert client.get(f'/api/conversations/{conv_id}/messages').status_code == 200
+
+        for path in (f'/api/conversations/{conv_id}/messages', f'/api/conversations/{conv_id}/messages/stream'):
+            response = client.post(path, data=json.dumps({'message': 'Hello'}), content_type='application/json')
+            assert response.status_code == 503
+            assert response.headers['Retry-After']
+            assert json.loads(response.data)['model']['state'] == 'not_loaded'
+
+        health = client.get('/api/health')
+        assert health.status_code == 200
+        data = json.loads(health.data)
+        assert data['ready'] is False
+        assert data['model']['state'] == 'not_loaded'
+
+        assert client.get('/api/health/ready').status_code == 503
+        assert client.delete(f'/api/conversations/{conv_id}').status_code == 200
+
+    def test_readiness_after_model_loaded(self, client, app_services):
+        """The readiness probe succeeds once the model is loaded"""
+        with patch('models.gpt2_model.GPT2ChatModel'):
+            app_services.chat.load_model()
+
+        response = client.get('/api/health/ready')
+        assert response.status_code == 200
+        assert json.loads(response.data)['model']['state'] == 'ready'
+
+    def test_import_does_not_load_model(self):
+        """Importing the app creates no services and does not import torch"""
+        code = "import sys, app; print('torch' in sys.modules, 'transformers' in sys.modules)"
+        result = subprocess.run(
+            [sys.executable, '-c', code],
+            cwd=Path(__file__).resolve().parent.parent,
+            capture_output=True,
+            text=True,
+            check=True
+        )
+        assert result.stdout.split() == ['False', 'False']
+
+    def test_services_own_shutdown(self, app_services):
+        """Storage is closed once, by AppServices.close"""
+        with patch.object(app_services.storage, 'close', wraps=app_services.storage.close) as close:
+            app_services.close()
+            app_services.close()
+            close.assert_called_once()
+
+        with patch('atexit.register') as register:
+            from services.storage_service import StorageService
+            StorageService.from_config(app_services.config).close()
+            register.assert_not_called()
+
+    def test_send_message_model_error(self, client, app_services):
         """Test handling of model errors"""
         create_response = client.post('/api/conversations')
         conv_data = json.loads(create_response.data)
         conv_id = conv_data['conversation_id']
 
-        with patch('api.routes.chat_service') as mock_chat_service:
+        with patch.object(app_services, 'chat') as mock_chat_service:
             mock_chat_service.process_message.return_value = {
                 "success": False,
                 "error": "Model error occurred",
@@ -0,0 +1,153 @@
+import pytest
+from datetime import datetime, timedelta
+from services.storage_service import StorageService
+from services.search_index import SearchIndex
+from utils.text_utils import tokenize_words
+
+
+def message(role, content):
+    return {"role": role, "content": content, "timestamp": datetime.now().isoformat()}
+
+
+@pytest.fixture
+def index(temp_data_dir):
+    index = SearchIndex(temp_data_dir / "search.db")
+    yield index
+    index.close()
+
+
+@pytest.fixture
+def service(temp_data_dir):
+    service = StorageService(temp_data_dir, search_index=SearchIndex(temp_data_dir / "search.db"))
+    yield service
+    service.close()
+
+
+class TestSearchIndex:
+    """Test suite for the inverted search index"""
+
+    def test_tokenize_words(self):
+        assert tokenize_words("Hello, WORLD! Привіт, Світе 42") == ["hello", "world", "привіт", "світе", "42"]
+
+    def test_search_requires_all_terms(self, index):
+        """Test AND semantics and case-insensitive matching"""
+        index.add_message("a", message("user", "How do I bake sourdough bread?"))
+        index.add_message("b", message("user", "Bread recipes without yeast"))
+        index.add_message("c", message("user", "Sourdough starter care"))
+
+        results, next_cursor = index.search("SOURDOUGH bread")
+
+        assert [r["conversation_id"] for r in results] == ["a"]
+        assert results[0]["title"] == "How do I bake sourdough bread?"
+        assert next_cursor is None
+        assert index.search("pizza") == ([], None)
+
+    def test_results_are_ranked(self, index):
+        """Test that more frequent terms in shorter conversations rank higher"""
+        index.add_message("rare", message("user", "python " + "filler words here " * 20))
+        index.add_message("frequent", message("user", "python python python tips"))
+        index.add_message("other", message("user", "java tips"))
+
+        results, _ = index.search("python")
+
+        assert [r["conversation_id"] for r in results] == ["frequent", "rare"]
+        assert results[0]["score"] > results[1]["score"] > 0
+
+    def test_terms_accumulate_across_messages(self, index):
+        """Test that a conversation matches words from different messages"""
+        index.add_message("a", message("user", "Tell me about Kyiv"))
+        index.add_message("a", message("assistant", "Kyiv is the capital of Ukraine"))
+
+        results, _ = index.search("kyiv ukraine")
+
+        assert [r["conversation_id"] for r in results] == ["a"]
+        assert results[0]["title"] == "Tell me about Kyiv"
+
+    def test_cursor_pagination(self, index):
+        """Test that pages cover all matches exactly once in rank order"""
+        for i in range(7):
+            index.add_message(f"conv-{i}", message("user", "search " * (i + 1) + "text"))
+
+        seen = []
+        cursor = None
+        while True:
+            results, cursor = index.search("search", limit=3, cursor=cursor)
+            seen.extend(r["conversation_id"] for r in results)
+            if cursor is None:
+                break
+
+        full, _ = index.search("search", limit=10)
+        assert seen == [r["conversation_id"] for r in full]
+        assert len(seen) == 7
+
+    def test_invalid_queries(self, index):
+        with pytest.raises(ValueError):
+            index.search("  ?! ")
+        with pytest.raises(ValueError):
+            index.search("hello", cursor="not-a-cursor")
+
+    def test_remove_and_rebuild(self, index):
+        """Test removal and that a rebuild matches incremental indexing"""
+        index.add_message("a", message("user", "alpha beta"))
+        index.add_message("b", message("user", "alpha gamma"))
+        index.remove("a")
+
+        assert [r["conversation_id"] for r in index.search("alpha")[0]] == ["b"]
+
+        incremental = index.search("alpha")
+        count = index.rebuild([{"conversation_id": "b", "messages": [message("user", "alpha gamma")]}])
+
+        assert count == 1
+        assert index.search("alpha") == incremental
+
+
+class TestSearchStorageService:
+    """Test suite for search maintained by StorageService"""
+
+    def test_add_message_updates_index(self, service):
+        conv_id = service.create_conversation()
+        service.add_message(conv_id, "user", "Where is the Eiffel tower?")
+        service.add_message(conv_id, "assistant", "It is in Paris.")
+
+        results, _ = service.search("eiffel paris")
+
+        assert [r["conversation_id"] for r in results] == [conv_id]
+
+    def test_write_back_messages_are_searchable(self, temp_data_dir):
+        """Test that pending write-back messages are indexed immediately"""
+        service = StorageService(
+            temp_data_dir,
+            cache_size=4,
+            write_back=True,
+            search_index=SearchIndex(temp_data_dir / "search.db")
+        )
+        conv_id = service.create_conversation()
+        service.add_message(conv_id, "user", "unflushed searchable words")
+
+        assert [r["conversation_id"] for r in service.search("unflushed")[0]] == [conv_id]
+        service.close()
+
+    def test_delete_removes_from_index(self, service):
+        conv_id = service.create_conversation()
+        service.add_message(conv_id, "user", "temporary conversation")
+
+        service.delete_conversation(conv_id)
+
+        assert service.search("temporary") == ([], None)
+
+    def test_rebuild_reads_archived_conversations(self, service, temp_data_dir):
+        """Test that a rebuild indexes archived conversations without restoring them"""
+        conv_id = service.create_conversation()
+        service.add_message(conv_id, "user", "archived needle")
+        service.backend.archive_idle((datetime.now() + timedelta(days=1)).isoformat())
+        for path in temp_data_dir.glob("search.db*"):
+            path.unlink()
+        service.search_index = SearchIndex(temp_data_dir / "search.db")
+
+        assert service.rebuild_search_index() == 1
+        assert [r["conversation_id"] for r in service.search("needle")[0]] == [conv_id]
+        assert service.get_stats()["archived_conversations"] == 1
+
+    def test_search_disabled(self, storage_service):
+        with pytest.raises(ValueError):
+            storage_service.search("anything")
@@ -0,0 +1,67 @@
+import pytest
+from services.storage_service import StorageService
+from services.backends import FileBackend
+from services.backends import serializers
+from services.backends.serializers import JSONSerializer, OrjsonSerializer, get_serializer
+import tests.test_storage_service as base
+
+RECORD = {"role": "user", "content": "Привіт світе", "tokens": [0, 3], "temperature": 0.7}
+
+
+class TestStdlibJSONStorageService(base.TestStorageService):
+    """Run the StorageService suite with the stdlib json serializer"""
+
+    @pytest.fixture
+    def storage_service(self, temp_data_dir):
+        return StorageService(temp_data_dir, serializer=JSONSerializer())
+
+
+class TestSerializers:
+    """Test suite for storage serializers"""
+
+    @pytest.mark.parametrize("serializer", [JSONSerializer(), get_serializer("orjson")])
+    def test_compact_round_trip(self, serializer):
+        """Test compact UTF-8 output and round trip"""
+        data = serializer.dumps(RECORD)
+
+        assert b"\n" not in data
+        assert b", " not in data and b'": ' not in data
+        assert "Привіт".encode("utf-8") in data
+        assert serializer.loads(data) == RECORD
+
+    @pytest.mark.parametrize("serializer", [JSONSerializer(), get_serializer("orjson")])
+    def test_pretty_output(self, serializer):
+        """Test readable formatting for exports"""
+        data = serializer.dumps(RECORD, pretty=True)
+
+        assert b'\n  "role": "user"' in data
+        assert serializer.loads(data) == RECORD
+
+    @pytest.mark.parametrize("serializer", [JSONSerializer(), get_serializer("orjson")])
+    def test_malformed_input_raises_value_error(self, serializer):
+        with pytest.raises(ValueError):
+            serializer.loads(b'{"role": "us')
+
+    def test_get_serializer(self, monkeypatch):
+        """Test serializer selection and fallback without orjson"""
+        assert isinstance(get_serializer("json"), JSONSerializer)
+        assert isinstance(get_serializer("auto"), OrjsonSerializer)
+        with pytest.raises(ValueError):
+            get_serializer("pickle")
+
+        monkeypatch.setattr(serializers, "orjson", None)
+        assert get_serializer("auto").name == "json"
+        assert get_serializer("orjson").name == "json"
+
+    def test_files_are_readable_by_other_serializer(self, temp_data_dir):
+        """Test that both serializers share one on-disk format"""
+        writer = StorageService(temp_data_dir, serializer=get_serializer("orjson"))
+        conv_id = writer.create_conversation()
+        writer.add_message(conv_id, "user", "Привіт", model_config={"temperature": 0.5}, token_ids=[1, 2])
+        expected = writer.load_conversation(conv_id)
+        writer.backend.close()
+
+        reader = StorageService(temp_data_dir, backend=FileBackend(temp_data_dir, serializer=JSONSerializer()))
+
+        assert reader.load_conversation(conv_id) == expected
+        assert reader.get_messages(conv_id, limit=1) == expected["messages"]
@@ -0,0 +1,125 @@
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+from pathlib import Path
+
+import pytest
+
+from server import worker_config, worker_cpus
+from utils.memory import process_memory
+
+ROOT = Path(__file__).resolve().parent.parent
+
+SERVER_SCRIPT = """
+import sys
+from pathlib import Path
+from config import Config
+from server import PreforkServer
+
+data_dir, port = Path(sys.argv[1]), int(sys.argv[2])
+
+class TestConfig(Config):
+    STORAGE_BACKEND = "sqlite"
+    SQLITE_PATH = data_dir / "conversations.db"
+    DATA_DIR = data_dir / "conversations"
+    SEARCH_INDEX_PATH = data_dir / "search.db"
+    MODEL_CACHE_DIR = data_dir / "models"
+    MAX_LENGTH = 10
+
+sys.exit(PreforkServer(TestConfig, host="127.0.0.1", port=port, workers=2).run())
+"""
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def request(url, data=None):
+    body = json.dumps(data).encode() if data is not None else None
+    req = urllib.request.Request(url, data=body, headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(req, timeout=60) as response:
+        return json.loads(response.read())
+
+
+class TestWorkerSetup:
+    """Test suite for per-worker CPUs and configuration"""
+
+    def test_cpus_are_split_between_workers(self):
+        """Every CPU goes to exactly one worker"""
+        cpus = list(range(8))
+        parts = [worker_cpus(index, 3, cpus) for index in range(3)]
+
+        assert sorted(cpu for part in parts for cpu in part) == cpus
+        assert all(len(part) in (2, 3) for part in parts)
+
+    def test_more_workers_than_cpus(self):
+        """Workers share CPUs round-robin, one CPU each"""
+        assert [worker_cpus(index, 4, [0, 1]) for index in range(4)] == [[0], [1], [0], [1]]
+
+    def test_worker_config(self, app_config):
+        """Workers never preload; caches and background jobs are not duplicated"""
+        single = worker_config(app_config, 0, 1)
+        assert single.MODEL_PRELOAD is False
+        assert single.STORAGE_CACHE_SIZE == app_config.STORAGE_CACHE_SIZE
+
+        first = worker_config(app_config, 0, 2)
+        second = worker_config(app_config, 1, 2)
+        assert first.STORAGE_CACHE_SIZE == 0 and first.STORAGE_WRITE_BACK is False
+        assert first.MAINTENANCE_INTERVAL == app_config.MAINTENANCE_INTERVAL
+        assert second.MAINTENANCE_INTERVAL == 0
+        assert second.SQLITE_PATH == app_config.SQLITE_PATH
+
+    @pytest.mark.skipif(not sys.platform.startswith("linux"), reason="reads /proc")
+    def test_process_memory(self):
+        """Memory counters of the current process"""
+        memory = process_memory()
+
+        assert memory["rss"] > 0
+        assert memory["shared"] + memory["private"] == pytest.approx(memory["rss"], abs=0.5)
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="pre-fork server needs os.fork")
+class TestPreforkServer:
+    """End-to-end test of the pre-fork server"""
+
+    def test_workers_serve_requests(self, temp_data_dir):
+        """Workers forked from the master answer requests and stop on SIGTERM"""
+        port = free_port()
+        base = f"http://127.0.0.1:{port}"
+        master = subprocess.Popen(
+            [sys.executable, "-c", SERVER_SCRIPT, str(temp_data_dir), str(port)],
+            cwd=ROOT,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL
+        )
+
+        try:
+            deadline = time.monotonic() + 120
+            while True:
+                try:
+                    health = request(f"{base}/api/health")
+                    break
+                except OSError:
+                    assert master.poll() is None and time.monotonic() < deadline
+                    time.sleep(0.2)
+
+            children_path = Path(f"/proc/{master.pid}/task/{master.pid}/children")
+            if children_path.exists():
+                children = {int(pid) for pid in children_path.read_text().split()}
+                assert len(children) == 2
+                assert health["process"]["pid"] in children
+
+            assert health["ready"] is True
+            conversation_id = request(f"{base}/api/conversations", {})["conversation_id"]
+            response = request(f"{base}/api/conversations/{conversation_id}/messages", {"message": "Hello"})
+            assert response["success"] is True
+        finally:
+            master.send_signal(signal.SIGTERM)
+            assert master.wait(timeout=60) == 0
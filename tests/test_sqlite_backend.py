@@ -0,0 +1,212 @@
+import pytest
+import sqlite3
+import threading
+from multiprocessing import Process
+from config import Config
+from services.storage_service import StorageService
+from services.backends import FileBackend, SQLiteBackend
+import tests.test_storage_service as base
+
+
+def _write_messages(db_path, data_dir, conv_id, count):
+    """Worker process: append messages through its own connection"""
+    service = StorageService(data_dir, backend=SQLiteBackend(db_path))
+    for i in range(count):
+        service.add_message(conv_id, "user", f"process message {i}")
+
+
+class TestSQLiteStorageService(base.TestStorageService):
+    """Run the StorageService suite against the SQLite backend"""
+
+    @pytest.fixture
+    def storage_service(self, temp_data_dir):
+        backend = SQLiteBackend(temp_data_dir / "test.db")
+        yield StorageService(temp_data_dir, backend=backend)
+        backend.close()
+
+
+class TestSQLiteBackend:
+    """SQLite-specific behaviour"""
+
+    @pytest.fixture
+    def db_path(self, temp_data_dir):
+        return temp_data_dir / "test.db"
+
+    def test_uses_wal_journal_mode(self, db_path):
+        """Test that the database is opened in WAL mode"""
+        SQLiteBackend(db_path)
+
+        conn = sqlite3.connect(db_path)
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        conn.close()
+
+    def test_token_reference_is_message_id(self, temp_data_dir, db_path):
+        """Test that token references point at message rows"""
+        service = StorageService(temp_data_dir, backend=SQLiteBackend(db_path))
+        conv_id = service.create_conversation()
+
+        service.add_message(conv_id, "user", "Hello", token_ids=[1, 2, 3])
+        service.add_message(conv_id, "assistant", "Hi", token_ids=[4])
+
+        messages = service.get_messages(conv_id)
+        assert messages[0]["tokens"][1] == 3
+        assert messages[1]["tokens"][1] == 1
+        assert messages[0]["tokens"][0] < messages[1]["tokens"][0]
+
+    def test_concurrent_thread_writes(self, temp_data_dir, db_path):
+        """Test that concurrent writers from threads lose no messages"""
+        service = StorageService(temp_data_dir, backend=SQLiteBackend(db_path))
+        conv_id = service.create_conversation()
+
+        def write(worker):
+            for i in range(25):
+                service.add_message(conv_id, "user", f"thread {worker} message {i}")
+
+        threads = [threading.Thread(target=write, args=(w,)) for w in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        conversation = service.load_conversation(conv_id)
+        assert len(conversation["messages"]) == 100
+        assert conversation["metadata"]["total_messages"] == 100
+
+    def test_concurrent_process_writes(self, temp_data_dir, db_path):
+        """Test that several worker processes can share one database"""
+        service = StorageService(temp_data_dir, backend=SQLiteBackend(db_path))
+        conv_id = service.create_conversation()
+
+        processes = [
+            Process(target=_write_messages, args=(db_path, temp_data_dir, conv_id, 20))
+            for _ in range(3)
+        ]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join(timeout=60)
+            assert process.exitcode == 0
+
+        conversation = service.load_conversation(conv_id)
+        assert len(conversation["messages"]) == 60
+        assert conversation["metadata"]["total_messages"] == 60
+
+    def test_close_closes_connections_of_all_threads(self, db_path):
+        """Test that close() closes connections opened by other threads"""
+        backend = SQLiteBackend(db_path)
+        connections = [backend._connection()]
+
+        thread = threading.Thread(target=lambda: connections.append(backend._connection()))
+        thread.start()
+        thread.join()
+        assert connections[0] is not connections[1]
+
+        backend.close()
+
+        for conn in connections:
+            with pytest.raises(sqlite3.ProgrammingError):
+                conn.execute("SELECT 1")
+        # A new connection is opened after close
+        assert backend._connection().execute("SELECT COUNT(*) FROM conversations").fetchone()[0] == 0
+        backend.close()
+
+    def test_connections_of_finished_threads_are_closed(self, db_path):
+        """Test that short-lived threads do not accumulate open connections"""
+        backend = SQLiteBackend(db_path)
+        connections = []
+
+        def read():
+            backend.list_ids()
+            connections.append(backend._connection())
+
+        for _ in range(50):
+            thread = threading.Thread(target=read)
+            thread.start()
+            thread.join()
+
+        # The last thread's connection plus the main thread's
+        assert len(backend._connections) <= 2
+        with pytest.raises(sqlite3.ProgrammingError):
+            connections[0].execute("SELECT 1")
+        backend.close()
+
+    def test_delete_removes_messages(self, temp_data_dir, db_path):
+        """Test that deleting a conversation removes its messages"""
+        backend = SQLiteBackend(db_path)
+        service = StorageService(temp_data_dir, backend=backend)
+        conv_id = service.create_conversation()
+        service.add_message(conv_id, "user", "Hello")
+
+        assert service.delete_conversation(conv_id) is True
+
+        conn = sqlite3.connect(db_path)
+        assert conn.execute("SELECT COUNT(*) FROM messages").fetchone()[0] == 0
+        conn.close()
+
+    def test_migrates_database_without_title(self, temp_data_dir, db_path):
+        """Test that databases from before the title column are upgraded"""
+        conn = sqlite3.connect(db_path)
+        conn.executescript("""
+            CREATE TABLE conversations (
+                id TEXT PRIMARY KEY, created_at TEXT NOT NULL, updated_at TEXT NOT NULL,
+                total_messages INTEGER NOT NULL DEFAULT 0, model_config TEXT NOT NULL DEFAULT '{}'
+            );
+            CREATE TABLE messages (
+                id INTEGER PRIMARY KEY AUTOINCREMENT, conversation_id TEXT NOT NULL,
+                role TEXT NOT NULL, content TEXT NOT NULL, timestamp TEXT NOT NULL, token_ids BLOB
+            );
+            INSERT INTO conversations VALUES ('c1', '2024-01-01', '2024-01-02', 2, '{}');
+            INSERT INTO messages (conversation_id, role, content, timestamp)
+                VALUES ('c1', 'assistant', 'Hi', '2024-01-01'), ('c1', 'user', 'Old question', '2024-01-02');
+        """)
+        conn.close()
+
+        service = StorageService(temp_data_dir, backend=SQLiteBackend(db_path))
+        conversations, _ = service.page_conversations()
+
+        assert conversations == [{
+            "conversation_id": "c1",
+            "created_at": "2024-01-01",
+            "updated_at": "2024-01-02",
+            "message_count": 2,
+            "title": "Old question"
+        }]
+
+
+class TestStorageBackendSelection:
+    """Backend selection from configuration"""
+
+    @pytest.fixture
+    def from_config(self, temp_data_dir):
+        """Create services from a config that keeps every file under temp_data_dir"""
+        services = []
+
+        def create(backend):
+            class TestConfig(Config):
+                STORAGE_BACKEND = backend
+                DATA_DIR = temp_data_dir
+                SQLITE_PATH = temp_data_dir / "conversations.db"
+                SEARCH_INDEX_PATH = temp_data_dir / "search.db"
+                STORAGE_CACHE_SIZE = 0
+                STORAGE_WRITE_BACK = False
+                STORAGE_ARCHIVE_AFTER_DAYS = 0
+            services.append(StorageService.from_config(TestConfig))
+            return services[-1]
+
+        yield create
+        for service in services:
+            service.close()
+
+    def test_file_backend_selected(self, from_config):
+        service = from_config("file")
+        assert isinstance(service.backend, FileBackend)
+
+    def test_sqlite_backend_selected(self, temp_data_dir, from_config):
+        service = from_config("sqlite")
+        assert isinstance(service.backend, SQLiteBackend)
+        assert (temp_data_dir / "conversations.db").exists()
+        assert (temp_data_dir / "search.db").exists()
+
+    def test_unknown_backend_raises(self, from_config):
+        with pytest.raises(ValueError):
+            from_config("redis")
@@ -0,0 +1,55 @@
+import pytest
+import torch
+from unittest.mock import Mock
+from models.stopping import StopSequenceCriteria
+
+
+@pytest.fixture
+def char_tokenizer():
+    """Tokenizer mock where every token id is one character code"""
+    tokenizer = Mock()
+    tokenizer.decode.side_effect = lambda ids, skip_special_tokens=True: "".join(chr(i) for i in ids)
+    return tokenizer
+
+
+def encode(text):
+    return [ord(c) for c in text]
+
+
+class TestStopSequenceCriteria:
+    """Test suite for StopSequenceCriteria"""
+
+    def test_matches_stop_sequence(self, char_tokenizer):
+        """Test that a stop sequence in generated text is detected"""
+        criteria = StopSequenceCriteria(char_tokenizer, ["\nUser:"])
+
+        assert criteria.matches(encode("Hello\nUs")) is False
+        assert criteria.triggered is False
+        assert criteria.matches(encode("Hello\nUser:")) is True
+        assert criteria.triggered is True
+
+    def test_only_decodes_tail(self, char_tokenizer):
+        """Test that only a window of recent tokens is decoded"""
+        criteria = StopSequenceCriteria(char_tokenizer, ["\nUser:", "\nAssistant:"])
+
+        criteria.matches(encode("x" * 500))
+
+        decoded = char_tokenizer.decode.call_args.args[0]
+        assert len(decoded) == len("\nAssistant:")
+
+    def test_ignores_prompt_tokens(self, char_tokenizer):
+        """Test that stop sequences inside the prompt do not stop generation"""
+        prompt = encode("User: Hi\nAssistant:")
+        criteria = StopSequenceCriteria(char_tokenizer, ["\nAssistant:"], prompt_length=len(prompt))
+
+        input_ids = torch.tensor([prompt + encode(" Hello")])
+        assert criteria(input_ids, scores=None) is False
+
+        input_ids = torch.tensor([prompt + encode(" Hello\nAssistant:")])
+        assert criteria(input_ids, scores=None) is True
+
+    def test_no_stop_sequences(self, char_tokenizer):
+        """Test that empty stop sequences never stop generation"""
+        criteria = StopSequenceCriteria(char_tokenizer, [])
+
+        assert criteria.matches(encode("anything")) is False
@@ -0,0 +1,230 @@
+import pytest
+from datetime import datetime, timedelta
+from services.storage_service import StorageService
+from services.backends import FileBackend
+from services.backends import archive
+from services.backends.archive import ArchiveStore, available_codec
+
+
+def future():
+    """Cutoff that makes every existing conversation idle"""
+    return (datetime.now() + timedelta(days=1)).isoformat()
+
+
+def hot_files(data_dir, conv_id):
+    return [path for path in data_dir.rglob(f"{conv_id}.*") if path.suffix in (".jsonl", ".json", ".tokens")]
+
+
+@pytest.fixture
+def backend(temp_data_dir):
+    backend = FileBackend(temp_data_dir)
+    yield backend
+    backend.close()
+
+
+@pytest.fixture
+def service(temp_data_dir, backend):
+    return StorageService(temp_data_dir, backend=backend)
+
+
+class TestColdArchive:
+    """Test suite for the file backend cold tier"""
+
+    def test_archive_removes_hot_files(self, service, temp_data_dir):
+        """Test that idle conversations move into a single compressed pack"""
+        conv_ids = [service.create_conversation() for _ in range(3)]
+        for conv_id in conv_ids:
+            service.add_message(conv_id, "user", f"Hello {conv_id}", token_ids=[1, 2, 3])
+
+        assert service.backend.archive_idle(future()) == 3
+
+        for conv_id in conv_ids:
+            assert hot_files(temp_data_dir, conv_id) == []
+            assert service.backend.exists(conv_id)
+        assert len(list((temp_data_dir / "archive").glob("*.pack"))) == 1
+        assert sorted(service.list_conversations()) == sorted(conv_ids)
+        assert service.get_stats()["archived_conversations"] == 3
+
+        conversations, _ = service.page_conversations()
+        assert {c["conversation_id"] for c in conversations} == set(conv_ids)
+
+    def test_load_restores_conversation(self, service, temp_data_dir):
+        """Test transparent decompression and rehydration on load"""
+        conv_id = service.create_conversation()
+        service.add_message(conv_id, "user", "Hello", model_config={"temperature": 0.5}, token_ids=[7, 8])
+        service.add_message(conv_id, "assistant", "Hi there", token_ids=[9])
+        expected = service.load_conversation(conv_id)
+        service.backend.archive_idle(future())
+
+        conversation = service.load_conversation(conv_id)
+
+        assert conversation == expected
+        assert len(hot_files(temp_data_dir, conv_id)) == 2
+        assert service.get_stats()["archived_conversations"] == 0
+        assert service.get_token_ids(conv_id, conversation["messages"]) == [[7, 8], [9]]
+
+    def test_tail_read_and_token_ids_restore(self, service):
+        """Test that tail reads and token lookups find archived conversations"""
+        conv_id = service.create_conversation()
+        service.add_message(conv_id, "user", "One", token_ids=[1])
+        service.add_message(conv_id, "assistant", "Two", token_ids=[2, 3])
+        messages = service.get_messages(conv_id)
+        service.backend.archive_idle(future())
+
+        assert service.backend.get_token_ids(conv_id, messages) == [[1], [2, 3]]
+        service.backend.archive_idle(future())
+        assert [m["content"] for m in service.get_messages(conv_id, limit=1)] == ["Two"]
+
+    def test_append_to_archived_conversation(self, service):
+        """Test that writing to an archived conversation rehydrates it first"""
+        conv_id = service.create_conversation()
+        service.add_message(conv_id, "user", "Old message", token_ids=[4])
+        service.backend.archive_idle(future())
+
+        service.add_message(conv_id, "assistant", "New message", token_ids=[5])
+
+        messages = service.get_messages(conv_id)
+        assert [m["content"] for m in messages] == ["Old message", "New message"]
+        assert service.get_token_ids(conv_id, messages) == [[4], [5]]
+
+    def test_archive_idle_skips_recent_conversations(self, service):
+        """Test cutoff and per-run limit"""
+        conv_ids = [service.create_conversation() for _ in range(3)]
+        past = (datetime.now() - timedelta(days=1)).isoformat()
+
+        assert service.backend.archive_idle(past) == 0
+        assert service.backend.archive_idle(future(), limit=2) == 2
+        assert service.backend.archive_idle(future()) == 1
+        assert service.backend.archive_idle(future()) == 0
+        assert sorted(service.list_conversations()) == sorted(conv_ids)
+
+    def test_delete_archived_conversation(self, service, temp_data_dir):
+        """Test that deleting an archived conversation removes its archive entry"""
+        conv_id = service.create_conversation()
+        service.add_message(conv_id, "user", "Hello")
+        service.backend.archive_idle(future())
+
+        assert service.delete_conversation(conv_id) is True
+        assert service.load_conversation(conv_id) is None
+        assert service.list_conversations() == []
+        assert not list(temp_data_dir.rglob(f"{conv_id}.*"))
+
+    def test_empty_packs_are_removed(self, temp_data_dir):
+        """Test one-file-per-conversation packing and removal of emptied packs"""
+        backend = FileBackend(temp_data_dir, archive_pack_bytes=0)
+        service = StorageService(temp_data_dir, backend=backend)
+        conv_ids = [service.create_conversation() for _ in range(2)]
+        backend.archive_idle(future())
+        packs = temp_data_dir / "archive"
+        assert len(list(packs.glob("*.pack"))) == 2
+
+        service.load_conversation(conv_ids[0])
+
+        # The pack still being written to is kept
+        assert len(list(packs.glob("*.pack"))) == 1
+        assert service.load_conversation(conv_ids[1]) is not None
+        backend.close()
+
+    def test_restored_conversation_waits_for_idle_window(self, service):
+        """Test that a restored conversation is archived again only after a full idle window"""
+        conv_id = service.create_conversation()
+        service.backend.archive_idle(future())
+        before_restore = datetime.now().isoformat()
+        service.backend.load(conv_id)
+
+        assert service.backend.archive_idle(before_restore) == 0
+        assert service.backend.archive_idle(future()) == 1
+
+    def test_sparse_packs_are_rewritten(self, temp_data_dir):
+        """Test that live records of a mostly dead pack move to the current pack"""
+        backend = FileBackend(temp_data_dir)
+        service = StorageService(temp_data_dir, backend=backend)
+        conv_ids = [service.create_conversation() for _ in range(4)]
+        for conv_id in conv_ids:
+            service.add_message(conv_id, "user", f"Message {conv_id}")
+        backend.archive_idle(future())
+        old_pack = backend.archive.current_pack
+        backend.archive.close()
+        backend.archive._pack = None
+
+        for conv_id in conv_ids[:3]:
+            backend.load(conv_id)
+        assert backend.compact_archive() == 1
+
+        packs = list((temp_data_dir / "archive").glob("*.pack"))
+        assert [pack.name for pack in packs] == [backend.archive.current_pack]
+        assert backend.archive.current_pack != old_pack
+        assert backend.load(conv_ids[3])["messages"][0]["content"] == f"Message {conv_ids[3]}"
+        assert backend.compact_archive() == 0
+        backend.close()
+
+    def test_rebuild_index_keeps_conversations_archived(self, service):
+        """Test that index rebuild reads archives without rehydrating them"""
+        conv_id = service.create_conversation()
+        service.add_message(conv_id, "user", "Archived title")
+        service.backend.archive_idle(future())
+
+        assert service.backend.rebuild_index() == 1
+
+        conversations, _ = service.page_conversations()
+        assert conversations[0]["title"] == "Archived title"
+        assert service.get_stats()["archived_conversations"] == 1
+
+    def test_archive_locations_recovered_without_index(self, service, temp_data_dir):
+        """Test that a lost index is rebuilt from self-describing packs"""
+        conv_id = service.create_conversation()
+        service.add_message(conv_id, "user", "Hello", token_ids=[1, 2])
+        service.backend.archive_idle(future())
+        service.backend.close()
+        for path in temp_data_dir.glob("index.db*"):
+            path.unlink()
+
+        reopened = StorageService(temp_data_dir)
+
+        assert reopened.list_conversations() == [conv_id]
+        conversations, _ = reopened.page_conversations()
+        assert conversations[0]["message_count"] == 1
+        messages = reopened.get_messages(conv_id)
+        assert reopened.get_token_ids(conv_id, messages) == [[1, 2]]
+
+    def test_service_archive_flushes_pending_messages(self, temp_data_dir, backend):
+        """Test that write-back messages are stored before archiving"""
+        service = StorageService(temp_data_dir, backend=backend, cache_size=4, write_back=True)
+        conv_id = service.create_conversation()
+        service.add_message(conv_id, "user", "Pending")
+
+        assert service.archive_idle(max_age_days=-1) == 1
+        service.cache.clear()
+
+        assert [m["content"] for m in service.get_messages(conv_id)] == ["Pending"]
+
+    def test_current_pack_of_another_store_is_kept(self, tmp_path):
+        """Test that a pack another process is writing to is not removed"""
+        writer = ArchiveStore(tmp_path)
+        other = ArchiveStore(tmp_path)
+        pack, _, _, _ = writer.write("first", b"log", b"")
+
+        other.release(pack)
+        assert (tmp_path / pack).exists()
+
+        writer.close()
+        other.release(pack)
+        assert not (tmp_path / pack).exists()
+
+    def test_truncated_pack_record_is_ignored(self, tmp_path):
+        """Test that scanning stops at a partially written record"""
+        store = ArchiveStore(tmp_path)
+        store.write("first", b"log", b"")
+        pack, _, _, _ = store.write("second", b"log" * 100, b"\x01\x00")
+        path = tmp_path / pack
+        path.write_bytes(path.read_bytes()[:-5])
+
+        assert [entry[0] for entry in store.scan()] == ["first"]
+
+    def test_codec_selection(self, monkeypatch):
+        """Test zstd fallback and unknown codec error"""
+        monkeypatch.setattr(archive, "zstandard", None)
+
+        assert available_codec("zstd") == "gzip"
+        with pytest.raises(ValueError):
+            available_codec("lz4")
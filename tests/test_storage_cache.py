@@ -0,0 +1,251 @@
+import pytest
+import time
+from services.storage_service import StorageService
+from services.backends import FileBackend
+from services.conversation_cache import ConversationCache, CachedConversation
+import tests.test_storage_service as base
+
+
+def _conversation(conv_id):
+    return {
+        "conversation_id": conv_id,
+        "created_at": "2024-01-01T00:00:00",
+        "updated_at": "2024-01-01T00:00:00",
+        "messages": [],
+        "metadata": {"total_messages": 0, "model_config": {}}
+    }
+
+
+class TestCachedStorageService(base.TestStorageService):
+    """Run the StorageService suite with the write-back cache enabled"""
+
+    @pytest.fixture
+    def storage_service(self, temp_data_dir):
+        service = StorageService(temp_data_dir, cache_size=4, write_back=True)
+        yield service
+        service.close()
+
+
+class TestConversationCache:
+    """Test suite for the LRU conversation cache"""
+
+    def test_get_counts_hits_and_misses(self):
+        cache = ConversationCache(max_conversations=2)
+        cache.put("a", CachedConversation(_conversation("a")))
+
+        assert cache.get("a") is not None
+        assert cache.get("b") is None
+        assert cache.stats["hits"] == 1
+        assert cache.stats["misses"] == 1
+
+    def test_evicts_least_recently_used(self):
+        cache = ConversationCache(max_conversations=2)
+        cache.put("a", CachedConversation(_conversation("a")))
+        cache.put("b", CachedConversation(_conversation("b")))
+        cache.get("a")
+
+        evicted = cache.put("c", CachedConversation(_conversation("c")))
+
+        assert [cid for cid, _ in evicted] == ["b"]
+        assert "a" in cache and "c" in cache
+        assert cache.stats["evictions"] == 1
+
+    def test_dirty_items(self):
+        cache = ConversationCache(max_conversations=2)
+        clean = CachedConversation(_conversation("a"))
+        dirty = CachedConversation(_conversation("b"))
+        dirty.pending.append(object())
+        cache.put("a", clean)
+        cache.put("b", dirty)
+
+        assert cache.dirty_items() == [("b", dirty)]
+
+
+class TestWriteBackCache:
+    """Write-back behaviour of StorageService"""
+
+    @pytest.fixture
+    def service(self, temp_data_dir):
+        service = StorageService(temp_data_dir, cache_size=2, write_back=True)
+        yield service
+        service.close()
+
+    def _on_disk(self, temp_data_dir, conv_id):
+        return FileBackend(temp_data_dir).get_messages(conv_id)
+
+    def test_add_message_is_deferred_until_flush(self, service, temp_data_dir):
+        conv_id = service.create_conversation()
+        service.add_message(conv_id, "user", "Hello")
+        service.add_message(conv_id, "assistant", "Hi", model_config={"temperature": 0.5})
+
+        assert self._on_disk(temp_data_dir, conv_id) == []
+        assert len(service.get_messages(conv_id)) == 2
+
+        assert service.flush() == 2
+        assert [m["content"] for m in self._on_disk(temp_data_dir, conv_id)] == ["Hello", "Hi"]
+        assert FileBackend(temp_data_dir).load(conv_id)["metadata"]["model_config"] == {"temperature": 0.5}
+        assert service.flush() == 0
+
+    def test_reads_are_served_from_cache(self, service):
+        conv_id = service.create_conversation()
+        service.add_message(conv_id, "user", "Hello")
+
+        service.get_messages(conv_id)
+        service.get_messages(conv_id, limit=1)
+
+        stats = service.get_stats()
+        assert stats["hits"] == 3
+        assert stats["misses"] == 0
+        assert stats["dirty_messages"] == 1
+
+    def test_miss_loads_from_backend(self, service, temp_data_dir):
+        writer = FileBackend(temp_data_dir)
+        conv_id = "00000000-0000-4000-8000-000000000001"
+        writer.create(_conversation(conv_id))
+        writer.append_message(conv_id, {"role": "user", "content": "Stored", "timestamp": "2024-01-01T00:00:01"})
+        writer.close()
+
+        assert service.get_messages(conv_id)[0]["content"] == "Stored"
+        assert service.get_stats()["misses"] == 1
+
+    def test_eviction_flushes_dirty_conversation(self, service, temp_data_dir):
+        conv_id = service.create_conversation()
+        service.add_message(conv_id, "user", "Hello")
+
+        service.create_conversation()
+        service.create_conversation()
+
+        assert conv_id not in service.cache
+        assert [m["content"] for m in self._on_disk(temp_data_dir, conv_id)] == ["Hello"]
+        assert service.get_stats()["evictions"] == 1
+
+    def test_token_ids_of_pending_messages(self, service):
+        conv_id = service.create_conversation()
+        service.add_message(conv_id, "user", "Hello", token_ids=[1, 2, 3])
+        service.add_message(conv_id, "assistant", "Hi")
+
+        messages = service.get_messages(conv_id)
+        assert service.get_token_ids(conv_id, messages) == [[1, 2, 3], None]
+
+        service.flush()
+        assert service.get_token_ids(conv_id, messages) == [[1, 2, 3], None]
+        assert "tokens" in messages[0]
+
+    def test_close_flushes(self, temp_data_dir):
+        service = StorageService(temp_data_dir, cache_size=2, write_back=True)
+        conv_id = service.create_conversation()
+        service.add_message(conv_id, "user", "Hello")
+
+        service.close()
+
+        assert len(self._on_disk(temp_data_dir, conv_id)) == 1
+
+    def test_delete_discards_pending(self, service, temp_data_dir):
+        conv_id = service.create_conversation()
+        service.add_message(conv_id, "user", "Hello")
+
+        assert service.delete_conversation(conv_id) is True
+        assert service.flush() == 0
+        assert service.load_conversation(conv_id) is None
+
+    def test_periodic_flusher(self, service, temp_data_dir):
+        conv_id = service.create_conversation()
+        service.add_message(conv_id, "user", "Hello")
+        service.start_flusher(0.05)
+
+        deadline = time.time() + 5
+        while not self._on_disk(temp_data_dir, conv_id) and time.time() < deadline:
+            time.sleep(0.02)
+
+        assert len(self._on_disk(temp_data_dir, conv_id)) == 1
+
+    def test_write_through_mode(self, temp_data_dir):
+        service = StorageService(temp_data_dir, cache_size=2, write_back=False)
+        conv_id = service.create_conversation()
+        service.add_message(conv_id, "user", "Hello")
+
+        assert len(self._on_disk(temp_data_dir, conv_id)) == 1
+        assert service.get_stats()["dirty_messages"] == 0
+
+
+class TestStoreOwnership:
+    """The cache requires exclusive use of the store"""
+
+    def test_second_service_refused_while_cache_owns_store(self, temp_data_dir):
+        owner = StorageService(temp_data_dir, cache_size=2, write_back=True)
+
+        with pytest.raises(RuntimeError):
+            StorageService(temp_data_dir)
+        with pytest.raises(RuntimeError):
+            StorageService(temp_data_dir, cache_size=2, write_back=True)
+
+        owner.close()
+        StorageService(temp_data_dir).close()
+
+    def test_cache_disabled_when_store_is_shared(self, temp_data_dir):
+        other = StorageService(temp_data_dir)
+        service = StorageService(temp_data_dir, cache_size=2, write_back=True)
+
+        assert service.cache is None
+        assert service.write_back is False
+
+        conv_id = service.create_conversation()
+        service.add_message(conv_id, "user", "Hello")
+        assert other.get_messages(conv_id)[0]["content"] == "Hello"
+
+        service.close()
+        other.close()
+
+
+class TestTailCache:
+    """Tail reads through the conversation cache"""
+
+    @pytest.fixture
+    def stored(self, temp_data_dir):
+        writer = FileBackend(temp_data_dir)
+        conv_id = "00000000-0000-4000-8000-000000000002"
+        writer.create(_conversation(conv_id))
+        for i in range(20):
+            message = {"role": "user", "content": f"message {i}", "timestamp": f"2024-01-01T00:00:{i:02d}"}
+            writer.append_message(conv_id, message)
+        writer.close()
+        return conv_id
+
+    @pytest.fixture
+    def service(self, temp_data_dir):
+        service = StorageService(temp_data_dir, cache_size=2, write_back=True)
+        yield service
+        service.close()
+
+    def test_limited_read_does_not_load_full_conversation(self, service, stored, monkeypatch):
+        def fail(conversation_id):
+            raise AssertionError("full load on the tail path")
+        monkeypatch.setattr(service.backend, "load", fail)
+
+        service.add_message(stored, "user", "new")
+        messages = service.get_messages(stored, limit=3)
+
+        assert [m["content"] for m in messages] == ["message 18", "message 19", "new"]
+
+    def test_partial_entry_grows_on_larger_limit(self, service, stored):
+        service.get_messages(stored, limit=2)
+        service.add_message(stored, "user", "new")
+
+        messages = service.get_messages(stored, limit=5)
+
+        assert [m["content"] for m in messages] == [f"message {i}" for i in range(16, 20)] + ["new"]
+
+    def test_full_read_completes_partial_entry(self, service, stored):
+        service.get_messages(stored, limit=2)
+        service.add_message(stored, "assistant", "reply", model_config={"temperature": 0.3})
+
+        conversation = service.load_conversation(stored)
+
+        assert len(conversation["messages"]) == 21
+        assert conversation["metadata"]["total_messages"] == 21
+        assert conversation["metadata"]["model_config"] == {"temperature": 0.3}
+        assert service.cache.peek(stored).complete
+
+    def test_add_message_to_missing_conversation(self, service):
+        with pytest.raises(ValueError):
+            service.add_message("missing", "user", "Hello")
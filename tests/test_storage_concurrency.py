@@ -0,0 +1,131 @@
+import pytest
+import threading
+from multiprocessing import Process
+from services.storage_service import StorageService
+from services.backends import FileBackend
+
+MESSAGES_PER_WORKER = 20
+
+
+def _service(data_dir):
+    backend = FileBackend(data_dir)
+    # Часта компакція: переписування журналу конкурує з дописуванням
+    backend.COMPACT_AFTER_META_RECORDS = 3
+    return StorageService(data_dir, backend=backend)
+
+
+def _write(data_dir, worker, shared_id, own_id):
+    """Append messages to a shared and a private conversation"""
+    service = _service(data_dir)
+    for i in range(MESSAGES_PER_WORKER):
+        token = worker * 1000 + i
+        for conv_id in (shared_id, own_id):
+            service.add_message(
+                conv_id, "user", f"{worker}:{i}",
+                model_config={"worker": worker} if i % 2 else None,
+                token_ids=[token, token]
+            )
+    service.backend.close()
+
+
+def _check(service, conv_id, workers):
+    messages = service.get_messages(conv_id)
+    contents = sorted(m["content"] for m in messages)
+    expected = sorted(f"{w}:{i}" for w in workers for i in range(MESSAGES_PER_WORKER))
+    assert contents == expected
+
+    # Кожне повідомлення вказує на свої власні токени
+    for message, ids in zip(messages, service.get_token_ids(conv_id, messages)):
+        worker, i = map(int, message["content"].split(":"))
+        assert ids == [worker * 1000 + i] * 2
+
+
+class TestConcurrentWrites:
+    """Stress tests for concurrent writers of the file backend"""
+
+    @pytest.fixture
+    def conversations(self, temp_data_dir):
+        service = _service(temp_data_dir)
+        shared_id = service.create_conversation()
+        own_ids = [service.create_conversation() for _ in range(4)]
+        return service, shared_id, own_ids
+
+    def test_threads(self, temp_data_dir, conversations):
+        """Threads with separate backends (as in separate workers) lose no messages"""
+        service, shared_id, own_ids = conversations
+
+        threads = [
+            threading.Thread(target=_write, args=(temp_data_dir, w, shared_id, own_id))
+            for w, own_id in enumerate(own_ids)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        _check(service, shared_id, range(len(own_ids)))
+        for w, own_id in enumerate(own_ids):
+            _check(service, own_id, [w])
+
+    def test_threads_sharing_one_backend(self, temp_data_dir, conversations):
+        """Threads of one process sharing a backend lose no messages"""
+        service, shared_id, _ = conversations
+
+        def write(worker):
+            for i in range(MESSAGES_PER_WORKER):
+                token = worker * 1000 + i
+                service.add_message(
+                    shared_id, "user", f"{worker}:{i}",
+                    model_config={"worker": worker} if i % 2 else None,
+                    token_ids=[token, token]
+                )
+
+        threads = [threading.Thread(target=write, args=(w,)) for w in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        _check(service, shared_id, range(8))
+        conversation = service.load_conversation(shared_id)
+        assert conversation["metadata"]["total_messages"] == 8 * MESSAGES_PER_WORKER
+
+    def test_processes(self, temp_data_dir, conversations):
+        """Worker processes writing the same and different conversations lose no messages"""
+        service, shared_id, own_ids = conversations
+
+        processes = [
+            Process(target=_write, args=(temp_data_dir, w, shared_id, own_id))
+            for w, own_id in enumerate(own_ids)
+        ]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join(timeout=120)
+            assert process.exitcode == 0
+
+        _check(service, shared_id, range(len(own_ids)))
+        for w, own_id in enumerate(own_ids):
+            _check(service, own_id, [w])
+
+        # Індекс метаданих бачить усі записи
+        summaries = {c["conversation_id"]: c for c in service.page_conversations(limit=10)[0]}
+        assert summaries[shared_id]["message_count"] == len(own_ids) * MESSAGES_PER_WORKER
+
+        # Після атомарних замін не лишається тимчасових файлів
+        assert not list(temp_data_dir.rglob("*.tmp"))
+
+    def test_failed_rewrite_keeps_log(self, temp_data_dir, conversations, monkeypatch):
+        """A crash while rewriting the log leaves the previous version intact"""
+        service, shared_id, _ = conversations
+        service.add_message(shared_id, "user", "kept")
+
+        def crash(*args, **kwargs):
+            raise OSError("disk full")
+        monkeypatch.setattr("services.backends.file_backend.os.replace", crash)
+
+        with pytest.raises(OSError):
+            service.compact(shared_id)
+
+        assert [m["content"] for m in service.get_messages(shared_id)] == ["kept"]
+        assert not list(temp_data_dir.rglob("*.tmp"))
@@ -1,6 +1,8 @@
 import pytest
+import json
 from datetime import datetime
 from services.storage_service import StorageService
+from services.backends import FileBackend
 
 
 class TestStorageService:
@@ -95,6 +97,70 @@ class TestStorageService:
         assert conv_id1 in conversations
         assert conv_id2 in conversations
 
+    def test_page_conversations_sorted_by_updated_at(self, storage_service):
+        """Test that pages are ordered by last update with index metadata"""
+        first = storage_service.create_conversation()
+        second = storage_service.create_conversation()
+        storage_service.add_message(first, "user", "  Як   справи?\nДобре ")
+        storage_service.add_message(first, "assistant", "Чудово")
+
+        conversations, next_cursor = storage_service.page_conversations(limit=10)
+
+        assert [c["conversation_id"] for c in conversations] == [first, second]
+        assert conversations[0]["message_count"] == 2
+        assert conversations[0]["title"] == "Як справи? Добре"
+        assert conversations[1]["title"] == ""
+        assert next_cursor is None
+
+    def test_page_conversations_cursor(self, storage_service):
+        """Test that cursors walk through all conversations without repeats"""
+        created = [storage_service.create_conversation() for _ in range(7)]
+
+        seen = []
+        cursor = None
+        while True:
+            page, cursor = storage_service.page_conversations(limit=3, cursor=cursor, sort="created_at", order="asc")
+            seen.extend(c["conversation_id"] for c in page)
+            if cursor is None:
+                break
+
+        assert seen == created
+
+    def test_page_conversations_by_message_count(self, storage_service):
+        """Test sorting by message count"""
+        small = storage_service.create_conversation()
+        large = storage_service.create_conversation()
+        storage_service.add_message(large, "user", "one")
+        storage_service.add_message(large, "assistant", "two")
+        storage_service.add_message(small, "user", "one")
+
+        conversations, _ = storage_service.page_conversations(sort="message_count", order="desc")
+
+        assert [c["conversation_id"] for c in conversations] == [large, small]
+
+    def test_page_conversations_excludes_deleted(self, storage_service):
+        """Test that deleted conversations disappear from the index"""
+        conv_id = storage_service.create_conversation()
+        storage_service.delete_conversation(conv_id)
+
+        conversations, _ = storage_service.page_conversations()
+        assert conversations == []
+
+    def test_page_conversations_invalid_arguments(self, storage_service):
+        """Test that bad sort fields and cursors are rejected"""
+        storage_service.create_conversation()
+        storage_service.create_conversation()
+        _, cursor = storage_service.page_conversations(limit=1)
+
+        with pytest.raises(ValueError):
+            storage_service.page_conversations(sort="title")
+        with pytest.raises(ValueError):
+            storage_service.page_conversations(order="sideways")
+        with pytest.raises(ValueError):
+            storage_service.page_conversations(cursor="not-a-cursor")
+        with pytest.raises(ValueError):
+            storage_service.page_conversations(cursor=cursor, sort="created_at")
+
     def test_delete_conversation(self, storage_service):
         """Test deleting a conversation"""
         conv_id = storage_service.create_conversation()
@@ -140,3 +206,263 @@ class TestStorageService:
 
         conversation = storage_service.load_conversation(conv_id)
         assert conversation['metadata']['total_messages'] == 3
+
+    def test_add_message_with_token_ids(self, storage_service):
+        """Test that token ids are persisted alongside messages"""
+        conv_id = storage_service.create_conversation()
+
+        storage_service.add_message(conv_id, "user", "Hello", token_ids=[15496, 11, 50256])
+        storage_service.add_message(conv_id, "assistant", "Hi", token_ids=[17250])
+        storage_service.add_message(conv_id, "user", "No tokens")
+
+        messages = storage_service.get_messages(conv_id)
+        assert "tokens" not in messages[2]
+
+        token_ids = storage_service.get_token_ids(conv_id, messages)
+        assert token_ids == [[15496, 11, 50256], [17250], None]
+
+    def test_get_token_ids_reads_requested_range(self, storage_service):
+        """Test reading token ids for the tail of a conversation"""
+        conv_id = storage_service.create_conversation()
+        for i in range(5):
+            storage_service.add_message(conv_id, "user", f"Message {i}", token_ids=[i, i + 100])
+
+        tail = storage_service.get_messages(conv_id, limit=2)
+
+        assert storage_service.get_token_ids(conv_id, tail) == [[3, 103], [4, 104]]
+
+    def test_token_ids_out_of_range_not_stored(self, storage_service):
+        """Test that ids that do not fit uint16 are skipped"""
+        conv_id = storage_service.create_conversation()
+
+        storage_service.add_message(conv_id, "user", "Hello", token_ids=[70000])
+
+        messages = storage_service.get_messages(conv_id)
+        assert "tokens" not in messages[0]
+        assert storage_service.get_token_ids(conv_id, messages) == [None]
+
+
+class TestFileBackend:
+    """Test suite for the append-only file backend"""
+
+    def test_token_ids_sidecar_file(self, storage_service):
+        """Test that token ids are stored as uint16 in a sidecar file"""
+        conv_id = storage_service.create_conversation()
+
+        storage_service.add_message(conv_id, "user", "Hello", token_ids=[15496, 11, 50256])
+        storage_service.add_message(conv_id, "assistant", "Hi", token_ids=[17250])
+
+        messages = storage_service.get_messages(conv_id)
+        assert messages[0]["tokens"] == [0, 3]
+        assert messages[1]["tokens"] == [3, 1]
+
+        # uint16 storage: two bytes per token
+        assert storage_service.backend._get_tokens_path(conv_id).stat().st_size == 8
+
+    def test_delete_conversation_removes_tokens(self, storage_service):
+        """Test that deleting a conversation removes its token file"""
+        conv_id = storage_service.create_conversation()
+        storage_service.add_message(conv_id, "user", "Hello", token_ids=[1, 2])
+
+        storage_service.delete_conversation(conv_id)
+
+        assert not storage_service.backend._get_tokens_path(conv_id).exists()
+
+    def test_add_message_appends_to_log(self, storage_service):
+        """Test that adding a message appends a record instead of rewriting the file"""
+        conv_id = storage_service.create_conversation()
+        file_path = storage_service.backend._get_file_path(conv_id)
+        header = file_path.read_text(encoding='utf-8')
+
+        storage_service.add_message(conv_id, "user", "Hello")
+        storage_service.add_message(conv_id, "assistant", "Hi", model_config={"temperature": 0.7})
+
+        content = file_path.read_text(encoding='utf-8')
+        assert content.startswith(header)
+        lines = content.splitlines()
+        assert len(lines) == 4
+        assert json.loads(lines[1])["type"] == "message"
+        assert json.loads(lines[3])["type"] == "meta"
+
+    def test_compaction_folds_meta_records(self, storage_service):
+        """Test that compaction keeps messages and the latest model config"""
+        conv_id = storage_service.create_conversation()
+        for i in range(3):
+            storage_service.add_message(conv_id, "assistant", f"Reply {i}", model_config={"step": i})
+
+        before = storage_service.load_conversation(conv_id)
+        assert storage_service.compact(conv_id) is True
+        after = storage_service.load_conversation(conv_id)
+
+        assert after == before
+        assert after['metadata']['model_config'] == {"step": 2}
+        lines = storage_service.backend._get_file_path(conv_id).read_text(encoding='utf-8').splitlines()
+        assert len(lines) == 4
+
+    def test_compaction_runs_periodically(self, storage_service):
+        """Test that the log is compacted after enough meta records"""
+        storage_service.backend.COMPACT_AFTER_META_RECORDS = 2
+        conv_id = storage_service.create_conversation()
+
+        storage_service.add_message(conv_id, "assistant", "One", model_config={"step": 1})
+        storage_service.add_message(conv_id, "assistant", "Two", model_config={"step": 2})
+
+        lines = storage_service.backend._get_file_path(conv_id).read_text(encoding='utf-8').splitlines()
+        assert [json.loads(line)["type"] for line in lines] == ["header", "message", "message"]
+        assert storage_service.load_conversation(conv_id)['metadata']['model_config'] == {"step": 2}
+
+    def test_legacy_conversation_is_migrated(self, storage_service, temp_data_dir):
+        """Test that conversations in the old JSON format are read and migrated on write"""
+        conv_id = "00000000-0000-4000-8000-00000000000a"
+        legacy = {
+            "conversation_id": conv_id,
+            "created_at": "2024-01-01T00:00:00",
+            "updated_at": "2024-01-01T00:00:01",
+            "messages": [{"role": "user", "content": "Old", "timestamp": "2024-01-01T00:00:01"}],
+            "metadata": {"total_messages": 1, "model_config": {}}
+        }
+        # Старі розмови лежать у пласкому каталозі
+        legacy_path = temp_data_dir / f"{conv_id}.json"
+        legacy_path.write_text(json.dumps(legacy, indent=2), encoding='utf-8')
+
+        assert storage_service.load_conversation(conv_id) == legacy
+        assert conv_id in storage_service.list_conversations()
+
+        storage_service.add_message(conv_id, "assistant", "New")
+
+        assert not legacy_path.exists()
+        messages = storage_service.get_messages(conv_id)
+        assert [m["content"] for m in messages] == ["Old", "New"]
+
+    def test_truncated_last_record_is_ignored(self, storage_service):
+        """Test that a partially written record does not break loading"""
+        conv_id = storage_service.create_conversation()
+        storage_service.add_message(conv_id, "user", "Hello")
+
+        with open(storage_service.backend._get_file_path(conv_id), 'a', encoding='utf-8') as f:
+            f.write('{"type": "message", "role": "us')
+
+        messages = storage_service.get_messages(conv_id)
+        assert len(messages) == 1
+        assert messages[0]["content"] == "Hello"
+
+    def test_tail_read_across_blocks(self, storage_service):
+        """Test that the last messages are read from the end of the log"""
+        storage_service.backend.TAIL_BLOCK_SIZE = 64
+        conv_id = storage_service.create_conversation()
+
+        for i in range(30):
+            storage_service.add_message(
+                conv_id, "user", f"Повідомлення {i}",
+                model_config={"temperature": 0.5} if i % 3 == 0 else None
+            )
+
+        messages = storage_service.get_messages(conv_id, limit=5)
+        assert [m["content"] for m in messages] == [f"Повідомлення {i}" for i in range(25, 30)]
+        assert messages == storage_service.load_conversation(conv_id)["messages"][-5:]
+
+    def test_tail_read_stops_at_header(self, storage_service):
+        """Test that asking for more messages than exist returns all of them"""
+        storage_service.backend.TAIL_BLOCK_SIZE = 64
+        conv_id = storage_service.create_conversation()
+        storage_service.add_message(conv_id, "user", "first")
+        storage_service.add_message(conv_id, "assistant", "second")
+
+        messages = storage_service.get_messages(conv_id, limit=10)
+        assert [m["content"] for m in messages] == ["first", "second"]
+
+    def test_tail_read_skips_truncated_record(self, storage_service):
+        """Test that a partially written last record is ignored by tail reads"""
+        conv_id = storage_service.create_conversation()
+        storage_service.add_message(conv_id, "user", "complete")
+
+        with open(storage_service.backend._get_file_path(conv_id), 'a', encoding='utf-8') as f:
+            f.write('{"role": "assistant", "content": "trunc')
+
+        messages = storage_service.get_messages(conv_id, limit=2)
+        assert [m["content"] for m in messages] == ["complete"]
+
+    def test_index_rebuilt_for_existing_files(self, temp_data_dir, storage_service):
+        """Test that a missing index is rebuilt from conversation files"""
+        conv_id = storage_service.create_conversation()
+        storage_service.add_message(conv_id, "user", "Hello there")
+        storage_service.backend.close()
+        for path in temp_data_dir.glob("index.db*"):
+            path.unlink()
+
+        reopened = StorageService(temp_data_dir)
+        conversations, _ = reopened.page_conversations()
+
+        assert len(conversations) == 1
+        assert conversations[0]["conversation_id"] == conv_id
+        assert conversations[0]["message_count"] == 1
+        assert conversations[0]["title"] == "Hello there"
+
+    def test_new_conversations_are_sharded(self, storage_service, temp_data_dir):
+        """Test that conversation files are placed under UUID-prefix directories"""
+        conv_id = storage_service.create_conversation()
+        storage_service.add_message(conv_id, "user", "Hello", token_ids=[1, 2])
+
+        shard = temp_data_dir / conv_id[:2] / conv_id[2:4]
+        assert (shard / f"{conv_id}.jsonl").exists()
+        assert (shard / f"{conv_id}.tokens").exists()
+        assert not (temp_data_dir / f"{conv_id}.jsonl").exists()
+
+    def test_flat_layout_is_found_and_migrated(self, temp_data_dir):
+        """Test transparent lookup of the flat layout and bulk migration"""
+        flat = StorageService(temp_data_dir, backend=FileBackend(temp_data_dir, shard_depth=0))
+        conv_ids = [flat.create_conversation() for _ in range(3)]
+        for conv_id in conv_ids:
+            flat.add_message(conv_id, "user", f"Hello {conv_id}", token_ids=[5, 6])
+
+        sharded = StorageService(temp_data_dir)
+        assert sorted(sharded.list_conversations()) == sorted(conv_ids)
+        sharded.add_message(conv_ids[0], "assistant", "Still flat")
+        assert (temp_data_dir / f"{conv_ids[0]}.jsonl").exists()
+
+        assert sharded.backend.migrate_layout() == 3
+        assert not list(temp_data_dir.glob("*.jsonl"))
+        assert not list(temp_data_dir.glob("*.tokens"))
+
+        messages = sharded.get_messages(conv_ids[0])
+        assert [m["content"] for m in messages] == [f"Hello {conv_ids[0]}", "Still flat"]
+        assert sharded.get_token_ids(conv_ids[0], messages) == [[5, 6], None]
+        assert sorted(sharded.list_conversations()) == sorted(conv_ids)
+
+    def test_delete_flat_layout_conversation(self, temp_data_dir):
+        """Test that conversations can be deleted before migration"""
+        flat = StorageService(temp_data_dir, backend=FileBackend(temp_data_dir, shard_depth=0))
+        conv_id = flat.create_conversation()
+        flat.add_message(conv_id, "user", "Hello", token_ids=[1])
+
+        sharded = StorageService(temp_data_dir)
+        assert sharded.delete_conversation(conv_id) is True
+        assert not list(temp_data_dir.glob(f"{conv_id}.*"))
+
+    def test_unknown_conversation_leaves_no_files(self, storage_service, temp_data_dir):
+        """Test that writes to unknown conversations create no shard directories or lock files"""
+        unknown = "00000000-0000-4000-8000-0000000000ff"
+
+        with pytest.raises(ValueError):
+            storage_service.add_message(unknown, "user", "Hello")
+        assert storage_service.delete_conversation(unknown) is False
+        assert storage_service.compact(unknown) is False
+
+        assert not [path for path in temp_data_dir.rglob("*") if path.name.startswith("00")]
+
+    def test_invalid_conversation_id_cannot_escape_data_dir(self, temp_data_dir):
+        """Test that only canonical UUIDs become part of file paths"""
+        data_dir = temp_data_dir / "conversations"
+        storage_service = StorageService(data_dir)
+        escaping = "../outside"
+
+        with pytest.raises(ValueError):
+            storage_service.add_message(escaping, "user", "Hello")
+        assert storage_service.load_conversation(escaping) is None
+        assert storage_service.get_messages(escaping) == []
+        assert storage_service.delete_conversation(escaping) is False
+        with pytest.raises(ValueError):
+            storage_service.backend.create({"conversation_id": escaping})
+
+        storage_service.close()
+        assert list(temp_data_dir.iterdir()) == [data_dir]
@@ -0,0 +1,86 @@
+import json
+import sys
+import pytest
+import torch
+from unittest.mock import patch
+from transformers import GPT2LMHeadModel
+
+from models.weights_cache import WeightsCache, WEIGHTS_FILE, MANIFEST_FILE
+from models.gpt2_model import GPT2ChatModel
+
+
+class TestWeightsCache:
+    """Test suite for the memory-mapped weights cache"""
+
+    def test_load_matches_pretrained(self, temp_data_dir, source_model):
+        """Mapped weights give the same logits as from_pretrained"""
+        cache = WeightsCache(temp_data_dir / "cache")
+        model, tokenizer, info = cache.load(source_model)
+
+        reference = GPT2LMHeadModel.from_pretrained(source_model).eval()
+        input_ids = torch.tensor([[1, 2, 3, 1]])
+        with torch.no_grad():
+            assert torch.allclose(model(input_ids).logits, reference(input_ids).logits)
+
+        assert model.lm_head.weight.data_ptr() == model.transformer.wte.weight.data_ptr()
+        assert tokenizer.encode("ab") == [1, 2]
+        assert info["bytes"] == (cache.path_for(source_model) / WEIGHTS_FILE).stat().st_size
+
+    @pytest.mark.skipif(not sys.platform.startswith("linux"), reason="reads /proc/self/maps")
+    def test_weights_are_memory_mapped(self, temp_data_dir, source_model):
+        """Parameters point into a file mapping instead of copied memory"""
+        cache = WeightsCache(temp_data_dir / "cache")
+        model, _, _ = cache.load(source_model)
+        weights_path = str(cache.path_for(source_model) / WEIGHTS_FILE)
+
+        mappings = []
+        with open("/proc/self/maps") as f:
+            for line in f:
+                if line.rstrip().endswith(weights_path):
+                    start, end = (int(value, 16) for value in line.split()[0].split("-"))
+                    mappings.append((start, end))
+
+        pointer = model.transformer.h[0].attn.c_attn.weight.data_ptr()
+        assert any(start <= pointer < end for start, end in mappings)
+
+    def test_conversion_happens_once(self, temp_data_dir, source_model):
+        """A valid cache is reused without converting the model again"""
+        cache = WeightsCache(temp_data_dir / "cache")
+        cache.load(source_model)
+
+        with patch.object(WeightsCache, 'convert') as convert:
+            cache.load(source_model)
+            convert.assert_not_called()
+
+        manifest = json.loads((cache.path_for(source_model) / MANIFEST_FILE).read_text())
+        assert manifest["source"] == source_model
+        assert {WEIGHTS_FILE, "config.json", "vocab.json"} <= set(manifest["files"])
+
+    def test_corrupted_cache_is_converted_again(self, temp_data_dir, source_model):
+        """A checksum mismatch is detected and the cache is rebuilt"""
+        cache = WeightsCache(temp_data_dir / "cache")
+        path = cache.ensure(source_model)
+        weights = path / WEIGHTS_FILE
+        data = bytearray(weights.read_bytes())
+        data[-1] ^= 0xFF
+        weights.write_bytes(bytes(data))
+
+        assert "checksum" in cache.check(path, source_model)
+        # Size-only verification does not read the file
+        assert WeightsCache(temp_data_dir / "cache", verify=False).check(path, source_model) is None
+
+        cache.ensure(source_model)
+        assert cache.check(path, source_model) is None
+
+    def test_chat_model_loads_from_cache(self, temp_data_dir, source_model):
+        """GPT2ChatModel uses the cache when cache_dir is given"""
+        GPT2ChatModel._instance = None
+        try:
+            model = GPT2ChatModel()
+            model.load_model(source_model, cache_dir=temp_data_dir / "cache")
+
+            assert model.weights["mmap"] is True
+            assert model.get_stats()["weights"]["path"] == str(WeightsCache(temp_data_dir / "cache").path_for(source_model))
+            assert model.count_tokens("ab") == 2
+        finally:
+            GPT2ChatModel._instance = None
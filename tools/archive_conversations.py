@@ -0,0 +1,57 @@
+"""
+Перенесення давно не оновлених розмов у холодне сховище
+
+Розмови без оновлень довше за --older-than-days стискаються в пакети
+<data_dir>/archive/*.pack, а їхні файли видаляються. Сервер може
+працювати під час архівації: архівовані розмови розпаковуються
+при першому зверненні.
+
+--recover відновлює розташування архівних записів з пакетів
+(якщо index.db втрачено або пошкоджено).
+
+Запуск: python -m tools.archive_conversations [--data-dir DIR] [--older-than-days N] [--limit N]
+"""
+import argparse
+import logging
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from config import Config
+from services.backends import FileBackend
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Move idle conversations to compressed archive packs")
+    parser.add_argument("--data-dir", type=Path, default=Config.DATA_DIR)
+    parser.add_argument("--shard-depth", type=int, default=Config.STORAGE_SHARD_DEPTH)
+    parser.add_argument("--older-than-days", type=float, default=Config.STORAGE_ARCHIVE_AFTER_DAYS)
+    parser.add_argument("--limit", type=int, default=Config.MAINTENANCE_BATCH)
+    parser.add_argument("--codec", choices=("gzip", "zstd"), default=Config.STORAGE_ARCHIVE_CODEC)
+    parser.add_argument("--pack-bytes", type=int, default=Config.STORAGE_ARCHIVE_PACK_BYTES)
+    parser.add_argument("--recover", action="store_true", help="rebuild archive locations from packs")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    backend = FileBackend(
+        args.data_dir,
+        shard_depth=args.shard_depth,
+        archive_codec=args.codec,
+        archive_pack_bytes=args.pack_bytes
+    )
+
+    if args.recover:
+        print(f"Recovered {backend.recover_archive()} archived conversations")
+
+    before = (datetime.now() - timedelta(days=args.older_than_days)).isoformat()
+    archived = backend.archive_idle(before, args.limit)
+    stats = backend.get_stats()
+    backend.close()
+
+    print(f"Archived {archived} conversations in {args.data_dir}")
+    print(f"Archive: {stats['archived_conversations']} conversations, "
+          f"{stats['archive_packs']} packs, {stats['archive_bytes']} bytes")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+"""
+Конвертація моделі в локальний кеш ваг (safetensors для mmap) або в ONNX
+
+Сервер конвертує модель сам при першому запуску; скрипт дозволяє
+зробити це заздалегідь (при розгортанні, до старту воркерів) і
+перевірити цілісність уже наявного кешу (--check). З --onnx - експорт
+для бекенду onnxruntime (MODEL_BACKEND=onnx).
+
+Запуск: python -m tools.convert_model [--model NAME] [--cache-dir DIR] [--onnx] [--check] [--force]
+"""
+import argparse
+import logging
+import shutil
+import sys
+import time
+from pathlib import Path
+
+from config import Config
+from models.onnx_model import OnnxCache
+from models.weights_cache import WeightsCache
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert model weights into the local memory-mapped cache")
+    parser.add_argument("--model", default=Config.MODEL_NAME)
+    parser.add_argument("--cache-dir", type=Path, default=Config.MODEL_CACHE_DIR)
+    parser.add_argument("--onnx", action="store_true", help="export to ONNX for the onnxruntime backend")
+    parser.add_argument("--check", action="store_true", help="only verify checksums of the existing cache")
+    parser.add_argument("--force", action="store_true", help="convert again even if the cache is valid")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    cache = (OnnxCache if args.onnx else WeightsCache)(args.cache_dir, verify=True)
+    path = cache.path_for(args.model)
+
+    if args.check:
+        problem = cache.check(path, args.model) if path.exists() else "not converted"
+        print(f"{path}: {problem or 'ok'}")
+        sys.exit(1 if problem else 0)
+
+    if args.force:
+        shutil.rmtree(path, ignore_errors=True)
+
+    start = time.perf_counter()
+    path = cache.ensure(args.model)
+    print(f"{'ONNX' if args.onnx else 'Weights'} cache for {args.model}: {path} ({time.perf_counter() - start:.1f}s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,34 @@
+"""
+Перенесення файлового сховища розмов у розміщення з підкаталогами
+
+Переносить <data_dir>/<id>.jsonl (а також .json і .tokens) у
+<data_dir>/<префікс>/.../<id>.jsonl. Сервер може працювати під час
+міграції: розмови знаходяться в обох розміщеннях.
+
+Запуск: python -m tools.migrate_storage_layout [--data-dir DIR] [--shard-depth N]
+"""
+import argparse
+import logging
+from pathlib import Path
+
+from config import Config
+from services.backends import FileBackend
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Migrate a flat conversation store to the sharded layout")
+    parser.add_argument("--data-dir", type=Path, default=Config.DATA_DIR)
+    parser.add_argument("--shard-depth", type=int, default=Config.STORAGE_SHARD_DEPTH)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    backend = FileBackend(args.data_dir, shard_depth=args.shard_depth)
+    moved = backend.migrate_layout()
+    backend.close()
+
+    print(f"Moved {moved} conversations in {args.data_dir}")
+
+
+if __name__ == "__main__":
+    main()
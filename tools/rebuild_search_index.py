@@ -0,0 +1,42 @@
+"""
+Перебудова індексу повнотекстового пошуку з усіх збережених розмов
+
+Потрібна після зміни токенізації, відновлення сховища з резервної
+копії або втрати search.db. Архівовані розмови читаються з пакетів
+без розпакування у гарячі файли.
+
+Запуск: python -m tools.rebuild_search_index [--index PATH]
+"""
+import argparse
+import logging
+import time
+from pathlib import Path
+
+from config import Config
+from services.search_index import SearchIndex
+from services.storage_service import StorageService
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild the full-text search index")
+    parser.add_argument("--index", type=Path, default=Config.SEARCH_INDEX_PATH)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    class ToolConfig(Config):
+        SEARCH_ENABLED = False
+        STORAGE_CACHE_SIZE = 0
+        STORAGE_WRITE_BACK = False
+
+    service = StorageService.from_config(ToolConfig)
+    service.search_index = SearchIndex(args.index)
+    start = time.perf_counter()
+    count = service.rebuild_search_index()
+    service.close()
+
+    print(f"Indexed {count} conversations into {args.index} in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
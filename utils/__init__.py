@@ -1,3 +1,4 @@
-from .text_utils import clean_text, truncate_text, split_into_sentences
+from .text_utils import clean_text, truncate_text, split_into_sentences, tokenize_words
+from .memory import process_memory
 
-__all__ = ['clean_text', 'truncate_text', 'split_into_sentences']
+__all__ = ['clean_text', 'truncate_text', 'split_into_sentences', 'tokenize_words', 'process_memory']
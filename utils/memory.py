@@ -0,0 +1,37 @@
+from pathlib import Path
+from typing import Dict, Union
+
+MB = 1024 * 1024
+
+# Поля /proc/<pid>/smaps_rollup (кБ), з яких складається звіт
+ROLLUP_FIELDS = ("Rss", "Pss", "Shared_Clean", "Shared_Dirty", "Private_Clean", "Private_Dirty", "Swap")
+
+
+def process_memory(pid: Union[int, str] = "self") -> Dict[str, float]:
+    """
+    Пам'ять процесу в МБ: rss, shared, private, pss, swap
+
+    shared - сторінки, які процес ділить з іншими (після fork - спільні
+    з майстром ваги, mmap-файли), private - лише його власні. pss -
+    пропорційна частка: спільна сторінка ділиться між усіма власниками,
+    тож сума pss воркерів - реальна пам'ять сервера. Порожній словник,
+    якщо /proc недоступний (не Linux).
+    """
+    try:
+        lines = Path(f"/proc/{pid}/smaps_rollup").read_text().splitlines()
+    except OSError:
+        return {}
+
+    values = {}
+    for line in lines[1:]:
+        key, _, value = line.partition(":")
+        if key in ROLLUP_FIELDS:
+            values[key] = int(value.split()[0]) * 1024
+
+    return {
+        "rss": round(values["Rss"] / MB, 1),
+        "shared": round((values["Shared_Clean"] + values["Shared_Dirty"]) / MB, 1),
+        "private": round((values["Private_Clean"] + values["Private_Dirty"]) / MB, 1),
+        "pss": round(values["Pss"] / MB, 1),
+        "swap": round(values["Swap"] / MB, 1)
+    }
@@ -15,6 +15,10 @@ def truncate_text(text: str, max_length: int = 500) -> str:
         return text
     return text[:max_length] + "..."
 
+def tokenize_words(text: str, max_length: int = 64) -> List[str]:
+    """Слова тексту для пошуку: послідовності букв/цифр у нижньому регістрі"""
+    return [word for word in re.findall(r'\w+', text.casefold()) if len(word) <= max_length]
+
 def split_into_sentences(text: str) -> List[str]:
     """Розбиття тексту на речення"""
     sentences = re.split(r'[.!?]+', text)